@@ -0,0 +1,1285 @@
+/*
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+ */
+
+#include "cdrcodec.h"
+#include <string.h>
+#include <float.h>
+#include <math.h>
+
+// Serialized data starts with a four byte encapsulation header,
+// alignment is relative to the end of that header.
+#define CDR_HEADER_SIZE 4
+#define CDR_ARGS_ON_STACK 16
+
+typedef struct cdr_writer_s
+{
+    uint8_t* data;
+    size_t pos;
+    size_t size;
+    bool swap;
+    // Writing into caller memory that cannot be reallocated
+    bool fixed;
+    // Start of the sample being written, alignment is relative to it
+    size_t origin;
+    size_t max_align;
+}
+cdr_writer;
+
+typedef struct cdr_reader_s
+{
+    const uint8_t* data;
+    size_t pos;
+    size_t size;
+    bool swap;
+    // Object exporting data (may be NULL) and a memoryview over it created on first use
+    PyObject* source;
+    PyObject* view;
+    // Offset of data within source
+    size_t base;
+    size_t max_align;
+}
+cdr_reader;
+
+static inline size_t ALIGN(size_t x, size_t val)
+{
+    return ((x - CDR_HEADER_SIZE + (val - 1)) & ~(val - 1)) + CDR_HEADER_SIZE;
+}
+
+static bool host_is_little_endian(void)
+{
+    const uint16_t one = 1;
+    return *((const uint8_t*) &one) == 1;
+}
+
+static inline uint16_t bswap2(uint16_t x)
+{
+    return (uint16_t) ((x >> 8) | (x << 8));
+}
+
+static inline uint32_t bswap4(uint32_t x)
+{
+    return ((x >> 24) & 0xffu) | ((x >> 8) & 0xff00u) | ((x << 8) & 0xff0000u) | (x << 24);
+}
+
+static inline uint64_t bswap8(uint64_t x)
+{
+    return ((uint64_t) bswap4((uint32_t) x) << 32) | (uint64_t) bswap4((uint32_t) (x >> 32));
+}
+
+
+/* ---------------------------------------------------------------------------
+ * Program construction
+ * ------------------------------------------------------------------------ */
+
+static bool link_ops(cdr_codec* codec, uint32_t index, uint32_t* next)
+{
+    if (index >= codec->num_ops) {
+        PyErr_SetString(PyExc_ValueError, "Codec program is truncated.");
+        return false;
+    }
+
+    cdr_codec_op* op = &codec->ops[index];
+    uint32_t at = index + 1;
+
+    switch (op->type) {
+        case CdrCodecOpPrimitive:
+        case CdrCodecOpChar:
+        case CdrCodecOpString:
+        case CdrCodecOpBytes:
+        case CdrCodecOpEnum:
+        case CdrCodecOpDelegate:
+        case CdrCodecOpNothing:
+            break;
+        case CdrCodecOpStruct:
+            for (uint32_t i = 0; i < op->value; ++i) {
+                if (!link_ops(codec, at, &at)) return false;
+            }
+            break;
+        case CdrCodecOpArray:
+        case CdrCodecOpSequence:
+        case CdrCodecOpOptional:
+        case CdrCodecOpDHeader:
+            if (!link_ops(codec, at, &at)) return false;
+            break;
+        case CdrCodecOpUnion:
+        {
+            uint32_t num_cases = op->value + (op->size ? 1 : 0);
+            if (!link_ops(codec, at, &at)) return false;
+            op->cases = (uint32_t*) malloc(sizeof(uint32_t) * (num_cases + 1));
+            if (op->cases == NULL) {
+                PyErr_NoMemory();
+                return false;
+            }
+            for (uint32_t i = 0; i < num_cases; ++i) {
+                op->cases[i] = at;
+                if (!link_ops(codec, at, &at)) return false;
+            }
+            break;
+        }
+        default:
+            PyErr_Format(PyExc_ValueError, "Invalid codec op type %d.", (int) op->type);
+            return false;
+    }
+
+    op->next = at;
+    *next = at;
+    return true;
+}
+
+static bool read_op_attr_uint(PyObject* pyop, const char* name, uint32_t* out)
+{
+    PyObject* attr = PyObject_GetAttrString(pyop, name);
+    if (attr == NULL) return false;
+    unsigned long value = PyLong_AsUnsignedLong(attr);
+    Py_DECREF(attr);
+    if (value == (unsigned long) -1 && PyErr_Occurred()) return false;
+    if (value > UINT32_MAX) {
+        PyErr_Format(PyExc_OverflowError, "Codec op attribute %s out of range.", name);
+        return false;
+    }
+    *out = (uint32_t) value;
+    return true;
+}
+
+static bool read_op(PyObject* pyop, cdr_codec_op* op)
+{
+    uint32_t type, align;
+    if (!read_op_attr_uint(pyop, "type", &type) ||
+        !read_op_attr_uint(pyop, "size", &op->size) ||
+        !read_op_attr_uint(pyop, "value", &op->value) ||
+        !read_op_attr_uint(pyop, "align", &align))
+        return false;
+
+    op->type = (cdr_codec_op_type) type;
+    op->align = (uint8_t) align;
+
+    PyObject* code = PyObject_GetAttrString(pyop, "code");
+    if (code == NULL) return false;
+    if (PyUnicode_Check(code) && PyUnicode_GET_LENGTH(code) > 0)
+        op->code = (char) PyUnicode_READ_CHAR(code, 0);
+    Py_DECREF(code);
+
+    op->ref = PyObject_GetAttrString(pyop, "ref");
+    if (op->ref == NULL) return false;
+    op->names = PyObject_GetAttrString(pyop, "names");
+    if (op->names == NULL) return false;
+
+    if (op->type == CdrCodecOpStruct) {
+        // Keyword names must be a tuple of str for vectorcall
+        PyObject* names = PySequence_Tuple(op->names);
+        Py_DECREF(op->names);
+        op->names = names;
+        if (names == NULL) return false;
+        if (PyTuple_GET_SIZE(names) != (Py_ssize_t) op->value) {
+            PyErr_SetString(PyExc_ValueError, "Struct op member count does not match its names.");
+            return false;
+        }
+    }
+    else if (op->type == CdrCodecOpUnion && !PyDict_Check(op->names)) {
+        PyErr_SetString(PyExc_ValueError, "Union op requires a label dict.");
+        return false;
+    }
+    else if (op->type == CdrCodecOpPrimitive && strchr("bBhHiIqQfd?", op->code) == NULL) {
+        PyErr_Format(PyExc_ValueError, "Invalid primitive code '%c'.", op->code);
+        return false;
+    }
+    return true;
+}
+
+void cdr_codec_free(cdr_codec* codec)
+{
+    if (codec == NULL) return;
+    if (codec->ops != NULL) {
+        for (uint32_t i = 0; i < codec->num_ops; ++i) {
+            Py_XDECREF(codec->ops[i].ref);
+            Py_XDECREF(codec->ops[i].names);
+            free(codec->ops[i].cases);
+        }
+        free(codec->ops);
+    }
+    cdr_codec_free(codec->xcdr2);
+    Py_XDECREF(codec->buffer_type);
+    Py_XDECREF(codec->endianness_little);
+    Py_XDECREF(codec->endianness_big);
+    Py_XDECREF(codec->union_kwnames);
+    free(codec);
+}
+
+static cdr_codec* create_program(PyObject* op_list, uint8_t max_align, uint8_t encapsulation)
+{
+    PyObject* ops = PySequence_Fast(op_list, "Codec program must be a sequence of ops.");
+    if (ops == NULL) return NULL;
+
+    Py_ssize_t len = PySequence_Fast_GET_SIZE(ops);
+    if (len <= 0 || len >= UINT32_MAX) {
+        PyErr_SetString(PyExc_ValueError, "Codec program is empty or too long.");
+        Py_DECREF(ops);
+        return NULL;
+    }
+
+    cdr_codec* codec = (cdr_codec*) calloc(1, sizeof(struct cdr_codec_s));
+    if (codec == NULL) {
+        Py_DECREF(ops);
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    codec->num_ops = (uint32_t) len;
+    codec->max_align = max_align;
+    codec->encapsulation = encapsulation;
+    codec->ops = (cdr_codec_op*) calloc((size_t) len, sizeof(struct cdr_codec_op_s));
+    if (codec->ops == NULL) {
+        PyErr_NoMemory();
+        goto err;
+    }
+
+    for (Py_ssize_t i = 0; i < len; ++i) {
+        if (!read_op(PySequence_Fast_GET_ITEM(ops, i), &codec->ops[i]))
+            goto err;
+    }
+
+    uint32_t end;
+    if (!link_ops(codec, 0, &end))
+        goto err;
+    if (end != codec->num_ops) {
+        PyErr_SetString(PyExc_ValueError, "Codec program has trailing ops.");
+        goto err;
+    }
+
+    PyObject* support = PyImport_ImportModule("cyclonedds.idl._support");
+    if (support == NULL)
+        goto err;
+    codec->buffer_type = PyObject_GetAttrString(support, "Buffer");
+    PyObject* endianness = PyObject_GetAttrString(support, "Endianness");
+    Py_DECREF(support);
+    if (codec->buffer_type == NULL || endianness == NULL) {
+        Py_XDECREF(endianness);
+        goto err;
+    }
+    codec->endianness_little = PyObject_GetAttrString(endianness, "Little");
+    codec->endianness_big = PyObject_GetAttrString(endianness, "Big");
+    Py_DECREF(endianness);
+    if (codec->endianness_little == NULL || codec->endianness_big == NULL)
+        goto err;
+
+    codec->union_kwnames = Py_BuildValue("(ss)", "discriminator", "value");
+    if (codec->union_kwnames == NULL)
+        goto err;
+
+    Py_DECREF(ops);
+    return codec;
+
+err:
+    Py_DECREF(ops);
+    cdr_codec_free(codec);
+    return NULL;
+}
+
+cdr_codec* cdr_codec_create(PyObject* op_list, PyObject* xcdr2_op_list, uint8_t xcdr2_encapsulation)
+{
+    if (xcdr2_encapsulation < 6 || xcdr2_encapsulation > 11 || (xcdr2_encapsulation & 1)) {
+        PyErr_SetString(PyExc_ValueError, "Invalid XCDR2 encapsulation identifier.");
+        return NULL;
+    }
+
+    cdr_codec* codec = create_program(op_list, 8, 0);
+    if (codec == NULL || xcdr2_op_list == Py_None)
+        return codec;
+
+    codec->xcdr2 = create_program(xcdr2_op_list, 4, xcdr2_encapsulation);
+    if (codec->xcdr2 == NULL) {
+        cdr_codec_free(codec);
+        return NULL;
+    }
+    return codec;
+}
+
+static const cdr_codec* select_program(const cdr_codec* codec, bool xcdr2)
+{
+    if (!xcdr2)
+        return codec;
+    if (codec->xcdr2 == NULL)
+        PyErr_SetString(PyExc_ValueError, "Codec has no XCDR2 program.");
+    return codec->xcdr2;
+}
+
+
+/* ---------------------------------------------------------------------------
+ * Shared helpers
+ * ------------------------------------------------------------------------ */
+
+static PyObject* call_with_kwnames(PyObject* callable, PyObject** args, PyObject* kwnames)
+{
+#if PY_VERSION_HEX >= 0x03090000
+    return PyObject_Vectorcall(callable, args, 0, kwnames);
+#else
+    PyObject* kwargs = PyDict_New();
+    if (kwargs == NULL) return NULL;
+    for (Py_ssize_t i = 0; i < PyTuple_GET_SIZE(kwnames); ++i) {
+        if (PyDict_SetItem(kwargs, PyTuple_GET_ITEM(kwnames, i), args[i]) < 0) {
+            Py_DECREF(kwargs);
+            return NULL;
+        }
+    }
+    PyObject* empty = PyTuple_New(0);
+    PyObject* result = empty ? PyObject_Call(callable, empty, kwargs) : NULL;
+    Py_XDECREF(empty);
+    Py_DECREF(kwargs);
+    return result;
+#endif
+}
+
+static bool as_integer(PyObject* value, char code, uint64_t* out)
+{
+    // Same acceptance rules as struct.pack: anything implementing __index__ in range
+    PyObject* index = PyNumber_Index(value);
+    if (index == NULL) return false;
+
+    if (code == 'Q') {
+        unsigned long long v = PyLong_AsUnsignedLongLong(index);
+        Py_DECREF(index);
+        if (v == (unsigned long long) -1 && PyErr_Occurred()) return false;
+        *out = (uint64_t) v;
+        return true;
+    }
+
+    long long v = PyLong_AsLongLong(index);
+    Py_DECREF(index);
+    if (v == -1 && PyErr_Occurred()) return false;
+
+    long long lo, hi;
+    switch (code) {
+        case 'b': lo = INT8_MIN; hi = INT8_MAX; break;
+        case 'B': lo = 0; hi = UINT8_MAX; break;
+        case 'h': lo = INT16_MIN; hi = INT16_MAX; break;
+        case 'H': lo = 0; hi = UINT16_MAX; break;
+        case 'i': lo = INT32_MIN; hi = INT32_MAX; break;
+        case 'I': lo = 0; hi = UINT32_MAX; break;
+        default: lo = INT64_MIN; hi = INT64_MAX; break;
+    }
+    if (v < lo || v > hi) {
+        PyErr_Format(PyExc_OverflowError, "Value %lld out of range for format '%c'.", v, code);
+        return false;
+    }
+    *out = (uint64_t) v;
+    return true;
+}
+
+
+/* ---------------------------------------------------------------------------
+ * Serialization
+ * ------------------------------------------------------------------------ */
+
+static bool writer_reserve(cdr_writer* w, size_t n)
+{
+    if (w->pos + n <= w->size) return true;
+
+    if (w->fixed) {
+        PyErr_SetString(PyExc_ValueError, "Serialized sample does not fit the target buffer.");
+        return false;
+    }
+
+    size_t size = w->size;
+    while (size < w->pos + n) size *= 2;
+    uint8_t* data = (uint8_t*) realloc(w->data, size);
+    if (data == NULL) {
+        PyErr_NoMemory();
+        return false;
+    }
+    w->data = data;
+    w->size = size;
+    return true;
+}
+
+static bool writer_align(cdr_writer* w, size_t align)
+{
+    if (align > w->max_align) align = w->max_align;
+    size_t pos = ALIGN(w->pos - w->origin, align) + w->origin;
+    if (!writer_reserve(w, pos - w->pos)) return false;
+    memset(w->data + w->pos, 0, pos - w->pos);
+    w->pos = pos;
+    return true;
+}
+
+static bool write_raw(cdr_writer* w, const void* data, size_t size)
+{
+    if (!writer_reserve(w, size)) return false;
+    memcpy(w->data + w->pos, data, size);
+    w->pos += size;
+    return true;
+}
+
+static bool write_sized(cdr_writer* w, uint64_t value, size_t size)
+{
+    if (!writer_align(w, size) || !writer_reserve(w, size)) return false;
+
+    uint8_t* dst = w->data + w->pos;
+    switch (size) {
+        case 1: { uint8_t x = (uint8_t) value; memcpy(dst, &x, 1); break; }
+        case 2: { uint16_t x = (uint16_t) value; if (w->swap) x = bswap2(x); memcpy(dst, &x, 2); break; }
+        case 4: { uint32_t x = (uint32_t) value; if (w->swap) x = bswap4(x); memcpy(dst, &x, 4); break; }
+        default: { uint64_t x = value; if (w->swap) x = bswap8(x); memcpy(dst, &x, 8); break; }
+    }
+    w->pos += size;
+    return true;
+}
+
+static bool ser_primitive(const cdr_codec_op* op, PyObject* value, cdr_writer* w)
+{
+    uint64_t bits;
+
+    switch (op->code) {
+        case 'f':
+        {
+            double d = PyFloat_AsDouble(value);
+            if (d == -1.0 && PyErr_Occurred()) return false;
+            float f = (float) d;
+            if (isinf(f) && !isinf(d)) {
+                PyErr_SetString(PyExc_OverflowError, "float too large to pack with f format");
+                return false;
+            }
+            uint32_t x;
+            memcpy(&x, &f, 4);
+            bits = x;
+            break;
+        }
+        case 'd':
+        {
+            double d = PyFloat_AsDouble(value);
+            if (d == -1.0 && PyErr_Occurred()) return false;
+            memcpy(&bits, &d, 8);
+            break;
+        }
+        case '?':
+        {
+            int truth = PyObject_IsTrue(value);
+            if (truth < 0) return false;
+            bits = (uint64_t) truth;
+            break;
+        }
+        default:
+            if (!as_integer(value, op->code, &bits)) return false;
+            break;
+    }
+
+    return write_sized(w, bits, op->size);
+}
+
+static bool ser_op(const cdr_codec* codec, uint32_t index, PyObject* value, cdr_writer* w);
+
+static char format_kind(char c)
+{
+    switch (c) {
+        case 'b': case 'h': case 'i': case 'l': case 'q': case 'n':
+            return 'i';
+        case 'B': case 'H': case 'I': case 'L': case 'Q': case 'N':
+            return 'u';
+        case 'e': case 'f': case 'd':
+            return 'f';
+        case '?':
+            return '?';
+        default:
+            return 0;
+    }
+}
+
+// Copy an array or sequence of primitives straight from an object exporting a
+// matching contiguous buffer (numpy.ndarray, array.array, bytes for octets).
+// Returns 1 when written, 0 if the value has to be serialized item by item.
+static int ser_primitive_buffer(const cdr_codec_op* op, const cdr_codec_op* element, PyObject* value, cdr_writer* w)
+{
+    if (PyList_Check(value) || PyTuple_Check(value) || !PyObject_CheckBuffer(value))
+        return 0;
+
+    Py_buffer view;
+    if (PyObject_GetBuffer(value, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        PyErr_Clear();
+        return 0;
+    }
+
+    const char* format = view.format ? view.format : "B";
+    bool little = host_is_little_endian();
+    if (*format == '<') little = true;
+    else if (*format == '>' || *format == '!') little = false;
+    while (*format == '@' || *format == '=' || *format == '<' || *format == '>' || *format == '!')
+        ++format;
+
+    int result = 0;
+    if (view.ndim != 1 || format[0] == 0 || format[1] != 0 || format_kind(format[0]) != format_kind(element->code) ||
+            view.itemsize != (Py_ssize_t) element->size)
+        goto done;
+
+    size_t count = (size_t) (view.len / view.itemsize);
+    result = -1;
+    if (op->type == CdrCodecOpArray && count != op->size) {
+        PyErr_SetString(PyExc_ValueError, "Incorrectly sized array.");
+        goto done;
+    }
+    if (op->type == CdrCodecOpSequence) {
+        if ((op->value && count > op->size) || count > UINT32_MAX) {
+            PyErr_SetString(PyExc_ValueError, "Sequence longer than bound.");
+            goto done;
+        }
+        if (!write_sized(w, (uint64_t) count, 4))
+            goto done;
+    }
+    if (count == 0) {
+        result = 1;
+        goto done;
+    }
+
+    if (!writer_align(w, element->size) || !write_raw(w, view.buf, (size_t) view.len))
+        goto done;
+
+    if (element->size > 1 && little != (w->swap != host_is_little_endian())) {
+        uint8_t* data = w->data + w->pos - (size_t) view.len;
+        for (size_t i = 0; i < count; ++i, data += element->size) {
+            switch (element->size) {
+                case 2: { uint16_t x; memcpy(&x, data, 2); x = bswap2(x); memcpy(data, &x, 2); break; }
+                case 4: { uint32_t x; memcpy(&x, data, 4); x = bswap4(x); memcpy(data, &x, 4); break; }
+                default: { uint64_t x; memcpy(&x, data, 8); x = bswap8(x); memcpy(data, &x, 8); break; }
+            }
+        }
+    }
+    result = 1;
+
+done:
+    PyBuffer_Release(&view);
+    return result;
+}
+
+static bool ser_elements(const cdr_codec* codec, uint32_t index, PyObject* fast, cdr_writer* w)
+{
+    Py_ssize_t len = PySequence_Fast_GET_SIZE(fast);
+    PyObject** items = PySequence_Fast_ITEMS(fast);
+
+    for (Py_ssize_t i = 0; i < len; ++i) {
+        if (!ser_op(codec, index, items[i], w)) return false;
+    }
+    return true;
+}
+
+static bool ser_union(const cdr_codec* codec, const cdr_codec_op* op, uint32_t index, PyObject* value, cdr_writer* w)
+{
+    PyObject* pair = PyObject_CallMethod(value, "get", NULL);
+    if (pair == NULL) return false;
+
+    PyObject *discriminator, *contents;
+    if (!PyArg_ParseTuple(pair, "OO", &discriminator, &contents)) {
+        Py_DECREF(pair);
+        return false;
+    }
+
+    bool ok = false;
+    uint32_t case_index;
+
+    if (discriminator == Py_None) {
+        if (!op->size) {
+            PyErr_SetString(PyExc_ValueError, "Union without default case has no discriminator set.");
+            goto done;
+        }
+        case_index = op->cases[op->value];
+        discriminator = PyObject_GetAttrString(value, "__idl_default_discriminator__");
+        if (discriminator == NULL) goto done;
+        ok = ser_op(codec, index + 1, discriminator, w);
+        Py_DECREF(discriminator);
+    }
+    else {
+        PyObject* label = PyDict_GetItemWithError(op->names, discriminator);
+        if (label == NULL) {
+            if (!PyErr_Occurred())
+                PyErr_SetObject(PyExc_KeyError, discriminator);
+            goto done;
+        }
+        size_t i = PyLong_AsSize_t(label);
+        if (i == (size_t) -1 && PyErr_Occurred()) goto done;
+        case_index = op->cases[i];
+        ok = ser_op(codec, index + 1, discriminator, w);
+    }
+
+    ok = ok && ser_op(codec, case_index, contents, w);
+
+done:
+    Py_DECREF(pair);
+    return ok;
+}
+
+static bool ser_delegate(const cdr_codec* codec, const cdr_codec_op* op, PyObject* value, cdr_writer* w)
+{
+    // Hand the value to the python machine with a buffer whose alignment matches ours
+    PyObject* buffer = PyObject_CallObject(codec->buffer_type, NULL);
+    if (buffer == NULL) return false;
+
+    bool ok = false;
+    PyObject* res = PyObject_CallMethod(
+        buffer, "set_endianness", "O",
+        (w->swap != host_is_little_endian()) ? codec->endianness_little : codec->endianness_big
+    );
+    if (res == NULL) goto done;
+    Py_DECREF(res);
+
+    res = PyObject_CallMethod(buffer, "set_align_offset", "n", (Py_ssize_t) ((12 - (w->pos - w->origin) % 8) % 8));
+    if (res == NULL) goto done;
+    Py_DECREF(res);
+
+    res = PyObject_CallMethod(buffer, "set_version", "i", codec->max_align == 4 ? 2 : 1);
+    if (res == NULL) goto done;
+    Py_DECREF(res);
+
+    res = PyObject_CallMethod(op->ref, "serialize", "OO", buffer, value);
+    if (res == NULL) goto done;
+    Py_DECREF(res);
+
+    res = PyObject_CallMethod(buffer, "asbytes", NULL);
+    if (res == NULL) goto done;
+    if (PyBytes_Check(res))
+        ok = write_raw(w, PyBytes_AS_STRING(res), (size_t) PyBytes_GET_SIZE(res));
+    else
+        PyErr_SetString(PyExc_TypeError, "Buffer.asbytes did not return bytes.");
+    Py_DECREF(res);
+
+done:
+    Py_DECREF(buffer);
+    return ok;
+}
+
+static bool ser_op(const cdr_codec* codec, uint32_t index, PyObject* value, cdr_writer* w)
+{
+    const cdr_codec_op* op = &codec->ops[index];
+
+    switch (op->type) {
+        case CdrCodecOpPrimitive:
+            return ser_primitive(op, value, w);
+        case CdrCodecOpChar:
+        {
+            long ch;
+            if (PyUnicode_Check(value) && PyUnicode_GET_LENGTH(value) == 1)
+                ch = (long) PyUnicode_READ_CHAR(value, 0);
+            else if (PyBytes_Check(value) && PyBytes_GET_SIZE(value) == 1)
+                ch = (long) (uint8_t) PyBytes_AS_STRING(value)[0];
+            else {
+                PyErr_SetString(PyExc_TypeError, "Expected a character.");
+                return false;
+            }
+            if (ch > INT8_MAX) {
+                PyErr_SetString(PyExc_OverflowError, "Character does not fit in a char.");
+                return false;
+            }
+            return write_sized(w, (uint64_t) ch, 1);
+        }
+        case CdrCodecOpString:
+        {
+            if (!PyUnicode_Check(value)) {
+                PyErr_SetString(PyExc_TypeError, "Expected a str.");
+                return false;
+            }
+            if (op->size && PyUnicode_GET_LENGTH(value) > (Py_ssize_t) op->size) {
+                PyErr_SetString(PyExc_ValueError, "String longer than bound.");
+                return false;
+            }
+            Py_ssize_t len;
+            const char* utf8 = PyUnicode_AsUTF8AndSize(value, &len);
+            if (utf8 == NULL) return false;
+            if ((size_t) len >= UINT32_MAX) {
+                PyErr_SetString(PyExc_OverflowError, "String too long.");
+                return false;
+            }
+            return write_sized(w, (uint64_t) len + 1, 4) &&
+                write_raw(w, utf8, (size_t) len) &&
+                write_sized(w, 0, 1);
+        }
+        case CdrCodecOpBytes:
+        {
+            Py_ssize_t len = PyObject_Length(value);
+            if (len < 0) return false;
+            if (op->size && len > (Py_ssize_t) op->size) {
+                PyErr_SetString(PyExc_ValueError, "Bytes longer than bound.");
+                return false;
+            }
+            Py_buffer view;
+            if (PyObject_GetBuffer(value, &view, PyBUF_SIMPLE) < 0) return false;
+            bool ok;
+            if (view.len != len || (size_t) len >= UINT32_MAX) {
+                PyErr_SetString(PyExc_ValueError, "Expected a bytes-like object of single byte items.");
+                ok = false;
+            }
+            else {
+                ok = write_sized(w, (uint64_t) len, 4) && write_raw(w, view.buf, (size_t) len);
+            }
+            PyBuffer_Release(&view);
+            return ok;
+        }
+        case CdrCodecOpEnum:
+        {
+            PyObject* number = PyObject_GetAttrString(value, "value");
+            if (number == NULL) return false;
+            uint64_t bits;
+            bool ok = as_integer(number, 'I', &bits);
+            Py_DECREF(number);
+            return ok && write_sized(w, bits, 4);
+        }
+        case CdrCodecOpStruct:
+        {
+            uint32_t at = index + 1;
+            for (uint32_t i = 0; i < op->value; ++i) {
+                PyObject* member = PyObject_GetAttr(value, PyTuple_GET_ITEM(op->names, i));
+                if (member == NULL) return false;
+                bool ok = ser_op(codec, at, member, w);
+                Py_DECREF(member);
+                if (!ok) return false;
+                at = codec->ops[at].next;
+            }
+            return true;
+        }
+        case CdrCodecOpArray:
+        case CdrCodecOpSequence:
+        {
+            if (codec->ops[index + 1].type == CdrCodecOpPrimitive) {
+                int written = ser_primitive_buffer(op, &codec->ops[index + 1], value, w);
+                if (written != 0) return written > 0;
+            }
+
+            PyObject* fast = PySequence_Fast(value, "Expected a sequence.");
+            if (fast == NULL) return false;
+            Py_ssize_t len = PySequence_Fast_GET_SIZE(fast);
+            bool ok = true;
+
+            if (op->type == CdrCodecOpArray && len != (Py_ssize_t) op->size) {
+                PyErr_SetString(PyExc_ValueError, "Incorrectly sized array.");
+                ok = false;
+            }
+            else if (op->type == CdrCodecOpSequence) {
+                if ((op->value && len > (Py_ssize_t) op->size) || (size_t) len > UINT32_MAX) {
+                    PyErr_SetString(PyExc_ValueError, "Sequence longer than bound.");
+                    ok = false;
+                }
+                else {
+                    ok = write_sized(w, (uint64_t) len, 4);
+                }
+            }
+
+            ok = ok && ser_elements(codec, index + 1, fast, w);
+            Py_DECREF(fast);
+            return ok;
+        }
+        case CdrCodecOpOptional:
+            if (value == Py_None)
+                return write_sized(w, 0, 1);
+            return write_sized(w, 1, 1) && ser_op(codec, index + 1, value, w);
+        case CdrCodecOpUnion:
+            return ser_union(codec, op, index, value, w);
+        case CdrCodecOpDelegate:
+            return ser_delegate(codec, op, value, w);
+        case CdrCodecOpNothing:
+            return true;
+        case CdrCodecOpDHeader:
+        {
+            // The size is only known once what it delimits is written
+            if (!write_sized(w, 0, 4)) return false;
+            size_t start = w->pos;
+            if (!ser_op(codec, index + 1, value, w)) return false;
+            if (w->pos - start > UINT32_MAX) {
+                PyErr_SetString(PyExc_OverflowError, "Delimited data too long.");
+                return false;
+            }
+            uint32_t size = (uint32_t) (w->pos - start);
+            if (w->swap) size = bswap4(size);
+            memcpy(w->data + start - 4, &size, 4);
+            return true;
+        }
+        default:
+            PyErr_SetString(PyExc_RuntimeError, "Invalid codec op.");
+            return false;
+    }
+}
+
+PyObject* cdr_codec_serialize(const cdr_codec* codec, PyObject* sample, bool little_endian, bool xcdr2)
+{
+    codec = select_program(codec, xcdr2);
+    if (codec == NULL) return NULL;
+
+    cdr_writer w = {
+        .data = (uint8_t*) malloc(256),
+        .pos = CDR_HEADER_SIZE,
+        .size = 256,
+        .swap = little_endian != host_is_little_endian(),
+        .max_align = codec->max_align
+    };
+    if (w.data == NULL) return PyErr_NoMemory();
+
+    w.data[0] = 0;
+    w.data[1] = (uint8_t) (codec->encapsulation | (little_endian ? 1 : 0));
+    w.data[2] = 0;
+    w.data[3] = 0;
+
+    PyObject* result = NULL;
+    if (ser_op(codec, 0, sample, &w))
+        result = PyBytes_FromStringAndSize((const char*) w.data, (Py_ssize_t) w.pos);
+
+    free(w.data);
+    return result;
+}
+
+PyObject* cdr_codec_serialize_many(const cdr_codec* codec, PyObject* samples, bool little_endian, bool xcdr2)
+{
+    codec = select_program(codec, xcdr2);
+    if (codec == NULL) return NULL;
+
+    // A private tuple, delegated members run python code that could modify a list
+    PyObject* items = PySequence_Tuple(samples);
+    if (items == NULL) return NULL;
+
+    size_t count = (size_t) PyTuple_GET_SIZE(items);
+    uint64_t* offsets = (uint64_t*) malloc((count + 1) * sizeof(uint64_t));
+    cdr_writer w = {
+        .data = (uint8_t*) malloc(256),
+        .pos = 0,
+        .size = 256,
+        .swap = little_endian != host_is_little_endian(),
+        .max_align = codec->max_align
+    };
+    PyObject* result = NULL;
+
+    if (offsets == NULL || w.data == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    const uint8_t header[CDR_HEADER_SIZE] = {0, (uint8_t) (codec->encapsulation | (little_endian ? 1 : 0)), 0, 0};
+    for (size_t i = 0; i < count; i++) {
+        offsets[i] = w.pos;
+        w.origin = w.pos;
+        if (!write_raw(&w, header, CDR_HEADER_SIZE) || !ser_op(codec, 0, PyTuple_GET_ITEM(items, (Py_ssize_t) i), &w))
+            goto done;
+    }
+    offsets[count] = w.pos;
+
+    result = Py_BuildValue(
+        "(y#y#)",
+        (const char*) w.data, (Py_ssize_t) w.pos,
+        (const char*) offsets, (Py_ssize_t) ((count + 1) * sizeof(uint64_t))
+    );
+
+done:
+    free(w.data);
+    free(offsets);
+    Py_DECREF(items);
+    return result;
+}
+
+bool cdr_codec_serialize_into(
+    const cdr_codec* codec, PyObject* sample, bool little_endian, bool xcdr2, uint8_t* data, size_t size, size_t* written)
+{
+    codec = select_program(codec, xcdr2);
+    if (codec == NULL) return false;
+
+    cdr_writer w = {
+        .data = data,
+        .pos = 0,
+        .size = size,
+        .swap = little_endian != host_is_little_endian(),
+        .fixed = true,
+        .max_align = codec->max_align
+    };
+
+    const uint8_t header[CDR_HEADER_SIZE] = {0, (uint8_t) (codec->encapsulation | (little_endian ? 1 : 0)), 0, 0};
+    if (!write_raw(&w, header, CDR_HEADER_SIZE) || !ser_op(codec, 0, sample, &w))
+        return false;
+
+    *written = w.pos;
+    return true;
+}
+
+
+/* ---------------------------------------------------------------------------
+ * Deserialization
+ * ------------------------------------------------------------------------ */
+
+static const uint8_t* reader_take(cdr_reader* r, size_t size)
+{
+    if (r->pos > r->size || size > r->size - r->pos) {
+        PyErr_SetString(PyExc_ValueError, "Serialized data is truncated.");
+        return NULL;
+    }
+    const uint8_t* src = r->data + r->pos;
+    r->pos += size;
+    return src;
+}
+
+static bool read_sized(cdr_reader* r, size_t size, uint64_t* out)
+{
+    r->pos = ALIGN(r->pos, size > r->max_align ? r->max_align : size);
+    const uint8_t* src = reader_take(r, size);
+    if (src == NULL) return false;
+
+    switch (size) {
+        case 1: *out = *src; break;
+        case 2: { uint16_t x; memcpy(&x, src, 2); *out = r->swap ? bswap2(x) : x; break; }
+        case 4: { uint32_t x; memcpy(&x, src, 4); *out = r->swap ? bswap4(x) : x; break; }
+        default: { uint64_t x; memcpy(&x, src, 8); *out = r->swap ? bswap8(x) : x; break; }
+    }
+    return true;
+}
+
+// New reference to a memoryview of 'size' bytes at the current position of the source
+static PyObject* reader_view(cdr_reader* r, size_t size)
+{
+    if (r->view == NULL) {
+        r->view = PyMemoryView_FromObject(r->source);
+        if (r->view == NULL) return NULL;
+    }
+    size_t start = r->base + r->pos;
+    if (reader_take(r, size) == NULL) return NULL;
+    return PySequence_GetSlice(r->view, (Py_ssize_t) start, (Py_ssize_t) (start + size));
+}
+
+static PyObject* des_primitive(const cdr_codec_op* op, cdr_reader* r)
+{
+    uint64_t bits;
+    if (!read_sized(r, op->size, &bits)) return NULL;
+
+    switch (op->code) {
+        case 'b': return PyLong_FromLong((int8_t) bits);
+        case 'B': return PyLong_FromLong((uint8_t) bits);
+        case 'h': return PyLong_FromLong((int16_t) bits);
+        case 'H': return PyLong_FromLong((uint16_t) bits);
+        case 'i': return PyLong_FromLong((int32_t) bits);
+        case 'I': return PyLong_FromUnsignedLong((uint32_t) bits);
+        case 'q': return PyLong_FromLongLong((int64_t) bits);
+        case 'Q': return PyLong_FromUnsignedLongLong(bits);
+        case '?': return PyBool_FromLong(bits != 0);
+        case 'f':
+        {
+            uint32_t x = (uint32_t) bits;
+            float f;
+            memcpy(&f, &x, 4);
+            return PyFloat_FromDouble((double) f);
+        }
+        default:
+        {
+            double d;
+            memcpy(&d, &bits, 8);
+            return PyFloat_FromDouble(d);
+        }
+    }
+}
+
+static PyObject* des_op(const cdr_codec* codec, uint32_t index, cdr_reader* r);
+
+static PyObject* des_elements(const cdr_codec* codec, uint32_t index, uint32_t count, cdr_reader* r)
+{
+    // Don't trust the count to preallocate more items than there is data
+    Py_ssize_t prealloc = ((size_t) count <= r->size - r->pos) ? (Py_ssize_t) count : 0;
+    PyObject* list = PyList_New(prealloc);
+    if (list == NULL) return NULL;
+
+    for (uint32_t i = 0; i < count; ++i) {
+        PyObject* item = des_op(codec, index, r);
+        if (item == NULL) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        if (prealloc) {
+            PyList_SET_ITEM(list, (Py_ssize_t) i, item);
+        }
+        else {
+            int ret = PyList_Append(list, item);
+            Py_DECREF(item);
+            if (ret < 0) {
+                Py_DECREF(list);
+                return NULL;
+            }
+        }
+    }
+    return list;
+}
+
+static PyObject* des_struct(const cdr_codec* codec, const cdr_codec_op* op, uint32_t index, cdr_reader* r)
+{
+    PyObject* stack_args[CDR_ARGS_ON_STACK];
+    PyObject** args = stack_args;
+    PyObject* result = NULL;
+    uint32_t done = 0;
+
+    if (op->value > CDR_ARGS_ON_STACK) {
+        args = (PyObject**) PyMem_Malloc(sizeof(PyObject*) * op->value);
+        if (args == NULL) return PyErr_NoMemory();
+    }
+
+    uint32_t at = index + 1;
+    for (; done < op->value; ++done) {
+        args[done] = des_op(codec, at, r);
+        if (args[done] == NULL) goto err;
+        at = codec->ops[at].next;
+    }
+
+    result = call_with_kwnames(op->ref, args, op->names);
+
+err:
+    for (uint32_t i = 0; i < done; ++i)
+        Py_DECREF(args[i]);
+    if (args != stack_args)
+        PyMem_Free(args);
+    return result;
+}
+
+static PyObject* des_union(const cdr_codec* codec, const cdr_codec_op* op, uint32_t index, cdr_reader* r)
+{
+    PyObject* args[2];
+    uint32_t case_index;
+
+    args[0] = des_op(codec, index + 1, r);
+    if (args[0] == NULL) return NULL;
+
+    PyObject* label = PyDict_GetItemWithError(op->names, args[0]);
+    if (label != NULL) {
+        size_t i = PyLong_AsSize_t(label);
+        if (i == (size_t) -1 && PyErr_Occurred()) goto err;
+        case_index = op->cases[i];
+    }
+    else if (PyErr_Occurred()) {
+        goto err;
+    }
+    else if (op->size) {
+        Py_DECREF(args[0]);
+        Py_INCREF(Py_None);
+        args[0] = Py_None;
+        case_index = op->cases[op->value];
+    }
+    else {
+        PyErr_SetString(PyExc_ValueError, "Union discriminator does not select a case.");
+        goto err;
+    }
+
+    args[1] = des_op(codec, case_index, r);
+    if (args[1] == NULL) goto err;
+
+    PyObject* result = call_with_kwnames(op->ref, args, codec->union_kwnames);
+    Py_DECREF(args[0]);
+    Py_DECREF(args[1]);
+    return result;
+
+err:
+    Py_DECREF(args[0]);
+    return NULL;
+}
+
+static PyObject* des_delegate(const cdr_codec* codec, const cdr_codec_op* op, cdr_reader* r)
+{
+    // The python machine reads the rest of the data in place when we know its owner
+    PyObject* data;
+    if (r->source != NULL) {
+        size_t pos = r->pos;
+        data = reader_view(r, r->size - r->pos);
+        r->pos = pos;
+    }
+    else {
+        data = PyBytes_FromStringAndSize((const char*) r->data + r->pos, (Py_ssize_t) (r->size - r->pos));
+    }
+    if (data == NULL) return NULL;
+
+    PyObject* buffer = PyObject_CallFunction(
+        codec->buffer_type, "OnO", data, (Py_ssize_t) ((12 - r->pos % 8) % 8), Py_True);
+    Py_DECREF(data);
+    if (buffer == NULL) return NULL;
+
+    PyObject* result = NULL;
+    PyObject* res = PyObject_CallMethod(
+        buffer, "set_endianness", "O",
+        (r->swap != host_is_little_endian()) ? codec->endianness_little : codec->endianness_big
+    );
+    if (res == NULL) goto done;
+    Py_DECREF(res);
+
+    res = PyObject_CallMethod(buffer, "set_version", "i", codec->max_align == 4 ? 2 : 1);
+    if (res == NULL) goto done;
+    Py_DECREF(res);
+
+    result = PyObject_CallMethod(op->ref, "deserialize", "O", buffer);
+    if (result == NULL) goto done;
+
+    res = PyObject_CallMethod(buffer, "tell", NULL);
+    if (res == NULL) {
+        Py_CLEAR(result);
+        goto done;
+    }
+    size_t consumed = PyLong_AsSize_t(res);
+    Py_DECREF(res);
+    if ((consumed == (size_t) -1 && PyErr_Occurred()) || reader_take(r, consumed) == NULL)
+        Py_CLEAR(result);
+
+done:
+    Py_DECREF(buffer);
+    return result;
+}
+
+static PyObject* des_op(const cdr_codec* codec, uint32_t index, cdr_reader* r)
+{
+    const cdr_codec_op* op = &codec->ops[index];
+    uint64_t bits;
+
+    switch (op->type) {
+        case CdrCodecOpPrimitive:
+            return des_primitive(op, r);
+        case CdrCodecOpChar:
+            if (!read_sized(r, 1, &bits)) return NULL;
+            if (bits > INT8_MAX) {
+                PyErr_SetString(PyExc_ValueError, "Character out of range.");
+                return NULL;
+            }
+            return PyUnicode_FromOrdinal((int) bits);
+        case CdrCodecOpString:
+        {
+            if (!read_sized(r, 4, &bits)) return NULL;
+            if (bits == 0) {
+                PyErr_SetString(PyExc_ValueError, "String without terminator.");
+                return NULL;
+            }
+            const uint8_t* src = reader_take(r, (size_t) bits);
+            if (src == NULL) return NULL;
+            return PyUnicode_DecodeUTF8((const char*) src, (Py_ssize_t) bits - 1, NULL);
+        }
+        case CdrCodecOpBytes:
+        {
+            if (!read_sized(r, 4, &bits)) return NULL;
+            if (op->value && r->source != NULL)
+                return reader_view(r, (size_t) bits);
+            const uint8_t* src = reader_take(r, (size_t) bits);
+            if (src == NULL) return NULL;
+            if (op->value) {
+                // Zero copy requested but the data has no owner, view a private copy
+                PyObject* copy = PyBytes_FromStringAndSize((const char*) src, (Py_ssize_t) bits);
+                PyObject* view = copy ? PyMemoryView_FromObject(copy) : NULL;
+                Py_XDECREF(copy);
+                return view;
+            }
+            return PyBytes_FromStringAndSize((const char*) src, (Py_ssize_t) bits);
+        }
+        case CdrCodecOpEnum:
+        {
+            if (!read_sized(r, 4, &bits)) return NULL;
+            PyObject* number = PyLong_FromUnsignedLong((unsigned long) bits);
+            if (number == NULL) return NULL;
+            PyObject* result = PyObject_CallFunctionObjArgs(op->ref, number, NULL);
+            Py_DECREF(number);
+            return result;
+        }
+        case CdrCodecOpStruct:
+            return des_struct(codec, op, index, r);
+        case CdrCodecOpArray:
+            if (op->ref != Py_None) return des_delegate(codec, op, r);
+            return des_elements(codec, index + 1, op->size, r);
+        case CdrCodecOpSequence:
+            if (op->ref != Py_None) return des_delegate(codec, op, r);
+            if (!read_sized(r, 4, &bits)) return NULL;
+            return des_elements(codec, index + 1, (uint32_t) bits, r);
+        case CdrCodecOpOptional:
+            if (!read_sized(r, 1, &bits)) return NULL;
+            if (!bits) Py_RETURN_NONE;
+            return des_op(codec, index + 1, r);
+        case CdrCodecOpUnion:
+            return des_union(codec, op, index, r);
+        case CdrCodecOpDelegate:
+            return des_delegate(codec, op, r);
+        case CdrCodecOpNothing:
+            Py_RETURN_NONE;
+        case CdrCodecOpDHeader:
+        {
+            if (!read_sized(r, 4, &bits)) return NULL;
+            if (bits > r->size - r->pos) {
+                PyErr_SetString(PyExc_ValueError, "Serialized data is truncated.");
+                return NULL;
+            }
+            size_t end = r->pos + (size_t) bits;
+            PyObject* result = des_op(codec, index + 1, r);
+            if (result != NULL && r->pos > end) {
+                // Written by another version of an extensible type, left to the python machines
+                PyErr_SetString(PyExc_ValueError, "Data exceeds its DHEADER.");
+                Py_CLEAR(result);
+            }
+            // Members appended by a newer version of the type are skipped in one go
+            r->pos = end;
+            return result;
+        }
+        default:
+            PyErr_SetString(PyExc_RuntimeError, "Invalid codec op.");
+            return NULL;
+    }
+}
+
+// 'view' is the memoryview over source shared by all samples deserialized from it
+static PyObject* deserialize_at(
+    const cdr_codec* codec, const uint8_t* data, size_t size, PyObject* source, size_t base, PyObject** view)
+{
+    if (size < CDR_HEADER_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "Serialized data is missing its header.");
+        return NULL;
+    }
+    // XCDR1 is 0x0000 and 0x0001, XCDR2 0x0006 up to 0x000b
+    if (data[0] != 0 || (data[1] > 1 && data[1] < 6) || data[1] > 11) {
+        PyErr_SetString(PyExc_ValueError, "Unsupported encapsulation.");
+        return NULL;
+    }
+    codec = select_program(codec, data[1] >= 6);
+    if (codec == NULL) return NULL;
+
+    cdr_reader r = {
+        .data = data,
+        .pos = CDR_HEADER_SIZE,
+        .size = size,
+        .swap = (data[1] & 1) != host_is_little_endian(),
+        .source = source,
+        .view = *view,
+        .base = base,
+        .max_align = codec->max_align
+    };
+
+    PyObject* sample = des_op(codec, 0, &r);
+    *view = r.view;
+    return sample;
+}
+
+PyObject* cdr_codec_deserialize(const cdr_codec* codec, const uint8_t* data, size_t size, PyObject* source)
+{
+    PyObject* view = NULL;
+    PyObject* sample = deserialize_at(codec, data, size, source, 0, &view);
+    Py_XDECREF(view);
+    return sample;
+}
+
+PyObject* cdr_codec_deserialize_many(
+    const cdr_codec* codec, const uint8_t* data, size_t size, const uint64_t* offsets, size_t count, PyObject* source)
+{
+    for (size_t i = 0; i < count; i++) {
+        if (offsets[i] > offsets[i + 1] || offsets[i + 1] > size) {
+            PyErr_SetString(PyExc_ValueError, "Sample offsets outside of the serialized data.");
+            return NULL;
+        }
+    }
+
+    PyObject* samples = PyList_New((Py_ssize_t) count);
+    if (samples == NULL) return NULL;
+
+    PyObject* view = NULL;
+    for (size_t i = 0; i < count; i++) {
+        PyObject* sample = deserialize_at(
+            codec, data + offsets[i], (size_t) (offsets[i + 1] - offsets[i]), source, (size_t) offsets[i], &view);
+        if (sample == NULL) {
+            Py_CLEAR(samples);
+            break;
+        }
+        PyList_SET_ITEM(samples, (Py_ssize_t) i, sample);
+    }
+
+    Py_XDECREF(view);
+    return samples;
+}
@@ -0,0 +1,84 @@
+#ifndef CDR_CODEC_H
+#define CDR_CODEC_H
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+
+// Mirrors cyclonedds.idl._support.CdrCodecOpType
+typedef enum
+{
+    CdrCodecOpDone,
+    CdrCodecOpPrimitive,
+    CdrCodecOpChar,
+    CdrCodecOpString,
+    CdrCodecOpBytes,
+    CdrCodecOpEnum,
+    CdrCodecOpStruct,
+    CdrCodecOpArray,
+    CdrCodecOpSequence,
+    CdrCodecOpOptional,
+    CdrCodecOpUnion,
+    CdrCodecOpDelegate,
+    CdrCodecOpNothing,
+    CdrCodecOpDHeader
+}
+cdr_codec_op_type;
+
+typedef struct cdr_codec_op_s
+{
+    cdr_codec_op_type type;
+    uint32_t size;
+    uint32_t value;
+    uint8_t align;
+    char code;
+    // Struct/union type, enum type, machine to delegate to or machine decoding a typed array
+    PyObject* ref;
+    // Struct member names (tuple) or union label to case index (dict)
+    PyObject* names;
+    // Index of the first op after this op and its children
+    uint32_t next;
+    // Union only: index of the first op of each case followed by the default case
+    uint32_t* cases;
+}
+cdr_codec_op;
+
+typedef struct cdr_codec_s
+{
+    cdr_codec_op* ops;
+    uint32_t num_ops;
+    // 8 for XCDR1, 4 for XCDR2
+    uint8_t max_align;
+    // Second byte of the encapsulation identifier, without the endianness bit
+    uint8_t encapsulation;
+    // Program of the same type in XCDR2, NULL if there is none
+    struct cdr_codec_s* xcdr2;
+    PyObject* buffer_type;
+    PyObject* endianness_little;
+    PyObject* endianness_big;
+    PyObject* union_kwnames;
+}
+cdr_codec;
+
+// All functions below require the GIL and set a python exception on failure.
+// 'xcdr2_op_list' (may be None) is the program for XCDR2 with encapsulation identifier 'xcdr2_encapsulation'.
+cdr_codec* cdr_codec_create(PyObject* op_list, PyObject* xcdr2_op_list, uint8_t xcdr2_encapsulation);
+void cdr_codec_free(cdr_codec* codec);
+// Serializing with 'xcdr2' fails if the codec has no XCDR2 program.
+PyObject* cdr_codec_serialize(const cdr_codec* codec, PyObject* sample, bool little_endian, bool xcdr2);
+// Serialize into 'size' bytes of caller memory at 'data', fails if the sample does not fit.
+bool cdr_codec_serialize_into(
+    const cdr_codec* codec, PyObject* sample, bool little_endian, bool xcdr2, uint8_t* data, size_t size, size_t* written);
+// Serialize all samples back to back, returns a tuple of the data and the native uint64 offsets of every sample and the end.
+PyObject* cdr_codec_serialize_many(const cdr_codec* codec, PyObject* samples, bool little_endian, bool xcdr2);
+// Deserialization follows the encapsulation identifier of each sample.
+// 'source' is the object exporting data, when given bytes and delegated members reference it instead of copying.
+PyObject* cdr_codec_deserialize(const cdr_codec* codec, const uint8_t* data, size_t size, PyObject* source);
+// Deserialize 'count' samples, sample i is data[offsets[i]:offsets[i + 1]], returns a list.
+PyObject* cdr_codec_deserialize_many(
+    const cdr_codec* codec, const uint8_t* data, size_t size, const uint64_t* offsets, size_t count, PyObject* source);
+
+#endif // CDR_CODEC_H
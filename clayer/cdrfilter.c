@@ -0,0 +1,219 @@
+/*
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+ */
+
+#include "cdrfilter.h"
+#include <string.h>
+#include <assert.h>
+
+static inline uint64_t read_uint_be(const uint8_t* data, size_t size)
+{
+    uint64_t value = 0;
+    for (size_t i = 0; i < size; ++i) {
+        value = (value << 8) | data[i];
+    }
+    return value;
+}
+
+static inline int64_t read_int_be(const uint8_t* data, size_t size)
+{
+    uint64_t value = read_uint_be(data, size);
+    // Sign extension of smaller integers
+    if (size < 8 && (value >> (8 * size - 1)) & 1) {
+        value |= ~(uint64_t)0 << (8 * size);
+    }
+    return (int64_t) value;
+}
+
+static inline double read_float_be(const uint8_t* data, size_t size)
+{
+    if (size == 4) {
+        uint32_t bits = (uint32_t) read_uint_be(data, 4);
+        float value;
+        memcpy(&value, &bits, 4);
+        return (double) value;
+    }
+    uint64_t bits = read_uint_be(data, 8);
+    double value;
+    memcpy(&value, &bits, 8);
+    return value;
+}
+
+static inline bool compare_result(int order, cdr_filter_compare compare)
+{
+    switch (compare) {
+        case CdrFilterEqual: return order == 0;
+        case CdrFilterNotEqual: return order != 0;
+        case CdrFilterLess: return order < 0;
+        case CdrFilterLessEqual: return order <= 0;
+        case CdrFilterGreater: return order > 0;
+        case CdrFilterGreaterEqual: return order >= 0;
+    }
+    return false;
+}
+
+#define ORDER(a, b) ((a) < (b) ? -1 : ((a) > (b) ? 1 : 0))
+
+// Clears 'valid' when the member can not be read from the sample, the comparison is then meaningless
+static bool compare_field(
+    const cdr_filter_field* field, const cdr_filter_op* op, const uint8_t* cdr_sample, size_t cdr_sample_size, bool* valid)
+{
+    // The key of this thread's runner is valid until the next run, so until the next comparison
+    cdr_key_vm_runner* runner = cdr_key_vm_thread_runner(field->vm);
+    if (runner == NULL) {
+        *valid = false;
+        return false;
+    }
+
+    size_t key_size = cdr_key_vm_run(runner, cdr_sample, cdr_sample_size);
+    if (key_size == CDR_KEY_VM_INVALID || key_size == CDR_KEY_VM_NO_MEMORY) {
+        *valid = false;
+        return false;
+    }
+    const uint8_t* key = runner->workspace;
+
+    if (field->optional && (key_size == 0 || key[0] == 0)) {
+        // Comparisons with absent members are false, whatever the comparison
+        return false;
+    }
+
+    if (field->kind == CdrFilterString) {
+        const uint8_t* value = key + field->offset;
+        size_t size = 1;
+        if (field->size == 0) {
+            // Strings are a length including the terminating 0 followed by the characters
+            if (key_size < field->offset + 4) return false;
+            size = (size_t) read_uint_be(value, 4);
+            size = size > 0 ? size - 1 : 0;
+            value += 4;
+            if (key_size < field->offset + 4 + size) return false;
+        }
+        else if (key_size < field->offset + 1) {
+            return false;
+        }
+
+        size_t common = size < op->string_size ? size : op->string_size;
+        int order = common > 0 ? memcmp(value, op->string, common) : 0;
+        if (order == 0) order = ORDER(size, op->string_size);
+        return compare_result(order, op->compare);
+    }
+
+    if (key_size < field->offset + field->size) return false;
+    const uint8_t* value = key + field->offset;
+
+    if (op->kind == CdrFilterSigned) {
+        int64_t i = read_int_be(value, field->size);
+        return compare_result(ORDER(i, op->i), op->compare);
+    }
+    if (op->kind == CdrFilterUnsigned) {
+        uint64_t u = read_uint_be(value, field->size);
+        return compare_result(ORDER(u, op->u), op->compare);
+    }
+
+    double f;
+    switch (field->kind) {
+        case CdrFilterSigned: f = (double) read_int_be(value, field->size); break;
+        case CdrFilterUnsigned: f = (double) read_uint_be(value, field->size); break;
+        default: f = read_float_be(value, field->size); break;
+    }
+    // Comparisons with NaN are false, except for not equal
+    if (f != f || op->f != op->f) return op->compare == CdrFilterNotEqual;
+    return compare_result(ORDER(f, op->f), op->compare);
+}
+
+bool cdr_filter_check(const cdr_filter* filter)
+{
+    size_t depth = 0;
+    const cdr_filter_op* op = filter->ops;
+
+    for (; op->type != CdrFilterOpDone; ++op) {
+        switch (op->type) {
+            case CdrFilterOpCompare:
+                if (op->field >= filter->num_fields || ++depth > CDR_FILTER_MAX_DEPTH) return false;
+            break;
+            case CdrFilterOpAnd:
+            case CdrFilterOpOr:
+                if (depth < 2) return false;
+                --depth;
+            break;
+            case CdrFilterOpNot:
+                if (depth < 1) return false;
+            break;
+            default:
+                return false;
+        }
+    }
+
+    for (size_t i = 0; i < filter->num_fields; ++i) {
+        const cdr_filter_field* field = filter->fields + i;
+        if (field->vm == NULL || (field->kind != CdrFilterString && field->kind != CdrFilterFloat &&
+                field->size != 1 && field->size != 2 && field->size != 4 && field->size != 8) ||
+                (field->kind == CdrFilterFloat && field->size != 4 && field->size != 8)) {
+            return false;
+        }
+    }
+
+    return depth == 1;
+}
+
+bool cdr_filter_eval(const cdr_filter* filter, const uint8_t* cdr_sample, size_t cdr_sample_size)
+{
+    bool stack[CDR_FILTER_MAX_DEPTH];
+    size_t depth = 0;
+    bool valid = true;
+    const cdr_filter_op* op = filter->ops;
+
+    if (cdr_sample_size < 4) return false;
+
+    for (; op->type != CdrFilterOpDone; ++op) {
+        switch (op->type) {
+            case CdrFilterOpCompare:
+                stack[depth++] = compare_field(filter->fields + op->field, op, cdr_sample, cdr_sample_size, &valid);
+                // Truncated or foreign samples match nothing, not even negated comparisons
+                if (!valid) return false;
+            break;
+            case CdrFilterOpAnd:
+                --depth;
+                stack[depth - 1] = stack[depth - 1] && stack[depth];
+            break;
+            case CdrFilterOpOr:
+                --depth;
+                stack[depth - 1] = stack[depth - 1] || stack[depth];
+            break;
+            case CdrFilterOpNot:
+                stack[depth - 1] = !stack[depth - 1];
+            break;
+            case CdrFilterOpDone:  // Impossible to get here
+                assert(0);
+            break;
+        }
+    }
+
+    assert(depth == 1);
+    return stack[0];
+}
+
+void cdr_filter_free(cdr_filter* filter)
+{
+    if (filter == NULL) return;
+
+    for (size_t i = 0; i < filter->num_fields; ++i) {
+        cdr_key_vm_free(filter->fields[i].vm);
+    }
+    if (filter->ops != NULL) {
+        for (cdr_filter_op* op = filter->ops; op->type != CdrFilterOpDone; ++op) {
+            free(op->string);
+        }
+    }
+    free(filter->fields);
+    free(filter->ops);
+    free(filter);
+}
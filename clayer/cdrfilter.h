@@ -0,0 +1,91 @@
+#ifndef CDR_FILTER_H
+#define CDR_FILTER_H
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+
+#include "cdrkeyvm.h"
+
+// Mirrors cyclonedds.idl._support.CdrFilterOpType
+typedef enum
+{
+    CdrFilterOpDone,
+    CdrFilterOpCompare,
+    CdrFilterOpAnd,
+    CdrFilterOpOr,
+    CdrFilterOpNot
+}
+cdr_filter_op_type;
+
+// Mirrors cyclonedds.idl._support.CdrFilterCompare
+typedef enum
+{
+    CdrFilterEqual,
+    CdrFilterNotEqual,
+    CdrFilterLess,
+    CdrFilterLessEqual,
+    CdrFilterGreater,
+    CdrFilterGreaterEqual
+}
+cdr_filter_compare;
+
+// Mirrors cyclonedds.idl._support.CdrFilterKind
+typedef enum
+{
+    CdrFilterSigned,
+    CdrFilterUnsigned,
+    CdrFilterFloat,
+    CdrFilterString
+}
+cdr_filter_kind;
+
+// A member of the sample, extracted by a key vm program as a (big endian, XCDR1) key
+typedef struct cdr_filter_field_s
+{
+    cdr_key_vm* vm;
+    cdr_filter_kind kind;
+    // Size of numbers, 1 for chars and 0 for strings
+    size_t size;
+    // Position of the value in the key, behind the present flag of optionals
+    size_t offset;
+    bool optional;
+}
+cdr_filter_field;
+
+typedef struct cdr_filter_op_s
+{
+    cdr_filter_op_type type;
+    cdr_filter_compare compare;
+    // Kind of the comparison, numbers of another kind than the field are compared as doubles
+    cdr_filter_kind kind;
+    size_t field;
+    int64_t i;
+    uint64_t u;
+    double f;
+    uint8_t* string;
+    size_t string_size;
+}
+cdr_filter_op;
+
+// Depth of the evaluation stack, deeper expressions are refused when creating the filter
+#define CDR_FILTER_MAX_DEPTH 64
+
+// Postfix program of comparisons and boolean operators, ending in CdrFilterOpDone
+typedef struct cdr_filter_s
+{
+    cdr_filter_field* fields;
+    size_t num_fields;
+    cdr_filter_op* ops;
+}
+cdr_filter;
+
+// Checks that the program of the filter is well formed, it is evaluated without further checks
+bool cdr_filter_check(const cdr_filter* filter);
+// Evaluates the filter on a serialized sample (with encapsulation header), with the runners of this thread.
+// Samples that do not have the members of the filter within their size do not pass.
+bool cdr_filter_eval(const cdr_filter* filter, const uint8_t* cdr_sample, size_t cdr_sample_size);
+// Frees the filter with its fields and values
+void cdr_filter_free(cdr_filter* filter);
+
+#endif // CDR_FILTER_H
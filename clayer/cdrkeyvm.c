@@ -16,12 +16,33 @@
 #include <stdio.h>
 #include <assert.h>
 #include <inttypes.h>
+#include <stddef.h>
 
 static inline size_t ALIGN(size_t x, size_t val)
 {
   return ((x + (val - 1)) & ~(val - 1));
 }
 
+// XCDR2 aligns 8 byte types to 4 in the sample, the key is XCDR1 either way
+#define SAMPLE_ALIGN(x, val) ALIGN((x), (val) > max_align ? max_align : (val))
+
+static inline size_t read_uint32(const uint8_t* data, bool little_endian)
+{
+    return little_endian ?
+        ((size_t)*data) | ((size_t)*(data + 1) << 8) | ((size_t)*(data + 2) << 16) | ((size_t)*(data + 3) << 24) :
+        ((size_t)*(data + 3)) | ((size_t)*(data + 2) << 8) | ((size_t)*(data + 1) << 16) | ((size_t)*data << 24);
+}
+
+void cdr_key_vm_free(cdr_key_vm* vm)
+{
+    if (vm == NULL) return;
+    free(vm->instructions);
+    free(vm->instructions_v2);
+    free(vm->direct);
+    free(vm->direct_v2);
+    free(vm);
+}
+
 cdr_key_vm_runner* cdr_key_vm_create_runner(cdr_key_vm* vm)
 {
     if (vm == NULL) return NULL;
@@ -29,7 +50,6 @@ cdr_key_vm_runner* cdr_key_vm_create_runner(cdr_key_vm* vm)
     if (runner == NULL) return NULL;
     size_t alloc_size = vm->initial_alloc_size < 16 ? 16 : vm->initial_alloc_size;
     runner->workspace = malloc(alloc_size);
-    memset(runner->workspace, 0, alloc_size);
     if (runner->workspace == NULL) {
         free(runner);
         return NULL;
@@ -39,23 +59,349 @@ cdr_key_vm_runner* cdr_key_vm_create_runner(cdr_key_vm* vm)
     return runner;
 }
 
-static void make_space_for(cdr_key_vm_runner* runner, size_t size) {
+#if defined(_MSC_VER)
+#define CDR_THREAD_LOCAL __declspec(thread)
+#else
+#define CDR_THREAD_LOCAL __thread
+#endif
+
+// One runner per thread, its workspace only grows. It is not freed when the thread exits, which is
+// fine for the long lived threads of DDS and the small size of keys.
+static CDR_THREAD_LOCAL cdr_key_vm_runner thread_runner;
+
+cdr_key_vm_runner* cdr_key_vm_thread_runner(cdr_key_vm* vm)
+{
+    if (vm == NULL) return NULL;
+    size_t alloc_size = vm->initial_alloc_size < 16 ? 16 : vm->initial_alloc_size;
+    if (thread_runner.workspace_size < alloc_size) {
+        uint8_t* workspace = (uint8_t*) realloc(thread_runner.workspace, alloc_size);
+        if (workspace == NULL) return NULL;
+        thread_runner.workspace = workspace;
+        thread_runner.workspace_size = alloc_size;
+    }
+    thread_runner.my_vm = vm;
+    return &thread_runner;
+}
+
+// Returns false when the workspace can not grow to 'size', it is left as it was
+static bool make_space_for(cdr_key_vm_runner* runner, size_t size) {
     // If you misconfigure things the following will wreak havoc
-    if (runner->my_vm->final_size_is_static) return;
+    if (runner->my_vm->final_size_is_static) return true;
 
     if (runner->workspace_size < size) {
-        uint8_t* new_workspace = (uint8_t*) malloc(size);
-        memset(new_workspace, 0, size);
-        memcpy(new_workspace, runner->workspace, runner->workspace_size);
-        free(runner->workspace);
+        size_t new_size = size < 2 * runner->workspace_size ? 2 * runner->workspace_size : size;
+        uint8_t* new_workspace = (uint8_t*) realloc(runner->workspace, new_size);
+        if (new_workspace == NULL) return false;
         runner->workspace = new_workspace;
-        runner->workspace_size = size;
+        runner->workspace_size = new_size;
+    }
+    return true;
+}
+
+// Align the key at '*pos', the workspace is not cleared between runs so padding is zeroed here
+static inline bool align_workspace(cdr_key_vm_runner* runner, size_t* pos, size_t align)
+{
+    size_t aligned = ALIGN(*pos, align);
+    if (!make_space_for(runner, aligned)) return false;
+    memset(runner->workspace + *pos, 0, aligned - *pos);
+    *pos = aligned;
+    return true;
+}
+
+// Reverse the bytes of every 'width' bytes of data, big endian keys from little endian samples
+static inline void swap_bytes(uint8_t* data, size_t size, size_t width)
+{
+    for (size_t i = 0; i < size; i += width) {
+        for (size_t j = 0; j < width / 2; j++) {
+            uint8_t tmp = data[i + j];
+            data[i + j] = data[i + width - 1 - j];
+            data[i + width - 1 - j] = tmp;
+        }
+    }
+}
+
+// Index an op jumps to (when a repeat is empty, a union label does not match, ...), -1 if it does not jump
+static ptrdiff_t jump_target(const cdr_key_vm_op* ops, size_t i)
+{
+    switch (ops[i].type) {
+        case CdrKeyVMOpRepeatStatic:
+        case CdrKeyVMOpRepeat2ByteSize:
+        case CdrKeyVMOpRepeat4ByteSize:
+            return (ptrdiff_t) (i + ops[i].value);
+        case CdrKeyVMOpEndRepeat:
+            return (ptrdiff_t) i - (ptrdiff_t) ops[i].size;
+        case CdrKeyVMOpUnion1Byte:
+        case CdrKeyVMOpUnion2Byte:
+        case CdrKeyVMOpUnion4Byte:
+        case CdrKeyVMOpUnion8Byte:
+        case CdrKeyVMOpJump:
+            return (ptrdiff_t) (i + ops[i].size);
+        default:
+            return -1;
     }
 }
 
+// Number of ops of a static stream at i: a StreamStatic, followed by its ByteSwap when copied, else 0
+static size_t static_stream_length(const cdr_key_vm_op* ops, size_t i)
+{
+    if (ops[i].type != CdrKeyVMOpStreamStatic) return 0;
+    if (!ops[i].skip && ops[i + 1].type == CdrKeyVMOpByteSwap) return 2;
+    return 1;
+}
+
+static size_t static_stream_swap(const cdr_key_vm_op* ops, size_t i, size_t n)
+{
+    return n == 2 ? ops[i + 1].align : 1;
+}
+
+// Repeats of a static body that take up to this many ops written out are unrolled
+#define CDR_KEY_VM_MAX_UNROLL 64
+
+// Number of ops in the body of a static repeat at i that only streams static sizes, else 0
+static size_t static_repeat_body(const cdr_key_vm_op* ops, size_t i, const size_t* targets)
+{
+    if (ops[i].type != CdrKeyVMOpRepeatStatic) return 0;
+
+    size_t m = 0;
+    while (ops[i + 1 + m].type == CdrKeyVMOpStreamStatic || ops[i + 1 + m].type == CdrKeyVMOpByteSwap) {
+        // Only the end of the repeat may jump into the body
+        if (targets[i + 1 + m] != (m == 0 ? 1u : 0u)) return 0;
+        m++;
+    }
+    if (m == 0 || ops[i + 1 + m].type != CdrKeyVMOpEndRepeat || ops[i + 1 + m].size != m || targets[i + 1 + m] != 0)
+        return 0;
+    return m;
+}
+
+cdr_key_vm_op* cdr_key_vm_optimize(cdr_key_vm_op* ops)
+{
+    size_t len = 0;
+    while (ops[len].type != CdrKeyVMOpDone) len++;
+
+    bool changed = len > 0;
+    while (changed) {
+        changed = false;
+
+        // Optimizing is optional, a failed allocation leaves the program as it is
+        size_t* targets = (size_t*) calloc(len + 1, sizeof(size_t));
+        size_t* map = (size_t*) malloc(sizeof(size_t) * (len + 1));
+        cdr_key_vm_op* out = NULL;
+        if (targets == NULL || map == NULL) {
+            free(targets);
+            free(map);
+            break;
+        }
+
+        // Ops that are jumped to start a new stream, they can not be merged into the op before them
+        for (size_t i = 0; i < len; i++) {
+            ptrdiff_t target = jump_target(ops, i);
+            if (target >= 0) targets[(size_t) target > len ? len : (size_t) target]++;
+        }
+
+        size_t capacity = len + 1;
+        for (size_t i = 0; i < len; i++) {
+            uint64_t unrolled = (uint64_t) static_repeat_body(ops, i, targets) * ops[i].size;
+            if (unrolled <= CDR_KEY_VM_MAX_UNROLL) capacity += (size_t) unrolled;
+        }
+        out = (cdr_key_vm_op*) malloc(sizeof(struct cdr_key_vm_op_s) * capacity);
+        if (out == NULL) {
+            free(targets);
+            free(map);
+            break;
+        }
+
+        size_t nout = 0;
+        size_t last_stream = SIZE_MAX;  // static stream in out that the next one can be merged into
+        size_t i = 0;
+        while (i < len) {
+            size_t n = static_stream_length(ops, i);
+            size_t m = static_repeat_body(ops, i, targets);
+
+            if (m > 0 && m == static_stream_length(ops, i + 1) && ops[i + 1].size % ops[i + 1].align == 0 &&
+                    (uint64_t) ops[i + 1].size * ops[i].size <= UINT32_MAX) {
+                // A repeated stream that ends aligned is one long stream
+                for (size_t j = 0; j < m + 2; j++) map[i + j] = nout;
+                memcpy(out + nout, ops + i + 1, sizeof(struct cdr_key_vm_op_s) * m);
+                out[nout].size *= ops[i].size;
+                last_stream = nout;
+                nout += m;
+                i += m + 2;
+                changed = true;
+                continue;
+            }
+
+            if (m > 0 && (uint64_t) m * ops[i].size <= CDR_KEY_VM_MAX_UNROLL) {
+                // Short repeats are written out, the next pass merges their streams
+                for (size_t j = 0; j < m + 2; j++) map[i + j] = nout;
+                for (uint32_t k = 0; k < ops[i].size; k++) {
+                    memcpy(out + nout, ops + i + 1, sizeof(struct cdr_key_vm_op_s) * m);
+                    nout += m;
+                }
+                last_stream = SIZE_MAX;
+                i += m + 2;
+                changed = true;
+                continue;
+            }
+
+            if (n == 0) {
+                map[i] = nout;
+                out[nout++] = ops[i++];
+                last_stream = SIZE_MAX;
+                continue;
+            }
+
+            if (last_stream != SIZE_MAX && targets[i] == 0 && ops[i].skip == out[last_stream].skip &&
+                    static_stream_swap(ops, i, n) == static_stream_swap(out, last_stream, nout - last_stream) &&
+                    ops[i].align <= out[last_stream].align && out[last_stream].size % ops[i].align == 0 &&
+                    (uint64_t) out[last_stream].size + ops[i].size <= UINT32_MAX) {
+                // Aligned by the end of the previous stream, it is a continuation of it
+                out[last_stream].size += ops[i].size;
+                for (size_t j = 0; j < n; j++) map[i + j] = last_stream;
+                i += n;
+                changed = true;
+                continue;
+            }
+
+            for (size_t j = 0; j < n; j++) {
+                map[i + j] = nout + j;
+                out[nout + j] = ops[i + j];
+            }
+            last_stream = nout;
+            nout += n;
+            i += n;
+        }
+        map[len] = nout;
+        out[nout].type = CdrKeyVMOpDone;
+
+        // Jumps go to the same ops at their new index
+        for (i = 0; changed && i < len; i++) {
+            ptrdiff_t target = jump_target(ops, i);
+            if (target < 0 || out[map[i]].type != ops[i].type) continue;
+            size_t to = map[(size_t) target > len ? len : (size_t) target];
+            if (ops[i].type == CdrKeyVMOpEndRepeat) {
+                out[map[i]].size = (uint32_t) (map[i] - to);
+            } else if (ops[i].type == CdrKeyVMOpRepeatStatic || ops[i].type == CdrKeyVMOpRepeat2ByteSize ||
+                       ops[i].type == CdrKeyVMOpRepeat4ByteSize) {
+                out[map[i]].value = to - map[i];
+            } else {
+                out[map[i]].size = (uint32_t) (to - map[i]);
+            }
+        }
+
+        free(targets);
+        free(map);
+        if (changed) {
+            free(ops);
+            ops = out;
+            len = nout;
+        } else {
+            free(out);
+        }
+    }
+
+    return ops;
+}
+
+cdr_key_vm_direct* cdr_key_vm_make_direct(const cdr_key_vm_op* ops, bool xcdr2)
+{
+    size_t max_align = xcdr2 ? 4 : 8;
+    size_t ncopies = 0;
+    bool last_copy = false;
+
+    for (const cdr_key_vm_op* op = ops; op->type != CdrKeyVMOpDone; op++) {
+        if (op->type == CdrKeyVMOpStreamStatic) {
+            last_copy = !op->skip;
+            ncopies += last_copy;
+        } else if (op->type == CdrKeyVMOpByteSwap && last_copy) {
+            last_copy = false;
+        } else {
+            return NULL;
+        }
+    }
+    if (ncopies == 0) return NULL;
+
+    cdr_key_vm_direct* direct = (cdr_key_vm_direct*) malloc(
+        sizeof(struct cdr_key_vm_direct_s) + sizeof(struct cdr_key_vm_copy_s) * ncopies);
+    if (direct == NULL) return NULL;
+    direct->padded = false;
+    direct->ncopies = 0;
+
+    // The positions are known up front, both start at 0 and only move by static sizes
+    size_t sample_pos = 0;
+    size_t key_pos = 0;
+    direct->sample_size = 0;
+    for (const cdr_key_vm_op* op = ops; op->type != CdrKeyVMOpDone; op++) {
+        if (op->type == CdrKeyVMOpByteSwap) {
+            direct->copies[direct->ncopies - 1].swap = op->align;
+            continue;
+        }
+        sample_pos = SAMPLE_ALIGN(sample_pos, op->align);
+        if (!op->skip) {
+            cdr_key_vm_copy* copy = &direct->copies[direct->ncopies++];
+            direct->padded |= ALIGN(key_pos, op->align) != key_pos;
+            key_pos = ALIGN(key_pos, op->align);
+            copy->sample_offset = sample_pos;
+            copy->key_offset = key_pos;
+            copy->size = op->size;
+            copy->swap = 1;
+            key_pos += op->size;
+            direct->sample_size = sample_pos + op->size;
+        }
+        sample_pos += op->size;
+    }
+    direct->key_size = key_pos;
+    return direct;
+}
+
+static size_t cdr_key_vm_run_direct(cdr_key_vm_runner* runner, const cdr_key_vm_direct* direct,
+                                    const uint8_t* cdr_sample, bool stream_little_endian)
+{
+    if (!make_space_for(runner, direct->key_size)) return CDR_KEY_VM_NO_MEMORY;
+    if (direct->padded) memset(runner->workspace, 0, direct->key_size);
+
+    for (size_t i = 0; i < direct->ncopies; i++) {
+        const cdr_key_vm_copy* copy = &direct->copies[i];
+        memcpy(runner->workspace + copy->key_offset, cdr_sample + copy->sample_offset, copy->size);
+        if (stream_little_endian && copy->swap > 1) {
+            swap_bytes(runner->workspace + copy->key_offset, copy->size, copy->swap);
+        }
+    }
+    return direct->key_size;
+}
+
+// Fails the run when the next 'n' bytes are not in the sample
+#define SAMPLE_HAS(n) \
+    do { if (sample_pos > sample_size || (size_t) (n) > sample_size - sample_pos) return CDR_KEY_VM_INVALID; } while (0)
+
+// Fails the run when 'count' elements of 'element_size' bytes can not be in the rest of the sample
+#define SAMPLE_HAS_ELEMENTS(count, element_size) \
+    do { if ((element_size) != 0 && (count) > sample_size / (element_size)) return CDR_KEY_VM_INVALID; } while (0)
+
+// Fails the run when the workspace can not hold the key up to 'n' bytes
+#define WORKSPACE_FOR(n) \
+    do { if (!make_space_for(runner, (n))) return CDR_KEY_VM_NO_MEMORY; } while (0)
+
+// Aligns the key, failing the run when the workspace can not hold the padding
+#define WORKSPACE_ALIGN(align) \
+    do { if (!align_workspace(runner, &workspace_pos, (align))) return CDR_KEY_VM_NO_MEMORY; } while (0)
+
 size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, const size_t cdr_sample_size_in)
 {
-    cdr_key_vm_op* instruction = runner->my_vm->instructions;
+    if (cdr_sample_size_in < 4) return CDR_KEY_VM_INVALID;
+
+    // XCDR2 encapsulation identifiers are 0x0006 to 0x000b
+    bool xcdr2 = *(cdr_sample_in + 1) >= 6 && runner->my_vm->instructions_v2 != NULL;
+    cdr_key_vm_direct* direct = xcdr2 ? runner->my_vm->direct_v2 : runner->my_vm->direct;
+    // Bytes behind the encapsulation header, every read of the sample is checked against it
+    const size_t sample_size = cdr_sample_size_in - 4;
+
+    if (direct != NULL) {
+        if (sample_size < direct->sample_size) return CDR_KEY_VM_INVALID;
+        return cdr_key_vm_run_direct(runner, direct, cdr_sample_in + 4, (*(cdr_sample_in + 1) & 1) > 0);
+    }
+
+    cdr_key_vm_op* instruction = xcdr2 ? runner->my_vm->instructions_v2 : runner->my_vm->instructions;
+    size_t max_align = xcdr2 ? 4 : 8;
     bool copy = false;
     size_t size = 0;
     uint64_t value = 0;
@@ -63,13 +409,14 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
     size_t workspace_pos = 0;
     size_t repeat_stack[20];  /// max recursion depth 20 == 20 nested structs
     size_t repeat_index = 0;
+    size_t dheader_start[20];  /// start and end of the data of the enclosing delimited types
+    size_t dheader_end[20];
+    size_t dheader_index = 0;
     bool stream_little_endian = (*(cdr_sample_in + 1) & 1) > 0;
 
     // Work relative from post-dds-header
     const uint8_t* cdr_sample = cdr_sample_in + 4;
-    (void)cdr_sample_size_in;
 
-    memset(runner->workspace, 0, runner->workspace_size);
 
     while (instruction->type != CdrKeyVMOpDone) {
         //printf("op: %d %d %" PRIu32 " %d %" PRIu64 "\n", instruction->type, instruction->skip, instruction->size, instruction->align, instruction->value);
@@ -81,7 +428,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
             break;
 
             case CdrKeyVMOpStreamStatic:
-                sample_pos = ALIGN(sample_pos, instruction->align);
+                sample_pos = SAMPLE_ALIGN(sample_pos, instruction->align);
+                SAMPLE_HAS(instruction->size);
 
                 if (instruction->skip) {
                     copy = false;
@@ -90,15 +438,16 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 }
                 else {
                     copy = true;
-                    workspace_pos = ALIGN(workspace_pos, instruction->align);
+                    WORKSPACE_ALIGN(instruction->align);
                     size = instruction->size;
-                    make_space_for(runner, workspace_pos + size);
+                    WORKSPACE_FOR(workspace_pos + size);
                 }
                 instruction++;
             break;
 
             case CdrKeyVMOpStream2ByteSize:
                 sample_pos = ALIGN(sample_pos, 2);
+                SAMPLE_HAS(2);
 
                 if (instruction->skip) {
                     copy = false;
@@ -107,8 +456,10 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                         ((size_t)*(cdr_sample + sample_pos) << 8) | ((size_t)*(cdr_sample + sample_pos + 1));
                     sample_pos += 2;
                     if (size > 0) {
-                        sample_pos = ALIGN(sample_pos, instruction->align);
+                        sample_pos = SAMPLE_ALIGN(sample_pos, instruction->align);
+                        SAMPLE_HAS_ELEMENTS(size, instruction->size);
                         size *= instruction->size;
+                        SAMPLE_HAS(size);
                         sample_pos += size;
                     } else {
                         copy = false;
@@ -116,20 +467,22 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 }
                 else {
                     copy = true;
-                    workspace_pos = ALIGN(workspace_pos, 2);
+                    WORKSPACE_ALIGN(2);
                     size = stream_little_endian ? 
                         ((size_t)*(cdr_sample + sample_pos)) | ((size_t)*(cdr_sample + sample_pos + 1) << 8) :
                         ((size_t)*(cdr_sample + sample_pos) << 8) | ((size_t)*(cdr_sample + sample_pos + 1));
                     
-                    make_space_for(runner, workspace_pos + 2);
+                    WORKSPACE_FOR(workspace_pos + 2);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 8) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) (size & 0xFF);
                     sample_pos += 2;
+                    SAMPLE_HAS_ELEMENTS(size, instruction->size);
                     size *= instruction->size;
                     if (size > 0) {
-                        sample_pos = ALIGN(sample_pos, instruction->align);
-                        workspace_pos = ALIGN(workspace_pos, instruction->align);
-                        make_space_for(runner, workspace_pos + size);
+                        sample_pos = SAMPLE_ALIGN(sample_pos, instruction->align);
+                        SAMPLE_HAS(size);
+                        WORKSPACE_ALIGN(instruction->align);
+                        WORKSPACE_FOR(workspace_pos + size);
                     } else {
                         copy = false;
                     }
@@ -139,6 +492,7 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
 
             case CdrKeyVMOpStream4ByteSize:
                 sample_pos = ALIGN(sample_pos, 4);
+                SAMPLE_HAS(4);
 
                 if (instruction->skip) {
                     copy = false;
@@ -150,33 +504,37 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                     sample_pos += 4;
 
                     if (size > 0) {
-                        sample_pos = ALIGN(sample_pos, instruction->align);
+                        sample_pos = SAMPLE_ALIGN(sample_pos, instruction->align);
+                        SAMPLE_HAS_ELEMENTS(size, instruction->size);
                         size *= instruction->size;
+                        SAMPLE_HAS(size);
                         sample_pos += size;
                     }
                 }
                 else {
                     copy = true;
                     sample_pos = ALIGN(sample_pos, 4);
-                    workspace_pos = ALIGN(workspace_pos, 4);
+                    WORKSPACE_ALIGN(4);
                     size = stream_little_endian ? 
                         ((size_t)*(cdr_sample + sample_pos)) | ((size_t)*(cdr_sample + sample_pos + 1) << 8) | 
                         ((size_t)*(cdr_sample + sample_pos + 2) << 16) | ((size_t)*(cdr_sample + sample_pos + 3) << 24) :
                         ((size_t)*(cdr_sample + sample_pos + 3)) | ((size_t)*(cdr_sample + sample_pos + 2) << 8) | 
                         ((size_t)*(cdr_sample + sample_pos + 1) << 16) | ((size_t)*(cdr_sample + sample_pos) << 24);
 
-                    make_space_for(runner, workspace_pos + 4);
+                    WORKSPACE_FOR(workspace_pos + 4);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 24) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 16) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 8) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) (size & 0xFF);
                     sample_pos += 4;
+                    SAMPLE_HAS_ELEMENTS(size, instruction->size);
                     size *= instruction->size;
                     
                     if (size > 0) {
-                        sample_pos = ALIGN(sample_pos, instruction->align);
-                        workspace_pos = ALIGN(workspace_pos, instruction->align);
-                        make_space_for(runner, workspace_pos + size);
+                        sample_pos = SAMPLE_ALIGN(sample_pos, instruction->align);
+                        SAMPLE_HAS(size);
+                        WORKSPACE_ALIGN(instruction->align);
+                        WORKSPACE_FOR(workspace_pos + size);
                     } else {
                         copy = false;
                     }
@@ -187,42 +545,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
             case CdrKeyVMOpByteSwap:
                 copy = false;
                 if (stream_little_endian) {
-                    switch(instruction->align) {
-                        default: assert(0); break;
-                        case 2:
-                            for (size_t i = size; i > 0; i -= 2) {
-                                uint8_t tmp = *(runner->workspace + workspace_pos - i);
-                                *(runner->workspace + workspace_pos - i) = *(runner->workspace + workspace_pos - i + 1);
-                                *(runner->workspace + workspace_pos - i + 1) = tmp;
-                            }
-                        break;
-                        case 4:
-                            for (size_t i = size; i > 0; i -= 4) {
-                                uint8_t tmp = *(runner->workspace + workspace_pos - i);
-                                *(runner->workspace + workspace_pos - i) = *(runner->workspace + workspace_pos - i + 3);
-                                *(runner->workspace + workspace_pos - i + 3) = tmp;
-                                tmp = *(runner->workspace + workspace_pos - i + 1);
-                                *(runner->workspace + workspace_pos - i + 1) = *(runner->workspace + workspace_pos - i + 2);
-                                *(runner->workspace + workspace_pos - i + 2) = tmp;
-                            }
-                        break;
-                        case 8:
-                            for (size_t i = size; i > 0; i -= 8) {
-                                uint8_t tmp = *(runner->workspace + workspace_pos - i);
-                                *(runner->workspace + workspace_pos - i) = *(runner->workspace + workspace_pos - i + 7);
-                                *(runner->workspace + workspace_pos - i + 7) = tmp;
-                                tmp = *(runner->workspace + workspace_pos - i + 1);
-                                *(runner->workspace + workspace_pos - i + 1) = *(runner->workspace + workspace_pos - i + 6);
-                                *(runner->workspace + workspace_pos - i + 6) = tmp;
-                                tmp = *(runner->workspace + workspace_pos - i + 2);
-                                *(runner->workspace + workspace_pos - i + 2) = *(runner->workspace + workspace_pos - i + 5);
-                                *(runner->workspace + workspace_pos - i + 5) = tmp;
-                                tmp = *(runner->workspace + workspace_pos - i + 3);
-                                *(runner->workspace + workspace_pos - i + 3) = *(runner->workspace + workspace_pos - i + 4);
-                                *(runner->workspace + workspace_pos - i + 4) = tmp;
-                            }
-                        break;
-                    }
+                    assert(instruction->align == 2 || instruction->align == 4 || instruction->align == 8);
+                    swap_bytes(runner->workspace + workspace_pos - size, size, instruction->align);
                 }
                 instruction++;
             break;
@@ -231,7 +555,7 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 copy = false;
                 if (repeat_index == 20 || instruction->size == 0) {
                     // Stack overflow or invalid
-                    assert(0);
+                    return CDR_KEY_VM_INVALID;
                 }
                 repeat_stack[repeat_index++] = instruction->size;
                 instruction++;
@@ -241,9 +565,10 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 copy = false;
                 if (repeat_index == 20) {
                     // Stack overflow!
-                    assert(0);
+                    return CDR_KEY_VM_INVALID;
                 }
                 sample_pos = ALIGN(sample_pos, 2);
+                SAMPLE_HAS(2);
                 size = stream_little_endian ? 
                     ((size_t)*(cdr_sample + sample_pos)) | ((size_t)*(cdr_sample + sample_pos + 1) << 8) :
                     ((size_t)*(cdr_sample + sample_pos) << 8) | ((size_t)*(cdr_sample + sample_pos + 1));
@@ -251,8 +576,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 sample_pos += 2;
                 
                 if (!instruction->skip) {
-                    workspace_pos = ALIGN(workspace_pos, 2);
-                    make_space_for(runner, workspace_pos + 2);
+                    WORKSPACE_ALIGN(2);
+                    WORKSPACE_FOR(workspace_pos + 2);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 8) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) (size & 0xFF);
                 }
@@ -270,9 +595,10 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 copy = false;
                 if (repeat_index == 20) {
                     // Stack overflow!
-                    assert(0);
+                    return CDR_KEY_VM_INVALID;
                 }
                 sample_pos = ALIGN(sample_pos, 4);
+                SAMPLE_HAS(4);
                 size = stream_little_endian ? 
                     ((size_t)*(cdr_sample + sample_pos)) | ((size_t)*(cdr_sample + sample_pos + 1) << 8) | 
                     ((size_t)*(cdr_sample + sample_pos + 2) << 16) | ((size_t)*(cdr_sample + sample_pos + 3) << 24) :
@@ -282,8 +608,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 sample_pos += 4;
 
                 if (!instruction->skip) {
-                    workspace_pos = ALIGN(workspace_pos, 4);
-                    make_space_for(runner, workspace_pos + 4);
+                    WORKSPACE_ALIGN(4);
+                    WORKSPACE_FOR(workspace_pos + 4);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 24) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 16) & 0xFF);
                     *(runner->workspace + workspace_pos++) = (uint8_t) ((size >> 8) & 0xFF);
@@ -312,12 +638,13 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
 
             case CdrKeyVMOpUnion1Byte:
                 copy = false;
+                SAMPLE_HAS(1);
                 value = ((uint64_t)*(cdr_sample + sample_pos) & 0xFF);
 
                 //printf("%" PRIu64 " %" PRIu64 "\n", value, instruction->value);
                 if (value == instruction->value)  {
                     if (!instruction->skip) {
-                        make_space_for(runner, workspace_pos + 1);
+                        WORKSPACE_FOR(workspace_pos + 1);
                         *(runner->workspace + workspace_pos++) = (uint8_t) value;
                     }
                     sample_pos++;
@@ -330,14 +657,15 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
             case CdrKeyVMOpUnion2Byte:
                 copy = false;
                 sample_pos = ALIGN(sample_pos, 2);
+                SAMPLE_HAS(2);
                 value = stream_little_endian ? 
                     ((uint64_t)*(cdr_sample + sample_pos)) | ((uint64_t)*(cdr_sample + sample_pos + 1) << 8) :
                     ((uint64_t)*(cdr_sample + sample_pos) << 8) | ((uint64_t)*(cdr_sample + sample_pos + 1));
 
                 if (instruction->value == value) {
                     if (!instruction->skip) {
-                        workspace_pos = ALIGN(workspace_pos, 2);
-                        make_space_for(runner, workspace_pos + 2);
+                        WORKSPACE_ALIGN(2);
+                        WORKSPACE_FOR(workspace_pos + 2);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 8) & 0xFF);
                         *(runner->workspace + workspace_pos++) = (uint8_t) (value & 0xFF);
                     }
@@ -352,6 +680,7 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
             case CdrKeyVMOpUnion4Byte:
                 copy = false;
                 sample_pos = ALIGN(sample_pos, 4);
+                SAMPLE_HAS(4);
                 value = stream_little_endian ? 
                     ((size_t)*(cdr_sample + sample_pos)) | ((size_t)*(cdr_sample + sample_pos + 1) << 8) | 
                     ((size_t)*(cdr_sample + sample_pos + 2) << 16) | ((size_t)*(cdr_sample + sample_pos + 3) << 24) :
@@ -360,8 +689,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 
                 if (instruction->value == value) {
                     if (!instruction->skip) {
-                        workspace_pos = ALIGN(workspace_pos, 4);
-                        make_space_for(runner, workspace_pos + 4);
+                        WORKSPACE_ALIGN(4);
+                        WORKSPACE_FOR(workspace_pos + 4);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 24) & 0xFF);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 16) & 0xFF);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 8) & 0xFF);
@@ -377,7 +706,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
 
             case CdrKeyVMOpUnion8Byte:
                 copy = false;
-                sample_pos = ALIGN(sample_pos, 8);
+                sample_pos = SAMPLE_ALIGN(sample_pos, 8);
+                SAMPLE_HAS(8);
                 value = stream_little_endian ? 
                     ((size_t)*(cdr_sample + sample_pos)) | ((size_t)*(cdr_sample + sample_pos + 1) << 8) | 
                     ((size_t)*(cdr_sample + sample_pos + 2) << 16) | ((size_t)*(cdr_sample + sample_pos + 3) << 24) |
@@ -390,8 +720,8 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 
                 if (instruction->value == value) {
                     if (!instruction->skip) {
-                        workspace_pos = ALIGN(workspace_pos, 8);
-                        make_space_for(runner, workspace_pos + 8);
+                        WORKSPACE_ALIGN(8);
+                        WORKSPACE_FOR(workspace_pos + 8);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 56) & 0xFF);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 48) & 0xFF);
                         *(runner->workspace + workspace_pos++) = (uint8_t) ((value >> 40) & 0xFF);
@@ -413,9 +743,75 @@ size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample_in, c
                 copy = false;
                 instruction += instruction->size;
             break;
+
+            case CdrKeyVMOpDHeaderStart:
+                copy = false;
+                if (dheader_index == 20) {
+                    // Stack overflow!
+                    return CDR_KEY_VM_INVALID;
+                }
+                sample_pos = ALIGN(sample_pos, 4);
+                SAMPLE_HAS(4);
+                size = read_uint32(cdr_sample + sample_pos, stream_little_endian);
+                sample_pos += 4;
+                // The delimited data has to be in the sample, member headers are then only read up to its end
+                SAMPLE_HAS(size);
+                dheader_start[dheader_index] = sample_pos;
+                dheader_end[dheader_index++] = sample_pos + size;
+                instruction++;
+            break;
+
+            case CdrKeyVMOpDHeaderEnd:
+                // Whatever was not read, including members unknown to us, is skipped at once
+                copy = false;
+                if (dheader_index == 0) return CDR_KEY_VM_INVALID;
+                sample_pos = dheader_end[--dheader_index];
+                instruction++;
+            break;
+
+            case CdrKeyVMOpMemberSeek:
+            {
+                // Walk the member headers of the enclosing mutable struct to the member with id 'value'
+                if (dheader_index == 0) return CDR_KEY_VM_INVALID;
+                size_t pos = dheader_start[dheader_index - 1];
+                size_t end = dheader_end[dheader_index - 1];
+                copy = false;
+                sample_pos = end;
+                while (ALIGN(pos, 4) + 4 <= end) {
+                    pos = ALIGN(pos, 4);
+                    size_t emheader = read_uint32(cdr_sample + pos, stream_little_endian);
+                    size_t length_code = (emheader >> 28) & 7;
+                    size_t member_size;
+                    pos += 4;
+                    if (length_code < 4) {
+                        member_size = (size_t) 1 << length_code;
+                    }
+                    else {
+                        if (pos + 4 > end) break;
+                        size_t nextint = read_uint32(cdr_sample + pos, stream_little_endian);
+                        if (length_code == 4) {
+                            pos += 4;
+                            member_size = nextint;
+                        }
+                        else {
+                            // The NEXTINT doubles as the length of the member itself
+                            member_size = 4 + nextint * (length_code == 5 ? 1 : (length_code == 6 ? 4 : 8));
+                        }
+                    }
+                    if ((emheader & 0x0FFFFFFF) == instruction->value) {
+                        sample_pos = pos;
+                        break;
+                    }
+                    if (member_size > end - pos) break;
+                    pos += member_size;
+                }
+                instruction++;
+            break;
+            }
         }
 
         if (copy) {
+            SAMPLE_HAS(size);
             memcpy(runner->workspace + workspace_pos, cdr_sample + sample_pos, size);
             workspace_pos += size;
             sample_pos += size;
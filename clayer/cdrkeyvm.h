@@ -20,7 +20,10 @@ typedef enum
     CdrKeyVMOpUnion2Byte,
     CdrKeyVMOpUnion4Byte,
     CdrKeyVMOpUnion8Byte,
-    CdrKeyVMOpJump
+    CdrKeyVMOpJump,
+    CdrKeyVMOpDHeaderStart,
+    CdrKeyVMOpDHeaderEnd,
+    CdrKeyVMOpMemberSeek
 }
 cdr_key_vm_op_type;
 
@@ -34,12 +37,39 @@ typedef struct cdr_key_vm_op_s
 }
 cdr_key_vm_op;
 
+// One memcpy of a key that sits at a fixed offset in the sample, byteswapped per 'swap' bytes in
+// little endian samples
+typedef struct cdr_key_vm_copy_s
+{
+    size_t sample_offset;
+    size_t key_offset;
+    size_t size;
+    uint8_t swap;
+}
+cdr_key_vm_copy;
+
+// Replaces the program when it only streams static sizes, the key is then a few copies
+typedef struct cdr_key_vm_direct_s
+{
+    size_t key_size;
+    // Bytes of the sample (behind the header) that the copies read
+    size_t sample_size;
+    bool padded;
+    size_t ncopies;
+    cdr_key_vm_copy copies[];
+}
+cdr_key_vm_direct;
 
 typedef struct cdr_key_vm_s
 {
     size_t initial_alloc_size;
     bool final_size_is_static;
     cdr_key_vm_op* instructions;
+    // Program for XCDR2 samples, they produce the same key as XCDR1 samples
+    cdr_key_vm_op* instructions_v2;
+    // Direct copy programs of the above, NULL if they are not static
+    cdr_key_vm_direct* direct;
+    cdr_key_vm_direct* direct_v2;
 }
 cdr_key_vm;
 
@@ -51,7 +81,23 @@ typedef struct cdr_key_vm_runner_s
 }
 cdr_key_vm_runner;
 
+void cdr_key_vm_free(cdr_key_vm* vm);
 cdr_key_vm_runner* cdr_key_vm_create_runner(cdr_key_vm* vm);
+// Runner owned by the calling thread, for running any vm, the key is valid until its next run
+cdr_key_vm_runner* cdr_key_vm_thread_runner(cdr_key_vm* vm);
+// Merges adjacent static streams and unrolls static repeats, jumps are adjusted. Returns the new program,
+// 'ops' is freed when it is replaced.
+cdr_key_vm_op* cdr_key_vm_optimize(cdr_key_vm_op* ops);
+// Direct copy program of a static program, NULL if it is not static
+cdr_key_vm_direct* cdr_key_vm_make_direct(const cdr_key_vm_op* ops, bool xcdr2);
+// Returned by cdr_key_vm_run for samples that end before their key does, or that are not of the type at all
+#define CDR_KEY_VM_INVALID SIZE_MAX
+// Returned by cdr_key_vm_run when the workspace of the runner can not grow to hold the key
+#define CDR_KEY_VM_NO_MEMORY (SIZE_MAX - 1)
+
+// Size of the key of the sample (with encapsulation header) in the workspace of the runner, CDR_KEY_VM_INVALID
+// or CDR_KEY_VM_NO_MEMORY.
+// The sample is only read within its size.
 size_t cdr_key_vm_run(cdr_key_vm_runner* runner, const uint8_t* cdr_sample, const size_t cdr_sample_size);
 
 #endif // CDR_KEY_VM_H
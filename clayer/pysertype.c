@@ -13,7 +13,10 @@
 #include <string.h>
 #include <stdio.h>
 #include "cdrkeyvm.h"
+#include "cdrcodec.h"
+#include "cdrfilter.h"
 #include "pysertype.h"
+#include <structmember.h>
 
 #include "dds/dds.h"
 
@@ -21,6 +24,8 @@
 #include "dds/ddsrt/heap.h"
 #include "dds/ddsrt/mh3.h"
 #include "dds/ddsrt/md5.h"
+#include "dds/ddsrt/sync.h"
+#include "dds/ddsrt/atomics.h"
 #include "dds/ddsi/q_radmin.h"
 #include "dds/ddsi/ddsi_serdata.h"
 #include "dds/ddsi/ddsi_sertype.h"
@@ -68,7 +73,22 @@ static cdr_key_vm_op* make_vm_ops_from_py_op_list(PyObject* list)
         }
     }
 
-    return ops;
+    return cdr_key_vm_optimize(ops);
+}
+
+static cdr_key_vm* make_key_vm_from_py_op_lists(PyObject* list, PyObject* list_v2)
+{
+    cdr_key_vm* vm = (cdr_key_vm*) malloc(sizeof(struct cdr_key_vm_s));
+    if (vm == NULL) return NULL;
+
+    vm->instructions = make_vm_ops_from_py_op_list(list);
+    vm->instructions_v2 = make_vm_ops_from_py_op_list(list_v2);
+    vm->direct = vm->instructions ? cdr_key_vm_make_direct(vm->instructions, false) : NULL;
+    vm->direct_v2 = vm->instructions_v2 ? cdr_key_vm_make_direct(vm->instructions_v2, true) : NULL;
+    vm->final_size_is_static = false;
+    vm->initial_alloc_size = 128;
+
+    return vm;
 }
 
 static cdr_key_vm* make_key_vm(PyObject* idl)
@@ -79,37 +99,74 @@ static cdr_key_vm* make_key_vm(PyObject* idl)
 
     PyObject* args = PyTuple_New(0);
     PyObject* list = PyObject_CallObject(attr_keymachine, args);
-    Py_DECREF(attr_keymachine);
     Py_DECREF(args);
 
-    if (list == NULL) return NULL;
-    cdr_key_vm* vm = (cdr_key_vm*) malloc(sizeof(struct cdr_key_vm_s));
-    if (vm == NULL) {
+    if (list == NULL) {
+        Py_DECREF(attr_keymachine);
+        return NULL;
+    }
+
+    // The same key from samples in XCDR2, which delimits extensible types and aligns differently
+    PyObject* list_v2 = PyObject_CallFunction(attr_keymachine, "Oi", Py_False, 2);
+    Py_DECREF(attr_keymachine);
+
+    if (list_v2 == NULL) {
         Py_DECREF(list);
         return NULL;
     }
 
-    vm->instructions = make_vm_ops_from_py_op_list(list);
-    vm->final_size_is_static = false;
-    vm->initial_alloc_size = 128;
+    cdr_key_vm* vm = make_key_vm_from_py_op_lists(list, list_v2);
 
     Py_DECREF(list);
+    Py_DECREF(list_v2);
 
     return vm;
 }
 
 
+
 typedef struct ddsi_serdata ddsi_serdata_t;
 typedef struct ddsi_sertype ddsi_sertype_t;
 
+// Recycled serdatas of one sertype, with the data and key buffers they had. Serdatas can outlive their
+// sertype (a sample loaned to python), so the pool is referenced by the sertype and every serdata from it.
+typedef struct ddspy_serdata_pool {
+    ddsrt_mutex_t lock;
+    ddsrt_atomic_uint32_t refc;
+    struct ddspy_serdata* free;
+    uint32_t nfree;
+    bool closed;
+} ddspy_serdata_pool_t;
+
+// Bounds on what a pool keeps, larger data buffers are freed with their serdata
+#define SERDATA_POOL_MAX_FREE 64
+#define SERDATA_POOL_MAX_DATA_SIZE 65536
+
+
+// Key vm of a python type, as held by its IDL (IDL.key_vm) and borrowed by its sertypes
+#define KEY_VM_CAPSULE_NAME "cyclonedds._clayer.key_vm"
+
+typedef struct ddspy_key_vm {
+    cdr_key_vm* vm;
+    // Keyhashes of keys that can be larger than 16 bytes are their md5
+    bool key_maxsize_bigger_16;
+} ddspy_key_vm_t;
 
 // Python refcount: one ref for each PyObject*.
 typedef struct ddspy_sertype {
     ddsi_sertype_t my_c_type;
     PyObject* my_py_type;
+    // Compiled once per python type (IDL.key_vm) and shared by its sertypes in all domains,
+    // the capsule owns key_vm and is kept alive by the reference held here
+    PyObject* my_py_key_vm;
     cdr_key_vm* key_vm;
+    // Hash of the python type, consistent with sertype_equal
+    uint32_t py_hash;
+    ddspy_serdata_pool_t* pool;
     bool keyless;
     bool key_maxsize_bigger_16;
+    // Size of keys that do not depend on the value, 0 if they do
+    size_t key_fixed_size;
 } ddspy_sertype_t;
 
 // Python refcount: one ref for sample.
@@ -117,17 +174,25 @@ typedef struct ddspy_serdata {
     ddsi_serdata_t c_data;
     void* data;
     size_t data_size;
+    size_t data_capacity;
     void* key;
     size_t key_size;
+    size_t key_capacity;
     ddsi_keyhash_t hash;
     bool key_populated;
     bool data_is_key;
+    // Data is a big endian XCDR1 header followed by the key, not a serialized sample
+    bool key_only;
+    ddspy_serdata_pool_t* pool;
+    struct ddspy_serdata* next_free;
 } ddspy_serdata_t;
 
 // Python refcount: one ref for sample.
 typedef struct ddspy_sample_container {
     void* usample;
     size_t usample_size;
+    // Only set by serdata_to_sample, usample is then the key of a key-only serdata (see ddspy_serdata.key_only)
+    bool key_only;
 } ddspy_sample_container_t;
 
 
@@ -151,17 +216,121 @@ static inline const ddspy_serdata_t* cserdata(const ddsi_serdata_t *this)
     return (const ddspy_serdata_t*) (this);
 }
 
+static ddspy_serdata_pool_t* ddspy_serdata_pool_new(void)
+{
+    ddspy_serdata_pool_t* pool = (ddspy_serdata_pool_t*) malloc(sizeof(ddspy_serdata_pool_t));
+    if (pool == NULL)
+        return NULL;
+    ddsrt_mutex_init(&pool->lock);
+    ddsrt_atomic_st32(&pool->refc, 1);
+    pool->free = NULL;
+    pool->nfree = 0;
+    pool->closed = false;
+    return pool;
+}
+
+static void ddspy_serdata_destroy(ddspy_serdata_t* d)
+{
+    free(d->data);
+    free(d->key);
+    free(d);
+}
+
+static void ddspy_serdata_pool_unref(ddspy_serdata_pool_t* pool)
+{
+    if (ddsrt_atomic_dec32_nv(&pool->refc) == 0) {
+        ddsrt_mutex_destroy(&pool->lock);
+        free(pool);
+    }
+}
+
+// For the sertype going away, serdatas still around are freed instead of recycled when they are
+static void ddspy_serdata_pool_close(ddspy_serdata_pool_t* pool)
+{
+    ddsrt_mutex_lock(&pool->lock);
+    ddspy_serdata_t* d = pool->free;
+    pool->free = NULL;
+    pool->nfree = 0;
+    pool->closed = true;
+    ddsrt_mutex_unlock(&pool->lock);
+
+    while (d != NULL) {
+        ddspy_serdata_t* next = d->next_free;
+        ddspy_serdata_destroy(d);
+        d = next;
+    }
+    ddspy_serdata_pool_unref(pool);
+}
+
+static void ddspy_serdata_recycle(ddspy_serdata_t* d)
+{
+    ddspy_serdata_pool_t* pool = d->pool;
+    bool kept = false;
+
+    if (d->data_capacity > SERDATA_POOL_MAX_DATA_SIZE) {
+        free(d->data);
+        d->data = NULL;
+        d->data_capacity = 0;
+    }
+
+    ddsrt_mutex_lock(&pool->lock);
+    if (!pool->closed && pool->nfree < SERDATA_POOL_MAX_FREE) {
+        d->next_free = pool->free;
+        pool->free = d;
+        pool->nfree++;
+        kept = true;
+    }
+    ddsrt_mutex_unlock(&pool->lock);
+
+    if (!kept)
+        ddspy_serdata_destroy(d);
+    ddspy_serdata_pool_unref(pool);
+}
+
+// NULL when out of memory
 static ddspy_serdata_t *ddspy_serdata_new(const struct ddsi_sertype* type, enum ddsi_serdata_kind kind, size_t data_size)
 {
-    ddspy_serdata_t *new = (ddspy_serdata_t*) malloc(sizeof(struct ddspy_serdata));
+    ddspy_serdata_pool_t* pool = ((const ddspy_sertype_t*) type)->pool;
+    ddspy_serdata_t *new;
+
+    ddsrt_mutex_lock(&pool->lock);
+    new = pool->free;
+    if (new != NULL) {
+        pool->free = new->next_free;
+        pool->nfree--;
+    }
+    ddsrt_mutex_unlock(&pool->lock);
+
+    if (new == NULL) {
+        new = (ddspy_serdata_t*) malloc(sizeof(struct ddspy_serdata));
+        if (new == NULL)
+            return NULL;
+        new->data = NULL;
+        new->data_capacity = 0;
+        new->key = NULL;
+        new->key_capacity = 0;
+    }
+    ddsrt_atomic_inc32(&pool->refc);
+    new->pool = pool;
+    new->next_free = NULL;
+
     ddsi_serdata_init((ddsi_serdata_t*) new, type, kind);
 
-    new->data = malloc(data_size);
+    if (new->data_capacity < data_size) {
+        free(new->data);
+        new->data_capacity = 0;
+        new->data = malloc(data_size);
+        if (new->data == NULL) {
+            ddspy_serdata_recycle(new);
+            return NULL;
+        }
+        new->data_capacity = data_size;
+    }
     new->data_size = data_size;
-    new->key = NULL;
     new->key_size = 0;
     new->key_populated = false;
     new->data_is_key = false;
+    new->key_only = false;
     memset((unsigned char*) &(new->hash), 0, 16);
 
     return new;
@@ -175,7 +344,7 @@ static void ddspy_serdata_calc_hash(ddspy_serdata_t* this)
         ddsrt_md5_append(&md5st, this->key, (unsigned int)this->key_size);
         ddsrt_md5_finish(&md5st, this->hash.value);
     } else {
-        assert(this->key_size < 16);
+        assert(this->key_size <= 16);
         memset(this->hash.value, 0, 16);
         memcpy(this->hash.value, (char*) this->key, this->key_size);
     }
@@ -183,25 +352,48 @@ static void ddspy_serdata_calc_hash(ddspy_serdata_t* this)
 }
 
 
-static void ddspy_serdata_populate_key(ddspy_serdata_t* this)
+// Key buffers are at least 16 bytes, zero padded. False when out of memory.
+static bool ddspy_serdata_reserve_key(ddspy_serdata_t* this, size_t size)
+{
+    size_t capacity = size < 16 ? 16 : size;
+    if (this->key_capacity < capacity) {
+        free(this->key);
+        this->key_capacity = 0;
+        this->key = malloc(capacity);
+        if (this->key == NULL)
+            return false;
+        this->key_capacity = capacity;
+    }
+    if (size < 16)
+        memset((char*) this->key + size, 0, 16 - size);
+    return true;
+}
+
+// False for data that is not a (complete) sample of the type, which then never becomes a serdata,
+// or when out of memory
+static bool ddspy_serdata_populate_key(ddspy_serdata_t* this)
 {
     if (sertype(this)->keyless) {
-        this->key = malloc(16);
+        if (!ddspy_serdata_reserve_key(this, 0))
+            return false;
         this->key_size = 16;
-        memset(this->key, 0, 16);
         memset(this->hash.value, 0, 16);
         this->key_populated = true;
-        return;
+        return true;
     }
 
-    cdr_key_vm_runner* runner = cdr_key_vm_create_runner(csertype(this)->key_vm);
-    this->key_size = cdr_key_vm_run(runner, this->data, this->data_size);
-    this->key = runner->workspace;
+    // The runner of this (receive or writing) thread, the key is copied out before its next use
+    cdr_key_vm_runner* runner = cdr_key_vm_thread_runner(csertype(this)->key_vm);
+    if (runner == NULL) return false;
+    size_t key_size = cdr_key_vm_run(runner, this->data, this->data_size);
+    if (key_size == CDR_KEY_VM_INVALID || key_size == CDR_KEY_VM_NO_MEMORY || !ddspy_serdata_reserve_key(this, key_size))
+        return false;
+    memcpy(this->key, runner->workspace, key_size);
+    this->key_size = key_size;
     this->key_populated = true;
 
-    free(runner);
-
     ddspy_serdata_calc_hash(this);
+    return true;
 }
 
 
@@ -237,6 +429,8 @@ static ddsi_serdata_t *serdata_from_ser(
   const struct nn_rdata* fragchain, size_t size)
 {
     ddspy_serdata_t *d = ddspy_serdata_new(type, kind, size);
+    if (d == NULL)
+        return NULL;
 
     uint32_t off = 0;
     assert(fragchain->min == 0);
@@ -258,7 +452,10 @@ static ddsi_serdata_t *serdata_from_ser(
         fragchain = fragchain->nextfrag;
     }
     
-    ddspy_serdata_populate_key(d);
+    if (!ddspy_serdata_populate_key(d)) {
+        ddspy_serdata_recycle(d);
+        return NULL;
+    }
     
     switch (kind)
     {
@@ -287,6 +484,8 @@ static ddsi_serdata_t *serdata_from_ser_iov(
   size_t size)
 {
     ddspy_serdata_t *d = ddspy_serdata_new(type, kind, size);
+    if (d == NULL)
+        return NULL;
 
     size_t off = 0;
     unsigned char* cursor = d->data;
@@ -299,7 +498,10 @@ static ddsi_serdata_t *serdata_from_ser_iov(
         off += n_bytes;
     }
     
-    ddspy_serdata_populate_key(d);
+    if (!ddspy_serdata_populate_key(d)) {
+        ddspy_serdata_recycle(d);
+        return NULL;
+    }
     
     switch (kind)
     {
@@ -324,12 +526,32 @@ static ddsi_serdata_t *serdata_from_keyhash(
   const struct ddsi_sertype* topic,
   const struct ddsi_keyhash* keyhash)
 {
-  (void)keyhash;
-  (void)topic;
-  //replace with (if key_size_max <= 16) then populate the data class with the key hash (key_read)
-  // TODO
-  assert(0);
-  return NULL;
+    const ddspy_sertype_t* type = (const ddspy_sertype_t*) topic;
+
+    // Only keys of at most 16 bytes are in the keyhash as is, and we need to know how long they are
+    if (type->keyless || type->key_maxsize_bigger_16 || type->key_fixed_size == 0 || type->key_fixed_size > 16)
+        return NULL;
+
+    size_t key_size = type->key_fixed_size;
+    ddspy_serdata_t *d = ddspy_serdata_new(topic, SDK_KEY, 4 + key_size);
+    if (d == NULL)
+        return NULL;
+
+    // Keys are big endian XCDR1, CDR_BE with no options
+    memset(d->data, 0, 4);
+    memcpy((char*) d->data + 4, keyhash->value, key_size);
+
+    if (!ddspy_serdata_reserve_key(d, key_size)) {
+        ddspy_serdata_recycle(d);
+        return NULL;
+    }
+    memcpy(d->key, keyhash->value, key_size);
+    d->key_size = key_size;
+    d->key_populated = true;
+    d->key_only = true;
+    ddspy_serdata_calc_hash(d);
+
+    return (ddsi_serdata_t*) d;
 }
 
 
@@ -341,9 +563,14 @@ static ddsi_serdata_t *serdata_from_sample(
     ddspy_sample_container_t *container = (ddspy_sample_container_t*) sample;
 
     ddspy_serdata_t* d = ddspy_serdata_new(type, kind, container->usample_size);
+    if (d == NULL)
+        return NULL;
     memcpy((char*) d->data, container->usample, container->usample_size);
 
-    ddspy_serdata_populate_key(d);
+    if (!ddspy_serdata_populate_key(d)) {
+        ddspy_serdata_recycle(d);
+        return NULL;
+    }
     
     switch (kind)
     {
@@ -419,8 +646,11 @@ static bool serdata_to_sample(
     assert(container->usample == NULL);
 
     container->usample = malloc(cserdata(dcmn)->data_size);
+    if (container->usample == NULL)
+        return false;
     memcpy(container->usample, cserdata(dcmn)->data, cserdata(dcmn)->data_size);
     container->usample_size = cserdata(dcmn)->data_size;
+    container->key_only = cserdata(dcmn)->key_only;
 
     return true;
 }
@@ -464,7 +694,10 @@ static bool serdata_typeless_to_sample(
     assert(container->usample == NULL);
 
     container->usample = malloc(cserdata(dcmn)->data_size);
+    if (container->usample == NULL)
+        return false;
     container->usample_size = cserdata(dcmn)->data_size;
+    container->key_only = cserdata(dcmn)->key_only;
 
     memcpy(container->usample, cserdata(dcmn)->data, container->usample_size);
     
@@ -478,9 +711,7 @@ static void serdata_free(struct ddsi_serdata* dcmn)
     assert(cserdata(dcmn)->data_size != 0);
     assert(cserdata(dcmn)->key_size >= 16);
 
-    free(serdata(dcmn)->data);
-    free(serdata(dcmn)->key);
-    free(dcmn);
+    ddspy_serdata_recycle(serdata(dcmn));
 }
 
 static size_t serdata_print(const struct ddsi_sertype* tpcmn, const struct ddsi_serdata* dcmn, char* buf, size_t bufsize)
@@ -538,21 +769,20 @@ const struct ddsi_serdata_ops ddspy_serdata_ops = {
 static void sertype_free(struct ddsi_sertype* tpcmn)
 {
     struct ddspy_sertype* this = (struct ddspy_sertype*) tpcmn;
-    if (this->key_vm != NULL) {
-        free(this->key_vm->instructions);
-        free(this->key_vm);
-    }
+    ddspy_serdata_pool_close(this->pool);
 
-    // Free the python type if python isn't already shutting down.
+    // Free the python type (and with it the key vm) if python isn't already shutting down.
 #if PY_MINOR_VERSION > 6
     if (!_Py_IsFinalizing()) {
         PyGILState_STATE state = PyGILState_Ensure();
+        Py_XDECREF(this->my_py_key_vm);
         Py_DECREF(this->my_py_type);
         PyGILState_Release(state);
     }
 #else
     if (PyGILState_GetThisThreadState() != _Py_Finalizing) {
         PyGILState_STATE state = PyGILState_Ensure();
+        Py_XDECREF(this->my_py_key_vm);
         Py_DECREF(this->my_py_type);
         PyGILState_Release(state);
     }
@@ -627,8 +857,9 @@ static bool sertype_equal(const ddsi_sertype_t* acmn, const ddsi_sertype_t* bcmn
 
 static uint32_t sertype_hash(const struct ddsi_sertype* tpcmn)
 {
-  (void)tpcmn;
-  return 0x0u;
+    // Equal sertypes have equal python types, so equal hashes. A constant would put all sertypes of
+    // a domain in one bucket, which makes every topic creation compare with all of them.
+    return ((const ddspy_sertype_t*) tpcmn)->py_hash;
 }
 
 
@@ -691,47 +922,62 @@ static ddspy_sertype_t *ddspy_sertype_new(PyObject *pytype)
     
     const char *name = PyUnicode_AsUTF8(pyname);
     bool keyless = pykeyless == Py_True;
+    Py_DECREF(pykeyless);
+
+    Py_hash_t py_hash = PyObject_Hash(pytype);
+    if (py_hash == -1) {
+        Py_DECREF(idl);
+        Py_DECREF(pyname);
+        return NULL;
+    }
 
     ddspy_sertype_t *new = (ddspy_sertype_t*) malloc(sizeof(ddspy_sertype_t));
-    Py_INCREF(pytype);
-    Py_DECREF(pykeyless);
-    
+    if (new == NULL) {
+        Py_DECREF(idl);
+        Py_DECREF(pyname);
+        PyErr_NoMemory();
+        return NULL;
+    }
+
     new->my_py_type = pytype;
+    new->my_py_key_vm = NULL;
+    new->key_vm = NULL;
+    new->py_hash = (uint32_t) ((uint64_t) py_hash ^ ((uint64_t) py_hash >> 32));
     new->keyless = keyless;
+    new->key_maxsize_bigger_16 = true; // arbitrary for keyless types
+    new->key_fixed_size = 0;
 
     if (!keyless) {
-        new->key_vm = make_key_vm(idl);
-        if (!valid_pt_or_set_error(new->key_vm)) {
-            free(new);
-            Py_DECREF(pytype);
-            Py_DECREF(pyname);
-            return NULL;
-        }
-
-        PyObject* pykeysize = PyObject_GetAttrString(idl, "key_max_size");
-        if (!valid_topic_py_or_set_error(pykeysize)) {
-            free(new);
-            Py_DECREF(pytype);
-            Py_DECREF(pyname);
-            return NULL;
-        }
-
-        long long keysize = PyLong_AsLongLong(pykeysize);
-        Py_DECREF(pykeysize);
-
+        // The key vm of the type, compiled by the first of its sertypes (or keyhash_many) and reused after
+        new->my_py_key_vm = PyObject_CallMethod(idl, "_native_key_vm", NULL);
+        const ddspy_key_vm_t* key_vm = NULL;
+        if (new->my_py_key_vm != NULL && PyCapsule_IsValid(new->my_py_key_vm, KEY_VM_CAPSULE_NAME))
+            key_vm = (const ddspy_key_vm_t*) PyCapsule_GetPointer(new->my_py_key_vm, KEY_VM_CAPSULE_NAME);
+        if (!valid_pt_or_set_error((void*) key_vm))
+            goto err;
+
+        new->key_vm = key_vm->vm;
+        new->key_maxsize_bigger_16 = key_vm->key_maxsize_bigger_16;
+
+        // None if the size of the key depends on the value
+        PyObject* pyfixedsize = PyObject_GetAttrString(idl, "key_fixed_size");
+        if (pyfixedsize == NULL)
+            goto err;
+        new->key_fixed_size = pyfixedsize == Py_None ? 0 : PyLong_AsSize_t(pyfixedsize);
+        Py_DECREF(pyfixedsize);
         if (PyErr_Occurred()) {
-            // Overflow
             PyErr_Clear();
-            new->key_maxsize_bigger_16 = true;
-        }
-        else {
-            new->key_maxsize_bigger_16 = keysize > 16;
+            new->key_fixed_size = 0;
         }
-    } else {
-        new->key_vm = NULL;
-        new->key_maxsize_bigger_16 = true; // arbitrary
     }
 
+    new->pool = ddspy_serdata_pool_new();
+    if (new->pool == NULL) {
+        PyErr_NoMemory();
+        goto err;
+    }
+
+    Py_INCREF(pytype);
     Py_DECREF(idl);
 
     ddsi_sertype_init(
@@ -744,6 +990,13 @@ static ddspy_sertype_t *ddspy_sertype_new(PyObject *pytype)
     Py_DECREF(pyname);
 
     return new;
+
+err:
+    Py_XDECREF(new->my_py_key_vm);
+    free(new);
+    Py_DECREF(idl);
+    Py_DECREF(pyname);
+    return NULL;
 }
 
 /// Python BIND
@@ -768,9 +1021,13 @@ ddspy_topic_create(PyObject *self, PyObject *args)
     if (qospy != Py_None) qos = PyLong_AsVoidPtr(qospy);
 
     ddspy_sertype_t *sertype = ddspy_sertype_new(datatype);
+    if (sertype == NULL)
+        return NULL;
     ddsi_sertype_t *rsertype = (ddsi_sertype_t*) sertype;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_create_topic_sertype(participant, name, (struct ddsi_sertype **) &rsertype, qos, listener, NULL);
+    Py_END_ALLOW_THREADS
 
     if (PyErr_Occurred()) return NULL;
 
@@ -795,7 +1052,9 @@ ddspy_write(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_write(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -819,13 +1078,147 @@ ddspy_write_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_write_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
     return PyLong_FromLong((long) sts);
 }
 
+typedef enum {
+    BatchWrite,
+    BatchDispose,
+    BatchUnregister
+} batch_action;
+
+static dds_return_t batch_call(batch_action action, dds_entity_t writer, const void* sample, const dds_time_t* time)
+{
+    switch (action) {
+        case BatchWrite:
+            return time ? dds_write_ts(writer, sample, *time) : dds_write(writer, sample);
+        case BatchDispose:
+            return time ? dds_dispose_ts(writer, sample, *time) : dds_dispose(writer, sample);
+        case BatchUnregister:
+            return time ? dds_unregister_instance_ts(writer, sample, *time) : dds_unregister_instance(writer, sample);
+    }
+    return DDS_RETCODE_BAD_PARAMETER;
+}
+
+// Writes, disposes or unregisters serialized samples at 'offsets' of one buffer, with no timestamp, one
+// timestamp for all or a buffer of int64 timestamps per sample. Returns the status and the number of samples done.
+static PyObject *
+batch(PyObject *args, batch_action action)
+{
+    ddspy_sample_container_t container;
+    dds_entity_t writer;
+    dds_return_t sts = 0;
+    Py_buffer sample_data;
+    Py_buffer offsets_data;
+    Py_buffer timestamps_data = {0};
+    PyObject* timestamp;
+    int coherent = 0;
+    dds_time_t time = 0;
+    // One timestamp for all samples or one per sample
+    const dds_time_t* one_time = NULL;
+    const dds_time_t* times = NULL;
+    bool begun = false;
+    size_t written = 0;
+
+    if (!PyArg_ParseTuple(args, "iy*y*O|p", &writer, &sample_data, &offsets_data, &timestamp, &coherent))
+        return NULL;
+
+    const uint64_t* offsets = (const uint64_t*) offsets_data.buf;
+    size_t count = (size_t) offsets_data.len / sizeof(uint64_t);
+
+    if (count == 0 || (size_t) offsets_data.len % sizeof(uint64_t) != 0) {
+        PyErr_SetString(PyExc_ValueError, "Offsets must be a non-empty array of uint64.");
+        goto err;
+    }
+    count -= 1;
+
+    for (size_t i = 0; i < count; i++) {
+        if (offsets[i] > offsets[i + 1] || offsets[i + 1] > (uint64_t) sample_data.len) {
+            PyErr_SetString(PyExc_ValueError, "Sample offsets outside of the serialized data.");
+            goto err;
+        }
+    }
+
+    if (PyLong_Check(timestamp)) {
+        time = PyLong_AsLongLong(timestamp);
+        if (time == -1 && PyErr_Occurred())
+            goto err;
+        one_time = &time;
+    } else if (timestamp != Py_None) {
+        if (PyObject_GetBuffer(timestamp, &timestamps_data, PyBUF_C_CONTIGUOUS) < 0)
+            goto err;
+        if ((size_t) timestamps_data.len != count * sizeof(dds_time_t)) {
+            PyErr_SetString(PyExc_ValueError, "Timestamps must be an array of one int64 per sample.");
+            goto err;
+        }
+        times = (const dds_time_t*) timestamps_data.buf;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    if (coherent) {
+        sts = dds_begin_coherent(writer);
+        begun = sts >= 0;
+    }
+
+    for (; sts >= 0 && written < count; written++) {
+        container.usample = (char*) sample_data.buf + offsets[written];
+        container.usample_size = (size_t) (offsets[written + 1] - offsets[written]);
+
+        sts = batch_call(action, writer, &container, times ? times + written : one_time);
+        if (sts < 0)
+            break;
+    }
+
+    if (begun) {
+        // The set ends with the samples done so far, also when one failed
+        dds_return_t end_sts = dds_end_coherent(writer);
+        if (sts >= 0)
+            sts = end_sts;
+    }
+    Py_END_ALLOW_THREADS
+
+    if (timestamps_data.obj != NULL)
+        PyBuffer_Release(&timestamps_data);
+    PyBuffer_Release(&offsets_data);
+    PyBuffer_Release(&sample_data);
+
+    return Py_BuildValue("(ln)", (long) sts, (Py_ssize_t) written);
+
+err:
+    if (timestamps_data.obj != NULL)
+        PyBuffer_Release(&timestamps_data);
+    PyBuffer_Release(&offsets_data);
+    PyBuffer_Release(&sample_data);
+    return NULL;
+}
+
+static PyObject *
+ddspy_write_many(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return batch(args, BatchWrite);
+}
+
+static PyObject *
+ddspy_dispose_many(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return batch(args, BatchDispose);
+}
+
+static PyObject *
+ddspy_unregister_many(PyObject *self, PyObject *args)
+{
+    (void)self;
+    return batch(args, BatchUnregister);
+}
+
 static PyObject *
 ddspy_dispose(PyObject *self, PyObject *args)
 {
@@ -842,7 +1235,9 @@ ddspy_dispose(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -866,7 +1261,9 @@ ddspy_dispose_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -889,7 +1286,9 @@ ddspy_writedispose(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_writedispose(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -913,7 +1312,9 @@ ddspy_writedispose_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_writedispose_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -931,7 +1332,9 @@ ddspy_dispose_handle(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iK", &writer, &handle))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose_ih(writer, handle);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -948,230 +1351,529 @@ ddspy_dispose_handle_ts(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iKL", &writer, &handle, &time))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_dispose_ih_ts(writer, handle, time);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
 
-static PyObject * sampleinfo_descriptor;
+/* SampleInfo of a received sample, members are only converted to python objects when accessed. */
+typedef struct {
+    PyObject_HEAD
+    dds_sample_info_t info;
+} ddspy_sampleinfo_t;
+
+static PyTypeObject ddspy_sampleinfo_type;
+
+#define SAMPLEINFO_MEMBER(name, type) \
+    {#name, type, offsetof(ddspy_sampleinfo_t, info) + offsetof(dds_sample_info_t, name), 0, NULL}
+
+static PyMemberDef ddspy_sampleinfo_members[] = {
+    SAMPLEINFO_MEMBER(sample_state, T_UINT),
+    SAMPLEINFO_MEMBER(view_state, T_UINT),
+    SAMPLEINFO_MEMBER(instance_state, T_UINT),
+    SAMPLEINFO_MEMBER(valid_data, T_BOOL),
+    SAMPLEINFO_MEMBER(source_timestamp, T_LONGLONG),
+    SAMPLEINFO_MEMBER(instance_handle, T_ULONGLONG),
+    SAMPLEINFO_MEMBER(publication_handle, T_ULONGLONG),
+    SAMPLEINFO_MEMBER(disposed_generation_count, T_UINT),
+    SAMPLEINFO_MEMBER(no_writers_generation_count, T_UINT),
+    SAMPLEINFO_MEMBER(sample_rank, T_UINT),
+    SAMPLEINFO_MEMBER(generation_rank, T_UINT),
+    SAMPLEINFO_MEMBER(absolute_generation_rank, T_UINT),
+    {NULL, 0, 0, 0, NULL}
+};
 
-static PyObject* get_sampleinfo_pyobject(dds_sample_info_t *sampleinfo)
+static PyObject* get_sampleinfo_pyobject(const dds_sample_info_t *sampleinfo)
 {
-    PyObject* arguments = Py_BuildValue("IIIOLKKkkkkk",
-        sampleinfo->sample_state,
-        sampleinfo->view_state,
-        sampleinfo->instance_state,
-        (sampleinfo->valid_data > 0) ? Py_True : Py_False,
-        sampleinfo->source_timestamp,
-        sampleinfo->instance_handle,
-        sampleinfo->publication_handle,
-        sampleinfo->disposed_generation_count,
-        sampleinfo->no_writers_generation_count,
-        sampleinfo->sample_rank,
-        sampleinfo->generation_rank,
-        sampleinfo->absolute_generation_rank
-    );
-    PyObject *pysampleinfo = PyObject_CallObject(sampleinfo_descriptor, arguments);
-    Py_DECREF(arguments);
-    return pysampleinfo;
+    ddspy_sampleinfo_t* pysampleinfo = PyObject_New(ddspy_sampleinfo_t, &ddspy_sampleinfo_type);
+    if (pysampleinfo == NULL)
+        return NULL;
+    pysampleinfo->info = *sampleinfo;
+    return (PyObject*) pysampleinfo;
 }
 
-static inline uint32_t
-check_number_of_samples(long long n)
+static PyObject* ddspy_sampleinfo_new(PyTypeObject* type, PyObject* args, PyObject* kwargs)
 {
-    static const uint32_t max_samples = (UINT32_MAX / sizeof(dds_sample_info_t));
+    static char* kwlist[] = {
+        "sample_state", "view_state", "instance_state", "valid_data", "source_timestamp", "instance_handle",
+        "publication_handle", "disposed_generation_count", "no_writers_generation_count", "sample_rank",
+        "generation_rank", "absolute_generation_rank", NULL
+    };
+    unsigned int sample_state, view_state, instance_state;
+    unsigned int disposed_generation_count, no_writers_generation_count;
+    unsigned int sample_rank, generation_rank, absolute_generation_rank;
+    unsigned long long instance_handle, publication_handle;
+    long long source_timestamp;
+    int valid_data;
+    dds_sample_info_t info;
+    (void)type;
 
-    if (n <= 0) {
-        PyErr_SetString(PyExc_TypeError, "N must be a positive integer");
-        return 0u;
-    }
-    if (n > (long long)max_samples) {
-        PyErr_SetString(PyExc_TypeError, "N exceeds maximum");
-        return 0u;
-    }
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "IIIpLKKIIIII", kwlist,
+            &sample_state, &view_state, &instance_state, &valid_data, &source_timestamp, &instance_handle,
+            &publication_handle, &disposed_generation_count, &no_writers_generation_count, &sample_rank,
+            &generation_rank, &absolute_generation_rank))
+        return NULL;
 
-    return (uint32_t)n;
+    memset(&info, 0, sizeof(info));
+    info.sample_state = (dds_sample_state_t) sample_state;
+    info.view_state = (dds_view_state_t) view_state;
+    info.instance_state = (dds_instance_state_t) instance_state;
+    info.valid_data = valid_data != 0;
+    info.source_timestamp = (dds_time_t) source_timestamp;
+    info.instance_handle = (dds_instance_handle_t) instance_handle;
+    info.publication_handle = (dds_instance_handle_t) publication_handle;
+    info.disposed_generation_count = disposed_generation_count;
+    info.no_writers_generation_count = no_writers_generation_count;
+    info.sample_rank = sample_rank;
+    info.generation_rank = generation_rank;
+    info.absolute_generation_rank = absolute_generation_rank;
+
+    return get_sampleinfo_pyobject(&info);
 }
 
-static PyObject *
-ddspy_read(PyObject *self, PyObject *args)
+static void ddspy_sampleinfo_dealloc(ddspy_sampleinfo_t* self)
 {
-    uint32_t Nu32;
-    long long N;
-    dds_entity_t reader;
-    dds_return_t sts;
-    (void)self;
+    PyObject_Del(self);
+}
 
-    if (!PyArg_ParseTuple(args, "iL", &reader, &N))
-        return NULL;
-    if (!(Nu32 = check_number_of_samples(N)))
-        return NULL;
+static PyObject* ddspy_sampleinfo_repr(ddspy_sampleinfo_t* self)
+{
+    const dds_sample_info_t* info = &self->info;
+    return PyUnicode_FromFormat(
+        "SampleInfo(sample_state=%u, view_state=%u, instance_state=%u, valid_data=%s, source_timestamp=%lld, "
+        "instance_handle=%llu, publication_handle=%llu, disposed_generation_count=%u, "
+        "no_writers_generation_count=%u, sample_rank=%u, generation_rank=%u, absolute_generation_rank=%u)",
+        (unsigned int) info->sample_state, (unsigned int) info->view_state, (unsigned int) info->instance_state,
+        info->valid_data ? "True" : "False", (long long) info->source_timestamp,
+        (unsigned long long) info->instance_handle, (unsigned long long) info->publication_handle,
+        info->disposed_generation_count, info->no_writers_generation_count, info->sample_rank,
+        info->generation_rank, info->absolute_generation_rank
+    );
+}
 
-    dds_sample_info_t* info = malloc(sizeof(dds_sample_info_t) * Nu32);
-    ddspy_sample_container_t* container = malloc(sizeof(ddspy_sample_container_t) * Nu32);
-    ddspy_sample_container_t** rcontainer = malloc(sizeof(ddspy_sample_container_t*) * Nu32);
+static PyObject* ddspy_sampleinfo_richcompare(PyObject* a, PyObject* b, int op)
+{
+    if ((op != Py_EQ && op != Py_NE) || !PyObject_TypeCheck(b, &ddspy_sampleinfo_type))
+        Py_RETURN_NOTIMPLEMENTED;
+
+    const dds_sample_info_t* x = &((ddspy_sampleinfo_t*) a)->info;
+    const dds_sample_info_t* y = &((ddspy_sampleinfo_t*) b)->info;
+    bool equal =
+        x->sample_state == y->sample_state &&
+        x->view_state == y->view_state &&
+        x->instance_state == y->instance_state &&
+        x->valid_data == y->valid_data &&
+        x->source_timestamp == y->source_timestamp &&
+        x->instance_handle == y->instance_handle &&
+        x->publication_handle == y->publication_handle &&
+        x->disposed_generation_count == y->disposed_generation_count &&
+        x->no_writers_generation_count == y->no_writers_generation_count &&
+        x->sample_rank == y->sample_rank &&
+        x->generation_rank == y->generation_rank &&
+        x->absolute_generation_rank == y->absolute_generation_rank;
+
+    return PyBool_FromLong(equal == (op == Py_EQ));
+}
 
-    for(uint32_t i = 0; i < Nu32; ++i) {
-        rcontainer[i] = &container[i];
-        container[i].usample = NULL;
-    }
+static PyObject* ddspy_sampleinfo_reduce(ddspy_sampleinfo_t* self, PyObject* unused)
+{
+    const dds_sample_info_t* info = &self->info;
+    (void)unused;
+    return Py_BuildValue("(O(IIIOLKKIIIII))", Py_TYPE(self),
+        (unsigned int) info->sample_state, (unsigned int) info->view_state, (unsigned int) info->instance_state,
+        info->valid_data ? Py_True : Py_False, (long long) info->source_timestamp,
+        (unsigned long long) info->instance_handle, (unsigned long long) info->publication_handle,
+        info->disposed_generation_count, info->no_writers_generation_count, info->sample_rank,
+        info->generation_rank, info->absolute_generation_rank
+    );
+}
 
-    sts = dds_read(reader, (void**) rcontainer, info, Nu32, Nu32);
-    if (sts < 0) {
-        return PyLong_FromLong((long) sts);
-    }
+static PyMethodDef ddspy_sampleinfo_methods[] = {
+    {"__reduce__", (PyCFunction) ddspy_sampleinfo_reduce, METH_NOARGS, NULL},
+    {NULL, NULL, 0, NULL}
+};
 
-    PyObject* list = PyList_New(sts);
+static PyTypeObject ddspy_sampleinfo_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cyclonedds._clayer.SampleInfo",
+    .tp_doc = "Sample states, instance state and ranks of a received sample, see dds_sample_info_t.",
+    .tp_basicsize = sizeof(ddspy_sampleinfo_t),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = ddspy_sampleinfo_new,
+    .tp_dealloc = (destructor) ddspy_sampleinfo_dealloc,
+    .tp_repr = (reprfunc) ddspy_sampleinfo_repr,
+    .tp_richcompare = ddspy_sampleinfo_richcompare,
+    .tp_methods = ddspy_sampleinfo_methods,
+    .tp_members = ddspy_sampleinfo_members,
+};
 
-    for(int i = 0; i < (sts > N ? N : sts); ++i) {
-        PyObject* sampleinfo = get_sampleinfo_pyobject(&info[i]);
-        PyObject* item = Py_BuildValue("(y#O)", container[i].usample, container[i].usample_size, sampleinfo);
-        PyList_SetItem(list, i, item); // steals ref
-        Py_DECREF(sampleinfo);
-        free(container[i].usample);
-    }
-    free(info);
-    free(container);
-    free(rcontainer);
+/* Serialized sample as read from a reader, it holds a reference to the serdata and exposes its data
+   through the buffer protocol without copying it. */
+typedef struct {
+    PyObject_HEAD
+    ddsi_serdata_t* serdata;
+} ddspy_sample_loan_t;
 
-    return list;
+static void ddspy_sample_loan_dealloc(ddspy_sample_loan_t* self)
+{
+    ddsi_serdata_unref(self->serdata);
+    PyObject_Del(self);
 }
 
+static int ddspy_sample_loan_getbuffer(ddspy_sample_loan_t* self, Py_buffer* view, int flags)
+{
+    const ddspy_serdata_t* data = cserdata(self->serdata);
+    return PyBuffer_FillInfo(view, (PyObject*) self, data->data, (Py_ssize_t) data->data_size, 1, flags);
+}
 
-static PyObject *
-ddspy_take(PyObject *self, PyObject *args)
+static Py_ssize_t ddspy_sample_loan_length(ddspy_sample_loan_t* self)
 {
-    uint32_t Nu32;
-    long long N;
-    dds_entity_t reader;
-    dds_return_t sts;
-    (void)self;
+    return (Py_ssize_t) cserdata(self->serdata)->data_size;
+}
 
-    if (!PyArg_ParseTuple(args, "iL", &reader, &N))
-        return NULL;
-    if (!(Nu32 = check_number_of_samples(N)))
-        return NULL;
+static PyObject* ddspy_sample_loan_key_only(ddspy_sample_loan_t* self, void* closure)
+{
+    (void)closure;
+    return PyBool_FromLong(cserdata(self->serdata)->key_only);
+}
 
-    dds_sample_info_t* info = malloc(sizeof(dds_sample_info_t) * Nu32);
-    ddspy_sample_container_t* container = malloc(sizeof(ddspy_sample_container_t) * Nu32);
-    ddspy_sample_container_t** rcontainer = malloc(sizeof(ddspy_sample_container_t*) * Nu32);
+static PyGetSetDef ddspy_sample_loan_getset[] = {
+    {"key_only", (getter) ddspy_sample_loan_key_only, NULL,
+        "Whether the data is only the key of a sample, rebuilt from a keyhash (see IDL.deserialize_key).", NULL},
+    {NULL}
+};
 
-    for(uint32_t i = 0; i < Nu32; ++i) {
-        rcontainer[i] = &container[i];
-        container[i].usample = NULL;
-    }
+static PySequenceMethods ddspy_sample_loan_as_sequence = {
+    .sq_length = (lenfunc) ddspy_sample_loan_length,
+};
 
-    sts = dds_take(reader, (void**) rcontainer, info, Nu32, Nu32);
-    if (sts < 0) {
-        return PyLong_FromLong((long) sts);
-    }
+static PyBufferProcs ddspy_sample_loan_as_buffer = {
+    .bf_getbuffer = (getbufferproc) ddspy_sample_loan_getbuffer,
+};
 
-    PyObject* list = PyList_New(sts);
+static PyTypeObject ddspy_sample_loan_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cyclonedds._clayer.SampleLoan",
+    .tp_doc = "Read-only bytes of a received sample, shared with the reader history.",
+    .tp_basicsize = sizeof(ddspy_sample_loan_t),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_dealloc = (destructor) ddspy_sample_loan_dealloc,
+    .tp_as_sequence = &ddspy_sample_loan_as_sequence,
+    .tp_as_buffer = &ddspy_sample_loan_as_buffer,
+    .tp_getset = ddspy_sample_loan_getset,
+};
 
-    for(int i = 0; i < (sts > N ? N : sts); ++i) {
-        PyObject* sampleinfo = get_sampleinfo_pyobject(&info[i]);
-        PyObject* item = Py_BuildValue("(y#O)", container[i].usample, container[i].usample_size, sampleinfo);
-        PyList_SetItem(list, i, item); // steals ref
+// Takes over the reference to serdata, also on failure.
+static PyObject* sample_loan_new(ddsi_serdata_t* serdata)
+{
+    ddspy_sample_loan_t* loan = PyObject_New(ddspy_sample_loan_t, &ddspy_sample_loan_type);
+    if (loan == NULL) {
+        ddsi_serdata_unref(serdata);
+        return NULL;
+    }
+    loan->serdata = serdata;
+    return (PyObject*) loan;
+}
+
+static PyObject* sample_loan_item(ddsi_serdata_t* serdata, dds_sample_info_t* info)
+{
+    PyObject* sampleinfo = get_sampleinfo_pyobject(info);
+    if (sampleinfo == NULL) {
+        ddsi_serdata_unref(serdata);
+        return NULL;
+    }
+    PyObject* loan = sample_loan_new(serdata);
+    if (loan == NULL) {
         Py_DECREF(sampleinfo);
-        free(container[i].usample);
+        return NULL;
     }
-    free(info);
-    free(container);
-    free(rcontainer);
+    PyObject* item = PyTuple_Pack(2, loan, sampleinfo);
+    Py_DECREF(loan);
+    Py_DECREF(sampleinfo);
+    return item;
+}
 
+// With info a list of (loan, sampleinfo), else a list of the loans of only the samples with valid data.
+// The references to the serdatas are consumed, also on failure.
+static PyObject* sample_loan_list(ddsi_serdata_t** buf, dds_sample_info_t* info, uint32_t count, bool with_info)
+{
+    uint32_t i = 0;
+    Py_ssize_t size = 0;
+
+    for (uint32_t j = 0; j < count; ++j)
+        size += (with_info || info[j].valid_data);
+
+    PyObject* list = PyList_New(size);
+    if (list == NULL)
+        goto err;
+
+    for (Py_ssize_t n = 0; i < count; ++i) {
+        PyObject* item;
+        if (with_info)
+            item = sample_loan_item(buf[i], &info[i]);
+        else if (info[i].valid_data)
+            item = sample_loan_new(buf[i]);
+        else {
+            ddsi_serdata_unref(buf[i]);
+            continue;
+        }
+        if (item == NULL) {
+            ++i;
+            goto err;
+        }
+        PyList_SET_ITEM(list, n++, item);
+    }
     return list;
+
+err:
+    for (; i < count; ++i)
+        ddsi_serdata_unref(buf[i]);
+    Py_XDECREF(list);
+    return NULL;
+}
+
+/* Arrays for the samples and sample infos of the read and take calls on one reader, reused across calls
+   and grown when more samples are asked for. A call that finds them in use by another thread (reading
+   with the GIL released) allocates its own. */
+typedef struct {
+    PyObject_HEAD
+    dds_sample_info_t* info;
+    ddsi_serdata_t** buf;
+    uint32_t size;
+    bool in_use;
+} ddspy_read_buffers_t;
+
+static PyObject* ddspy_read_buffers_new(PyTypeObject* type, PyObject* args, PyObject* kwargs)
+{
+    if (!PyArg_ParseTuple(args, ":ReadBuffers") || (kwargs != NULL && PyDict_Size(kwargs) > 0)) {
+        if (!PyErr_Occurred())
+            PyErr_SetString(PyExc_TypeError, "ReadBuffers takes no arguments");
+        return NULL;
+    }
+
+    ddspy_read_buffers_t* buffers = PyObject_New(ddspy_read_buffers_t, type);
+    if (buffers == NULL)
+        return NULL;
+    buffers->info = NULL;
+    buffers->buf = NULL;
+    buffers->size = 0;
+    buffers->in_use = false;
+    return (PyObject*) buffers;
+}
+
+static void ddspy_read_buffers_dealloc(ddspy_read_buffers_t* self)
+{
+    free(self->info);
+    free(self->buf);
+    PyObject_Del(self);
 }
 
+static PyTypeObject ddspy_read_buffers_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cyclonedds._clayer.ReadBuffers",
+    .tp_doc = "Sample and sample info arrays reused by the read and take calls of one reader.",
+    .tp_basicsize = sizeof(ddspy_read_buffers_t),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = ddspy_read_buffers_new,
+    .tp_dealloc = (destructor) ddspy_read_buffers_dealloc,
+};
+
+// Arrays for N samples, from buffers (a ReadBuffers or None) when possible.
+static bool read_buffers_acquire(PyObject* buffers, uint32_t N, dds_sample_info_t** info, ddsi_serdata_t*** buf)
+{
+    if (buffers != Py_None && !PyObject_TypeCheck(buffers, &ddspy_read_buffers_type)) {
+        PyErr_SetString(PyExc_TypeError, "Expected ReadBuffers or None.");
+        return false;
+    }
+
+    ddspy_read_buffers_t* reuse = buffers != Py_None ? (ddspy_read_buffers_t*) buffers : NULL;
+    if (reuse != NULL && !reuse->in_use) {
+        if (reuse->size < N) {
+            dds_sample_info_t* new_info = realloc(reuse->info, sizeof(dds_sample_info_t) * N);
+            if (new_info != NULL)
+                reuse->info = new_info;
+            ddsi_serdata_t** new_buf = realloc(reuse->buf, sizeof(ddsi_serdata_t*) * N);
+            if (new_buf != NULL)
+                reuse->buf = new_buf;
+            if (new_info == NULL || new_buf == NULL) {
+                PyErr_NoMemory();
+                return false;
+            }
+            reuse->size = N;
+        }
+        reuse->in_use = true;
+        *info = reuse->info;
+        *buf = reuse->buf;
+        return true;
+    }
+
+    *info = malloc(sizeof(dds_sample_info_t) * N);
+    *buf = malloc(sizeof(ddsi_serdata_t*) * N);
+    if (*info == NULL || *buf == NULL) {
+        free(*info);
+        free(*buf);
+        PyErr_NoMemory();
+        return false;
+    }
+    return true;
+}
+
+static void read_buffers_release(PyObject* buffers, dds_sample_info_t* info, ddsi_serdata_t** buf)
+{
+    if (buffers != Py_None && ((ddspy_read_buffers_t*) buffers)->buf == buf) {
+        ((ddspy_read_buffers_t*) buffers)->in_use = false;
+    } else {
+        free(info);
+        free(buf);
+    }
+}
+
+static inline uint32_t
+check_number_of_samples(long long n)
+{
+    static const uint32_t max_samples = (UINT32_MAX / sizeof(dds_sample_info_t));
+
+    if (n <= 0) {
+        PyErr_SetString(PyExc_TypeError, "N must be a positive integer");
+        return 0u;
+    }
+    if (n > (long long)max_samples) {
+        PyErr_SetString(PyExc_TypeError, "N exceeds maximum");
+        return 0u;
+    }
+
+    return (uint32_t)n;
+}
 
 static PyObject *
-ddspy_read_handle(PyObject *self, PyObject *args)
+ddspy_read(PyObject *self, PyObject *args)
 {
     uint32_t Nu32;
     long long N;
     dds_entity_t reader;
     dds_return_t sts;
-    dds_instance_handle_t handle;
+    int with_info = 1;
+    PyObject* buffers = Py_None;
+    dds_sample_info_t* info;
+    ddsi_serdata_t** buf;
     (void)self;
 
-    if (!PyArg_ParseTuple(args, "iLK", &reader, &N, &handle))
+    if (!PyArg_ParseTuple(args, "iL|pO", &reader, &N, &with_info, &buffers))
         return NULL;
     if (!(Nu32 = check_number_of_samples(N)))
         return NULL;
 
-    dds_sample_info_t* info = malloc(sizeof(dds_sample_info_t) * Nu32);
-    ddspy_sample_container_t* container = malloc(sizeof(ddspy_sample_container_t) * Nu32);
-    ddspy_sample_container_t** rcontainer = malloc(sizeof(ddspy_sample_container_t*) * Nu32);
+    if (!read_buffers_acquire(buffers, Nu32, &info, &buf))
+        return NULL;
 
-    for(uint32_t i = 0; i < Nu32; ++i) {
-        rcontainer[i] = &container[i];
-        container[i].usample = NULL;
-    }
+    Py_BEGIN_ALLOW_THREADS
+    sts = dds_readcdr(reader, buf, Nu32, info, DDS_ANY_STATE);
+    Py_END_ALLOW_THREADS
 
-    sts = dds_read_instance(reader, (void**)rcontainer, info, Nu32, Nu32, handle);
-    if (sts < 0) {
-        return PyLong_FromLong((long) sts);
-    }
+    PyObject* result = sts < 0 ? PyLong_FromLong((long) sts) : sample_loan_list(buf, info, (uint32_t) sts, with_info);
+    read_buffers_release(buffers, info, buf);
 
-    PyObject* list = PyList_New(sts);
+    return result;
+}
 
-    for(uint32_t i = 0; i < ((uint32_t)sts > Nu32 ? Nu32 : (uint32_t)sts); ++i) {
-        PyObject* sampleinfo = get_sampleinfo_pyobject(&info[i]);
-        PyObject* item = Py_BuildValue("(y#O)", container[i].usample, container[i].usample_size, sampleinfo);
-        PyList_SetItem(list, i, item); // steals ref
-        Py_DECREF(sampleinfo);
-        free(container[i].usample);
-    }
-    free(info);
-    free(container);
-    free(rcontainer);
 
-    return list;
+static PyObject *
+ddspy_take(PyObject *self, PyObject *args)
+{
+    uint32_t Nu32;
+    long long N;
+    dds_entity_t reader;
+    dds_return_t sts;
+    int with_info = 1;
+    PyObject* buffers = Py_None;
+    dds_sample_info_t* info;
+    ddsi_serdata_t** buf;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "iL|pO", &reader, &N, &with_info, &buffers))
+        return NULL;
+    if (!(Nu32 = check_number_of_samples(N)))
+        return NULL;
+
+    if (!read_buffers_acquire(buffers, Nu32, &info, &buf))
+        return NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    sts = dds_takecdr(reader, buf, Nu32, info, DDS_ANY_STATE);
+    Py_END_ALLOW_THREADS
+
+    PyObject* result = sts < 0 ? PyLong_FromLong((long) sts) : sample_loan_list(buf, info, (uint32_t) sts, with_info);
+    read_buffers_release(buffers, info, buf);
+
+    return result;
 }
 
 
 static PyObject *
-ddspy_take_handle(PyObject *self, PyObject *args)
+ddspy_read_handle(PyObject *self, PyObject *args)
 {
     uint32_t Nu32;
     long long N;
     dds_entity_t reader;
     dds_return_t sts;
+    int with_info = 1;
+    PyObject* buffers = Py_None;
+    dds_sample_info_t* info;
+    ddsi_serdata_t** buf;
     dds_instance_handle_t handle;
     (void)self;
 
-    if (!PyArg_ParseTuple(args, "iLK", &reader, &N, &handle))
+    if (!PyArg_ParseTuple(args, "iLK|pO", &reader, &N, &handle, &with_info, &buffers))
         return NULL;
     if (!(Nu32 = check_number_of_samples(N)))
         return NULL;
 
-    dds_sample_info_t* info = malloc(sizeof(dds_sample_info_t) * Nu32);
-    ddspy_sample_container_t* container = malloc(sizeof(ddspy_sample_container_t) * Nu32);
-    ddspy_sample_container_t** rcontainer = malloc(sizeof(ddspy_sample_container_t*) * Nu32);
+    if (!read_buffers_acquire(buffers, Nu32, &info, &buf))
+        return NULL;
 
-    for(uint32_t i = 0; i < Nu32; ++i) {
-        rcontainer[i] = &(container[i]);
-        container[i].usample = NULL;
-    }
+    Py_BEGIN_ALLOW_THREADS
+    sts = dds_readcdr_instance(reader, buf, Nu32, info, handle, DDS_ANY_STATE);
+    Py_END_ALLOW_THREADS
 
-    sts = dds_take_instance(reader, (void**) rcontainer, info, Nu32, Nu32, handle);
-    if (sts < 0) {
-        return PyLong_FromLong((long) sts);
-    }
+    PyObject* result = sts < 0 ? PyLong_FromLong((long) sts) : sample_loan_list(buf, info, (uint32_t) sts, with_info);
+    read_buffers_release(buffers, info, buf);
 
-    PyObject* list = PyList_New(sts);
+    return result;
+}
 
-    for(uint32_t i = 0; i < ((uint32_t)sts > Nu32 ? Nu32 : (uint32_t)sts); ++i) {
-        PyObject* sampleinfo = get_sampleinfo_pyobject(&info[i]);
-        PyObject* item = Py_BuildValue("(y#O)", container[i].usample, container[i].usample_size, sampleinfo);
-        PyList_SetItem(list, i, item); // steals ref
-        Py_DECREF(sampleinfo);
-        free(container[i].usample);
-    }
-    free(info);
-    free(container);
-    free(rcontainer);
 
-    return list;
+static PyObject *
+ddspy_take_handle(PyObject *self, PyObject *args)
+{
+    uint32_t Nu32;
+    long long N;
+    dds_entity_t reader;
+    dds_return_t sts;
+    int with_info = 1;
+    PyObject* buffers = Py_None;
+    dds_sample_info_t* info;
+    ddsi_serdata_t** buf;
+    dds_instance_handle_t handle;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "iLK|pO", &reader, &N, &handle, &with_info, &buffers))
+        return NULL;
+    if (!(Nu32 = check_number_of_samples(N)))
+        return NULL;
+
+    if (!read_buffers_acquire(buffers, Nu32, &info, &buf))
+        return NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    sts = dds_takecdr_instance(reader, buf, Nu32, info, handle, DDS_ANY_STATE);
+    Py_END_ALLOW_THREADS
+
+    PyObject* result = sts < 0 ? PyLong_FromLong((long) sts) : sample_loan_list(buf, info, (uint32_t) sts, with_info);
+    read_buffers_release(buffers, info, buf);
+
+    return result;
 }
 
 
@@ -1193,7 +1895,9 @@ ddspy_register_instance(PyObject *self, PyObject *args)
     handle = 0;
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_register_instance(writer, &handle, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1220,7 +1924,9 @@ ddspy_unregister_instance(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance(writer, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1239,7 +1945,9 @@ ddspy_unregister_instance_handle(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iK", &writer, &handle))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance_ih(writer, handle);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -1262,7 +1970,9 @@ ddspy_unregister_instance_ts(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance_ts(writer, &container, time);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1282,7 +1992,9 @@ ddspy_unregister_instance_handle_ts(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "iKL", &writer, &handle, &time))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_unregister_instance_ih_ts(writer, handle, time);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong((long) sts);
 }
@@ -1304,7 +2016,9 @@ ddspy_lookup_instance(PyObject *self, PyObject *args)
     assert(sample_data.len >= 0);
     container.usample_size = (size_t)sample_data.len;
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_lookup_instance(entity, &container);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
@@ -1317,32 +2031,26 @@ ddspy_read_next(PyObject *self, PyObject *args)
     dds_entity_t reader;
     dds_return_t sts;
     dds_sample_info_t info;
-    ddspy_sample_container_t container;
-    ddspy_sample_container_t* pt_container;
+    ddsi_serdata_t* serdata = NULL;
     (void)self;
-    container.usample = NULL;
 
     if (!PyArg_ParseTuple(args, "i", &reader))
         return NULL;
 
-    pt_container = &container;
-
-    sts = dds_read_next(reader, (void**) &pt_container, &info);
+    // Same selection as dds__read_next
+    Py_BEGIN_ALLOW_THREADS
+    sts = dds_readcdr(reader, &serdata, 1, &info, DDS_NOT_READ_SAMPLE_STATE | DDS_ANY_VIEW_STATE | DDS_ANY_INSTANCE_STATE);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
         return PyLong_FromLong((long) sts);
     }
 
-    if (sts == 0 || container.usample == NULL) {
+    if (sts == 0) {
         Py_INCREF(Py_None);
         return Py_None;
     }
 
-    PyObject* sampleinfo = get_sampleinfo_pyobject(&info);
-    PyObject* item = Py_BuildValue("(y#O)", container.usample, container.usample_size, sampleinfo);
-    Py_DECREF(sampleinfo);
-    free(container.usample);
-
-    return item;
+    return sample_loan_item(serdata, &info);
 }
 
 static PyObject *
@@ -1351,35 +2059,28 @@ ddspy_take_next(PyObject *self, PyObject *args)
     dds_entity_t reader;
     dds_return_t sts;
     dds_sample_info_t info;
-    ddspy_sample_container_t container;
-    ddspy_sample_container_t* pt_container;
+    ddsi_serdata_t* serdata = NULL;
     (void)self;
-    container.usample = NULL;
 
     if (!PyArg_ParseTuple(args, "i", &reader))
         return NULL;
 
-    pt_container = &container;
-
-    sts = dds_take_next(reader, (void**) &pt_container, &info);
+    // Same selection as dds__take_next
+    Py_BEGIN_ALLOW_THREADS
+    sts = dds_takecdr(reader, &serdata, 1, &info, DDS_NOT_READ_SAMPLE_STATE | DDS_ANY_VIEW_STATE | DDS_ANY_INSTANCE_STATE);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
         return PyLong_FromLong((long) sts);
     }
 
-    if (sts == 0 || container.usample == NULL) {
+    if (sts == 0) {
         Py_INCREF(Py_None);
         return Py_None;
     }
 
-    PyObject* sampleinfo = get_sampleinfo_pyobject(&info);
-    PyObject* item = Py_BuildValue("(y#O)", container.usample, container.usample_size, sampleinfo);
-    Py_DECREF(sampleinfo);
-    free(container.usample);
-
-    return item;
+    return sample_loan_item(serdata, &info);
 }
 
-
 static PyObject *
 ddspy_calc_key(PyObject *self, PyObject *args)
 {
@@ -1392,24 +2093,740 @@ ddspy_calc_key(PyObject *self, PyObject *args)
 
     cdr_key_vm* vm = make_key_vm(idl);
 
-    if (vm == NULL) return NULL;
+    if (vm == NULL) {
+        PyBuffer_Release(&sample_data);
+        return NULL;
+    }
 
-    cdr_key_vm_runner* runner = cdr_key_vm_create_runner(vm);
+    cdr_key_vm_runner* runner = cdr_key_vm_thread_runner(vm);
+    if (runner == NULL) {
+        cdr_key_vm_free(vm);
+        PyBuffer_Release(&sample_data);
+        return PyErr_NoMemory();
+    }
 
-    size_t enc = cdr_key_vm_run(runner, (const uint8_t*) sample_data.buf, (size_t)sample_data.len);
+    size_t enc;
+    Py_BEGIN_ALLOW_THREADS
+    enc = cdr_key_vm_run(runner, (const uint8_t*) sample_data.buf, (size_t)sample_data.len);
+    Py_END_ALLOW_THREADS
 
     PyBuffer_Release(&sample_data);
 
+    if (enc == CDR_KEY_VM_INVALID) {
+        cdr_key_vm_free(vm);
+        PyErr_SetString(PyExc_ValueError, "Serialized sample is truncated or not of this type.");
+        return NULL;
+    }
+    if (enc == CDR_KEY_VM_NO_MEMORY) {
+        cdr_key_vm_free(vm);
+        return PyErr_NoMemory();
+    }
+
     PyObject* returnv = Py_BuildValue("y#", (char*) runner->workspace, enc);
 
-    free(runner->workspace);
-    free(runner);
-    free(vm->instructions);
-    free(vm);
+    cdr_key_vm_free(vm);
     return returnv;
 }
 
 
+/* keys of serialized samples in bulk */
+
+static void ddspy_key_vm_capsule_free(PyObject* capsule)
+{
+    ddspy_key_vm_t* key_vm = (ddspy_key_vm_t*) PyCapsule_GetPointer(capsule, KEY_VM_CAPSULE_NAME);
+    if (key_vm != NULL) {
+        cdr_key_vm_free(key_vm->vm);
+        free(key_vm);
+    }
+}
+
+static PyObject *
+ddspy_key_vm_create(PyObject *self, PyObject *args)
+{
+    PyObject* idl;
+    int key_maxsize_bigger_16;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "Op", &idl, &key_maxsize_bigger_16))
+        return NULL;
+
+    ddspy_key_vm_t* key_vm = (ddspy_key_vm_t*) malloc(sizeof(ddspy_key_vm_t));
+    if (key_vm == NULL)
+        return PyErr_NoMemory();
+
+    key_vm->vm = make_key_vm(idl);
+    key_vm->key_maxsize_bigger_16 = key_maxsize_bigger_16 != 0;
+    if (key_vm->vm == NULL || key_vm->vm->instructions == NULL || key_vm->vm->instructions_v2 == NULL) {
+        cdr_key_vm_free(key_vm->vm);
+        free(key_vm);
+        return PyErr_Occurred() ? NULL : PyErr_NoMemory();
+    }
+
+    PyObject* capsule = PyCapsule_New(key_vm, KEY_VM_CAPSULE_NAME, ddspy_key_vm_capsule_free);
+    if (capsule == NULL) {
+        cdr_key_vm_free(key_vm->vm);
+        free(key_vm);
+    }
+    return capsule;
+}
+
+static void key_vm_keyhash(const ddspy_key_vm_t* key_vm, const uint8_t* key, size_t key_size, unsigned char* keyhash)
+{
+    if (key_vm->key_maxsize_bigger_16) {
+        ddsrt_md5_state_t md5st;
+        ddsrt_md5_init(&md5st);
+        ddsrt_md5_append(&md5st, key, (unsigned int) key_size);
+        ddsrt_md5_finish(&md5st, keyhash);
+    } else {
+        assert(key_size <= 16);
+        if (key_size > 0)
+            memcpy(keyhash, key, key_size);
+        memset(keyhash + key_size, 0, 16 - key_size);
+    }
+}
+
+// Runs the key vm over 'count' samples, into 16 byte keyhashes or keys back to back with their offsets.
+// Runs without the GIL, returns false when out of memory or at the first invalid sample, whose index is then in
+// 'invalid' ('count' otherwise).
+static bool key_vm_run_many(
+    const ddspy_key_vm_t* key_vm, const uint8_t** samples, const size_t* sizes, size_t count, bool keyhash,
+    unsigned char* keyhashes, uint8_t** keys, size_t* keys_size, uint64_t* key_offsets, size_t* invalid)
+{
+    cdr_key_vm_runner* runner = cdr_key_vm_thread_runner(key_vm->vm);
+    size_t capacity = 0;
+    size_t pos = 0;
+
+    *invalid = count;
+    if (runner == NULL)
+        return false;
+
+    for (size_t i = 0; i < count; i++) {
+        size_t key_size = cdr_key_vm_run(runner, samples[i], sizes[i]);
+        if (key_size == CDR_KEY_VM_INVALID) {
+            *invalid = i;
+            return false;
+        }
+        if (key_size == CDR_KEY_VM_NO_MEMORY)
+            return false;
+
+        if (keyhash) {
+            key_vm_keyhash(key_vm, runner->workspace, key_size, keyhashes + 16 * i);
+            continue;
+        }
+
+        if (pos + key_size > capacity) {
+            size_t new_capacity = 2 * capacity > pos + key_size ? 2 * capacity : pos + key_size + 256;
+            uint8_t* new_keys = (uint8_t*) realloc(*keys, new_capacity);
+            if (new_keys == NULL)
+                return false;
+            *keys = new_keys;
+            capacity = new_capacity;
+        }
+        key_offsets[i] = pos;
+        // Keys of keyless types are empty, and there is no key buffer (nor workspace) for them
+        if (key_size > 0)
+            memcpy(*keys + pos, runner->workspace, key_size);
+        pos += key_size;
+    }
+
+    if (!keyhash)
+        key_offsets[count] = pos;
+    *keys_size = pos;
+    return true;
+}
+
+static PyObject *
+ddspy_key_vm_calc_many(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    PyObject* samples;
+    PyObject* offsets;
+    int keyhash;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOOp", &capsule, &samples, &offsets, &keyhash))
+        return NULL;
+
+    ddspy_key_vm_t* key_vm = (ddspy_key_vm_t*) PyCapsule_GetPointer(capsule, KEY_VM_CAPSULE_NAME);
+    if (key_vm == NULL)
+        return NULL;
+
+    // Either a sequence of serialized samples or all samples back to back in one buffer with their offsets
+    Py_buffer data = {0};
+    Py_buffer offsets_data = {0};
+    Py_buffer* views = NULL;
+    PyObject* sequence = NULL;
+    const uint8_t** starts = NULL;
+    size_t* sizes = NULL;
+    size_t count = 0;
+    size_t nviews = 0;
+    PyObject* result = NULL;
+
+    if (offsets == Py_None) {
+        sequence = PySequence_Fast(samples, "Samples must be a sequence of serialized samples.");
+        if (sequence == NULL)
+            return NULL;
+        count = (size_t) PySequence_Fast_GET_SIZE(sequence);
+        views = (Py_buffer*) malloc(sizeof(Py_buffer) * (count ? count : 1));
+    } else {
+        if (PyObject_GetBuffer(samples, &data, PyBUF_SIMPLE) < 0)
+            return NULL;
+        if (PyObject_GetBuffer(offsets, &offsets_data, PyBUF_SIMPLE) < 0) {
+            PyBuffer_Release(&data);
+            return NULL;
+        }
+        if (offsets_data.len < (Py_ssize_t) sizeof(uint64_t) || offsets_data.len % (Py_ssize_t) sizeof(uint64_t) != 0) {
+            PyErr_SetString(PyExc_ValueError, "Offsets must be a non-empty array of uint64.");
+            goto done;
+        }
+        count = (size_t) offsets_data.len / sizeof(uint64_t) - 1;
+    }
+
+    starts = (const uint8_t**) malloc(sizeof(uint8_t*) * (count ? count : 1));
+    sizes = (size_t*) malloc(sizeof(size_t) * (count ? count : 1));
+    if (starts == NULL || sizes == NULL || (sequence != NULL && views == NULL)) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    for (size_t i = 0; i < count; i++) {
+        if (sequence != NULL) {
+            if (PyObject_GetBuffer(PySequence_Fast_GET_ITEM(sequence, (Py_ssize_t) i), &views[i], PyBUF_SIMPLE) < 0)
+                goto done;
+            nviews++;
+            starts[i] = (const uint8_t*) views[i].buf;
+            sizes[i] = (size_t) views[i].len;
+        } else {
+            const uint64_t* bounds = (const uint64_t*) offsets_data.buf;
+            if (bounds[i] > bounds[i + 1] || bounds[i + 1] > (uint64_t) data.len) {
+                PyErr_SetString(PyExc_ValueError, "Sample offsets outside of the serialized data.");
+                goto done;
+            }
+            starts[i] = (const uint8_t*) data.buf + bounds[i];
+            sizes[i] = (size_t) (bounds[i + 1] - bounds[i]);
+        }
+        if (sizes[i] < 4) {
+            PyErr_SetString(PyExc_ValueError, "Serialized sample without encapsulation header.");
+            goto done;
+        }
+    }
+
+    {
+        PyObject* keyhashes = keyhash ? PyBytes_FromStringAndSize(NULL, (Py_ssize_t) (16 * count)) : NULL;
+        uint64_t* key_offsets = keyhash ? NULL : (uint64_t*) malloc(sizeof(uint64_t) * (count + 1));
+        uint8_t* keys = NULL;
+        size_t keys_size = 0;
+        size_t invalid;
+        bool ok;
+
+        if (keyhash ? keyhashes == NULL : key_offsets == NULL) {
+            if (!keyhash)
+                PyErr_NoMemory();
+            goto done;
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        ok = key_vm_run_many(
+            key_vm, starts, sizes, count, keyhash,
+            keyhash ? (unsigned char*) PyBytes_AS_STRING(keyhashes) : NULL, &keys, &keys_size, key_offsets, &invalid);
+        Py_END_ALLOW_THREADS
+
+        if (!ok) {
+            if (invalid < count)
+                PyErr_Format(PyExc_ValueError, "Serialized sample %zu is truncated or not of this type.", invalid);
+            else
+                PyErr_NoMemory();
+            Py_XDECREF(keyhashes);
+        } else if (keyhash) {
+            result = keyhashes;
+        } else {
+            result = Py_BuildValue(
+                "y#y#", keys != NULL ? (const char*) keys : "", (Py_ssize_t) keys_size,
+                (const char*) key_offsets, (Py_ssize_t) ((count + 1) * sizeof(uint64_t)));
+        }
+        free(keys);
+        free(key_offsets);
+    }
+
+done:
+    for (size_t i = 0; i < nviews; i++)
+        PyBuffer_Release(&views[i]);
+    free(views);
+    free(starts);
+    free(sizes);
+    Py_XDECREF(sequence);
+    if (data.obj != NULL)
+        PyBuffer_Release(&data);
+    if (offsets_data.obj != NULL)
+        PyBuffer_Release(&offsets_data);
+    return result;
+}
+
+
+/* content filters */
+
+#define CONTENT_FILTER_CAPSULE_NAME "cyclonedds._clayer.content_filter"
+
+// Query condition filters get nothing but the sample, so every content filter in use by a query
+// condition has a slot in a fixed table with a filter function of its own
+#define QUERY_FILTER_SLOTS 32
+
+typedef struct ddspy_content_filter {
+    cdr_filter* filter;
+    // Slot in query_filters, -1 if no query condition uses the filter
+    int slot;
+} ddspy_content_filter_t;
+
+static cdr_filter* query_filters[QUERY_FILTER_SLOTS];
+
+static bool read_filter_attr_size(PyObject* obj, const char* name, size_t* out)
+{
+    PyObject* attr = PyObject_GetAttrString(obj, name);
+    if (attr == NULL) return false;
+    size_t value = PyLong_AsSize_t(attr);
+    Py_DECREF(attr);
+    if (value == (size_t) -1 && PyErr_Occurred()) return false;
+    *out = value;
+    return true;
+}
+
+static bool read_filter_field(PyObject* pyfield, cdr_filter_field* field)
+{
+    size_t kind;
+    if (!read_filter_attr_size(pyfield, "kind", &kind) ||
+        !read_filter_attr_size(pyfield, "size", &field->size) ||
+        !read_filter_attr_size(pyfield, "offset", &field->offset))
+        return false;
+    field->kind = (cdr_filter_kind) kind;
+
+    PyObject* optional = PyObject_GetAttrString(pyfield, "optional");
+    if (optional == NULL) return false;
+    field->optional = PyObject_IsTrue(optional) == 1;
+    Py_DECREF(optional);
+
+    PyObject* key_ops = PyObject_GetAttrString(pyfield, "key_ops");
+    PyObject* key_ops_v2 = PyObject_GetAttrString(pyfield, "key_ops_v2");
+    if (key_ops != NULL && key_ops_v2 != NULL) {
+        if (PyList_Check(key_ops) && PyList_Check(key_ops_v2)) {
+            field->vm = make_key_vm_from_py_op_lists(key_ops, key_ops_v2);
+        } else {
+            PyErr_SetString(PyExc_TypeError, "Content filter field key ops must be lists.");
+        }
+    }
+    Py_XDECREF(key_ops);
+    Py_XDECREF(key_ops_v2);
+
+    if (PyErr_Occurred()) return false;
+    if (field->vm == NULL || field->vm->instructions == NULL || field->vm->instructions_v2 == NULL) {
+        PyErr_NoMemory();
+        return false;
+    }
+    return true;
+}
+
+static bool read_filter_op(PyObject* pyop, cdr_filter_op* op)
+{
+    size_t type, compare, kind;
+    if (!read_filter_attr_size(pyop, "type", &type) ||
+        !read_filter_attr_size(pyop, "field", &op->field) ||
+        !read_filter_attr_size(pyop, "compare", &compare) ||
+        !read_filter_attr_size(pyop, "kind", &kind))
+        return false;
+    if (type > CdrFilterOpNot || compare > CdrFilterGreaterEqual || kind > CdrFilterString) {
+        PyErr_SetString(PyExc_ValueError, "Invalid content filter op.");
+        return false;
+    }
+    op->type = (cdr_filter_op_type) type;
+    op->compare = (cdr_filter_compare) compare;
+    op->kind = (cdr_filter_kind) kind;
+    if (op->type != CdrFilterOpCompare) return true;
+
+    PyObject* value = PyObject_GetAttrString(pyop, "value");
+    if (value == NULL) return false;
+
+    switch (op->kind) {
+        case CdrFilterSigned:
+            op->i = PyLong_AsLongLong(value);
+        break;
+        case CdrFilterUnsigned:
+            op->u = PyLong_AsUnsignedLongLong(value);
+        break;
+        case CdrFilterFloat:
+            op->f = PyFloat_AsDouble(value);
+        break;
+        case CdrFilterString: {
+            char* buffer;
+            Py_ssize_t size;
+            if (PyBytes_AsStringAndSize(value, &buffer, &size) == 0) {
+                op->string_size = (size_t) size;
+                // Never empty, so that it is freed as any other
+                op->string = (uint8_t*) malloc(op->string_size + 1);
+                if (op->string == NULL)
+                    PyErr_NoMemory();
+                else
+                    memcpy(op->string, buffer, op->string_size);
+            }
+        }
+        break;
+    }
+
+    Py_DECREF(value);
+    return !PyErr_Occurred();
+}
+
+static cdr_filter* make_filter(PyObject* fields, PyObject* ops)
+{
+    if (!PyList_Check(fields) || !PyList_Check(ops)) {
+        PyErr_SetString(PyExc_TypeError, "Content filter fields and ops must be lists.");
+        return NULL;
+    }
+
+    size_t num_fields = (size_t) PyList_GET_SIZE(fields);
+    size_t num_ops = (size_t) PyList_GET_SIZE(ops);
+    cdr_filter* filter = (cdr_filter*) calloc(1, sizeof(cdr_filter));
+    if (filter == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    // Zeroed ops end in CdrFilterOpDone wherever reading them stops
+    filter->fields = (cdr_filter_field*) calloc(num_fields + 1, sizeof(cdr_filter_field));
+    filter->ops = (cdr_filter_op*) calloc(num_ops + 1, sizeof(cdr_filter_op));
+    if (filter->fields == NULL || filter->ops == NULL) {
+        cdr_filter_free(filter);
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    for (size_t i = 0; i < num_fields; ++i) {
+        filter->num_fields = i + 1;
+        if (!read_filter_field(PyList_GET_ITEM(fields, i), filter->fields + i)) {
+            cdr_filter_free(filter);
+            return NULL;
+        }
+    }
+
+    for (size_t i = 0; i < num_ops; ++i) {
+        if (!read_filter_op(PyList_GET_ITEM(ops, i), filter->ops + i)) {
+            cdr_filter_free(filter);
+            return NULL;
+        }
+        if (filter->ops[i].type == CdrFilterOpDone) break;
+    }
+
+    if (!cdr_filter_check(filter)) {
+        cdr_filter_free(filter);
+        PyErr_SetString(PyExc_ValueError, "Invalid content filter program, or nested too deeply.");
+        return NULL;
+    }
+
+    return filter;
+}
+
+static void ddspy_content_filter_capsule_free(PyObject* capsule)
+{
+    ddspy_content_filter_t* content_filter =
+        (ddspy_content_filter_t*) PyCapsule_GetPointer(capsule, CONTENT_FILTER_CAPSULE_NAME);
+    if (content_filter != NULL) {
+        // Query conditions using the filter are deleted before their content filter is released
+        if (content_filter->slot >= 0)
+            query_filters[content_filter->slot] = NULL;
+        cdr_filter_free(content_filter->filter);
+        free(content_filter);
+    }
+}
+
+static PyObject *
+ddspy_content_filter_create(PyObject *self, PyObject *args)
+{
+    PyObject* fields;
+    PyObject* ops;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OO", &fields, &ops))
+        return NULL;
+
+    ddspy_content_filter_t* content_filter = (ddspy_content_filter_t*) malloc(sizeof(ddspy_content_filter_t));
+    if (content_filter == NULL)
+        return PyErr_NoMemory();
+
+    content_filter->slot = -1;
+    content_filter->filter = make_filter(fields, ops);
+    if (content_filter->filter == NULL) {
+        free(content_filter);
+        return NULL;
+    }
+
+    PyObject* capsule = PyCapsule_New(content_filter, CONTENT_FILTER_CAPSULE_NAME, ddspy_content_filter_capsule_free);
+    if (capsule == NULL) {
+        cdr_filter_free(content_filter->filter);
+        free(content_filter);
+    }
+    return capsule;
+}
+
+static PyObject *
+ddspy_content_filter_eval(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    Py_buffer sample_data;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "Oy*", &capsule, &sample_data))
+        return NULL;
+
+    ddspy_content_filter_t* content_filter =
+        (ddspy_content_filter_t*) PyCapsule_GetPointer(capsule, CONTENT_FILTER_CAPSULE_NAME);
+    if (content_filter == NULL) {
+        PyBuffer_Release(&sample_data);
+        return NULL;
+    }
+
+    bool result;
+    Py_BEGIN_ALLOW_THREADS
+    result = cdr_filter_eval(content_filter->filter, (const uint8_t*) sample_data.buf, (size_t) sample_data.len);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&sample_data);
+    return PyBool_FromLong(result);
+}
+
+static bool query_filter(int slot, const void* sample)
+{
+    const ddspy_sample_container_t* container = (const ddspy_sample_container_t*) sample;
+    const cdr_filter* filter = query_filters[slot];
+    // Key-only samples have nothing but the key, which is not laid out as a sample
+    if (filter == NULL || container->usample == NULL || container->key_only) return false;
+    return cdr_filter_eval(filter, (const uint8_t*) container->usample, container->usample_size);
+}
+
+#define QUERY_FILTER(n) static bool query_filter_##n(const void* sample) { return query_filter(n, sample); }
+QUERY_FILTER(0) QUERY_FILTER(1) QUERY_FILTER(2) QUERY_FILTER(3) QUERY_FILTER(4) QUERY_FILTER(5) QUERY_FILTER(6)
+QUERY_FILTER(7) QUERY_FILTER(8) QUERY_FILTER(9) QUERY_FILTER(10) QUERY_FILTER(11) QUERY_FILTER(12) QUERY_FILTER(13)
+QUERY_FILTER(14) QUERY_FILTER(15) QUERY_FILTER(16) QUERY_FILTER(17) QUERY_FILTER(18) QUERY_FILTER(19) QUERY_FILTER(20)
+QUERY_FILTER(21) QUERY_FILTER(22) QUERY_FILTER(23) QUERY_FILTER(24) QUERY_FILTER(25) QUERY_FILTER(26) QUERY_FILTER(27)
+QUERY_FILTER(28) QUERY_FILTER(29) QUERY_FILTER(30) QUERY_FILTER(31)
+#undef QUERY_FILTER
+
+static bool (* const query_filter_fns[QUERY_FILTER_SLOTS])(const void* sample) = {
+    query_filter_0, query_filter_1, query_filter_2, query_filter_3, query_filter_4, query_filter_5, query_filter_6,
+    query_filter_7, query_filter_8, query_filter_9, query_filter_10, query_filter_11, query_filter_12, query_filter_13,
+    query_filter_14, query_filter_15, query_filter_16, query_filter_17, query_filter_18, query_filter_19, query_filter_20,
+    query_filter_21, query_filter_22, query_filter_23, query_filter_24, query_filter_25, query_filter_26, query_filter_27,
+    query_filter_28, query_filter_29, query_filter_30, query_filter_31
+};
+
+/* end content filters */
+
+
+/* full sample codec */
+
+#define CDR_CODEC_CAPSULE_NAME "cyclonedds._clayer.cdr_codec"
+
+static void ddspy_codec_capsule_free(PyObject* capsule)
+{
+    cdr_codec_free((cdr_codec*) PyCapsule_GetPointer(capsule, CDR_CODEC_CAPSULE_NAME));
+}
+
+static PyObject *
+ddspy_codec_create(PyObject *self, PyObject *args)
+{
+    PyObject* op_list;
+    PyObject* xcdr2_op_list;
+    unsigned char xcdr2_encapsulation;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOb", &op_list, &xcdr2_op_list, &xcdr2_encapsulation))
+        return NULL;
+
+    cdr_codec* codec = cdr_codec_create(op_list, xcdr2_op_list, xcdr2_encapsulation);
+
+    if (codec == NULL) return NULL;
+
+    PyObject* capsule = PyCapsule_New(codec, CDR_CODEC_CAPSULE_NAME, ddspy_codec_capsule_free);
+
+    if (capsule == NULL) cdr_codec_free(codec);
+
+    return capsule;
+}
+
+static PyObject *
+ddspy_codec_serialize(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    PyObject* sample;
+    int little_endian;
+    int xcdr2;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOpp", &capsule, &sample, &little_endian, &xcdr2))
+        return NULL;
+
+    cdr_codec* codec = (cdr_codec*) PyCapsule_GetPointer(capsule, CDR_CODEC_CAPSULE_NAME);
+
+    if (codec == NULL) return NULL;
+
+    return cdr_codec_serialize(codec, sample, little_endian != 0, xcdr2 != 0);
+}
+
+static PyObject *
+ddspy_codec_serialize_into(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    PyObject* sample;
+    Py_buffer target;
+    Py_ssize_t offset;
+    int little_endian;
+    int xcdr2;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOw*npp", &capsule, &sample, &target, &offset, &little_endian, &xcdr2))
+        return NULL;
+
+    cdr_codec* codec = (cdr_codec*) PyCapsule_GetPointer(capsule, CDR_CODEC_CAPSULE_NAME);
+    PyObject* written = NULL;
+    size_t size;
+
+    if (codec == NULL)
+        goto done;
+
+    if (offset < 0 || offset > target.len) {
+        PyErr_SetString(PyExc_ValueError, "Offset outside of the target buffer.");
+        goto done;
+    }
+
+    if (cdr_codec_serialize_into(
+            codec, sample, little_endian != 0, xcdr2 != 0,
+            (uint8_t*) target.buf + offset, (size_t) (target.len - offset), &size))
+        written = PyLong_FromSize_t(size);
+
+done:
+    PyBuffer_Release(&target);
+    return written;
+}
+
+static PyObject *
+ddspy_codec_serialize_many(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    PyObject* samples;
+    int little_endian;
+    int xcdr2;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "OOpp", &capsule, &samples, &little_endian, &xcdr2))
+        return NULL;
+
+    cdr_codec* codec = (cdr_codec*) PyCapsule_GetPointer(capsule, CDR_CODEC_CAPSULE_NAME);
+
+    if (codec == NULL) return NULL;
+
+    return cdr_codec_serialize_many(codec, samples, little_endian != 0, xcdr2 != 0);
+}
+
+static PyObject *
+ddspy_codec_deserialize(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    Py_buffer sample_data;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "Oy*", &capsule, &sample_data))
+        return NULL;
+
+    cdr_codec* codec = (cdr_codec*) PyCapsule_GetPointer(capsule, CDR_CODEC_CAPSULE_NAME);
+    PyObject* sample = NULL;
+
+    if (codec != NULL)
+        sample = cdr_codec_deserialize(
+            codec, (const uint8_t*) sample_data.buf, (size_t) sample_data.len, sample_data.obj);
+
+    PyBuffer_Release(&sample_data);
+    return sample;
+}
+
+static PyObject *
+ddspy_codec_deserialize_many(PyObject *self, PyObject *args)
+{
+    PyObject* capsule;
+    Py_buffer data;
+    Py_buffer offsets;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "Oy*y*", &capsule, &data, &offsets))
+        return NULL;
+
+    cdr_codec* codec = (cdr_codec*) PyCapsule_GetPointer(capsule, CDR_CODEC_CAPSULE_NAME);
+    PyObject* samples = NULL;
+
+    if (codec != NULL) {
+        if (offsets.len < (Py_ssize_t) sizeof(uint64_t) || offsets.len % (Py_ssize_t) sizeof(uint64_t) != 0)
+            PyErr_SetString(PyExc_ValueError, "Offsets must be a non-empty array of uint64.");
+        else
+            samples = cdr_codec_deserialize_many(
+                codec, (const uint8_t*) data.buf, (size_t) data.len, (const uint64_t*) offsets.buf,
+                (size_t) offsets.len / sizeof(uint64_t) - 1, data.obj);
+    }
+
+    PyBuffer_Release(&offsets);
+    PyBuffer_Release(&data);
+    return samples;
+}
+
+/* end full sample codec */
+
+
+/* query conditions */
+
+static PyObject *
+ddspy_querycondition_create(PyObject *self, PyObject *args)
+{
+    dds_entity_t reader;
+    uint32_t mask;
+    PyObject* capsule;
+    (void)self;
+
+    if (!PyArg_ParseTuple(args, "iIO", &reader, &mask, &capsule))
+        return NULL;
+
+    ddspy_content_filter_t* content_filter =
+        (ddspy_content_filter_t*) PyCapsule_GetPointer(capsule, CONTENT_FILTER_CAPSULE_NAME);
+    if (content_filter == NULL)
+        return NULL;
+
+    // Slots are only assigned and released with the GIL held
+    bool assigned = false;
+    if (content_filter->slot < 0) {
+        for (int i = 0; i < QUERY_FILTER_SLOTS; ++i) {
+            if (query_filters[i] == NULL) {
+                content_filter->slot = i;
+                query_filters[i] = content_filter->filter;
+                assigned = true;
+                break;
+            }
+        }
+        if (content_filter->slot < 0) {
+            // All slots are taken, the caller filters through python instead
+            Py_RETURN_NONE;
+        }
+    }
+
+    dds_entity_t condition;
+    Py_BEGIN_ALLOW_THREADS
+    condition = dds_create_querycondition(reader, mask, query_filter_fns[content_filter->slot]);
+    Py_END_ALLOW_THREADS
+
+    if (condition < 0 && assigned) {
+        query_filters[content_filter->slot] = NULL;
+        content_filter->slot = -1;
+    }
+
+    return PyLong_FromLong((long) condition);
+}
+
+/* end query conditions */
+
+
 /* builtin topic */
 
 static PyObject *
@@ -1436,8 +2853,12 @@ ddspy_read_participant(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        free(info);
+        free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1489,8 +2910,12 @@ ddspy_take_participant(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        free(info);
+        free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1542,8 +2967,12 @@ ddspy_read_endpoint(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_read(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        free(info);
+        free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1604,8 +3033,12 @@ ddspy_take_endpoint(PyObject *self, PyObject *args)
         rcontainer[i] = NULL;
     }
 
+    Py_BEGIN_ALLOW_THREADS
     sts = dds_take(reader, (void**) rcontainer, info, Nu32, Nu32);
+    Py_END_ALLOW_THREADS
     if (sts < 0) {
+        free(info);
+        free(rcontainer);
         return PyLong_FromLong((long) sts);
     }
 
@@ -1677,6 +3110,42 @@ PyMethodDef ddspy_funcs[] = {
 		(PyCFunction)ddspy_calc_key,
 		METH_VARARGS,
 		ddspy_docs},
+    {	"ddspy_content_filter_create",
+		(PyCFunction)ddspy_content_filter_create,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_content_filter_eval",
+		(PyCFunction)ddspy_content_filter_eval,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_querycondition_create",
+		(PyCFunction)ddspy_querycondition_create,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_codec_create",
+		(PyCFunction)ddspy_codec_create,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_codec_serialize",
+		(PyCFunction)ddspy_codec_serialize,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_codec_serialize_into",
+		(PyCFunction)ddspy_codec_serialize_into,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_codec_serialize_many",
+		(PyCFunction)ddspy_codec_serialize_many,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_codec_deserialize",
+		(PyCFunction)ddspy_codec_deserialize,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_codec_deserialize_many",
+		(PyCFunction)ddspy_codec_deserialize_many,
+		METH_VARARGS,
+		ddspy_docs},
     {	"ddspy_topic_create",
 		(PyCFunction)ddspy_topic_create,
 		METH_VARARGS,
@@ -1713,10 +3182,22 @@ PyMethodDef ddspy_funcs[] = {
 		(PyCFunction)ddspy_writedispose_ts,
 		METH_VARARGS,
 		ddspy_docs},
+    {	"ddspy_write_many",
+		(PyCFunction)ddspy_write_many,
+		METH_VARARGS,
+		ddspy_docs},
     {	"ddspy_dispose",
 		(PyCFunction)ddspy_dispose,
 		METH_VARARGS,
 		ddspy_docs},
+    {	"ddspy_dispose_many",
+		(PyCFunction)ddspy_dispose_many,
+		METH_VARARGS,
+		ddspy_docs},
+    {	"ddspy_unregister_many",
+		(PyCFunction)ddspy_unregister_many,
+		METH_VARARGS,
+		ddspy_docs},
     {	"ddspy_dispose_ts",
 		(PyCFunction)ddspy_dispose_ts,
 		METH_VARARGS,
@@ -1795,37 +3276,39 @@ PyModuleDef _clayer_mod = {
 };
 
 PyMODINIT_FUNC PyInit__clayer(void) {
-    PyObject* import = PyImport_ImportModule("cyclonedds.internal");
+    if (PyType_Ready(&ddspy_sampleinfo_type) < 0)
+        return NULL;
 
-    if (PyErr_Occurred()) return NULL;
-    if (import == NULL) {
-        PyObject* msg = PyUnicode_FromString("Failed to import cyclonedds.internal to get SampleInfo cls.");
-        PyObject* name = PyUnicode_FromString("cyclonedds.internal");
-        PyObject* path = PyUnicode_FromString("cyclonedds.internal");
-        PyErr_SetImportError(msg, name, path);
-        Py_DECREF(msg);
-        Py_DECREF(name);
-        Py_DECREF(path);
+    // Names of the members in the order of the positional arguments
+    Py_ssize_t nmembers = sizeof(ddspy_sampleinfo_members) / sizeof(PyMemberDef) - 1;
+    PyObject* match_args = PyTuple_New(nmembers);
+    if (match_args == NULL)
+        return NULL;
+    for (Py_ssize_t i = 0; i < nmembers; ++i)
+        PyTuple_SET_ITEM(match_args, i, PyUnicode_FromString(ddspy_sampleinfo_members[i].name));
+    if (PyDict_SetItemString(ddspy_sampleinfo_type.tp_dict, "__match_args__", match_args) < 0) {
+        Py_DECREF(match_args);
         return NULL;
     }
+    Py_DECREF(match_args);
+    PyType_Modified(&ddspy_sampleinfo_type);
 
-    sampleinfo_descriptor = PyObject_GetAttrString(import, "SampleInfo");
-
-    if (PyErr_Occurred()) return NULL;
-    if (sampleinfo_descriptor == NULL) {
-        PyObject* msg = PyUnicode_FromString("Failed to import cyclonedds.internal to get SampleInfo cls.");
-        PyObject* name = PyUnicode_FromString("cyclonedds.internal");
-        PyObject* path = PyUnicode_FromString("cyclonedds.internal");
-        PyErr_SetImportError(msg, name, path);
-        Py_DECREF(msg);
-        Py_DECREF(name);
-        Py_DECREF(path);
+    if (PyType_Ready(&ddspy_sample_loan_type) < 0)
+        return NULL;
+    if (PyType_Ready(&ddspy_read_buffers_type) < 0)
         return NULL;
-    }
-    Py_DECREF(import);
 
     PyObject* module = PyModule_Create(&_clayer_mod);
 
+    Py_INCREF(&ddspy_sampleinfo_type);
+    PyModule_AddObject(module, "SampleInfo", (PyObject*) &ddspy_sampleinfo_type);
+
+    Py_INCREF(&ddspy_sample_loan_type);
+    PyModule_AddObject(module, "SampleLoan", (PyObject*) &ddspy_sample_loan_type);
+
+    Py_INCREF(&ddspy_read_buffers_type);
+    PyModule_AddObject(module, "ReadBuffers", (PyObject*) &ddspy_read_buffers_type);
+
     PyModule_AddObject(module, "DDS_INFINITY", PyLong_FromLongLong(DDS_INFINITY));
     PyModule_AddObject(module, "UINT32_MAX", PyLong_FromUnsignedLong(UINT32_MAX));
 
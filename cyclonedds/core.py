@@ -1260,25 +1260,77 @@ _querycondition_filter_fn = c_callable(ct.c_bool, [ct.c_void_p])
 class QueryCondition(_Condition):
     """Condition that triggers when new data is available to read according to the mask.
     Construct a mask using InstanceState, ViewState and SampleState. Add a filter function
-    that receives the sample and returns a boolean whether to accept or reject the sample.
+    that receives the sample and returns a boolean whether to accept or reject the sample,
+    or a filter expression on the members of the sample such as ``"speed > 30 AND region = %0"``
+    with its parameters. Expressions are evaluated on the serialized sample, without calling
+    into python for up to 32 expression query conditions at once.
     """
 
-    def __init__(self, reader: 'cyclonedds.sub.DataReader', mask: int, filter: Callable[[Any], bool]) -> None:
-        """Construct a QueryCondition."""
+    def __init__(self, reader: 'cyclonedds.sub.DataReader', mask: int, filter: Callable[[Any], bool] = None, *,
+                 expr: Optional[str] = None, params: List[Any] = ()) -> None:
+        """Construct a QueryCondition.
+
+        Parameters
+        ----------
+        reader: DataReader
+            The reader the condition reads from.
+        mask: int
+            Mask of InstanceState, ViewState and SampleState.
+        filter: Callable[[Any], bool], optional
+            Function that receives the deserialized sample and returns whether to accept it.
+        expr: str, optional
+            Filter expression instead of a filter function. Comparisons of members (or dotted paths into nested
+            structs) with numbers, 'strings', enum members, TRUE, FALSE or %n for the n-th parameter, combined
+            with AND, OR, NOT and parentheses.
+        params: List[Any], optional
+            The values of the %n parameters of the expression.
+
+        Raises
+        ------
+        ValueError
+            If the expression is invalid for the type of the reader.
+        """
+        if (filter is None) == (expr is None):
+            raise ValueError("A QueryCondition needs either a filter function or a filter expression.")
+
         self.reader = reader
         self.mask = mask
         self.filter = filter
-
-        def call(sample_pt):
-            try:
-                sample_info = ct.cast(sample_pt, ct.POINTER(dds_c_t.sample_buffer))[0]
-                array_type = ct.c_ubyte * sample_info.len
-                array = ct.cast(sample_info.buf, ct.POINTER(array_type))
-                contents = array.contents[:]
-                data = self.reader._topic.data_type.deserialize(bytes(contents))
-                return self.filter(data)
-            except Exception:  # Block any python exception from going into C
-                return False
+        self.expr = expr
+
+        if expr is not None:
+            from cyclonedds._clayer import ddspy_content_filter_create, ddspy_content_filter_eval, \
+                ddspy_querycondition_create
+            content_filter = reader._topic.data_type.__idl__.content_filter(expr, params)
+            # Released after the condition is deleted, which stops the use of its filter
+            self._content_filter = ddspy_content_filter_create(content_filter.fields, content_filter.ops)
+            condition = ddspy_querycondition_create(reader._ref, mask, self._content_filter)
+            if condition is not None:
+                super().__init__(condition)
+                return
+
+            # Every native filter function is in use, the expression is then evaluated through a python callback
+            def call(sample_pt):
+                try:
+                    sample_info = ct.cast(sample_pt, ct.POINTER(dds_c_t.sample_buffer))[0]
+                    if sample_info.key_only:
+                        return False
+                    return ddspy_content_filter_eval(self._content_filter, ct.string_at(sample_info.buf, sample_info.len))
+                except Exception:  # Block any python exception from going into C
+                    return False
+        else:
+            def call(sample_pt):
+                try:
+                    sample_info = ct.cast(sample_pt, ct.POINTER(dds_c_t.sample_buffer))[0]
+                    if sample_info.key_only:
+                        return False
+                    array_type = ct.c_ubyte * sample_info.len
+                    array = ct.cast(sample_info.buf, ct.POINTER(array_type))
+                    contents = array.contents[:]
+                    data = self.reader._topic.data_type.deserialize(bytes(contents))
+                    return self.filter(data)
+                except Exception:  # Block any python exception from going into C
+                    return False
 
         self._filter = _querycondition_filter_fn(call)
         super().__init__(self._create_querycondition(reader._ref, mask, self._filter))
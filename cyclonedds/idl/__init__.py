@@ -11,3 +11,4 @@
 """
 
 from ._main import IdlStruct, IdlUnion
+from ._view import SampleView, ProjectedSample, RawView
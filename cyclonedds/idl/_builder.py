@@ -11,16 +11,19 @@
 """
 
 from enum import Enum
+from hashlib import md5
 from importlib import import_module
 from inspect import isclass
 from typing import Type, Optional, Union
 from collections import defaultdict
 
 from ._main import IdlStruct, IdlUnion
-from ._support import MaxSizeFinder
+from ._support import MaxSizeFinder, Endianness
+from ._compiler import CodecCompiler
 from ._type_helper import Annotated, get_origin, get_args, get_type_hints
 from ._machinery import NoneMachine, PrimitiveMachine, StringMachine, BytesMachine, ByteArrayMachine, UnionMachine, \
-    ArrayMachine, SequenceMachine, InstanceMachine, MappingMachine, EnumMachine, StructMachine, OptionalMachine, CharMachine
+    ArrayMachine, SequenceMachine, InstanceMachine, MappingMachine, EnumMachine, StructMachine, OptionalMachine, CharMachine, \
+    _is_fixed
 
 from .types import array, bounded_str, sequence, primitive_types, NoneType, char
 
@@ -94,6 +97,19 @@ class Builder:
 
         raise TypeError(f"{repr(_type)} {get_origin(_type)} {get_args(_type)} is not valid in IDL classes because it cannot be encoded.")
 
+    @classmethod
+    def _machine_for_field(cls, _type, annotations):
+        machine = cls._machine_for_type(_type)
+        if annotations.get("typed_array"):
+            if not isinstance(machine, (ArrayMachine, SequenceMachine)) or not machine.bulk:
+                raise TypeError(f"{repr(_type)} cannot be a typed array, only arrays and sequences of primitives can.")
+            machine.typed_array = True
+        if annotations.get("zero_copy"):
+            if not isinstance(machine, BytesMachine):
+                raise TypeError(f"{repr(_type)} cannot be zero copy, only bytes can.")
+            machine.zero_copy = True
+        return machine
+
     @classmethod
     def _machine_struct(cls, struct: Type[IdlStruct]):
         fields = get_type_hints(struct, include_extras=True)
@@ -109,13 +125,37 @@ class Builder:
                 keylist = None
 
         members = {
-            name: cls._machine_for_type(field_type)
+            name: cls._machine_for_field(field_type, struct.__idl_field_annotations__.get(name, {}))
             for name, field_type in fields.items()
         }
-        return StructMachine(struct, members, keylist)
+
+        if struct.__idl_annotations__.get("autoid") == "hash":
+            # XTypes hashed member id: the first four bytes of the md5 of the name, little endian
+            member_ids = {
+                name: int.from_bytes(md5(name.encode('utf-8')).digest()[:4], 'little') & 0x0FFFFFFF
+                for name in members
+            }
+            if len(set(member_ids.values())) != len(member_ids):
+                raise TypeError(f"Member ids of {struct.__name__} collide, use sequential ids.")
+        else:
+            member_ids = {name: i for i, name in enumerate(members)}
+
+        must_understand = [
+            name for name, annotations in struct.__idl_field_annotations__.items()
+            if annotations.get("must_understand")
+        ]
+
+        return StructMachine(
+            struct, members, keylist,
+            extensibility=struct.__idl_annotations__.get("extensibility", "final"),
+            member_ids=member_ids,
+            must_understand=must_understand
+        )
 
     @classmethod
     def _machine_union(cls, union: Type[IdlUnion]):
+        if union.__idl_annotations__.get("extensibility") == "mutable":
+            raise TypeError(f"{union.__name__} cannot be mutable, only final and appendable unions are supported.")
         discriminator = cls._machine_for_type(union.__idl_discriminator__)
         cases = {
             label: cls._machine_for_type(case_type)
@@ -136,11 +176,151 @@ class Builder:
         else:
             raise Exception(f"Cannot build for {_type}, not struct or union.")
 
-        if not keyless:
-            finder = MaxSizeFinder()
-            machine.max_key_size(finder)
-            size = finder.size
+        return machine, keyless
+
+    @classmethod
+    def key_max_size(cls, machine):
+        """Upper bound of the size of the key stream (see IDL.key). Nested types are populated along the way,
+        so the machine has to be set on the type first."""
+        finder = MaxSizeFinder()
+        finder.types.append(machine.type)
+        machine.max_key_size(finder)
+        return finder.size
+
+    @classmethod
+    def fixed_key_size(cls, machine):
+        """Exact size of the key stream (see IDL.key) if it does not depend on the value, None otherwise."""
+        finder = MaxSizeFinder()
+        return finder.size if cls._fixed_key_member(machine, finder, (machine.type,)) else None
+
+    @classmethod
+    def _fixed_key_member(cls, machine, finder, seen):
+        # Keys are XCDR1 aligned from their start, of structs only the key members are streamed
+        if isinstance(machine, InstanceMachine):
+            if machine.type in seen:
+                return False
+            if machine.type.__idl__.machine is None:
+                machine.type.__idl__.populate()
+            return cls._fixed_key_member(machine.type.__idl__.machine, finder, seen + (machine.type,))
+        if isinstance(machine, StructMachine):
+            return all(
+                cls._fixed_key_member(submachine, finder, seen)
+                for member, submachine in machine.members_machines.items()
+                if not machine.keylist or member in machine.keylist
+            )
+        if isinstance(machine, UnionMachine):
+            if not machine.discriminator_is_key:
+                return False
+            machine.discriminator.max_size(finder)
+            return True
+        if isinstance(machine, ArrayMachine) and not machine.bulk:
+            return all(cls._fixed_key_member(machine.submachine, finder, seen) for i in range(machine.size))
+        if isinstance(machine, (PrimitiveMachine, CharMachine, EnumMachine, ByteArrayMachine, ArrayMachine)):
+            machine.max_size(finder)
+            return True
+        return False
+
+    @classmethod
+    def immutable_key(cls, machine):
+        """Whether all key members of the struct are scalars or strings, which the sample holds as
+        immutable values: samples of a frozen dataclass can then not change their key."""
+        if not isinstance(machine, StructMachine):
+            return False
+        return all(
+            cls._immutable_member(submachine)
+            for member, submachine in machine.members_machines.items()
+            if not machine.keylist or member in machine.keylist
+        )
+
+    @classmethod
+    def _immutable_member(cls, machine):
+        if isinstance(machine, OptionalMachine):
+            machine = machine.submachine
+        return isinstance(machine, (PrimitiveMachine, CharMachine, EnumMachine, StringMachine))
+
+    @classmethod
+    def extensibilities(cls, machine, seen=None):
+        """Extensibility kinds of all structs and unions in the type tree of 'machine'."""
+        seen = set() if seen is None else seen
+        if isinstance(machine, InstanceMachine):
+            if machine.type in seen:
+                return set()
+            seen.add(machine.type)
+            if machine.type.__idl__.machine is None:
+                machine.type.__idl__.populate()
+            machine = machine.type.__idl__.machine
+
+        kinds = set()
+        children = []
+        if isinstance(machine, StructMachine):
+            kinds.add(machine.extensibility)
+            children = list(machine.members_machines.values())
+        elif isinstance(machine, UnionMachine):
+            kinds.add(machine.extensibility)
+            children = [machine.discriminator, machine.default] + list(machine.labels_submachines.values())
+        elif isinstance(machine, MappingMachine):
+            children = [machine.key_machine, machine.value_machine]
+        elif hasattr(machine, "submachine"):
+            children = [machine.submachine]
+
+        for child in children:
+            if child is not None:
+                kinds |= cls.extensibilities(child, seen)
+        return kinds
+
+    @classmethod
+    def fixed_layout(cls, machine, version=1):
+        """Offset table of a final struct of which every member sits at a constant position, None for
+        other types. Maps the dotted path of every member, including nested struct members and array
+        elements (by index), to its offset from the start of the data and its machine."""
+        if not isinstance(machine, StructMachine) or (version == 2 and machine.extensibility != "final") \
+                or not _is_fixed(machine, version):
+            return None
+
+        table = {}
+        finder = MaxSizeFinder(version=version)
+        for member, submachine in machine.members_machines.items():
+            cls._layout_member(submachine, finder, member, table)
+        return table
+
+    @classmethod
+    def _layout_member(cls, machine, finder, path, table):
+        if isinstance(machine, InstanceMachine):
+            if machine.type.__idl__.machine is None:
+                machine.type.__idl__.populate()
+            machine = machine.type.__idl__.machine
+
+        if isinstance(machine, StructMachine):
+            table[path] = (finder.size, machine)
+            for member, submachine in machine.members_machines.items():
+                cls._layout_member(submachine, finder, f"{path}.{member}", table)
+        elif isinstance(machine, ArrayMachine) and not machine.bulk:
+            if machine.delimited and finder.version == 2:
+                finder.increase(4, 4)
+            table[path] = (finder.size, machine)
+            for i in range(machine.size):
+                cls._layout_member(machine.submachine, finder, f"{path}.{i}", table)
         else:
-            size = 0
+            # Primitives, enums, chars, byte arrays and arrays of primitives
+            if not isinstance(machine, ArrayMachine) or machine.size:
+                finder.align(machine.alignment)
+            table[path] = (finder.size, machine)
+            machine.max_size(finder)
+
+    @classmethod
+    def build_codecs(cls, machine, version=1):
+        if not isinstance(machine, StructMachine) or (version == 2 and machine.extensibility == "mutable"):
+            return None
+
+        return {
+            endianness: CodecCompiler(machine, endianness, version=version).compile()
+            for endianness in (Endianness.Little, Endianness.Big)
+        }
+
+    @classmethod
+    def build_key_codec(cls, machine):
+        if not isinstance(machine, StructMachine):
+            return None
 
-        return machine, keyless, size
+        # Keys are always serialized big-endian
+        return CodecCompiler(machine, Endianness.Big, for_key=True).compile()
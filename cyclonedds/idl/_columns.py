@@ -0,0 +1,241 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+from ._support import MaxSizeFinder, _import_numpy
+from ._machinery import ArrayMachine, CharMachine, EnumMachine, PrimitiveMachine, _is_fixed
+from ._view import Projection, _struct_machine
+
+
+def _require_numpy():
+    numpy = _import_numpy()
+    if not numpy:
+        raise ImportError("Decoding into columns requires numpy, install cyclonedds[numpy].")
+    return numpy
+
+
+def leaf_fields(machine, prefix="", seen=()):
+    """Dotted paths of all members of a struct, nested structs are expanded into their members."""
+    fields = []
+    for member, submachine in machine.members_machines.items():
+        struct = _struct_machine(submachine)
+        if struct is not None and struct.type not in seen:
+            fields += leaf_fields(struct, f"{prefix}{member}.", seen + (machine.type,))
+        else:
+            fields.append(prefix + member)
+    return fields
+
+
+def _leaf(machine, path):
+    for name in path[:-1]:
+        machine = _struct_machine(machine.members_machines[name])
+    return machine.members_machines[path[-1]]
+
+
+def _fixed_offset(machine, path, version, start=None):
+    """Position of a member relative to the start of the data, when it does not depend on the value of
+    any member before it, else None."""
+    if version == 2 and machine.extensibility != "final":
+        if start is not None:
+            # Nested extensible types can be written by another version of the type
+            return None
+        start = 4
+    start = start or 0
+    finder = MaxSizeFinder(start, version)
+    for member, submachine in machine.members_machines.items():
+        if member == path[0]:
+            if len(path) > 1:
+                return _fixed_offset(_struct_machine(submachine), path[1:], version, finder.size)
+            finder.align(submachine.alignment)
+            return finder.size
+        if not _is_fixed(submachine, version):
+            return None
+        submachine.max_size(finder)
+    return None
+
+
+def _gather_format(machine):
+    """Item format, item size and item count of members that can be copied from the data as-is."""
+    if isinstance(machine, PrimitiveMachine):
+        return machine.code, machine.alignment, None
+    if isinstance(machine, EnumMachine):
+        return "I", 4, None
+    if isinstance(machine, CharMachine):
+        return "S1", 1, None
+    if isinstance(machine, ArrayMachine) and machine.bulk:
+        return machine.submachine.code, machine.submachine.alignment, machine.size
+    return None
+
+
+def _column(numpy, machine, values):
+    # Column of values decoded one by one
+    if isinstance(machine, PrimitiveMachine):
+        return numpy.array(values, dtype=machine.code)
+    if isinstance(machine, ArrayMachine) and machine.bulk:
+        return numpy.array(values, dtype=machine.submachine.code).reshape(len(values), machine.size)
+    if isinstance(machine, EnumMachine):
+        return numpy.array([v.value for v in values], dtype="I")
+    if isinstance(machine, CharMachine):
+        return numpy.array(values, dtype="U1")
+    column = numpy.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+class ColumnDecoder:
+    """Decodes a batch of serialized samples of a struct type into one numpy array per field.
+
+    Fields that are primitives, enums, chars or arrays of primitives at a position that does not depend
+    on the sample are copied out of all samples at once. Other fields are decoded per sample with a
+    projection, without creating instances of the type."""
+
+    def __init__(self, machine, fields=None):
+        self.machine = machine
+        self.fields = tuple(fields) if fields is not None else tuple(leaf_fields(machine))
+        # Fails early on fields that do not exist
+        Projection(machine, self.fields)
+        self.leaves = [_leaf(machine, field.split(".")) for field in self.fields]
+        # Per XCDR version: fields copied as-is, with their position, and the projection for the others
+        self.plans = {}
+
+    def _plan(self, version):
+        gathered, others = [], []
+        for field, leaf in zip(self.fields, self.leaves):
+            fmt = _gather_format(leaf)
+            offset = None
+            if fmt is not None and not (version == 2 and self.machine.extensibility == "mutable"):
+                offset = _fixed_offset(self.machine, field.split("."), version)
+            if offset is None:
+                others.append(field)
+            else:
+                # Past the encapsulation header
+                gathered.append((field, offset + 4) + fmt)
+        return gathered, Projection(self.machine, others) if others else None
+
+    def deserialize(self, samples, valid=None):
+        """'samples' is a sequence of serialized samples, returns a dict of field to column. Rows of samples
+        that 'valid' (a sequence of bools) marks as invalid are not decoded and left zero (None for objects)."""
+        numpy = _require_numpy()
+        if valid is None or all(valid):
+            return self._decode(numpy, samples)
+
+        rows = [i for i, v in enumerate(valid) if v]
+        decoded = self._decode(numpy, [samples[i] for i in rows])
+        columns = {}
+        for field, column in decoded.items():
+            columns[field] = numpy.zeros((len(samples),) + column.shape[1:], dtype=column.dtype)
+            if column.dtype == object:
+                columns[field][:] = None
+            columns[field][rows] = column
+        return columns
+
+    def _decode(self, numpy, samples):
+        count = len(samples)
+        if count == 0:
+            return {field: _column(numpy, leaf, []) for field, leaf in zip(self.fields, self.leaves)}
+
+        sizes = numpy.fromiter((len(s) for s in samples), dtype=numpy.int64, count=count)
+        starts = numpy.zeros(count, dtype=numpy.int64)
+        numpy.cumsum(sizes[:-1], out=starts[1:])
+        data = numpy.frombuffer(b"".join(samples), dtype=numpy.uint8)
+        if (sizes < 4).any():
+            raise Exception("Serialized sample without encapsulation header.")
+
+        encapsulation = data[starts + 1]
+        little = (encapsulation & 1).astype(bool)
+        version_2 = encapsulation >= 6
+
+        columns = {}
+        for version, rows in ((1, numpy.flatnonzero(~version_2)), (2, numpy.flatnonzero(version_2))):
+            if len(rows) == 0:
+                continue
+            plan = self.plans.get(version)
+            if plan is None:
+                plan = self.plans[version] = self._plan(version)
+            gathered, projection = plan
+            part = self._gather(numpy, data, starts[rows], sizes[rows], little[rows], version, gathered)
+            if projection is not None:
+                decoded = [projection.deserialize(samples[i]) for i in rows]
+                for j, field in enumerate(projection.fields):
+                    part[field] = [values[j] for values in decoded]
+            for field, leaf in zip(self.fields, self.leaves):
+                column = part[field]
+                if not isinstance(column, numpy.ndarray):
+                    column = _column(numpy, leaf, column)
+                if len(rows) == count:
+                    columns[field] = column
+                else:
+                    if field not in columns:
+                        columns[field] = numpy.zeros((count,) + column.shape[1:], dtype=column.dtype)
+                    columns[field][rows] = column
+        return columns
+
+    def _gather(self, numpy, data, starts, sizes, little, version, gathered):
+        part = {}
+        if not gathered:
+            return part
+
+        delimited_end = None
+        if version == 2 and self.machine.extensibility == "appendable":
+            # Data written by an older version of the type can end before a member
+            dheader = data[(starts + 4)[:, None] + numpy.arange(4)]
+            dheader[little] = dheader[little, ::-1]
+            delimited_end = dheader.view(">u4")[:, 0].astype(numpy.int64) + 8
+
+        for field, offset, fmt, size, items in gathered:
+            nbytes = size * (items or 1)
+            # Written by an older version of the type, before this member was appended
+            missing = numpy.zeros(len(starts), dtype=bool) if delimited_end is None else delimited_end <= offset
+            rows = numpy.flatnonzero(~missing)
+            if (sizes[rows] < offset + nbytes).any() or \
+                    (delimited_end is not None and (delimited_end[rows] < offset + nbytes).any()):
+                raise Exception(f"Member {field} exceeds the serialized data.")
+            raw = data[(starts[rows] + offset)[:, None] + numpy.arange(nbytes)].reshape(len(rows), items or 1, size)
+            if size > 1:
+                # Big endian items, little endian ones are reversed
+                raw[little[rows]] = raw[little[rows], :, ::-1]
+                column = raw.reshape(len(rows), nbytes).view(">" + fmt).astype("=" + fmt)
+            else:
+                column = raw.reshape(len(rows), nbytes).view(fmt)
+            if fmt == "S1":
+                column = column.astype("U1")
+            column = column if items else column[:, 0]
+            if missing.any():
+                full = numpy.empty((len(starts),) + column.shape[1:], dtype=column.dtype)
+                full[missing] = self._missing(numpy, field)
+                full[rows] = column
+                column = full
+            part[field] = column
+        return part
+
+    def _missing(self, numpy, field):
+        # Value of a field of which the top level member is missing from the data
+        path = field.split(".")
+        value = self.machine._missing(path[0], self.machine.members_machines[path[0]])
+        for name in path[1:]:
+            value = getattr(value, name)
+        return _column(numpy, _leaf(self.machine, path), [value])[0]
+
+
+# Columns of the sample infos of a batch, other members are int64
+_sample_info_dtypes = {"valid_data": "?", "instance_handle": "u8", "publication_handle": "u8"}
+
+
+def sample_info_columns(infos):
+    """Turn a sequence of cyclonedds.internal.SampleInfo into a dict of member to numpy array."""
+    numpy = _require_numpy()
+    from cyclonedds.internal import SampleInfo
+    return {
+        name: numpy.fromiter((getattr(info, name) for info in infos),
+                             dtype=_sample_info_dtypes.get(name, "i8"), count=len(infos))
+        for name in SampleInfo.__match_args__
+    }
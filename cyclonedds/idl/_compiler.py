@@ -0,0 +1,499 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+import struct
+
+from dataclasses import dataclass
+from typing import Callable
+
+from ._support import Endianness, pack_array_into, unpack_array_from
+from ._machinery import NoneMachine, PrimitiveMachine, CharMachine, StringMachine, BytesMachine, ArrayMachine, \
+    SequenceMachine, StructMachine, InstanceMachine, EnumMachine, OptionalMachine
+
+
+def _grow(buffer, pos, size):
+    buffer._pos = pos
+    buffer.ensure_size(size)
+    return buffer._bytes, buffer._size
+
+
+@dataclass
+class Codec:
+    """Straight-line serializer and deserializer functions for one type and endianness."""
+    serialize: Callable
+    deserialize: Callable
+    source: str
+
+
+class CodecCompiler:
+    """Turn a machine tree into python source and compile it with exec.
+
+    The generated functions operate directly on the internals of a Buffer. Runs of
+    fixed size members are coalesced into a single precompiled struct.Struct. To do that
+    the compiler tracks how much of the alignment of the stream position is statically
+    known: 'known' is the largest alignment for which the position modulo that alignment
+    ('residue') is known at compile time. Anything the compiler does not know how to
+    inline is delegated back to its machine.
+
+    With 'for_key' the serializer only writes the key members, matching the machines
+    serializing with for_key=True. Keys are always XCDR version 1. With version 2 the code
+    follows XCDR2: alignment is capped at 4 and appendable structs as well as collections
+    of non-primitives are preceded by a DHEADER. Mutable structs are left to the machines.
+    """
+
+    max_align = 8
+    # Larger primitive arrays are copied in bulk instead of being unrolled into a run
+    max_inline_array = 64
+
+    def __init__(self, machine, endianness, for_key=False, version=1):
+        self.root = machine
+        self.for_key = for_key
+        self.version = 1 if for_key else version
+        if self.version == 2:
+            self.max_align = 4
+        self.endian = "<" if endianness == Endianness.Little else ">"
+        self.namespace = {
+            "_grow": _grow, "_apack": pack_array_into, "_aunpack": unpack_array_from,
+            "_U32": struct.Struct(self.endian + "I")
+        }
+        self.lines = []
+        self.indent = 1
+        self.counter = 0
+        self.stack = [machine.type]
+        self.known = self.max_align
+        self.residue = 0
+        self.run_fmt = []
+        self.run_size = 0
+        self.run_items = []
+        self.run_post = []
+
+    def _name(self, prefix, obj=None):
+        self.counter += 1
+        name = f"{prefix}{self.counter}"
+        if obj is not None:
+            self.namespace[name] = obj
+        return name
+
+    def _emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def _forget_alignment(self):
+        self.known, self.residue = 1, 0
+
+    def _align(self, alignment):
+        alignment = min(alignment, self.max_align)
+        if alignment > 1:
+            self._emit(f"pos = ((pos - off + {alignment - 1}) & {-alignment}) + off")
+        self.known, self.residue = alignment, 0
+
+    def _run_add(self, alignment, fmt, size, item):
+        alignment = min(alignment, self.max_align)
+        if alignment > self.known:
+            self._flush()
+            self._align(alignment)
+
+        padding = -self.residue % alignment
+        if padding:
+            self.run_fmt.append(f"{padding}x")
+        self.run_fmt.append(fmt)
+        self.run_size += padding + size
+        self.run_items.append(item)
+        self.residue = (self.residue + padding + size) % self.known
+
+    def _post(self, line):
+        if self.run_items:
+            self.run_post.append(line)
+        else:
+            self._emit(line)
+
+    def _stmt(self, line):
+        self._flush()
+        self._emit(line)
+
+    def _delegate_start(self, machine):
+        self._flush()
+        self._emit("buffer._pos = pos")
+        return self._name("_m", machine)
+
+    def _delegate_end(self):
+        self._emit("pos = buffer._pos")
+        self._forget_alignment()
+
+    def _loop(self, header, body):
+        self._stmt(header)
+        self._forget_alignment()
+        self.indent += 1
+        body()
+        self._flush()
+        self.indent -= 1
+        self._forget_alignment()
+
+    def _inline_array(self, machine):
+        return isinstance(machine, ArrayMachine) and machine.bulk and not machine.typed_array and \
+            machine.size <= self.max_inline_array
+
+    def _inline_struct(self, machine):
+        """Nested structs are inlined, unless they are recursive."""
+        if not isinstance(machine, InstanceMachine) or machine.type in self.stack:
+            return None
+        if machine.type.__idl__.machine is None:
+            machine.type.__idl__.populate()
+        nested = machine.type.__idl__.machine
+        if isinstance(nested, StructMachine) and not (self.version == 2 and nested.extensibility == "mutable"):
+            return nested
+        return None
+
+    def _delimited(self, delimited, body):
+        """Generate 'body' preceded by an XCDR2 DHEADER if 'delimited'."""
+        if self.version != 2 or not delimited:
+            body()
+            return
+
+        self._flush()
+        self._align(4)
+        if self._des_mode:
+            end = self._name("_e")
+            self._emit(f"{end} = _U32.unpack_from(b, pos)[0] + pos + 4")
+            self._emit("pos += 4")
+            body()
+            self._flush()
+            # Shorter data was written by an older version of the type, the machines sort that out
+            self._emit(f"if pos > {end}:")
+            self._emit("    raise ValueError(\"Data exceeds its DHEADER.\")")
+            self._emit(f"pos = {end}")
+            self._forget_alignment()
+        else:
+            at = self._name("_d")
+            self._ser_ensure(4)
+            self._emit(f"{at} = pos")
+            self._emit("pos += 4")
+            body()
+            self._flush()
+            self._emit(f"_U32.pack_into(b, {at}, pos - {at} - 4)")
+
+    def _members(self, machine):
+        if self.for_key and machine.keylist:
+            return [(member, m) for member, m in machine.members_machines.items() if member in machine.keylist]
+        return machine.members_machines.items()
+
+    def compile(self):
+        ser_lines = self._function("serialize", ["buffer", "v"], self._ser_body)
+        if self.for_key:
+            source = "\n".join(ser_lines) + "\n"
+            exec(compile(source, f"<idl key codec {self.root.type.__name__}>", "exec"), self.namespace)
+            return Codec(self.namespace["serialize"], None, source)
+
+        des_lines = self._function("deserialize", ["buffer"], self._des_body)
+        source = "\n".join(ser_lines + [""] + des_lines) + "\n"
+        exec(compile(source, f"<idl codec {self.root.type.__name__}>", "exec"), self.namespace)
+        return Codec(self.namespace["serialize"], self.namespace["deserialize"], source)
+
+    def _function(self, name, args, body):
+        self.lines = []
+        self.stack = [self.root.type]
+        self.known, self.residue = self.max_align, 0
+        body()
+        return [f"def {name}({', '.join(args)}):"] + self.lines
+
+    # Serialization
+
+    def _ser_body(self):
+        self._emit("b = buffer._bytes")
+        self._emit("size_ = buffer._size")
+        self._emit("pos = buffer._pos")
+        self._emit("off = buffer._align_offset")
+
+        def members():
+            for member, machine in self._members(self.root):
+                self._ser(machine, f"v.{member}")
+
+        self._delimited(self.root.extensibility == "appendable", members)
+        self._flush()
+        self._emit("buffer._pos = pos")
+
+    def _ser(self, machine, expr):
+        if isinstance(machine, NoneMachine):
+            return
+        elif isinstance(machine, PrimitiveMachine):
+            self._run_add(machine.alignment, machine.code, machine.alignment, expr)
+        elif isinstance(machine, CharMachine):
+            self._run_add(1, "b", 1, f"ord({expr})")
+        elif isinstance(machine, EnumMachine):
+            self._run_add(4, "I", 4, f"{expr}.value")
+        elif self._inline_array(machine):
+            sub = machine.submachine
+            self._run_add(sub.alignment, f"{machine.size}{sub.code}", sub.alignment * machine.size, f"*{expr}")
+        elif isinstance(machine, ArrayMachine) and machine.bulk:
+            var = self._name("_v")
+            self._stmt(f"{var} = {expr}")
+            self._emit(f"assert len({var}) == {machine.size}")
+            self._ser_bulk(machine.submachine, var, machine.size)
+        elif isinstance(machine, ArrayMachine):
+            var = self._name("_v")
+            self._stmt(f"assert len({expr}) == {machine.size}")
+            self._delimited(
+                machine.delimited, lambda: self._loop(f"for {var} in {expr}:", lambda: self._ser(machine.submachine, var))
+            )
+        elif isinstance(machine, SequenceMachine):
+            self._delimited(machine.delimited, lambda: self._ser_sequence(machine, expr))
+        elif isinstance(machine, StringMachine):
+            self._ser_string(machine, expr)
+        elif isinstance(machine, BytesMachine):
+            self._ser_bytes(machine, expr)
+        elif isinstance(machine, OptionalMachine):
+            self._ser_optional(machine, expr)
+        elif self._inline_struct(machine) is not None:
+            nested = self._inline_struct(machine)
+            var = self._name("_v")
+            self._emit(f"{var} = {expr}")
+            self.stack.append(machine.type)
+
+            def members():
+                for member, submachine in self._members(nested):
+                    self._ser(submachine, f"{var}.{member}")
+
+            self._delimited(nested.extensibility == "appendable", members)
+            self.stack.pop()
+        else:
+            name = self._delegate_start(machine)
+            self._emit(f"{name}.serialize(buffer, {expr}{', True' if self.for_key else ''})")
+            self._emit("b = buffer._bytes")
+            self._emit("size_ = buffer._size")
+            self._delegate_end()
+
+    def _ser_ensure(self, size):
+        self._emit(f"if pos + {size} > size_:")
+        self._emit(f"    b, size_ = _grow(buffer, pos, {size})")
+
+    def _ser_sequence(self, machine, expr):
+        var = self._name("_v")
+        self._emit(f"{var} = {expr}")
+        if machine.maxlen is not None:
+            self._emit(f"assert len({var}) <= {machine.maxlen}")
+        self._run_add(4, "I", 4, f"len({var})")
+
+        sub = machine.submachine
+        if machine.bulk:
+            num = self._name("_n")
+            self._stmt(f"{num} = len({var})")
+            self._emit(f"if {num}:")
+            self.indent += 1
+            self._ser_bulk(sub, var, num)
+            self.indent -= 1
+            # Either nothing was written after the 4-aligned length or a multiple of the alignment
+            self.known, self.residue = min(sub.alignment, 4), 0
+        else:
+            item = self._name("_v")
+            self._loop(f"for {item} in {var}:", lambda: self._ser(sub, item))
+
+    def _ser_bulk(self, sub, var, num):
+        self._align(sub.alignment)
+        self._ser_ensure(f"{num} * {sub.alignment}")
+        self._emit(f"_apack('{self.endian}', '{sub.code}', {sub.alignment}, b, pos, {var})")
+        self._emit(f"pos += {num} * {sub.alignment}")
+
+    def _ser_string(self, machine, expr):
+        var = self._name("_s")
+        if machine.bound:
+            self._emit(f"if len({expr}) > {machine.bound}:")
+            self._emit("    raise ValueError(\"String longer than bound.\")")
+        self._emit(f"{var} = {expr}.encode('utf-8')")
+        self._run_add(4, "I", 4, f"len({var}) + 1")
+        self._flush()
+        self._ser_ensure(f"len({var}) + 1")
+        self._emit(f"b[pos:pos + len({var})] = {var}")
+        self._emit(f"pos += len({var})")
+        self._emit("b[pos] = 0")
+        self._emit("pos += 1")
+        self._forget_alignment()
+
+    def _ser_bytes(self, machine, expr):
+        var = self._name("_s")
+        self._emit(f"{var} = {expr}")
+        if machine.bound:
+            self._emit(f"if len({var}) > {machine.bound}:")
+            self._emit("    raise ValueError(\"Bytes longer than bound.\")")
+        self._run_add(4, "I", 4, f"len({var})")
+        self._flush()
+        self._ser_ensure(f"len({var})")
+        self._emit(f"b[pos:pos + len({var})] = {var}")
+        self._emit(f"pos += len({var})")
+        self._forget_alignment()
+
+    def _ser_optional(self, machine, expr):
+        var = self._name("_v")
+        self._emit(f"{var} = {expr}")
+        self._run_add(1, "?", 1, f"{var} is not None")
+        self._stmt(f"if {var} is not None:")
+        self.indent += 1
+        self._ser(machine.submachine, var)
+        self._flush()
+        self._emit("pass")
+        self.indent -= 1
+        self._forget_alignment()
+
+    def _flush(self):
+        if not self.run_items:
+            return
+
+        fmt = struct.Struct(self.endian + "".join(self.run_fmt))
+        assert fmt.size == self.run_size
+        name = self._name("_S", fmt)
+        items, post = self.run_items, self.run_post
+        self.run_fmt, self.run_size, self.run_items, self.run_post = [], 0, [], []
+
+        if self._des_mode:
+            if all(count is None for _, count in items):
+                self._emit(f"{', '.join(target for target, _ in items)}, = {name}.unpack_from(b, pos)")
+            else:
+                result = self._name("_r")
+                self._emit(f"{result} = {name}.unpack_from(b, pos)")
+                index = 0
+                for target, count in items:
+                    if count is None:
+                        self._emit(f"{target} = {result}[{index}]")
+                        index += 1
+                    else:
+                        self._emit(f"{target} = list({result}[{index}:{index + count}])")
+                        index += count
+            self._emit(f"pos += {fmt.size}")
+        else:
+            self._ser_ensure(fmt.size)
+            self._emit(f"{name}.pack_into(b, pos, {', '.join(items)})")
+            self._emit(f"pos += {fmt.size}")
+
+        for line in post:
+            self._emit(line)
+
+    # Deserialization
+
+    _des_mode = False
+
+    def _des_body(self):
+        self._des_mode = True
+        self._emit("b = buffer._bytes")
+        self._emit("pos = buffer._pos")
+        self._emit("off = buffer._align_offset")
+        kwargs = []
+
+        def members():
+            for member, machine in self.root.members_machines.items():
+                target = self._name("_t")
+                self._des(machine, target)
+                kwargs.append(f"{member}={target}")
+
+        self._delimited(self.root.extensibility == "appendable", members)
+        self._flush()
+        self._emit("buffer._pos = pos")
+        self._emit(f"return {self._name('_T', self.root.type)}({', '.join(kwargs)})")
+        self._des_mode = False
+
+    def _des(self, machine, target):
+        if isinstance(machine, NoneMachine):
+            self._emit(f"{target} = None")
+        elif isinstance(machine, PrimitiveMachine):
+            self._run_add(machine.alignment, machine.code, machine.alignment, (target, None))
+        elif isinstance(machine, CharMachine):
+            self._run_add(1, "b", 1, (target, None))
+            self._post(f"{target} = chr({target})")
+        elif isinstance(machine, EnumMachine):
+            self._run_add(4, "I", 4, (target, None))
+            self._post(f"{target} = {self._name('_E', machine.enum)}({target})")
+        elif self._inline_array(machine):
+            sub = machine.submachine
+            self._run_add(sub.alignment, f"{machine.size}{sub.code}", sub.alignment * machine.size, (target, machine.size))
+        elif isinstance(machine, ArrayMachine) and machine.bulk:
+            self._flush()
+            self._align(machine.submachine.alignment)
+            self._des_bulk(machine, target, machine.size)
+        elif isinstance(machine, ArrayMachine):
+            self._delimited(machine.delimited, lambda: self._des_list(machine.submachine, target, str(machine.size)))
+        elif isinstance(machine, SequenceMachine):
+            self._delimited(machine.delimited, lambda: self._des_sequence(machine, target))
+        elif isinstance(machine, StringMachine):
+            num = self._name("_n")
+            self._run_add(4, "I", 4, (num, None))
+            self._flush()
+            self._emit(f"{target} = str(b[pos:pos + {num} - 1], 'utf-8')")
+            self._emit(f"pos += {num}")
+            self._forget_alignment()
+        elif isinstance(machine, BytesMachine):
+            num = self._name("_n")
+            self._run_add(4, "I", 4, (num, None))
+            self._flush()
+            if machine.zero_copy:
+                self._emit(f"{target} = memoryview(b)[pos:pos + {num}]")
+            else:
+                self._emit(f"{target} = bytes(b[pos:pos + {num}])")
+            self._emit(f"pos += {num}")
+            self._forget_alignment()
+        elif isinstance(machine, OptionalMachine):
+            flag = self._name("_f")
+            self._run_add(1, "?", 1, (flag, None))
+            self._stmt(f"if {flag}:")
+            self.indent += 1
+            self._des(machine.submachine, target)
+            self._flush()
+            self.indent -= 1
+            self._emit("else:")
+            self._emit(f"    {target} = None")
+            self._forget_alignment()
+        elif self._inline_struct(machine) is not None:
+            nested = self._inline_struct(machine)
+            self.stack.append(machine.type)
+            kwargs = []
+
+            def members():
+                for member, submachine in nested.members_machines.items():
+                    subtarget = self._name("_t")
+                    self._des(submachine, subtarget)
+                    kwargs.append(f"{member}={subtarget}")
+
+            self._delimited(nested.extensibility == "appendable", members)
+            self.stack.pop()
+            self._post(f"{target} = {self._name('_T', machine.type)}({', '.join(kwargs)})")
+        else:
+            name = self._delegate_start(machine)
+            self._emit(f"{target} = {name}.deserialize(buffer)")
+            self._delegate_end()
+
+    def _des_sequence(self, machine, target):
+        num = self._name("_n")
+        self._run_add(4, "I", 4, (num, None))
+        sub = machine.submachine
+        if machine.bulk:
+            self._stmt(f"if {num}:")
+            self.indent += 1
+            self._align(sub.alignment)
+            self.indent -= 1
+            self._des_bulk(machine, target, num)
+            self.known, self.residue = min(sub.alignment, 4), 0
+        else:
+            self._flush()
+            self._des_list(sub, target, num)
+
+    def _des_bulk(self, machine, target, num):
+        sub = machine.submachine
+        self._emit(
+            f"{target} = _aunpack('{self.endian}', '{sub.code}', {sub.alignment}, b, pos, {num}, {machine.typed_array})"
+        )
+        self._emit(f"pos += {num} * {sub.alignment}")
+
+    def _des_list(self, submachine, target, count):
+        item = self._name("_t")
+        self._stmt(f"{target} = []")
+
+        def body():
+            self._des(submachine, item)
+            self._stmt(f"{target}.append({item})")
+
+        self._loop(f"for _ in range({count}):", body)
@@ -0,0 +1,268 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+import re
+from enum import Enum
+
+from ._support import CdrKeyVmOp, CdrKeyVMOpType, CdrFilterCompare, CdrFilterField, CdrFilterKind, CdrFilterOp, \
+    CdrFilterOpType
+from ._machinery import CharMachine, EnumMachine, OptionalMachine, PrimitiveMachine, StringMachine
+from ._view import _struct_machine
+
+
+_token = re.compile(r"""\s*(?:
+    (?P<number>[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?) |
+    (?P<string>'(?:[^']|'')*') |
+    (?P<param>%\d+) |
+    (?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*) |
+    (?P<symbol><>|!=|<=|>=|==|=|<|>|\(|\))
+)""", re.VERBOSE)
+
+_keywords = {"AND", "OR", "NOT", "TRUE", "FALSE"}
+
+_compares = {
+    "=": CdrFilterCompare.Equal, "==": CdrFilterCompare.Equal, "<>": CdrFilterCompare.NotEqual,
+    "!=": CdrFilterCompare.NotEqual, "<": CdrFilterCompare.Less, "<=": CdrFilterCompare.LessEqual,
+    ">": CdrFilterCompare.Greater, ">=": CdrFilterCompare.GreaterEqual
+}
+
+# The same comparison with its operands swapped
+_swapped = {
+    CdrFilterCompare.Less: CdrFilterCompare.Greater, CdrFilterCompare.LessEqual: CdrFilterCompare.GreaterEqual,
+    CdrFilterCompare.Greater: CdrFilterCompare.Less, CdrFilterCompare.GreaterEqual: CdrFilterCompare.LessEqual
+}
+
+_signed_codes = "bhiq"
+
+
+def _tokenize(expr):
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        match = _token.match(expr, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Invalid filter expression at '{expr[pos:].strip()}'.")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "name" and text.upper() in _keywords:
+            kind, text = "keyword", text.upper()
+        tokens.append((kind, text))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over the tokens of a filter expression, into a tree of tuples:
+    ("or", a, b), ("and", a, b), ("not", a) and ("compare", left, compare, right) with operands
+    ("member", path) or ("value", value)."""
+
+    def __init__(self, expr, params):
+        self.tokens = _tokenize(expr)
+        self.pos = 0
+        self.params = params
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError("Filter expression ends unexpectedly.")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        tree = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.pos][1]}' in filter expression.")
+        return tree
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.peek() == ("keyword", "OR"):
+            self.take()
+            tree = ("or", tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_not()
+        while self.peek() == ("keyword", "AND"):
+            self.take()
+            tree = ("and", tree, self.parse_not())
+        return tree
+
+    def parse_not(self):
+        if self.peek() == ("keyword", "NOT"):
+            self.take()
+            return ("not", self.parse_not())
+        if self.peek() == ("symbol", "("):
+            self.take()
+            tree = self.parse_or()
+            if self.take() != ("symbol", ")"):
+                raise ValueError("Missing ')' in filter expression.")
+            return tree
+        left = self.parse_operand()
+        kind, text = self.take()
+        if kind != "symbol" or text not in _compares:
+            raise ValueError(f"Expected a comparison instead of '{text}' in filter expression.")
+        return ("compare", left, _compares[text], self.parse_operand())
+
+    def parse_operand(self):
+        kind, text = self.take()
+        if kind == "name":
+            return ("member", text.split("."))
+        if kind == "number":
+            return ("value", float(text) if any(c in text for c in ".eE") else int(text))
+        if kind == "string":
+            return ("value", text[1:-1].replace("''", "'"))
+        if kind == "param":
+            index = int(text[1:])
+            if index >= len(self.params):
+                raise ValueError(f"Filter expression uses {text} but only {len(self.params)} parameters are given.")
+            return ("value", self.params[index])
+        if kind == "keyword" and text in ("TRUE", "FALSE"):
+            return ("value", text == "TRUE")
+        raise ValueError(f"Expected a member or a value instead of '{text}' in filter expression.")
+
+
+def _member_key_ops(machine, path, version):
+    # Key machine ops that skip everything before the member and stream the member itself
+    if machine.extensibility == "mutable":
+        raise ValueError(f"Cannot filter on members of mutable type {machine.type.__name__}.")
+    ops = []
+    if version == 2 and machine.extensibility != "final":
+        ops.append(CdrKeyVmOp(CdrKeyVMOpType.DHeaderStart, False))
+    for name, submachine in machine.members_machines.items():
+        if name == path[0]:
+            if len(path) == 1:
+                return ops + submachine.cdr_key_machine_op(False, version)
+            struct = _struct_machine(submachine)
+            if struct is None:
+                raise ValueError(f"Cannot filter on {'.'.join(path)}, {name} is not a struct.")
+            return ops + _member_key_ops(struct, path[1:], version)
+        ops += submachine.cdr_key_machine_op(True, version)
+    raise ValueError(f"{machine.type.__name__} has no member {path[0]}.")
+
+
+def _member_leaf(machine, path):
+    for i, name in enumerate(path):
+        if name not in machine.members_machines:
+            raise ValueError(f"{machine.type.__name__} has no member {name}.")
+        if i == len(path) - 1:
+            return machine.members_machines[name]
+        machine = _struct_machine(machine.members_machines[name])
+        if machine is None:
+            raise ValueError(f"Cannot filter on {'.'.join(path)}, {name} is not a struct.")
+
+
+def _member_field(machine, path):
+    leaf = _member_leaf(machine, path)
+    optional = isinstance(leaf, OptionalMachine)
+    if optional:
+        leaf = leaf.submachine
+
+    if isinstance(leaf, PrimitiveMachine):
+        kind = CdrFilterKind.Float if leaf.code in "fd" else \
+            CdrFilterKind.Signed if leaf.code in _signed_codes else CdrFilterKind.Unsigned
+        size = align = leaf.alignment
+    elif isinstance(leaf, EnumMachine):
+        kind, size, align = CdrFilterKind.Unsigned, 4, 4
+    elif isinstance(leaf, CharMachine):
+        kind, size, align = CdrFilterKind.String, 1, 1
+    elif isinstance(leaf, StringMachine):
+        kind, size, align = CdrFilterKind.String, 0, 4
+    else:
+        raise ValueError(f"Cannot filter on {'.'.join(path)}, only primitives, enums, chars and strings can be.")
+
+    return CdrFilterField(
+        key_ops=_member_key_ops(machine, path, 1),
+        key_ops_v2=_member_key_ops(machine, path, 2),
+        kind=kind,
+        size=size,
+        # Keys are aligned as XCDR1, the present flag is the first byte
+        offset=(1 + align - 1) & ~(align - 1) if optional else 0,
+        optional=optional
+    ), leaf
+
+
+def _compare_value(path, field, leaf, value):
+    # The value to compare with and the kind of the comparison, numbers of another kind than the
+    # member (or out of its range) are compared as floats
+    if isinstance(leaf, EnumMachine):
+        if isinstance(value, str):
+            if value not in leaf.enum.__members__:
+                raise ValueError(f"{value} is not a member of {leaf.enum.__name__}, compared with {'.'.join(path)}.")
+            value = leaf.enum[value]
+        if isinstance(value, Enum):
+            value = value.value
+    if field.kind == CdrFilterKind.String:
+        if not isinstance(value, str) or (field.size == 1 and len(value) != 1):
+            raise ValueError(f"Cannot compare {'.'.join(path)} with {value!r}, it is a {'char' if field.size else 'string'}.")
+        return CdrFilterKind.String, value.encode("utf-8")
+    if not isinstance(value, (int, float)):
+        raise ValueError(f"Cannot compare {'.'.join(path)} with {value!r}, it is a number.")
+    if isinstance(value, int) and field.kind == CdrFilterKind.Signed and -2**63 <= value < 2**63:
+        return CdrFilterKind.Signed, int(value)
+    if isinstance(value, int) and field.kind == CdrFilterKind.Unsigned and 0 <= value < 2**64:
+        return CdrFilterKind.Unsigned, int(value)
+    return CdrFilterKind.Float, float(value)
+
+
+class ContentFilter:
+    """A filter expression compiled for a struct type, for the content filter evaluator of the C layer.
+
+    Expressions compare members with values, combined with AND, OR, NOT and parentheses, for example
+    "speed > 30 AND region = %0". Members are names or dotted paths into nested structs of primitives,
+    enums, chars or strings, not of mutable types. Values are numbers, 'quoted strings', TRUE, FALSE or
+    %n for the n-th of 'params'. Enums compare with their value or the name of a member. A comparison
+    with an optional member that is not set is false."""
+
+    def __init__(self, machine, expr, params=()):
+        if not hasattr(machine, "members_machines"):
+            raise TypeError(f"Cannot filter {machine.type.__name__}, only structs can be filtered.")
+        self.expr = expr
+        self.params = tuple(params)
+        self.fields = []
+        self.ops = []
+        self._field_indices = {}
+        self._emit(machine, _Parser(expr, self.params).parse())
+        self.ops.append(CdrFilterOp(CdrFilterOpType.Done))
+
+    def _field(self, machine, path):
+        key = tuple(path)
+        if key not in self._field_indices:
+            field, leaf = _member_field(machine, path)
+            self._field_indices[key] = (len(self.fields), leaf)
+            self.fields.append(field)
+        return self._field_indices[key]
+
+    def _emit(self, machine, tree):
+        if tree[0] in ("and", "or"):
+            self._emit(machine, tree[1])
+            self._emit(machine, tree[2])
+            self.ops.append(CdrFilterOp(CdrFilterOpType.And if tree[0] == "and" else CdrFilterOpType.Or))
+        elif tree[0] == "not":
+            self._emit(machine, tree[1])
+            self.ops.append(CdrFilterOp(CdrFilterOpType.Not))
+        else:
+            _, left, compare, right = tree
+            if left[0] == "value":
+                left, right = right, left
+                compare = _swapped.get(compare, compare)
+            if left[0] != "member":
+                raise ValueError("A comparison in a filter expression needs a member.")
+            if right[0] == "member":
+                raise ValueError("Comparing two members is not supported in filter expressions.")
+            index, leaf = self._field(machine, left[1])
+            kind, value = _compare_value(left[1], self.fields[index], leaf, right[1])
+            self.ops.append(CdrFilterOp(CdrFilterOpType.Compare, index, compare, kind, value))
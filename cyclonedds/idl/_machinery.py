@@ -10,8 +10,80 @@
  * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
 """
 
+import dataclasses
+
 from .types import primitive_types
-from ._support import Buffer, MaxSizeFinder, CdrKeyVmOp, CdrKeyVMOpType
+from ._support import Buffer, MaxSizeFinder, CdrKeyVmOp, CdrKeyVMOpType, CdrCodecOp, CdrCodecOpType, unpack_array_from
+
+
+def _max_element_size(finder, machine):
+    """Largest size of one element including its leading padding, at any position."""
+    size = 0
+    for start in range(8):
+        subfinder = finder.sub(start)
+        machine.max_size(subfinder)
+        finder.bounded = finder.bounded and subfinder.bounded
+        size = max(size, subfinder.size - start)
+    return size
+
+
+def _is_primitive(machine):
+    """XCDR2 delimits collections of anything but these."""
+    return isinstance(machine, (PrimitiveMachine, CharMachine, EnumMachine))
+
+
+def _is_fixed(machine, version, seen=()):
+    """Whether the serialized size of the machine does not depend on the value, which makes the
+    position of whatever follows it in a struct computable from the machine tree alone."""
+    if isinstance(machine, (PrimitiveMachine, CharMachine, EnumMachine, ByteArrayMachine)):
+        return True
+    if isinstance(machine, ArrayMachine):
+        return _is_fixed(machine.submachine, version, seen)
+    if isinstance(machine, InstanceMachine):
+        if machine.type in seen:
+            return False
+        if machine.type.__idl__.machine is None:
+            machine.type.__idl__.populate()
+        return _is_fixed(machine.type.__idl__.machine, version, seen + (machine.type,))
+    if isinstance(machine, StructMachine):
+        # Extensible structs can be written by another version of the type
+        return (version == 1 or machine.extensibility == "final") and \
+            all(_is_fixed(m, version, seen) for m in machine.members_machines.values())
+    return False
+
+
+def _skip_elements(machine, buffer, count):
+    """Skip 'count' serialized values of the submachine of an array or sequence. When their size does
+    not depend on the value, the size of one including its padding only depends on where it starts."""
+    sizes = machine.element_sizes.get(buffer.version)
+    if sizes is None:
+        sizes = ()
+        if _is_fixed(machine.submachine, buffer.version):
+            finders = [MaxSizeFinder(start, buffer.version) for start in range(8)]
+            for finder in finders:
+                machine.submachine.max_size(finder)
+            sizes = tuple(finder.size - start for start, finder in enumerate(finders))
+        machine.element_sizes[buffer.version] = sizes
+
+    if not sizes:
+        for i in range(count):
+            machine.submachine.skip(buffer)
+        return
+    pos, offset = buffer.tell(), buffer._align_offset
+    for i in range(count):
+        pos += sizes[(pos - offset) & 7]
+    buffer.seek(pos)
+
+
+def _length_code(machine):
+    """EMHEADER length code of members of 1, 2, 4 or 8 bytes, None when the size needs a NEXTINT."""
+    if isinstance(machine, PrimitiveMachine):
+        return {1: 0, 2: 1, 4: 2, 8: 3}[machine.alignment]
+    if isinstance(machine, CharMachine):
+        return 0
+    if isinstance(machine, EnumMachine):
+        return 2
+    return None
 
 
 class Machine:
@@ -25,12 +97,33 @@ class Machine:
     def deserialize(self, buffer):
         pass
 
+    def skip(self, buffer):
+        """Move the buffer past a serialized value, machines that can do so without decoding it override this."""
+        self.deserialize(buffer)
+
+    def deserialize_key(self, buffer):
+        """Decode a value from a key stream (see IDL.key), machines of which the key leaves out parts override this."""
+        return self.deserialize(buffer)
+
+    def default_value(self):
+        """Zero value of the type, used for members that are missing from data written by an older type."""
+        return None
+
     def max_key_size(self, finder):
         pass
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        pass
+
+    def max_size(self, finder):
+        finder.bounded = False
+
+    def cdr_key_machine_op(self, skip, version=1):
         pass
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Delegate, ref=self)]
+
 
 class NoneMachine(Machine):
     def __init__(self):
@@ -42,12 +135,24 @@ class NoneMachine(Machine):
     def deserialize(self, buffer):
         pass
 
+    def skip(self, buffer):
+        pass
+
     def max_key_size(self, finder):
         pass
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        pass
+
+    def max_size(self, finder):
+        pass
+
+    def cdr_key_machine_op(self, skip, version=1):
         return []
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Nothing)]
+
 
 class PrimitiveMachine(Machine):
     def __init__(self, type):
@@ -62,15 +167,31 @@ class PrimitiveMachine(Machine):
         buffer.align(self.alignment)
         return buffer.read(self.code, self.alignment)
 
+    def default_value(self):
+        return unpack_array_from('=', self.code, self.alignment, bytes(self.alignment), 0, 1)[0]
+
+    def skip(self, buffer):
+        buffer.align(self.alignment)
+        buffer.seek(buffer.tell() + self.alignment)
+
     def max_key_size(self, finder: MaxSizeFinder):
         finder.increase(self.alignment, self.alignment)
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        finder.increase(self.alignment, self.alignment)
+
+    def max_size(self, finder):
+        finder.increase(self.alignment, self.alignment)
+
+    def cdr_key_machine_op(self, skip, version=1):
         stream = [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, self.alignment, align=self.alignment)]
         if not skip and not self.alignment == 1:
             stream += [CdrKeyVmOp(CdrKeyVMOpType.ByteSwap, skip, align=self.alignment)]
         return stream
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Primitive, size=self.alignment, align=self.alignment, code=self.code)]
+
 
 class CharMachine(Machine):
     def __init__(self):
@@ -82,12 +203,27 @@ class CharMachine(Machine):
     def deserialize(self, buffer):
         return chr(buffer.read('b', 1))
 
+    def default_value(self):
+        return '\x00'
+
+    def skip(self, buffer):
+        buffer.seek(buffer.tell() + 1)
+
     def max_key_size(self, finder: MaxSizeFinder):
         finder.increase(1, 1)
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        finder.increase(1, 1)
+
+    def max_size(self, finder):
+        finder.increase(1, 1)
+
+    def cdr_key_machine_op(self, skip, version=1):
         return [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, 1, align=1)]
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Char)]
+
 
 class StringMachine(Machine):
     def __init__(self, bound=None):
@@ -106,9 +242,17 @@ class StringMachine(Machine):
     def deserialize(self, buffer):
         buffer.align(4)
         numbytes = buffer.read('I', 4)
-        bytes = buffer.read_bytes(numbytes - 1)
+        value = buffer.read_str(numbytes - 1)
         buffer.read('b', 1)
-        return bytes.decode('utf-8')
+        return value
+
+    def default_value(self):
+        return ""
+
+    def skip(self, buffer):
+        buffer.align(4)
+        numbytes = buffer.read('I', 4)
+        buffer.seek(buffer.tell() + numbytes)
 
     def max_key_size(self, finder: MaxSizeFinder):
         if self.bound:
@@ -116,14 +260,30 @@ class StringMachine(Machine):
         else:
             finder.increase(2**64 - 1 + 5, 4)
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        finder.increase(4, 4)
+        finder.size += (len(value) if value.isascii() else len(value.encode('utf-8'))) + 1
+
+    def max_size(self, finder):
+        if self.bound:
+            # The bound counts characters, which take up to four bytes in utf-8
+            finder.increase(4 + 4 * self.bound + 1, 4)
+        else:
+            finder.bounded = False
+
+    def cdr_key_machine_op(self, skip, version=1):
         return [CdrKeyVmOp(CdrKeyVMOpType.Stream4ByteSize, skip, 1, align=1)]
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.String, size=self.bound or 0)]
+
 
 class BytesMachine(Machine):
-    def __init__(self, bound=None):
+    def __init__(self, bound=None, zero_copy=False):
         self.alignment = 2
         self.bound = bound
+        # Return memoryview slices of the serialized data instead of copies
+        self.zero_copy = zero_copy
 
     def serialize(self, buffer, value, for_key=False):
         if self.bound and len(value) > self.bound:
@@ -135,17 +295,40 @@ class BytesMachine(Machine):
     def deserialize(self, buffer):
         buffer.align(4)
         numbytes = buffer.read('I', 4)
+        if self.zero_copy:
+            return buffer.read_view(numbytes)
         return buffer.read_bytes(numbytes)
 
+    def default_value(self):
+        return b""
+
+    def skip(self, buffer):
+        buffer.align(4)
+        numbytes = buffer.read('I', 4)
+        buffer.seek(buffer.tell() + numbytes)
+
     def max_key_size(self, finder: MaxSizeFinder):
         if self.bound:
             finder.increase(self.bound + 3, 2)  # string size + length serialized (2)
         else:
             finder.increase(65535 + 3, 2)
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        finder.increase(4, 4)
+        finder.size += len(value)
+
+    def max_size(self, finder):
+        if self.bound:
+            finder.increase(4 + self.bound, 4)
+        else:
+            finder.bounded = False
+
+    def cdr_key_machine_op(self, skip, version=1):
         return [CdrKeyVmOp(CdrKeyVMOpType.Stream4ByteSize, skip, 1, align=1)]
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Bytes, size=self.bound or 0, value=int(self.zero_copy))]
+
 
 class ByteArrayMachine(Machine):
     def __init__(self, size):
@@ -161,27 +344,80 @@ class ByteArrayMachine(Machine):
     def deserialize(self, buffer):
         return buffer.read_bytes(self.size)
 
+    def default_value(self):
+        return bytes(self.size)
+
+    def skip(self, buffer):
+        buffer.seek(buffer.tell() + self.size)
+
     def max_key_size(self, finder: MaxSizeFinder):
         finder.increase(self.size, 1)
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        finder.size += self.size
+
+    def max_size(self, finder):
+        finder.size += self.size
+
+    def cdr_key_machine_op(self, skip, version=1):
         return [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, self.size, align=1)]
 
 
 class ArrayMachine(Machine):
-    def __init__(self, submachine, size):
+    def __init__(self, submachine, size, typed_array=False):
         self.size = size
         self.submachine = submachine
         self.alignment = submachine.alignment
+        # Primitive items are (de)serialized in bulk, typed arrays decode to numpy/array.array
+        self.bulk = isinstance(submachine, PrimitiveMachine)
+        self.typed_array = typed_array
+        # Preceded by a DHEADER in XCDR2
+        self.delimited = not _is_primitive(submachine)
+        # Per XCDR version, see _skip_elements
+        self.element_sizes = {}
 
     def serialize(self, buffer, value, for_key=False):
         assert len(value) == self.size
 
+        if self.bulk:
+            buffer.write_array(self.submachine.code, self.submachine.alignment, value)
+            return
+
+        dheader = buffer.write_dheader() if self.delimited and buffer.version == 2 else None
         for v in value:
             self.submachine.serialize(buffer, v, for_key)
+        if dheader is not None:
+            buffer.finish_dheader(dheader)
 
     def deserialize(self, buffer):
-        return [self.submachine.deserialize(buffer) for i in range(self.size)]
+        if self.bulk:
+            return buffer.read_array(self.submachine.code, self.submachine.alignment, self.size, self.typed_array)
+        end = buffer.read_dheader() if self.delimited and buffer.version == 2 else None
+        values = [self.submachine.deserialize(buffer) for i in range(self.size)]
+        if end is not None:
+            buffer.seek(end)
+        return values
+
+    def default_value(self):
+        if self.bulk:
+            size = self.submachine.alignment
+            return unpack_array_from('=', self.submachine.code, size, bytes(size * self.size), 0, self.size, self.typed_array)
+        return [self.submachine.default_value() for i in range(self.size)]
+
+    def deserialize_key(self, buffer):
+        if self.bulk:
+            return self.deserialize(buffer)
+        return [self.submachine.deserialize_key(buffer) for i in range(self.size)]
+
+    def skip(self, buffer):
+        if self.bulk:
+            if self.size:
+                buffer.align(self.alignment)
+            buffer.seek(buffer.tell() + self.size * self.alignment)
+        elif self.delimited and buffer.version == 2:
+            buffer.seek(buffer.read_dheader())
+        else:
+            _skip_elements(self, buffer, self.size)
 
     def max_key_size(self, finder: MaxSizeFinder):
         if self.size == 0:
@@ -196,7 +432,31 @@ class ArrayMachine(Machine):
         size = (size + self.alignment - 1) & ~(self.alignment - 1)
         finder.size = pre_size + self.size * size
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        if self.bulk:
+            if self.size:
+                finder.increase(self.size * self.submachine.alignment, self.submachine.alignment)
+            return
+        if self.delimited and finder.version == 2:
+            finder.increase(4, 4)
+        for v in value:
+            self.submachine.serialized_size(finder, v)
+
+    def max_size(self, finder):
+        if self.bulk:
+            if self.size:
+                finder.increase(self.size * self.submachine.alignment, self.submachine.alignment)
+            return
+        if self.delimited and finder.version == 2:
+            finder.increase(4, 4)
+        if _is_fixed(self.submachine, finder.version):
+            # Exact, the padding of every element depends on where it starts
+            for i in range(self.size):
+                self.submachine.max_size(finder)
+            return
+        finder.size += self.size * _max_element_size(finder, self.submachine)
+
+    def cdr_key_machine_op(self, skip, version=1):
         if isinstance(self.submachine, PrimitiveMachine):
             stream = [CdrKeyVmOp(
                 CdrKeyVMOpType.StreamStatic,
@@ -208,31 +468,80 @@ class ArrayMachine(Machine):
                 stream += [CdrKeyVmOp(CdrKeyVMOpType.ByteSwap, skip, align=self.submachine.alignment)]
             return stream
 
-        subops = self.submachine.cdr_key_machine_op(skip)
-        return [CdrKeyVmOp(CdrKeyVMOpType.RepeatStatic, skip, self.size, value=len(subops)+2)] + \
+        subops = self.submachine.cdr_key_machine_op(skip, version)
+        dheader = [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, True, 4, align=4)] if self.delimited and version == 2 else []
+        return dheader + [CdrKeyVmOp(CdrKeyVMOpType.RepeatStatic, skip, self.size, value=len(subops)+2)] + \
             subops + [CdrKeyVmOp(CdrKeyVMOpType.EndRepeat, skip, len(subops))]
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        # Typed arrays are decoded by this machine, the interpreter only encodes them
+        dheader = [CdrCodecOp(CdrCodecOpType.DHeader)] if self.delimited and version == 2 else []
+        return dheader + [CdrCodecOp(CdrCodecOpType.Array, size=self.size, ref=self if self.typed_array else None)] + \
+            self.submachine.cdr_codec_machine_op(stack, version)
+
 
 class SequenceMachine(Machine):
-    def __init__(self, submachine, maxlen=None):
+    def __init__(self, submachine, maxlen=None, typed_array=False):
         self.submachine = submachine
         self.alignment = 2
         self.maxlen = maxlen
+        self.bulk = isinstance(submachine, PrimitiveMachine)
+        self.typed_array = typed_array
+        self.delimited = not _is_primitive(submachine)
+        self.element_sizes = {}
 
     def serialize(self, buffer, value, for_key=False):
         if self.maxlen is not None:
             assert len(value) <= self.maxlen
 
+        dheader = buffer.write_dheader() if self.delimited and buffer.version == 2 else None
         buffer.align(4)
         buffer.write('I', 4, len(value))
 
+        if self.bulk:
+            buffer.write_array(self.submachine.code, self.submachine.alignment, value)
+            return
+
         for v in value:
             self.submachine.serialize(buffer, v, for_key)
+        if dheader is not None:
+            buffer.finish_dheader(dheader)
 
     def deserialize(self, buffer):
+        end = buffer.read_dheader() if self.delimited and buffer.version == 2 else None
+        buffer.align(4)
+        num = buffer.read('I', 4)
+        if self.bulk:
+            return buffer.read_array(self.submachine.code, self.submachine.alignment, num, self.typed_array)
+        values = [self.submachine.deserialize(buffer) for i in range(num)]
+        if end is not None:
+            buffer.seek(end)
+        return values
+
+    def default_value(self):
+        if self.bulk:
+            return unpack_array_from('=', self.submachine.code, self.submachine.alignment, b"", 0, 0, self.typed_array)
+        return []
+
+    def deserialize_key(self, buffer):
+        if self.bulk:
+            return self.deserialize(buffer)
+        buffer.align(4)
+        num = buffer.read('I', 4)
+        return [self.submachine.deserialize_key(buffer) for i in range(num)]
+
+    def skip(self, buffer):
+        if self.delimited and buffer.version == 2:
+            buffer.seek(buffer.read_dheader())
+            return
         buffer.align(4)
         num = buffer.read('I', 4)
-        return [self.submachine.deserialize(buffer) for i in range(num)]
+        if self.bulk:
+            if num:
+                buffer.align(self.submachine.alignment)
+            buffer.seek(buffer.tell() + num * self.submachine.alignment)
+        else:
+            _skip_elements(self, buffer, num)
 
     def max_key_size(self, finder: MaxSizeFinder):
         if self.maxlen == 0:
@@ -247,7 +556,30 @@ class SequenceMachine(Machine):
         size = (size + self.alignment - 1) & ~(self.alignment - 1)
         finder.size = pre_size + (self.maxlen if self.maxlen else 65535) * size + 2
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        if self.delimited and finder.version == 2:
+            finder.increase(4, 4)
+        finder.increase(4, 4)
+        if self.bulk:
+            if len(value):
+                finder.increase(len(value) * self.submachine.alignment, self.submachine.alignment)
+            return
+        for v in value:
+            self.submachine.serialized_size(finder, v)
+
+    def max_size(self, finder):
+        if self.delimited and finder.version == 2:
+            finder.increase(4, 4)
+        finder.increase(4, 4)
+        if self.maxlen is None:
+            finder.bounded = False
+        elif self.bulk:
+            if self.maxlen:
+                finder.increase(self.maxlen * self.submachine.alignment, self.submachine.alignment)
+        elif self.maxlen:
+            finder.size += self.maxlen * _max_element_size(finder, self.submachine)
+
+    def cdr_key_machine_op(self, skip, version=1):
         if isinstance(self.submachine, PrimitiveMachine):
             stream = [CdrKeyVmOp(
                 CdrKeyVMOpType.Stream4ByteSize,
@@ -259,10 +591,21 @@ class SequenceMachine(Machine):
                 stream += [CdrKeyVmOp(CdrKeyVMOpType.ByteSwap, skip, align=self.submachine.alignment)]
             return stream
 
-        subops = self.submachine.cdr_key_machine_op(skip)
-        return [CdrKeyVmOp(CdrKeyVMOpType.Repeat4ByteSize, skip, value=len(subops)+2)] + \
+        subops = self.submachine.cdr_key_machine_op(skip, version)
+        dheader = [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, True, 4, align=4)] if self.delimited and version == 2 else []
+        return dheader + [CdrKeyVmOp(CdrKeyVMOpType.Repeat4ByteSize, skip, value=len(subops)+2)] + \
             subops + [CdrKeyVmOp(CdrKeyVMOpType.EndRepeat, skip, len(subops))]
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        bounded = self.maxlen is not None
+        dheader = [CdrCodecOp(CdrCodecOpType.DHeader)] if self.delimited and version == 2 else []
+        return dheader + [CdrCodecOp(
+            CdrCodecOpType.Sequence,
+            size=self.maxlen if bounded else 0,
+            value=int(bounded),
+            ref=self if self.typed_array else None
+        )] + self.submachine.cdr_codec_machine_op(stack, version)
+
 
 class UnionMachine(Machine):
     def __init__(self, type, discriminator_machine, labels_submachines, default_case=None):
@@ -273,6 +616,7 @@ class UnionMachine(Machine):
         self.discriminator = discriminator_machine
         self.default = default_case
         self.discriminator_is_key = type.__idl_annotations__.get("discriminator_is_key", False)
+        self.extensibility = type.__idl_annotations__.get("extensibility", "final")
 
     def serialize(self, buffer, union, for_key=False):
         discr, value = union.get()
@@ -288,16 +632,20 @@ class UnionMachine(Machine):
                 raise Exception(f"Failed to encode union, {self.type}, value is {value}") from e
 
         try:
+            dheader = buffer.write_dheader() if buffer.version == 2 and self.extensibility != "final" else None
             if discr is None:
                 self.discriminator.serialize(buffer, union.__idl_default_discriminator__)
                 self.default.serialize(buffer, value)
             else:
                 self.discriminator.serialize(buffer, discr)
                 self.labels_submachines[discr].serialize(buffer, value)
+            if dheader is not None:
+                buffer.finish_dheader(dheader)
         except Exception as e:
             raise Exception(f"Failed to encode union, {self.type}, value is {value}") from e
 
     def deserialize(self, buffer):
+        end = buffer.read_dheader() if buffer.version == 2 and self.extensibility != "final" else None
         label = self.discriminator.deserialize(buffer)
 
         if label not in self.labels_submachines:
@@ -306,19 +654,67 @@ class UnionMachine(Machine):
         else:
             contents = self.labels_submachines[label].deserialize(buffer)
 
+        if end is not None:
+            buffer.seek(end)
         return self.type(discriminator=label, value=contents)
 
+    def default_value(self):
+        if self.default is not None:
+            return self.type(discriminator=None, value=self.default.default_value())
+        label, machine = next(iter(self.labels_submachines.items()))
+        return self.type(discriminator=label, value=machine.default_value())
+
+    def deserialize_key(self, buffer):
+        if not self.discriminator_is_key:
+            return self.deserialize(buffer)
+        # Only the discriminator is in the key, the value is left unset
+        label = self.discriminator.deserialize(buffer)
+        return self.type(discriminator=label if label in self.labels_submachines else None, value=None)
+
+    def skip(self, buffer):
+        if buffer.version == 2 and self.extensibility != "final":
+            buffer.seek(buffer.read_dheader())
+        else:
+            self.deserialize(buffer)
+
     def max_key_size(self, finder: MaxSizeFinder):
         self.discriminator.max_key_size(finder)
         if not self.discriminator_is_key:
             ms = 0
             for _, machine in self.labels_submachines.items():
-                subfinder = MaxSizeFinder()
+                subfinder = finder.sub(0)
                 machine.max_key_size(subfinder)
                 ms = max(ms, subfinder.size)
             finder.increase(ms, self.alignment)
 
-    def cdr_key_machine_op(self, skip):  # TODO: check again
+    def serialized_size(self, finder, union):
+        discr, value = union.get()
+        if finder.version == 2 and self.extensibility != "final":
+            finder.increase(4, 4)
+        if discr is None:
+            self.discriminator.serialized_size(finder, union.__idl_default_discriminator__)
+            self.default.serialized_size(finder, value)
+        else:
+            self.discriminator.serialized_size(finder, discr)
+            self.labels_submachines[discr].serialized_size(finder, value)
+
+    def max_size(self, finder):
+        if finder.version == 2 and self.extensibility != "final":
+            finder.increase(4, 4)
+        self.discriminator.max_size(finder)
+        cases = list(self.labels_submachines.values())
+        if self.default is not None:
+            cases.append(self.default)
+
+        size = finder.size
+        for machine in cases:
+            subfinder = finder.sub(finder.size)
+            machine.max_size(subfinder)
+            finder.bounded = finder.bounded and subfinder.bounded
+            size = max(size, subfinder.size)
+        finder.size = size
+
+    def cdr_key_machine_op(self, skip, version=1):  # TODO: check again
         headers = []
         opsets = []
         union_type = {
@@ -338,12 +734,14 @@ class UnionMachine(Machine):
             buffer.seek(0)
             value = buffer.read({1: 'B', 2: 'H', 4: 'I', 8: 'Q'}[self.discriminator.alignment], self.discriminator.alignment)
             headers.append(CdrKeyVmOp(union_type, skip, value=value))
-            opsets.append(submachine.cdr_key_machine_op(value_skip))
+            opsets.append(submachine.cdr_key_machine_op(value_skip, version))
 
         lens = [len(o) + 2 for o in opsets]
 
         if self.default is not None:
-            opsets.append(self.discriminator.cdr_key_machine_op(skip) + self.default.cdr_key_machine_op(value_skip))
+            opsets.append(
+                self.discriminator.cdr_key_machine_op(skip, version) + self.default.cdr_key_machine_op(value_skip, version)
+            )
             lens.append(len(opsets[-1]))
         else:
             lens[-1] -= 1
@@ -356,8 +754,30 @@ class UnionMachine(Machine):
             headers[i].size = lens[i]
             opsets[i] = [headers[i]] + opsets[i]
 
+        if version == 2 and self.extensibility != "final":
+            # Jumps are relative, wrapping does not move their targets
+            return [CdrKeyVmOp(CdrKeyVMOpType.DHeaderStart, skip)] + sum(opsets, []) + \
+                [CdrKeyVmOp(CdrKeyVMOpType.DHeaderEnd, skip)]
         return sum(opsets, [])
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        labels = {}
+        cases = []
+        for label, submachine in self.labels_submachines.items():
+            labels[label] = len(labels)
+            cases += submachine.cdr_codec_machine_op(stack, version)
+        if self.default is not None:
+            cases += self.default.cdr_codec_machine_op(stack, version)
+
+        dheader = [CdrCodecOp(CdrCodecOpType.DHeader)] if version == 2 and self.extensibility != "final" else []
+        return dheader + [CdrCodecOp(
+            CdrCodecOpType.Union,
+            size=int(self.default is not None),
+            value=len(labels),
+            ref=self.type,
+            names=labels
+        )] + self.discriminator.cdr_codec_machine_op(stack, version) + cases
+
 
 class MappingMachine(Machine):
     def __init__(self, key_machine, value_machine):
@@ -385,6 +805,9 @@ class MappingMachine(Machine):
 
         return ret
 
+    def default_value(self):
+        return {}
+
     def max_key_size(self, finder: MaxSizeFinder):
         finder.increase(2, 2)
 
@@ -395,21 +818,49 @@ class MappingMachine(Machine):
 
         finder.size = pre_size + (post_size - pre_size) * 65535
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, values):
+        finder.increase(2, 2)
+        for key, value in values.items():
+            self.key_machine.serialized_size(finder, key)
+            self.value_machine.serialized_size(finder, value)
+
+    def max_size(self, finder):
+        finder.bounded = False
+
+    def cdr_key_machine_op(self, skip, version=1):
         raise NotImplementedError()
 
 
 class StructMachine(Machine):
-    def __init__(self, object, members_machines, keylist):
+    def __init__(self, object, members_machines, keylist, extensibility="final", member_ids=None, must_understand=()):
         self.type = object
         self.members_machines = members_machines
         self.keylist = keylist
+        self.extensibility = extensibility
+        if member_ids is None:
+            member_ids = {member: i for i, member in enumerate(members_machines)}
+        self.member_ids = member_ids
+        self.members_by_id = {i: member for member, i in member_ids.items()}
+        self.fields = {f.name: f for f in dataclasses.fields(object)} if dataclasses.is_dataclass(object) else {}
+
+        # EMHEADER of every member of a mutable struct and whether a NEXTINT with its size follows
+        self.emheaders = {}
+        for member, machine in members_machines.items():
+            flag = 0x80000000 if member in must_understand or (keylist and member in keylist) else 0
+            code = _length_code(machine.submachine if isinstance(machine, OptionalMachine) else machine)
+            self.emheaders[member] = (flag | (4 if code is None else code) << 28 | member_ids[member], code is None)
 
     def serialize(self, buffer, value, for_key=False):
         #  We use the fact here that dicts retain their insertion order
         #  This is guaranteed from python 3.7 but no existing python 3.6 implementation
         #  breaks this guarantee.
 
+        if buffer.version == 2 and self.extensibility == "mutable":
+            self._serialize_mutable(buffer, value)
+            return
+
+        dheader = buffer.write_dheader() if buffer.version == 2 and self.extensibility == "appendable" else None
+
         for member, machine in self.members_machines.items():
             if for_key and self.keylist and member not in self.keylist:
                 continue
@@ -419,26 +870,211 @@ class StructMachine(Machine):
             except Exception as e:
                 raise Exception(f"Failed to encode member {member}, value is {getattr(value, member)}") from e
 
+        if dheader is not None:
+            buffer.finish_dheader(dheader)
+
+    def _present_members(self, value):
+        # Members of a mutable struct, absent optionals are left out and present ones have no flag
+        for member, machine in self.members_machines.items():
+            v = getattr(value, member)
+            if isinstance(machine, OptionalMachine):
+                if v is None:
+                    continue
+                machine = machine.submachine
+            yield member, machine, v
+
+    def _serialize_mutable(self, buffer, value):
+        dheader = buffer.write_dheader()
+        for member, machine, v in self._present_members(value):
+            emheader, nextint = self.emheaders[member]
+            try:
+                buffer.align(4)
+                buffer.write('I', 4, emheader)
+                if nextint:
+                    size = buffer.write_dheader()
+                    machine.serialize(buffer, v)
+                    buffer.finish_dheader(size)
+                else:
+                    machine.serialize(buffer, v)
+            except Exception as e:
+                raise Exception(f"Failed to encode member {member}, value is {v}") from e
+        buffer.finish_dheader(dheader)
+
+    def _missing(self, member, machine):
+        # Members appended after the type that wrote the data take the default of their field,
+        # or else the zero value of their type, absent optionals are None
+        if isinstance(machine, OptionalMachine):
+            return None
+        field = self.fields.get(member)
+        if field is not None and field.default is not dataclasses.MISSING:
+            return field.default
+        if field is not None and field.default_factory is not dataclasses.MISSING:
+            return field.default_factory()
+        return machine.default_value()
+
     def deserialize(self, buffer):
+        if buffer.version == 2 and self.extensibility == "mutable":
+            return self._deserialize_mutable(buffer)
+
+        if buffer.version == 2 and self.extensibility == "appendable":
+            end = buffer.read_dheader()
+            valuedict = {}
+            for member, machine in self.members_machines.items():
+                if buffer.tell() < end:
+                    valuedict[member] = machine.deserialize(buffer)
+                else:
+                    # Written by an older version of the type, before this member was appended
+                    valuedict[member] = self._missing(member, machine)
+            # Members appended by a newer version of the type are skipped in one go
+            buffer.seek(end)
+            return self.type(**valuedict)
+
         valuedict = {}
         for member, machine in self.members_machines.items():
             valuedict[member] = machine.deserialize(buffer)
         return self.type(**valuedict)
 
+    def default_value(self):
+        valuedict = {member: self._missing(member, machine) for member, machine in self.members_machines.items()}
+        return self.type(**valuedict)
+
+    def deserialize_key(self, buffer):
+        # Keys are XCDR1, members that are not part of the key are left None
+        valuedict = {}
+        for member, machine in self.members_machines.items():
+            if self.keylist and member not in self.keylist:
+                valuedict[member] = None
+            else:
+                valuedict[member] = machine.deserialize_key(buffer)
+        return self.type(**valuedict)
+
+    def skip(self, buffer):
+        if buffer.version == 2 and self.extensibility != "final":
+            buffer.seek(buffer.read_dheader())
+            return
+        for machine in self.members_machines.values():
+            machine.skip(buffer)
+
+    def _deserialize_mutable(self, buffer):
+        end = buffer.read_dheader()
+        valuedict = {}
+        for member, start, size in self.scan_mutable(buffer, end):
+            buffer.seek(start)
+            machine = self.members_machines[member]
+            if isinstance(machine, OptionalMachine):
+                machine = machine.submachine
+            valuedict[member] = machine.deserialize(buffer)
+
+        buffer.seek(end)
+        for member, machine in self.members_machines.items():
+            if member not in valuedict:
+                valuedict[member] = self._missing(member, machine)
+        return self.type(**valuedict)
+
+    def scan_mutable(self, buffer, end):
+        """Walk the EMHEADERs of a mutable struct up to 'end', yields the member, the position of its
+        data and its size for every known member. Unknown members are skipped unless they must be understood."""
+        while buffer.tell() < end:
+            buffer.align(4)
+            emheader = buffer.read('I', 4)
+            start = buffer.tell()
+            code = (emheader >> 28) & 7
+            if code < 4:
+                size = 1 << code
+            else:
+                nextint = buffer.read('I', 4)
+                if code == 4:
+                    start, size = start + 4, nextint
+                else:
+                    # The NEXTINT doubles as the length of the member itself
+                    buffer.seek(start)
+                    size = 4 + nextint * (1, 4, 8)[code - 5]
+
+            member = self.members_by_id.get(emheader & 0x0FFFFFFF)
+            if member is not None:
+                yield member, start, size
+            elif emheader & 0x80000000:
+                raise Exception(f"Unknown member {emheader & 0x0FFFFFFF} of {self.type.__name__} must be understood.")
+            # Unknown members are skipped in one go
+            buffer.seek(start + size)
+
     def max_key_size(self, finder):
         for member, machine in self.members_machines.items():
             if self.keylist and member not in self.keylist:
                 continue
             machine.max_key_size(finder)
 
-    def cdr_key_machine_op(self, skip):
-        return sum(
+    def serialized_size(self, finder, value):
+        if finder.version == 2 and self.extensibility == "mutable":
+            finder.increase(4, 4)
+            for member, machine, v in self._present_members(value):
+                finder.increase(8 if self.emheaders[member][1] else 4, 4)
+                machine.serialized_size(finder, v)
+            return
+
+        if finder.version == 2 and self.extensibility == "appendable":
+            finder.increase(4, 4)
+        for member, machine in self.members_machines.items():
+            machine.serialized_size(finder, getattr(value, member))
+
+    def max_size(self, finder):
+        if finder.version == 2 and self.extensibility == "mutable":
+            finder.increase(4, 4)
+            for member, machine in self.members_machines.items():
+                finder.increase(8 if self.emheaders[member][1] else 4, 4)
+                (machine.submachine if isinstance(machine, OptionalMachine) else machine).max_size(finder)
+            return
+
+        if finder.version == 2 and self.extensibility == "appendable":
+            finder.increase(4, 4)
+        for machine in self.members_machines.values():
+            machine.max_size(finder)
+
+    def cdr_key_machine_op(self, skip, version=1):
+        if version == 2 and self.extensibility != "final":
+            start = [CdrKeyVmOp(CdrKeyVMOpType.DHeaderStart, skip)]
+            end = [CdrKeyVmOp(CdrKeyVMOpType.DHeaderEnd, skip)]
+            if skip:
+                # The end of the delimited data is known, no need to walk the members
+                return start + end
+            if self.extensibility == "mutable":
+                # Key members are found by id, whatever order they were written in
+                ops = []
+                for name, m in self.members_machines.items():
+                    if self.keylist and name not in self.keylist:
+                        continue
+                    if isinstance(m, OptionalMachine):
+                        m = m.submachine
+                    ops += [CdrKeyVmOp(CdrKeyVMOpType.MemberSeek, skip, value=self.member_ids[name])]
+                    ops += m.cdr_key_machine_op(skip, version)
+                return start + ops + end
+        else:
+            start = end = []
+
+        return start + sum(
             (
-                m.cdr_key_machine_op(skip or (self.keylist and name not in self.keylist))
+                m.cdr_key_machine_op(skip or (self.keylist and name not in self.keylist), version)
                 for name, m in self.members_machines.items()
             ),
             []
-        )
+        ) + end
+
+    def cdr_codec_machine_op(self, stack, version=1):
+        if version == 2 and self.extensibility == "mutable":
+            # Member headers are left to this machine
+            return [CdrCodecOp(CdrCodecOpType.Delegate, ref=self)]
+
+        ops = [CdrCodecOp(
+            CdrCodecOpType.Struct,
+            value=len(self.members_machines),
+            ref=self.type,
+            names=tuple(self.members_machines.keys())
+        )]
+        for machine in self.members_machines.values():
+            ops += machine.cdr_codec_machine_op(stack, version)
+        if version == 2 and self.extensibility == "appendable":
+            ops = [CdrCodecOp(CdrCodecOpType.DHeader)] + ops
+        return ops
 
 
 class InstanceMachine(Machine):
@@ -456,39 +1092,99 @@ class InstanceMachine(Machine):
             self.type.__idl__.populate()
         return self.type.__idl__.machine.deserialize(buffer)
 
+    def default_value(self):
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        return self.type.__idl__.machine.default_value()
+
+    def deserialize_key(self, buffer):
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        return self.type.__idl__.machine.deserialize_key(buffer)
+
+    def skip(self, buffer):
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        self.type.__idl__.machine.skip(buffer)
+
     def max_key_size(self, finder):
-        if self.type.__idl__.key_max_size is not None:
-            return self.type.__idl__.key_max_size
-        else:
-            # If we get here the object can contain itself
-            # Size can be infinite
-            return 1_000_000_000
+        if self.type in finder.types:
+            # The object can contain itself, size can be infinite
+            finder.size += 1_000_000_000
+            return
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        finder.types.append(self.type)
+        self.type.__idl__.machine.max_key_size(finder)
+        finder.types.pop()
+
+    def serialized_size(self, finder, value):
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        self.type.__idl__.machine.serialized_size(finder, value)
+
+    def max_size(self, finder):
+        if self.type in finder.types:
+            finder.bounded = False
+            return
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        finder.types.append(self.type)
+        self.type.__idl__.machine.max_size(finder)
+        finder.types.pop()
 
-    def cdr_key_machine_op(self, skip):
+    def cdr_key_machine_op(self, skip, version=1):
         if self.type.__idl__.machine == None:
             self.type.__idl__.populate()
-        return self.type.__idl__.machine.cdr_key_machine_op(skip)
+        return self.type.__idl__.machine.cdr_key_machine_op(skip, version)
+
+    def cdr_codec_machine_op(self, stack, version=1):
+        if self.type in stack:
+            # Recursive types stay with the python machines
+            return [CdrCodecOp(CdrCodecOpType.Delegate, ref=self)]
+        if self.type.__idl__.machine == None:
+            self.type.__idl__.populate()
+        return self.type.__idl__.machine.cdr_codec_machine_op(stack + [self.type], version)
 
 
 class EnumMachine(Machine):
     def __init__(self, enum):
         self.enum = enum
+        self.alignment = 4
 
     def serialize(self, buffer, value, for_key=False):
+        buffer.align(4)
         buffer.write("I", 4, value.value)
 
     def deserialize(self, buffer):
+        buffer.align(4)
         return self.enum(buffer.read("I", 4))
 
+    def default_value(self):
+        return next(iter(self.enum))
+
+    def skip(self, buffer):
+        buffer.align(4)
+        buffer.seek(buffer.tell() + 4)
+
     def max_key_size(self, finder: MaxSizeFinder):
         finder.increase(4, 4)
 
-    def cdr_key_machine_op(self, skip):
+    def serialized_size(self, finder, value):
+        finder.increase(4, 4)
+
+    def max_size(self, finder):
+        finder.increase(4, 4)
+
+    def cdr_key_machine_op(self, skip, version=1):
         stream = [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, 4, align=4)]
         if not skip:
             stream += [CdrKeyVmOp(CdrKeyVMOpType.ByteSwap, skip, align=4)]
         return stream
 
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Enum, ref=self.enum)]
+
 
 class OptionalMachine(Machine):
     def __init__(self, submachine):
@@ -506,10 +1202,32 @@ class OptionalMachine(Machine):
             return self.submachine.deserialize(buffer)
         return None
 
+    def deserialize_key(self, buffer):
+        if buffer.read('?', 1):
+            return self.submachine.deserialize_key(buffer)
+        return None
+
+    def skip(self, buffer):
+        if buffer.read('?', 1):
+            self.submachine.skip(buffer)
+
     def max_key_size(self, finder: MaxSizeFinder):
         finder.increase(1, 1)
 
-    def cdr_key_machine_op(self, skip):
-        stream = [CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, 1, align=1)]
-        stream += self.submachine.cdr_key_machine_op(skip)
-        return stream
+    def serialized_size(self, finder, value):
+        finder.size += 1
+        if value is not None:
+            self.submachine.serialized_size(finder, value)
+
+    def max_size(self, finder):
+        finder.size += 1
+        self.submachine.max_size(finder)
+
+    def cdr_key_machine_op(self, skip, version=1):
+        # The present flag is streamed as is, the value only follows when it is set
+        subops = self.submachine.cdr_key_machine_op(skip, version)
+        return [CdrKeyVmOp(CdrKeyVMOpType.Union1Byte, skip, len(subops) + 2, value=1)] + subops + \
+            [CdrKeyVmOp(CdrKeyVMOpType.Jump, skip, 2), CdrKeyVmOp(CdrKeyVMOpType.StreamStatic, skip, 1, align=1)]
+
+    def cdr_codec_machine_op(self, stack, version=1):
+        return [CdrCodecOp(CdrCodecOpType.Optional)] + self.submachine.cdr_codec_machine_op(stack, version)
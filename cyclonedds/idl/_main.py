@@ -10,17 +10,31 @@
  * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
 """
 
+import struct
+
+from array import array
+from contextlib import contextmanager
 from typing import Optional, cast, Any, Type, Union, ClassVar, Mapping, Dict, TypeVar, Tuple
 from collections import defaultdict
 from dataclasses import dataclass
 from hashlib import md5
+from functools import partial
+from weakref import ref
 from enum import Enum
 
-from ._support import Buffer, Endianness
+from ._support import Buffer, BufferPool, FixedBuffer, MaxSizeFinder, Endianness, _import_numpy
+from ._view import SampleView, Projection, RawView, encapsulation, open_sample, raw_view_class
+from ._columns import ColumnDecoder
+from ._filter import ContentFilter
 from ._type_helper import get_origin, get_args, get_type_hints, Annotated
 from . import types
 
 
+# Raised by the native and compiled codecs for values or data they do not handle, the machines then redo
+# the work and either handle it or raise a descriptive error. Anything else is a real failure and propagates.
+_codec_errors = (ValueError, TypeError, OverflowError, KeyError, IndexError, AttributeError, struct.error)
+
+
 @dataclass
 class IdlField:
     name: dict
@@ -51,60 +65,380 @@ class IdlClassNamespace(dict):
 
 
 class IDL:
+    # Compile the machine tree of every type into straight-line python code,
+    # set to False to always interpret the machines.
+    compile_codecs: ClassVar[bool] = True
+    # Run full samples through the op program interpreter of the C layer when
+    # it is available, set to False to keep (de)serialization in python.
+    native_codecs: ClassVar[bool] = True
+    # Serialization buffers, shared by all types but never between threads.
+    # Lower buffer_pool.max_retained to bound the memory kept by every thread.
+    buffer_pool: ClassVar[BufferPool] = BufferPool()
+    # Remember the keyhash of samples of frozen dataclasses with only scalars and strings as key
+    # members, which cannot change their key, set to False to always recompute it.
+    memoize_keyhash: ClassVar[bool] = True
+
+    # Second byte of the XCDR2 encapsulation identifier per extensibility of the top-level type,
+    # the lowest bit is set for little endian data.
+    xcdr2_encapsulation: ClassVar[Dict[str, int]] = {"final": 0x06, "appendable": 0x08, "mutable": 0x0a}
+
     def __init__(self, datatype):
-        self.buffer = Buffer()
         self.datatype = datatype
         self.machine = None
+        self.codecs = None
+        self.codecs_v2 = None
+        # XCDR2 is used by default when the type tree has appendable or mutable types,
+        # mutable types cannot be represented in XCDR1 at all.
+        self.version_2 = False
+        self.requires_version_2 = False
+        self.encapsulation_v2 = self.xcdr2_encapsulation["final"]
+        self.key_codec = None
+        # Key machine of the C layer for keys of serialized samples, shared with the sertypes of all topics
+        # of the type, False if there is none
+        self.key_vm = None
+        # Keyhashes of live samples by id, None if samples of the type can change their key
+        self.keyhash_memo = None
+        self.native_serialize = None
+        self.native_serialize_into = None
+        self.native_serialize_many = None
+        self.native_deserialize = None
+        self.native_deserialize_many = None
         self.keyless = None
         self.key_max_size = None
+        # Size of keys that do not depend on the value, see Builder.fixed_key_size
+        self.key_fixed_size = None
+        self.max_size = None
+        self.max_sizes = {1: None, 2: None}
+        # Shared by the lazy views of samples of this type, per XCDR version
+        self.view_layouts = {}
+        # Offset tables per XCDR version of types with a fixed layout, see Builder.fixed_layout
+        self.fixed_layouts = {1: None, 2: None}
+        self.raw_view_classes = {}
+        # Projections and column decoders by their fields
+        self.projections = {}
+        self.column_decoders = {}
         self.idl_transformed_typename = self.datatype.__idl_typename__.replace(".", "::")
 
     def populate(self):
         if self.machine is None:
             from ._builder import Builder
-            self.machine, self.keyless, self.key_max_size = Builder.build_machines(self.datatype)
+            self.machine, self.keyless = Builder.build_machines(self.datatype)
+            self.key_max_size = 0 if self.keyless else Builder.key_max_size(self.machine)
+            self.key_fixed_size = None if self.keyless else Builder.fixed_key_size(self.machine)
+            extensibilities = Builder.extensibilities(self.machine, {self.datatype})
+            self.version_2 = extensibilities != {"final"}
+            self.requires_version_2 = "mutable" in extensibilities
+            self.encapsulation_v2 = self.xcdr2_encapsulation[self.machine.extensibility]
+            for version in (1, 2):
+                finder = MaxSizeFinder(version=version)
+                self.machine.max_size(finder)
+                # Header included, None if the type has unbounded members
+                self.max_sizes[version] = finder.size + 4 if finder.bounded else None
+            self.max_size = self.max_sizes[2 if self.version_2 else 1]
+            self.fixed_layouts = {version: Builder.fixed_layout(self.machine, version) for version in (1, 2)}
+            if self.compile_codecs:
+                try:
+                    self.codecs = Builder.build_codecs(self.machine)
+                    # Only types that default to XCDR2 get it compiled, others read it with the machines
+                    self.codecs_v2 = Builder.build_codecs(self.machine, version=2) if self.version_2 else None
+                    self.key_codec = None if self.keyless else Builder.build_key_codec(self.machine)
+                except Exception:
+                    # Anything we fail to compile is still handled by the machines
+                    self.codecs = self.codecs_v2 = self.key_codec = None
+            params = getattr(self.datatype, "__dataclass_params__", None)
+            if self.memoize_keyhash and params is not None and params.frozen and not self.keyless \
+                    and Builder.immutable_key(self.machine):
+                self.keyhash_memo = {}
+            if self.native_codecs:
+                try:
+                    from cyclonedds._clayer import ddspy_codec_create, ddspy_codec_serialize, ddspy_codec_serialize_into, \
+                        ddspy_codec_serialize_many, ddspy_codec_deserialize, ddspy_codec_deserialize_many
+                    program_v2 = None
+                    if self.version_2 and self.machine.extensibility != "mutable":
+                        program_v2 = self.cdr_codec_machine(version=2)
+                    codec = ddspy_codec_create(self.cdr_codec_machine(), program_v2, self.encapsulation_v2)
+                    self.native_serialize = partial(ddspy_codec_serialize, codec)
+                    self.native_serialize_into = partial(ddspy_codec_serialize_into, codec)
+                    self.native_serialize_many = partial(ddspy_codec_serialize_many, codec)
+                    self.native_deserialize = partial(ddspy_codec_deserialize, codec)
+                    self.native_deserialize_many = partial(ddspy_codec_deserialize_many, codec)
+                except (ImportError,) + _codec_errors:
+                    # No C layer available (idl used standalone) or unsupported program
+                    self.native_serialize = self.native_serialize_into = self.native_serialize_many = None
+                    self.native_deserialize = self.native_deserialize_many = None
+
+    def _use_version_2(self, use_version_2):
+        if use_version_2 is None:
+            return self.version_2
+        if not use_version_2 and self.requires_version_2:
+            raise Exception(f"{self.datatype.__name__} contains mutable types, it can only be serialized with XCDR2.")
+        return bool(use_version_2)
+
+    def serialize(self, object, buffer=None, endianness=None, use_version_2=None) -> bytes:
+        """Serialize 'object' in XCDR2 if 'use_version_2' or XCDR1 otherwise, by default XCDR2
+        is used if the type tree contains appendable or mutable types."""
+        if self.machine is None:
+            self.populate()
 
-    def serialize(self, object, buffer=None, endianness=None) -> bytes:
+        version_2 = self._use_version_2(use_version_2)
+
+        if self.native_serialize is not None and buffer is None:
+            try:
+                return self.native_serialize(object, (endianness or Endianness.native()) == Endianness.Little, version_2)
+            except _codec_errors:
+                # Rerun in python, which produces descriptive errors
+                pass
+
+        if buffer is not None:
+            self._serialize(buffer, object, endianness, version_2=version_2)
+            return buffer.asbytes()
+
+        # A buffer is only returned to the pool on success, when it is known how much of it was used
+        ibuffer = self.buffer_pool.acquire()
+        self._serialize(ibuffer, object, endianness, version_2=version_2)
+        data = ibuffer.asbytes()
+        self.buffer_pool.release(ibuffer)
+        return data
+
+    @contextmanager
+    def serialized(self, object, endianness=None, use_version_2=None):
+        """Serialize 'object' for use inside a with block, as bytes or as a memoryview of a pooled
+        buffer that is only valid in the block. Saves the copy into bytes of serialize()."""
+        if self.machine is None:
+            self.populate()
+
+        version_2 = self._use_version_2(use_version_2)
+
+        if self.native_serialize is not None:
+            try:
+                data = self.native_serialize(object, (endianness or Endianness.native()) == Endianness.Little, version_2)
+            except _codec_errors:
+                pass
+            else:
+                yield data
+                return
+
+        ibuffer = self.buffer_pool.acquire()
+        self._serialize(ibuffer, object, endianness, version_2=version_2)
+        try:
+            with memoryview(ibuffer._bytes)[:ibuffer.tell()].toreadonly() as data:
+                yield data
+        finally:
+            self.buffer_pool.release(ibuffer)
+
+    def serialize_into(self, object, buffer, offset=0, endianness=None, use_version_2=None) -> int:
+        """Serialize into the writable 'buffer' (bytearray, mmap, ...) at 'offset' and return the
+        number of bytes written."""
         if self.machine is None:
             self.populate()
 
-        ibuffer = buffer or self.buffer
-        ibuffer.seek(0)
-        ibuffer.set_align_offset(0)
+        version_2 = self._use_version_2(use_version_2)
+
+        if self.native_serialize_into is not None:
+            try:
+                return self.native_serialize_into(
+                    object, buffer, offset, (endianness or Endianness.native()) == Endianness.Little, version_2
+                )
+            except _codec_errors:
+                pass
+
+        target = FixedBuffer(buffer, offset)
+        self._serialize(target, object, endianness, version_2=version_2)
+        return target.tell()
+
+    def serialize_many(self, objects, endianness=None, use_version_2=None) -> Tuple[bytes, array]:
+        """Serialize all 'objects' back to back, returns the data and an array of the offsets of
+        every sample and of the end of the data: sample i is data[offsets[i]:offsets[i + 1]]."""
+        if self.machine is None:
+            self.populate()
+
+        version_2 = self._use_version_2(use_version_2)
+
+        if self.native_serialize_many is not None:
+            try:
+                data, raw_offsets = self.native_serialize_many(
+                    objects, (endianness or Endianness.native()) == Endianness.Little, version_2
+                )
+                offsets = array('Q')
+                offsets.frombytes(raw_offsets)
+                return data, offsets
+            except _codec_errors:
+                pass
+
+        buffer = Buffer()
+        offsets = array('Q')
+        for object in objects:
+            offsets.append(buffer.tell())
+            self._serialize(buffer, object, endianness, buffer.tell(), version_2)
+        offsets.append(buffer.tell())
+        return buffer.asbytes(), offsets
+
+    def deserialize_many(self, data, offsets) -> list:
+        """Reverse of serialize_many, 'offsets' is any sequence of the sample boundaries."""
+        if self.machine is None:
+            self.populate()
+
+        if not isinstance(offsets, array) or offsets.typecode != 'Q':
+            offsets = array('Q', offsets)
+
+        if self.native_deserialize_many is not None:
+            try:
+                return self.native_deserialize_many(data, offsets)
+            except _codec_errors:
+                pass
+
+        # One buffer over all of the data, every sample is read in place
+        buffer = Buffer(data, readonly=True)
+        samples = []
+        for i in range(len(offsets) - 1):
+            start = offsets[i]
+            if start > offsets[i + 1] or offsets[i + 1] > buffer._size:
+                raise Exception("Sample offsets outside of the serialized data.")
+            buffer.seek(start)
+            buffer.set_align_offset(start + 4)
+            samples.append(self._deserialize(buffer))
+        return samples
+
+    def serialized_size(self, object, use_version_2=None) -> int:
+        """Exact number of bytes serialize() produces for 'object', header included."""
+        if self.machine is None:
+            self.populate()
+
+        finder = MaxSizeFinder(version=2 if self._use_version_2(use_version_2) else 1)
+        self.machine.serialized_size(finder, object)
+        return finder.size + 4
+
+    def max_serialized_size(self) -> Optional[int]:
+        """Upper bound on the serialized size of any sample in the default encoding, None if the
+        type is unbounded."""
+        if self.machine is None:
+            self.populate()
+        return self.max_size
+
+    def fits_serialized_size(self, size, version) -> bool:
+        """Cheap check of the size of a serialized sample in XCDR 'version', header included: at most the
+        maximum size of a bounded type (plus padding to 4 bytes) and at least the size of a fixed layout.
+        Extensible types can get members in later versions of the type, their samples pass."""
+        if self.machine is None:
+            self.populate()
+
+        max_size = self.max_sizes[version]
+        if max_size is None or self.version_2:
+            return True
+        if size > (max_size + 3) & ~3:
+            return False
+        return self.fixed_layouts[version] is None or size >= max_size
+
+    def _serialize(self, ibuffer, object, endianness, start=0, version_2=False):
+        ibuffer.seek(start)
+        ibuffer.set_align_offset(start)
         ibuffer.set_endianness(endianness or Endianness.native())
+        ibuffer.set_version(2 if version_2 else 1)
 
-        if ibuffer.endianness == Endianness.Big:
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0)
-        else:
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 1)
-            ibuffer.write('b', 1, 0)
-            ibuffer.write('b', 1, 0)
+        encapsulation = self.encapsulation_v2 if version_2 else 0
+        if ibuffer.endianness == Endianness.Little:
+            encapsulation |= 1
+        ibuffer.write_bytes(bytes((0, encapsulation, 0, 0)))
 
-        ibuffer.set_align_offset(4)
+        ibuffer.set_align_offset(start + 4)
+
+        codecs = self.codecs_v2 if version_2 else self.codecs
+        if codecs is not None:
+            try:
+                codecs[ibuffer.endianness].serialize(ibuffer, object)
+                return
+            except _codec_errors:
+                # Rerun on the machines, which produce descriptive errors
+                ibuffer.zero_used(start + 4)
+                ibuffer.seek(start + 4)
 
         self.machine.serialize(ibuffer, object)
-        a = ibuffer.asbytes() #.ljust((self.buffer._pos - 1) // 8 * 8 + 8, b'\0')
-        return a
 
-    def deserialize(self, data) -> object:
+    def deserialize(self, data, lazy=False, fields=None) -> object:
+        """With 'lazy' a struct is returned as a SampleView over 'data' that decodes members on first access,
+        other types are always decoded in full. With 'fields', a sequence of member names or dotted paths
+        into nested structs, only those members of a struct are decoded and returned as a ProjectedSample."""
         if self.machine is None:
             self.populate()
 
-        buffer = Buffer(data, align_offset=4) if not isinstance(data, Buffer) else data
+        if fields is not None:
+            return self.projection(fields).deserialize(data)
 
-        if buffer.tell() == 0:
-            buffer.read('b', 1)
-            v = buffer.read('b', 1)
-            if v == 0:
-                buffer.set_endianness(Endianness.Big)
-            else:
-                buffer.set_endianness(Endianness.Little)
-            buffer.read('b', 1)
-            buffer.read('b', 1)
+        if lazy and hasattr(self.machine, "members_machines") and not isinstance(data, Buffer):
+            return SampleView(self, data)
+
+        if self.native_deserialize is not None and not isinstance(data, Buffer):
+            try:
+                return self.native_deserialize(data)
+            except _codec_errors:
+                pass
+
+        buffer = Buffer(data, align_offset=4, readonly=True) if not isinstance(data, Buffer) else data
+        return self._deserialize(buffer)
+
+    def raw_view(self, data) -> RawView:
+        """View of a serialized sample of a type with a fixed layout that reads and patches members in place,
+        'data' has to be writable for the latter."""
+        if self.machine is None:
+            self.populate()
+
+        endianness, version = encapsulation(data[:4])
+        cls = self.raw_view_classes.get((endianness, version))
+        if cls is None:
+            table = self.fixed_layouts[version]
+            if table is None:
+                raise TypeError(f"{self.datatype.__name__} does not have a fixed layout in XCDR{version}.")
+            cls = raw_view_class(self.machine, table, "<" if endianness == Endianness.Little else ">")
+            self.raw_view_classes[(endianness, version)] = cls
+        return cls(data)
+
+    def projection(self, fields) -> Projection:
+        fields = tuple(fields)
+        projection = self.projections.get(fields)
+        if projection is None:
+            if self.machine is None:
+                self.populate()
+            if not hasattr(self.machine, "members_machines"):
+                raise TypeError(f"Cannot project {self.datatype.__name__}, only structs can be projected.")
+            projection = self.projections[fields] = Projection(self.machine, fields)
+        return projection
+
+    def content_filter(self, expr, params=()) -> ContentFilter:
+        """Compile a filter expression on the members of a struct, see ContentFilter."""
+        if self.machine is None:
+            self.populate()
+        return ContentFilter(self.machine, expr, params)
+
+    def deserialize_columns(self, samples, fields=None, valid=None) -> Dict[str, Any]:
+        """Decode a sequence of serialized samples of a struct into a dict of field to numpy array. Fields are
+        member names or dotted paths into nested structs, by default every member with nested structs expanded.
+        Rows that 'valid' marks False are left zero (None for object columns)."""
+        key = tuple(fields) if fields is not None else None
+        decoder = self.column_decoders.get(key)
+        if decoder is None:
+            if self.machine is None:
+                self.populate()
+            if not hasattr(self.machine, "members_machines"):
+                raise TypeError(f"Cannot decode {self.datatype.__name__} into columns, only structs can be.")
+            decoder = self.column_decoders[key] = ColumnDecoder(self.machine, fields)
+        return decoder.deserialize(samples, valid)
+
+    def _deserialize(self, buffer):
+        if buffer.tell() in (0, buffer._align_offset - 4):
+            header = buffer.read_bytes(4)
+            if header[0] != 0 or 1 < header[1] < 6 or header[1] > 11:
+                raise Exception(f"Unsupported encapsulation {header.hex()}, only XCDR1 and XCDR2 are.")
+            buffer.set_endianness(Endianness.Little if header[1] & 1 else Endianness.Big)
+            buffer.set_version(2 if header[1] >= 6 else 1)
+
+        start = buffer.tell()
+        codecs = self.codecs_v2 if buffer.version == 2 else self.codecs
+        if codecs is not None and (start - buffer._align_offset) % 8 == 0:
+            try:
+                return codecs[buffer.endianness].deserialize(buffer)
+            except _codec_errors:
+                # Data of another version of an extensible type, the machines deal with that
+                buffer.seek(start)
 
         return self.machine.deserialize(buffer)
 
@@ -112,22 +446,71 @@ class IDL:
         if self.machine is None:
             self.populate()
 
-        self.buffer.seek(0)
-        self.buffer.zero_out()
-        self.buffer.set_align_offset(0)
-        self.buffer.set_endianness(Endianness.Big)
-
         if self.keyless:
             return bytes()
 
-        self.machine.serialize(self.buffer, object, for_key=True)
+        # Keys are XCDR1 whatever the encoding of the sample, so the keyhash does not depend on it
+        buffer = self.buffer_pool.acquire()
+        buffer.seek(0)
+        buffer.set_align_offset(0)
+        buffer.set_endianness(Endianness.Big)
+        buffer.set_version(1)
+
+        if self.key_codec is not None:
+            try:
+                self.key_codec.serialize(buffer, object)
+                key = buffer.asbytes()
+                self.buffer_pool.release(buffer)
+                return key
+            except _codec_errors:
+                # Rerun on the machines, which produce descriptive errors
+                buffer.zero_used()
+                buffer.seek(0)
+
+        self.machine.serialize(buffer, object, for_key=True)
+        key = buffer.asbytes()
+        self.buffer_pool.release(buffer)
+        return key
+
+    def deserialize_key(self, data) -> object:
+        """Decode a key-only sample, an XCDR1 encapsulation header followed by the key of a sample as returned
+        by key. Members that are not part of the key are None, of unions keyed on their discriminator only the
+        discriminator is set."""
+        if self.machine is None:
+            self.populate()
 
-        return self.buffer.asbytes()
+        buffer = open_sample(data)
+        if buffer.version != 1:
+            raise Exception("Keys are XCDR1, a key-only sample cannot have an XCDR2 encapsulation.")
+        return self.machine.deserialize_key(buffer)
 
     def keyhash(self, object) -> bytes:
         if self.machine is None:
             self.populate()
 
+        memo = self.keyhash_memo
+        if memo is None:
+            return self._keyhash(object)
+
+        entry = memo.get(id(object))
+        if entry is not None and entry[0]() is object:
+            return entry[1]
+
+        keyhash = self._keyhash(object)
+        try:
+            # The entry goes with the sample, whose id may be reused afterwards
+            memo[id(object)] = (ref(object, partial(self._forget_keyhash, id(object))), keyhash)
+        except TypeError:
+            # Samples of dataclasses with slots cannot be referenced weakly
+            pass
+        return keyhash
+
+    def _forget_keyhash(self, key, reference):
+        entry = self.keyhash_memo.get(key)
+        if entry is not None and entry[0] is reference:
+            del self.keyhash_memo[key]
+
+    def _keyhash(self, object) -> bytes:
         if self.key_max_size <= 16:
             return self.key(object).ljust(16, b'\0')
 
@@ -135,13 +518,94 @@ class IDL:
         m.update(self.key(object))
         return m.digest()
 
-    def cdr_key_machine(self, skip=False):
+    def _native_key_vm(self):
+        if self.key_vm is None:
+            try:
+                from cyclonedds._clayer import ddspy_key_vm_create
+            except ImportError:
+                # No C layer available, idl used standalone
+                self.key_vm = False
+                return self.key_vm
+            # Failures are errors of the type, for the sertype and keyhash_many callers to report
+            self.key_vm = ddspy_key_vm_create(self, self.key_max_size > 16)
+        return self.key_vm
+
+    def _samples(self, samples, offsets):
+        # Python path of key_many and keyhash_many, which fails on bad samples as the key vm does
+        if offsets is not None:
+            data = memoryview(samples).cast('B')
+            if not offsets:
+                raise ValueError("Offsets must be a non-empty array of uint64.")
+            if any(offsets[i] > offsets[i + 1] for i in range(len(offsets) - 1)) or offsets[-1] > len(data):
+                raise ValueError("Sample offsets outside of the serialized data.")
+            samples = (data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+
+        for i, sample in enumerate(samples):
+            try:
+                yield self.deserialize(sample)
+            except Exception as e:
+                raise ValueError(f"Serialized sample {i} is truncated or not of this type.") from e
+
+    def key_many(self, samples, offsets=None) -> Tuple[bytes, array]:
+        """Keys of serialized samples, 'samples' is a sequence of serialized samples or, with 'offsets', all of them
+        back to back as returned by serialize_many. Returns the keys back to back and an array of their offsets:
+        key i is data[offsets[i]:offsets[i + 1]]. The samples are not deserialized if the C layer is available."""
+        if self.machine is None:
+            self.populate()
+
+        if offsets is not None and (not isinstance(offsets, array) or offsets.typecode != 'Q'):
+            offsets = array('Q', offsets)
+
+        key_vm = self._native_key_vm()
+        if key_vm:
+            from cyclonedds._clayer import ddspy_key_vm_calc_many
+            data, raw_offsets = ddspy_key_vm_calc_many(key_vm, samples, offsets, False)
+            key_offsets = array('Q')
+            key_offsets.frombytes(raw_offsets)
+            return data, key_offsets
+
+        keys = [self.key(object) for object in self._samples(samples, offsets)]
+        key_offsets = array('Q', [0])
+        for key in keys:
+            key_offsets.append(key_offsets[-1] + len(key))
+        return b"".join(keys), key_offsets
+
+    def keyhash_many(self, samples, offsets=None, as_numpy=False) -> Any:
+        """Keyhashes of serialized samples, which are passed as to key_many. Returns the 16 byte keyhashes back to back,
+        or a numpy array of shape (n, 16) of uint8 if 'as_numpy'."""
+        if self.machine is None:
+            self.populate()
+
+        if offsets is not None and (not isinstance(offsets, array) or offsets.typecode != 'Q'):
+            offsets = array('Q', offsets)
+
+        key_vm = self._native_key_vm()
+        if key_vm:
+            from cyclonedds._clayer import ddspy_key_vm_calc_many
+            keyhashes = ddspy_key_vm_calc_many(key_vm, samples, offsets, True)
+        else:
+            keyhashes = b"".join(self._keyhash(object) for object in self._samples(samples, offsets))
+
+        if as_numpy:
+            numpy = _import_numpy()
+            if not numpy:
+                raise ImportError("Keyhashes as a numpy array require numpy, install cyclonedds[numpy].")
+            return numpy.frombuffer(keyhashes, dtype=numpy.uint8).reshape(-1, 16)
+        return keyhashes
+
+    def cdr_key_machine(self, skip=False, version=1):
         if self.machine is None:
             self.populate()
         if self.keyless:
             return []
 
-        return self.machine.cdr_key_machine_op(skip)
+        return self.machine.cdr_key_machine_op(skip, version)
+
+    def cdr_codec_machine(self, version=1):
+        if self.machine is None:
+            self.populate()
+
+        return self.machine.cdr_codec_machine_op([self.datatype], version)
 
 
 class IdlMeta(type):
@@ -297,12 +761,40 @@ class IdlUnionMeta(IdlMeta):
 
 
 class IdlStruct(metaclass=IdlMeta):
-    def serialize(self, buffer=None, endianness=None):
-        return self.__idl__.serialize(self, buffer=buffer, endianness=endianness)
+    def serialize(self, buffer=None, endianness=None, use_version_2=None):
+        return self.__idl__.serialize(self, buffer=buffer, endianness=endianness, use_version_2=use_version_2)
 
     @classmethod
-    def deserialize(cls, data):
-        return cls.__idl__.deserialize(data)
+    def deserialize(cls, data, lazy=False, fields=None):
+        return cls.__idl__.deserialize(data, lazy=lazy, fields=fields)
+
+    def serialize_into(self, buffer, offset=0, endianness=None, use_version_2=None):
+        return self.__idl__.serialize_into(
+            self, buffer, offset=offset, endianness=endianness, use_version_2=use_version_2
+        )
+
+    def serialized_size(self, use_version_2=None):
+        return self.__idl__.serialized_size(self, use_version_2=use_version_2)
+
+    @classmethod
+    def max_serialized_size(cls):
+        return cls.__idl__.max_serialized_size()
+
+    @classmethod
+    def serialize_many(cls, samples, endianness=None, use_version_2=None):
+        return cls.__idl__.serialize_many(samples, endianness=endianness, use_version_2=use_version_2)
+
+    @classmethod
+    def deserialize_many(cls, data, offsets):
+        return cls.__idl__.deserialize_many(data, offsets)
+
+    @classmethod
+    def deserialize_columns(cls, samples, fields=None):
+        return cls.__idl__.deserialize_columns(samples, fields=fields)
+
+    @classmethod
+    def raw_view(cls, data):
+        return cls.__idl__.raw_view(data)
 
 
 class IdlUnion(metaclass=IdlUnionMeta):
@@ -388,10 +880,30 @@ class IdlUnion(metaclass=IdlUnionMeta):
     def __eq__(self, other):
         return self.__class__ == other.__class__ and self.get() == other.get()
 
-    def serialize(self, buffer=None, endianness=None):
-        return self.__idl__.serialize(self, buffer=buffer, endianness=endianness)
+    def serialize(self, buffer=None, endianness=None, use_version_2=None):
+        return self.__idl__.serialize(self, buffer=buffer, endianness=endianness, use_version_2=use_version_2)
+
+    @classmethod
+    def deserialize(cls, data, lazy=False, fields=None):
+        return cls.__idl__.deserialize(data, lazy=lazy, fields=fields)
+
+    def serialize_into(self, buffer, offset=0, endianness=None, use_version_2=None):
+        return self.__idl__.serialize_into(
+            self, buffer, offset=offset, endianness=endianness, use_version_2=use_version_2
+        )
+
+    def serialized_size(self, use_version_2=None):
+        return self.__idl__.serialized_size(self, use_version_2=use_version_2)
+
+    @classmethod
+    def max_serialized_size(cls):
+        return cls.__idl__.max_serialized_size()
+
+    @classmethod
+    def serialize_many(cls, samples, endianness=None, use_version_2=None):
+        return cls.__idl__.serialize_many(samples, endianness=endianness, use_version_2=use_version_2)
 
     @classmethod
-    def deserialize(cls, data):
-        return cls.__idl__.deserialize(data)
+    def deserialize_many(cls, data, offsets):
+        return cls.__idl__.deserialize_many(data, offsets)
 
@@ -11,10 +11,13 @@
 """
 
 import sys
+import array
 import struct
+import threading
 
 from inspect import isclass
 from dataclasses import dataclass
+from typing import Any
 from enum import IntEnum, Enum, auto
 
 
@@ -33,6 +36,9 @@ class CdrKeyVMOpType(IntEnum):
     Union4Byte = 11
     Union8Byte = 12
     Jump = 13
+    DHeaderStart = 14
+    DHeaderEnd = 15
+    MemberSeek = 16
 
 
 @dataclass
@@ -44,6 +50,91 @@ class CdrKeyVmOp:
     align: int = 0
 
 
+class CdrCodecOpType(IntEnum):
+    Done = 0
+    Primitive = 1
+    Char = 2
+    String = 3
+    Bytes = 4
+    Enum = 5
+    Struct = 6
+    Array = 7
+    Sequence = 8
+    Optional = 9
+    Union = 10
+    Delegate = 11
+    Nothing = 12
+    DHeader = 13
+
+
+@dataclass
+class CdrCodecOp:
+    """One op of a full-sample codec program, ops of nested types directly follow their parent.
+
+    Struct ops are followed by one program per member, Array, Sequence and Optional ops
+    by the program of their element, DHeader ops (XCDR2 delimiter) by the program of what
+    they delimit and Union ops by the discriminator, the cases and finally the default case.
+    The 'ref' holds the python object the op works on (a struct, union or enum type, the
+    machine to delegate to or the machine decoding a typed array) and 'names' the struct
+    member names or the mapping of union labels to case index.
+    """
+    type: CdrCodecOpType
+    size: int = 0
+    value: int = 0
+    align: int = 0
+    code: str = ''
+    ref: Any = None
+    names: Any = None
+
+
+class CdrFilterOpType(IntEnum):
+    Done = 0
+    Compare = 1
+    And = 2
+    Or = 3
+    Not = 4
+
+
+class CdrFilterCompare(IntEnum):
+    Equal = 0
+    NotEqual = 1
+    Less = 2
+    LessEqual = 3
+    Greater = 4
+    GreaterEqual = 5
+
+
+class CdrFilterKind(IntEnum):
+    Signed = 0
+    Unsigned = 1
+    Float = 2
+    String = 3
+
+
+@dataclass
+class CdrFilterField:
+    """A member a content filter reads, streamed out of the sample by key machine ops (XCDR1 and XCDR2) that
+    skip everything else. The member is then 'size' bytes (0 for a length prefixed string) at 'offset' of the
+    streamed data, preceded by its present flag if it is 'optional'."""
+    key_ops: list
+    key_ops_v2: list
+    kind: CdrFilterKind
+    size: int
+    offset: int = 0
+    optional: bool = False
+
+
+@dataclass
+class CdrFilterOp:
+    """One op of a content filter program in postfix order. Compare pushes whether member 'field' compares
+    to 'value' as 'kind', And, Or and Not combine the results on the stack."""
+    type: CdrFilterOpType
+    field: int = 0
+    compare: CdrFilterCompare = CdrFilterCompare.Equal
+    kind: CdrFilterKind = CdrFilterKind.Signed
+    value: Any = 0
+
+
 class Endianness(Enum):
     Little = auto()
     Big = auto()
@@ -54,12 +145,17 @@ class Endianness(Enum):
 
 
 class Buffer:
-    def __init__(self, bytes=None, align_offset=0):
-        self._bytes = bytearray(bytes) if bytes else bytearray(512)
+    def __init__(self, bytes=None, align_offset=0, readonly=False):
+        if readonly:
+            # Read straight from the caller's memory instead of a private copy
+            self._bytes = memoryview(bytes).cast('B')
+        else:
+            self._bytes = bytearray(bytes) if bytes else bytearray(512)
         self._pos = 0
         self._size = len(self._bytes)
         self._align_offset = align_offset
         self.set_endianness(Endianness.native())
+        self.set_version(1)
 
     def set_endianness(self, endianness):
         self.endianness = endianness
@@ -68,11 +164,21 @@ class Buffer:
         else:
             self._endian = ">"
 
+    def set_version(self, version):
+        # XCDR version 2 aligns 8 byte types to 4 and delimits extensible types
+        self.version = version
+        self._max_align = 4 if version == 2 else 8
+
     def zero_out(self):
         # As per testing (https://stackoverflow.com/questions/19671145)
         # Quickest way to zero is to re-alloc..
         self._bytes = bytearray(self._size)
 
+    def zero_used(self, start=0):
+        # Alignment padding is skipped, not written, so only a zeroed buffer
+        # gives reproducible output. Cheaper than zero_out for small samples.
+        self._bytes[start:self._pos] = bytes(self._pos - start)
+
     def set_align_offset(self, offset):
         self._align_offset = offset
 
@@ -87,11 +193,14 @@ class Buffer:
         if self._pos + size > self._size:
             old_bytes = self._bytes
             old_size = self._size
-            self._size *= 2
+            # A single bulk array write can be more than double the current size
+            self._size = max(self._size * 2, self._pos + size)
             self._bytes = bytearray(self._size)
             self._bytes[0:old_size] = old_bytes
 
     def align(self, alignment):
+        if alignment > self._max_align:
+            alignment = self._max_align
         self._pos = ((self._pos - self._align_offset + alignment - 1) & ~(alignment - 1)) + self._align_offset
         return self
 
@@ -113,20 +222,222 @@ class Buffer:
         self._pos += length
         return b
 
+    def read_view(self, length):
+        v = memoryview(self._bytes)[self._pos:self._pos+length]
+        self._pos += length
+        return v
+
+    def read_str(self, length):
+        s = str(self._bytes[self._pos:self._pos+length], 'utf-8')
+        self._pos += length
+        return s
+
     def read(self, pack, size):
         v = struct.unpack_from(self._endian + pack, buffer=self._bytes, offset=self._pos)
         self._pos += size
         return v[0]
 
+    def write_array(self, pack, size, values):
+        count = len(values)
+        if count:
+            self.align(size)
+            self.ensure_size(size * count)
+            pack_array_into(self._endian, pack, size, self._bytes, self._pos, values)
+            self._pos += size * count
+        return self
+
+    def read_array(self, pack, size, count, typed=False):
+        if count:
+            self.align(size)
+        values = unpack_array_from(self._endian, pack, size, self._bytes, self._pos, count, typed)
+        self._pos += size * count
+        return values
+
+    def write_dheader(self):
+        """Reserve a 4-byte delimiter header, returns its position for finish_dheader."""
+        self.align(4)
+        self.ensure_size(4)
+        pos = self._pos
+        self._pos += 4
+        return pos
+
+    def finish_dheader(self, pos):
+        struct.pack_into(self._endian + "I", self._bytes, pos, self._pos - pos - 4)
+
+    def read_dheader(self):
+        """Read a delimiter header, returns the position where the delimited data ends."""
+        self.align(4)
+        size = self.read("I", 4)
+        if self._pos + size > self._size:
+            raise Exception("Delimited data exceeds the serialized data.")
+        return self._pos + size
+
     def asbytes(self):
         return bytes(self._bytes[0:self._pos])
 
 
+class FixedBuffer(Buffer):
+    """Buffer writing straight into caller-supplied writable memory (bytearray, mmap,
+    shared memory) starting at 'offset', it cannot grow.
+
+    The target is not zeroed up front: '_size' only covers what was written so far, and
+    bytes skipped over (alignment padding) are zeroed when it is extended past them."""
+    def __init__(self, target, offset=0):
+        view = memoryview(target).cast('B')
+        if view.readonly:
+            raise Exception("Target buffer is read-only.")
+        if offset < 0 or offset > len(view):
+            raise Exception("Offset outside of the target buffer.")
+        self._bytes = view[offset:]
+        self._pos = 0
+        self._size = 0
+        self._capacity = len(self._bytes)
+        self._align_offset = 0
+        self.set_endianness(Endianness.native())
+        self.set_version(1)
+
+    def ensure_size(self, size):
+        if self._pos + size > self._size:
+            if self._pos + size > self._capacity:
+                raise Exception("Serialized sample does not fit the target buffer.")
+            if self._pos > self._size:
+                self._bytes[self._size:self._pos] = bytes(self._pos - self._size)
+            self._size = self._pos + size
+
+    def align(self, alignment):
+        super().align(alignment)
+        self.ensure_size(0)
+        return self
+
+
+# Kind of the items of a buffer per struct format character, a buffer can be copied
+# as-is into a primitive array or sequence when both kind and item size match.
+_format_kinds = {c: kind for kind, chars in (("i", "bhilqn"), ("u", "BHILQN"), ("f", "efd"), ("?", "?")) for c in chars}
+_native_endian = "<" if sys.byteorder == "little" else ">"
+_numpy = None
+
+
+def _import_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def _primitive_view(values, pack, size):
+    """Flat byte view and byte order of 'values' if it exports a contiguous buffer of
+    'pack' items, or (None, None) if it has to be packed item by item."""
+    if isinstance(values, (list, tuple)):
+        return None, None
+
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return None, None
+
+    fmt = view.format
+    order = fmt[0] if fmt[0] in "@=<>!" else "@"
+    fmt = fmt.lstrip("@=<>!")
+
+    if len(fmt) != 1 or _format_kinds.get(fmt) != _format_kinds[pack] or view.itemsize != size \
+            or not view.c_contiguous or view.nbytes != size * len(values):
+        return None, None
+
+    return view.cast("B"), {"<": "<", ">": ">", "!": ">"}.get(order, _native_endian)
+
+
+def pack_array_into(endian, pack, size, buffer, pos, values):
+    """Pack a list or buffer-protocol object (numpy.ndarray, array.array) of primitives at 'pos'."""
+    view, order = _primitive_view(values, pack, size)
+    if view is None:
+        struct.pack_into(f"{endian}{len(values)}{pack}", buffer, pos, *values)
+        return
+
+    buffer[pos:pos + view.nbytes] = view
+    if size > 1 and order != endian:
+        swapped = array.array(pack)
+        swapped.frombytes(view)
+        swapped.byteswap()
+        buffer[pos:pos + view.nbytes] = memoryview(swapped).cast("B")
+
+
+def unpack_array_from(endian, pack, size, buffer, pos, count, typed=False):
+    """Unpack 'count' primitives at 'pos' as a list or, if 'typed', as a numpy.ndarray in
+    native byte order (array.array when numpy is not available)."""
+    numpy = _import_numpy() if typed else False
+    if not typed or (pack == "?" and not numpy):
+        return list(struct.unpack_from(f"{endian}{count}{pack}", buffer, pos))
+
+    if pos + count * size > len(buffer):
+        raise Exception("Array exceeds the serialized data.")
+
+    if numpy:
+        values = numpy.frombuffer(buffer, dtype=endian + pack, count=count, offset=pos)
+        if endian != _native_endian:
+            values = values.astype(values.dtype.newbyteorder("="))
+        return values
+
+    values = array.array(pack)
+    values.frombytes(memoryview(buffer)[pos:pos + count * size])
+    if endian != _native_endian:
+        values.byteswap()
+    return values
+
+
+class BufferPool:
+    """Per-thread free lists of serialization buffers.
+
+    A buffer is taken out of the pool while it is in use, so concurrent and nested
+    serializations never share one. Each thread retains at most 'max_retained' bytes
+    worth of buffers, anything that grew beyond that is dropped after use. Buffers
+    are handed out zeroed.
+    """
+    def __init__(self, max_retained=1 << 20):
+        self.max_retained = max_retained
+        self._local = threading.local()
+
+    def acquire(self):
+        free = getattr(self._local, "free", None)
+        if free:
+            buffer = free.pop()
+            self._local.retained -= buffer._size
+            return buffer
+        return Buffer()
+
+    def release(self, buffer):
+        local = self._local
+        if not hasattr(local, "free"):
+            local.free = []
+            local.retained = 0
+        if local.retained + buffer._size <= self.max_retained:
+            buffer.zero_used()
+            local.free.append(buffer)
+            local.retained += buffer._size
+
+
 class MaxSizeFinder:
-    def __init__(self):
-        self.size = 0
+    """Tracks the size of serialized data while walking the machines, for key sizes, exact
+    sample sizes (Machine.serialized_size) and upper bounds (Machine.max_size)."""
+    def __init__(self, size=0, version=1):
+        self.size = size
+        self.version = version
+        self.max_align = 4 if version == 2 else 8
+        # Cleared by any unbounded member, the size is meaningless from then on
+        self.bounded = True
+        # Types being sized, a type that contains itself is unbounded
+        self.types = []
+
+    def sub(self, size):
+        finder = MaxSizeFinder(size, self.version)
+        finder.types = self.types
+        return finder
 
     def align(self, alignment):
+        alignment = min(alignment, self.max_align)
         self.size = (self.size + alignment - 1) & ~(alignment - 1)
 
     def increase(self, bytes, alignment):
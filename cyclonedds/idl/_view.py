@@ -0,0 +1,416 @@
+"""
+ * Copyright(c) 2021 ADLINK Technology Limited and others
+ *
+ * This program and the accompanying materials are made available under the
+ * terms of the Eclipse Public License v. 2.0 which is available at
+ * http://www.eclipse.org/legal/epl-2.0, or the Eclipse Distribution License
+ * v. 1.0 which is available at
+ * http://www.eclipse.org/org/documents/edl-v10.php.
+ *
+ * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
+"""
+
+import struct
+
+from ._support import Buffer, Endianness, MaxSizeFinder
+from ._machinery import ArrayMachine, ByteArrayMachine, CharMachine, EnumMachine, InstanceMachine, OptionalMachine, \
+    PrimitiveMachine, StructMachine, _is_fixed
+
+
+def encapsulation(header):
+    """Endianness and XCDR version of the sample with this 4-byte encapsulation header."""
+    if len(header) < 4 or header[0] != 0 or 1 < header[1] < 6 or header[1] > 11:
+        raise Exception(f"Unsupported encapsulation {bytes(header).hex()}, only XCDR1 and XCDR2 are.")
+    return Endianness.Little if header[1] & 1 else Endianness.Big, 2 if header[1] >= 6 else 1
+
+
+def open_sample(data):
+    """Read-only buffer over a serialized sample, positioned after the encapsulation header of which it
+    took the endianness and XCDR version."""
+    buffer = Buffer(data, align_offset=4, readonly=True)
+    endianness, version = encapsulation(buffer.read_bytes(4))
+    buffer.set_endianness(endianness)
+    buffer.set_version(version)
+    return buffer
+
+
+class ViewLayout:
+    """What every view of a struct type in one XCDR version shares: the machines of the members in order
+    and the positions, relative to the start of the data, of every member up to and including the first one
+    whose size depends on its value. Positions of later members are found by skipping over the data."""
+
+    def __init__(self, machine, version):
+        self.machine = machine
+        self.index = {member: i for i, member in enumerate(machine.members_machines)}
+        self.machines = list(machine.members_machines.values())
+        self.delimited = version == 2 and machine.extensibility != "final"
+        self.mutable = version == 2 and machine.extensibility == "mutable"
+
+        finder = MaxSizeFinder(4 if self.delimited else 0, version)
+        self.offsets = [finder.size]
+        if not self.mutable:
+            for submachine in self.machines:
+                if not _is_fixed(submachine, version):
+                    break
+                submachine.max_size(finder)
+                self.offsets.append(finder.size)
+
+
+class SampleView:
+    """Serialized sample of a struct type that decodes a member the first time it is accessed.
+
+    Decoded members are kept on the view, so repeated access is as fast as it is on a sample. Positions
+    of members that follow variable-length members are remembered once found. Call materialize() to get
+    an instance of the type.
+    """
+
+    def __init__(self, idl, data):
+        buffer = open_sample(data)
+
+        layout = idl.view_layouts.get(buffer.version)
+        if layout is None:
+            layout = idl.view_layouts[buffer.version] = ViewLayout(idl.machine, buffer.version)
+
+        self.__dict__.update(
+            _view_idl=idl,
+            _view_layout=layout,
+            _view_buffer=buffer,
+            _view_end=buffer.read_dheader() if layout.delimited else None,
+            # Absolute positions of the members as far as they are known
+            _view_offsets=[offset + 4 for offset in layout.offsets],
+            # Positions of the members of a mutable struct, found on first access
+            _view_members=None
+        )
+
+    def __getattr__(self, name):
+        if "_view_layout" not in self.__dict__ or name not in self._view_layout.index:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        value = self._decode(name)
+        # Found by regular attribute lookup from now on
+        self.__dict__[name] = value
+        return value
+
+    def _decode(self, name):
+        layout = self._view_layout
+        buffer = self._view_buffer
+        end = self._view_end
+        index = layout.index[name]
+        machine = layout.machines[index]
+
+        if layout.mutable:
+            if self._view_members is None:
+                buffer.seek(self._view_offsets[0])
+                self._view_members = {member: start for member, start, _ in layout.machine.scan_mutable(buffer, end)}
+            if name not in self._view_members:
+                return layout.machine._missing(name, machine)
+            buffer.seek(self._view_members[name])
+            return (machine.submachine if isinstance(machine, OptionalMachine) else machine).deserialize(buffer)
+
+        offsets = self._view_offsets
+        while len(offsets) <= index:
+            buffer.seek(offsets[-1])
+            if end is None or buffer.tell() < end:
+                layout.machines[len(offsets) - 1].skip(buffer)
+            offsets.append(buffer.tell())
+
+        if end is not None and offsets[index] >= end:
+            # Written by an older version of the type, before this member was appended
+            return layout.machine._missing(name, machine)
+        buffer.seek(offsets[index])
+        value = machine.deserialize(buffer)
+        if len(offsets) == index + 1:
+            offsets.append(buffer.tell())
+        return value
+
+    def materialize(self):
+        """Decode all members into an instance of the type."""
+        return self._view_idl.datatype(**{member: getattr(self, member) for member in self._view_layout.index})
+
+    def __eq__(self, other):
+        if isinstance(other, SampleView):
+            other = other.materialize()
+        return self.materialize() == other
+
+    def __repr__(self):
+        return f"SampleView({self.materialize()!r})"
+
+
+class ProjectedSample(tuple):
+    """Values of the projected members of a sample, in the order they were asked for."""
+
+
+def _struct_machine(machine):
+    if isinstance(machine, InstanceMachine):
+        if machine.type.__idl__.machine is None:
+            machine.type.__idl__.populate()
+        machine = machine.type.__idl__.machine
+    return machine if isinstance(machine, StructMachine) else None
+
+
+def _fixed_run_sizes(machines, version):
+    # Size of consecutive members whose size does not depend on their value, per start position modulo 8
+    sizes = []
+    for start in range(8):
+        finder = MaxSizeFinder(start, version)
+        for machine in machines:
+            machine.max_size(finder)
+        sizes.append(finder.size - start)
+    return tuple(sizes)
+
+
+class Projection:
+    """Decodes a subset of the members of a struct type, given as member names or dotted paths into
+    nested structs. Members that are not asked for are skipped over without building objects for them,
+    members after the last one asked for are not looked at at all."""
+
+    def __init__(self, machine, fields):
+        self.machine = machine
+        self.fields = tuple(fields)
+        if not self.fields:
+            raise TypeError("A projection needs at least one field.")
+        self.tree = {}
+        for index, field in enumerate(self.fields):
+            node, struct = self.tree, machine
+            path = field.split(".")
+            for depth, name in enumerate(path):
+                if struct is None:
+                    raise TypeError(f"Cannot project '{field}', '{path[depth - 1]}' is not a struct.")
+                if name not in struct.members_machines:
+                    raise TypeError(f"Cannot project '{field}', {struct.type.__name__} has no member '{name}'.")
+                if depth == len(path) - 1:
+                    if name in node:
+                        raise TypeError(f"Cannot project '{field}', it overlaps with another field.")
+                    node[name] = index
+                else:
+                    if isinstance(node.get(name, {}), int):
+                        raise TypeError(f"Cannot project '{field}', it overlaps with another field.")
+                    node = node.setdefault(name, {})
+                    struct = _struct_machine(struct.members_machines[name])
+        # Per XCDR version
+        self.plans = {}
+
+    def _plan(self, machine, tree, version, root):
+        """Steps for one struct: ("skip", sizes or machine), ("read", machine, index) or ("struct", machine, plan)."""
+        if version == 2 and machine.extensibility == "mutable":
+            return {
+                member: self._step(machine.members_machines[member], subtree, version)
+                for member, subtree in tree.items()
+            }
+
+        members = list(machine.members_machines.items())
+        if root:
+            # Nothing after the last member asked for is needed
+            last = max(i for i, (member, _) in enumerate(members) if member in tree)
+            members = members[:last + 1]
+
+        steps, run = [], []
+        for member, submachine in members:
+            if member not in tree:
+                if _is_fixed(submachine, version):
+                    run.append(submachine)
+                else:
+                    if run:
+                        steps.append(("skip", _fixed_run_sizes(run, version)))
+                        run = []
+                    steps.append(("skip", submachine))
+                continue
+            if run:
+                steps.append(("skip", _fixed_run_sizes(run, version)))
+                run = []
+            steps.append((member,) + self._step(submachine, tree[member], version))
+        if run:
+            steps.append(("skip", _fixed_run_sizes(run, version)))
+        return steps
+
+    def _step(self, machine, subtree, version):
+        if isinstance(subtree, int):
+            return ("read", machine, subtree)
+        struct = _struct_machine(machine)
+        return ("struct", struct, self._plan(struct, subtree, version, False))
+
+    def deserialize(self, data):
+        buffer = open_sample(data)
+
+        plan = self.plans.get(buffer.version)
+        if plan is None:
+            plan = self.plans[buffer.version] = self._plan(self.machine, self.tree, buffer.version, True)
+
+        values = [None] * len(self.fields)
+        self._run(buffer, self.machine, plan, values)
+        return ProjectedSample(values)
+
+    def _run(self, buffer, machine, plan, values):
+        if buffer.version == 2 and machine.extensibility == "mutable":
+            end = buffer.read_dheader()
+            found = set()
+            for member, start, size in machine.scan_mutable(buffer, end):
+                step = plan.get(member)
+                if step is not None:
+                    found.add(member)
+                    buffer.seek(start)
+                    submachine = step[1]
+                    if step[0] == "read" and isinstance(submachine, OptionalMachine):
+                        submachine = submachine.submachine
+                    self._member(buffer, (member, step[0], submachine, step[2]), values)
+            for member, step in plan.items():
+                if member not in found:
+                    self._missing(machine, member, step, values)
+            buffer.seek(end)
+            return
+
+        end = buffer.read_dheader() if buffer.version == 2 and machine.extensibility == "appendable" else None
+        offset = buffer._align_offset
+        for step in plan:
+            if end is not None and buffer.tell() >= end:
+                if step[0] != "skip":
+                    self._missing(machine, step[0], step[1:], values)
+                continue
+            if step[0] == "skip":
+                if type(step[1]) is tuple:
+                    buffer.seek(buffer.tell() + step[1][(buffer.tell() - offset) & 7])
+                else:
+                    step[1].skip(buffer)
+            else:
+                self._member(buffer, step, values)
+        if end is not None:
+            buffer.seek(end)
+
+    def _member(self, buffer, step, values):
+        _, kind, machine, arg = step
+        if kind == "read":
+            values[arg] = machine.deserialize(buffer)
+        else:
+            self._run(buffer, machine, arg, values)
+
+    def _missing(self, machine, member, step, values):
+        # A member that is not in the data, written by another version of an extensible type
+        kind, submachine, arg = step
+        if kind == "read":
+            values[arg] = machine._missing(member, submachine)
+        else:
+            self._fill(machine._missing(member, submachine), arg, values)
+
+    def _fill(self, value, plan, values):
+        # Projected members of a nested struct that is missing as a whole, taken from its default
+        steps = [(member,) + step for member, step in plan.items()] if isinstance(plan, dict) else plan
+        for step in steps:
+            if step[0] == "skip":
+                continue
+            member, kind, _, arg = step
+            if kind == "read":
+                values[arg] = getattr(value, member)
+            else:
+                self._fill(getattr(value, member), arg, values)
+
+
+class RawView:
+    """Sample of a type with a fixed layout, read and written in place in its serialized data.
+
+    Every member is a property that unpacks it from a constant position, nested structs are views
+    themselves and arrays of anything but primitives are tuples. Members can be assigned, as can any
+    dotted path with set_field(), when the data is writable (a bytearray for example). Use serialize()
+    for the bytes of the patched sample.
+    """
+    __slots__ = ("_data",)
+
+    # Set on the class generated for every type, XCDR version and endianness
+    _machine = None
+    _offset = 0
+    _prefix = ""
+    _setters = {}
+
+    def __init__(self, data):
+        self._data = data
+
+    def set_field(self, path, value):
+        """Patch the member at the dotted 'path', array elements are addressed by their index."""
+        setter = self._setters.get(self._prefix + path)
+        if setter is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no settable member '{path}'")
+        setter(self._data, value)
+
+    def serialize(self) -> bytes:
+        return bytes(self._data)
+
+    def materialize(self):
+        """Decode the viewed struct into an instance of its type."""
+        buffer = open_sample(self._data)
+        buffer.seek(self._offset)
+        return self._machine.deserialize(buffer)
+
+    def __eq__(self, other):
+        if isinstance(other, RawView):
+            other = other.materialize()
+        return self.materialize() == other
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.materialize()!r})"
+
+
+def _raw_accessors(machine, offset, endian):
+    """Functions reading and writing a member at the constant 'offset' of a sample."""
+    if isinstance(machine, PrimitiveMachine):
+        packer = struct.Struct(endian + machine.code)
+        return (lambda data: packer.unpack_from(data, offset)[0]), (lambda data, value: packer.pack_into(data, offset, value))
+    if isinstance(machine, EnumMachine):
+        packer, enum = struct.Struct(endian + "I"), machine.enum
+        return (lambda data: enum(packer.unpack_from(data, offset)[0])), \
+            (lambda data, value: packer.pack_into(data, offset, enum(value).value))
+    if isinstance(machine, CharMachine):
+        packer = struct.Struct("b")
+        return (lambda data: chr(packer.unpack_from(data, offset)[0])), \
+            (lambda data, value: packer.pack_into(data, offset, ord(value)))
+    if isinstance(machine, ByteArrayMachine):
+        size = machine.size
+
+        def set_bytes(data, value):
+            if len(value) != size:
+                raise Exception("Incorrectly sized array.")
+            data[offset:offset + size] = value
+        return (lambda data: bytes(data[offset:offset + size])), set_bytes
+
+    # Arrays of primitives
+    size, packer = machine.size, struct.Struct(f"{endian}{machine.size}{machine.submachine.code}")
+
+    def set_array(data, value):
+        if len(value) != size:
+            raise Exception("Incorrectly sized array.")
+        packer.pack_into(data, offset, *value)
+    return (lambda data: list(packer.unpack_from(data, offset))), set_array
+
+
+def raw_view_class(machine, table, endian, prefix="", setters=None):
+    """RawView subclass for a struct machine, with every member at the position the offset table gives it
+    (after the encapsulation header). Nested structs get classes of their own, all share the setters."""
+    setters = {} if setters is None else setters
+    namespace = {
+        "__slots__": (),
+        "_machine": machine,
+        "_offset": table[prefix[:-1]][0] + 4 if prefix else 4,
+        "_prefix": prefix,
+        "_setters": setters,
+    }
+
+    def getter(machine, path):
+        if isinstance(machine, InstanceMachine):
+            machine = machine.type.__idl__.machine
+        if isinstance(machine, StructMachine):
+            return raw_view_class(machine, table, endian, path + ".", setters)
+        if isinstance(machine, ArrayMachine) and not machine.bulk:
+            elements = [getter(machine.submachine, f"{path}.{i}") for i in range(machine.size)]
+            return lambda data: tuple(element(data) for element in elements)
+        get, setters[path] = _raw_accessors(machine, table[path][0] + 4, endian)
+        return get
+
+    for member, submachine in machine.members_machines.items():
+        path = prefix + member
+        get = getter(submachine, path)
+        if path in setters:
+            namespace[member] = property(
+                lambda self, get=get: get(self._data),
+                lambda self, value, set=setters[path]: set(self._data, value)
+            )
+        else:
+            namespace[member] = property(lambda self, get=get: get(self._data))
+    return type(f"{machine.type.__name__}RawView", (RawView,), namespace)
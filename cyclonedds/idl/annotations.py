@@ -20,6 +20,18 @@ def must_understand(value: Any) -> None:
     field.annotations["must_understand"] = True
 
 
+def typed_array(value: Any) -> None:
+    # Decode an array or sequence of primitives as numpy.ndarray (array.array without numpy)
+    field: IdlField = cast(IdlField, value)
+    field.annotations["typed_array"] = True
+
+
+def zero_copy(value: Any) -> None:
+    # Decode bytes as memoryview slices of the received data instead of copies
+    field: IdlField = cast(IdlField, value)
+    field.annotations["zero_copy"] = True
+
+
 def autoid(autoid_type: str) -> Callable[[Type[IdlStruct]], Type[IdlStruct]]:
     if autoid_type not in ["hash", "sequential"]:
         raise AnnotationException(f"autoid is either 'hash' or 'sequential'.")
@@ -17,7 +17,11 @@ import platform
 import ctypes as ct
 from ctypes.util import find_library
 from functools import wraps
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
+
+# Built natively, it has the members of dds_sample_info_t and keeps them unconverted until accessed
+from cyclonedds._clayer import SampleInfo  # noqa F401
 
 
 class CycloneDDSLoaderException(Exception):
@@ -213,26 +217,20 @@ class DDS:
         self._ref = reference
 
 
-@dataclass
-class SampleInfo:
-    sample_state: int
-    view_state: int
-    instance_state: int
-    valid_data: bool
-    source_timestamp: int
-    instance_handle: int
-    publication_handle: int
-    disposed_generation_count: int
-    no_writers_generation_count: int
-    sample_rank: int
-    generation_rank: int
-    absolute_generation_rank: int
-
-
 @dataclass
 class InvalidSample:
+    """Sample without valid data, of a disposed or unregistered instance. 'key' is the serialized sample the
+    instance was disposed or unregistered with, or with 'key_only' just the key (see IDL.deserialize_key)."""
     key: bytes
     sample_info: SampleInfo
+    data_type: Any = field(default=None, repr=False, compare=False)
+    key_only: bool = field(default=False, repr=False, compare=False)
+
+    def sample(self) -> Any:
+        """Decode the data into an instance of the data type, of which at least the key members are set."""
+        if self.key_only:
+            return self.data_type.__idl__.deserialize_key(self.key)
+        return self.data_type.deserialize(self.key)
 
 
 class dds_c_t:  # noqa N801
@@ -342,7 +340,8 @@ class dds_c_t:  # noqa N801
     class sample_buffer(ct.Structure):  # noqa N801
         _fields_ = [
             ('buf', ct.c_void_p),
-            ('len', ct.c_size_t)
+            ('len', ct.c_size_t),
+            ('key_only', ct.c_bool)
         ]
 
 
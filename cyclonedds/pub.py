@@ -10,6 +10,9 @@
  * SPDX-License-Identifier: EPL-2.0 OR BSD-3-Clause
 """
 
+from array import array
+from contextlib import nullcontext
+from numbers import Integral
 from typing import Optional, Union, TYPE_CHECKING
 
 from .internal import c_call, dds_c_t
@@ -18,10 +21,10 @@ from .domain import DomainParticipant
 from .topic import Topic
 from .qos import _CQos, Qos, LimitedScopeQos, PublisherQos, DataWriterQos
 
-from cyclonedds._clayer import ddspy_write, ddspy_write_ts, ddspy_dispose, ddspy_writedispose, ddspy_writedispose_ts, \
-    ddspy_dispose_handle, ddspy_dispose_handle_ts, ddspy_register_instance, ddspy_unregister_instance,   \
-    ddspy_unregister_instance_handle, ddspy_unregister_instance_ts, ddspy_unregister_instance_handle_ts, \
-    ddspy_lookup_instance, ddspy_dispose_ts
+from cyclonedds._clayer import ddspy_write, ddspy_write_ts, ddspy_write_many, ddspy_dispose, ddspy_writedispose, \
+    ddspy_writedispose_ts, ddspy_dispose_handle, ddspy_dispose_handle_ts, ddspy_register_instance, \
+    ddspy_unregister_instance, ddspy_unregister_instance_handle, ddspy_unregister_instance_ts, \
+    ddspy_unregister_instance_handle_ts, ddspy_lookup_instance, ddspy_dispose_ts, ddspy_dispose_many, ddspy_unregister_many
 
 
 if TYPE_CHECKING:
@@ -144,36 +147,84 @@ class DataWriter(Entity):
     def topic(self) -> 'cyclonedds.topic.Topic':
         return self._topic
 
-    def write(self, sample, timestamp=None):
-        if not isinstance(sample, self.data_type):
-            raise TypeError(f"{sample} is not of type {self.data_type}")
+    def _serialized(self, sample):
+        # Samples are serialized for the duration of a with block, anything else must be a sample that is
+        # already serialized in a contiguous buffer (bytes, bytearray, memoryview, mmap, numpy array, ...)
+        if isinstance(sample, self.data_type):
+            return self.data_type.__idl__.serialized(sample)
+        try:
+            with memoryview(sample) as view:
+                if not view.c_contiguous or view.nbytes < 4:
+                    raise ValueError("A serialized sample is a contiguous buffer starting with an encapsulation header.")
+                with view.cast('B') as data:
+                    version = 2 if data[1] >= 6 else 1
+                if not self.data_type.__idl__.fits_serialized_size(view.nbytes, version):
+                    raise ValueError(f"{view.nbytes} bytes can not be a serialized sample of {self.data_type}.")
+        except TypeError:
+            raise TypeError(f"{sample} is not of type {self.data_type} nor a serialized sample") from None
+        return nullcontext(sample)
 
-        if timestamp is not None:
-            ret = ddspy_write_ts(self._ref, sample.serialize(), timestamp)
-        else:
-            ret = ddspy_write(self._ref, sample.serialize())
+    def write(self, sample, timestamp=None):
+        """Write a sample, or a sample that is already serialized in any contiguous buffer."""
+        with self._serialized(sample) as data:
+            if timestamp is not None:
+                ret = ddspy_write_ts(self._ref, data, timestamp)
+            else:
+                ret = ddspy_write(self._ref, data)
 
         if ret < 0:
             raise DDSException(ret, f"Occurred while writing sample in {repr(self)}")
 
+    def _batch(self, call, samples, timestamp, coherent, action):
+        # Serialized together and handed to the C layer in a single call
+        samples = samples if isinstance(samples, (list, tuple)) else list(samples)
+        for sample in samples:
+            if not isinstance(sample, self.data_type):
+                raise TypeError(f"{sample} is not of type {self.data_type}")
+
+        if isinstance(timestamp, Integral):
+            timestamp = int(timestamp)
+        elif timestamp is not None:
+            timestamp = array('q', timestamp)
+            if len(timestamp) != len(samples):
+                raise ValueError(f"Got {len(timestamp)} timestamps for {len(samples)} samples.")
+
+        data, offsets = self.data_type.serialize_many(samples)
+        ret, done = call(self._ref, data, offsets, timestamp, coherent)
+
+        if ret < 0:
+            raise DDSException(ret, f"Occurred while {action} sample {done} of a batch in {repr(self)}")
+
+    def write_many(self, samples, timestamp=None, coherent=False):
+        """Write a batch of samples in one call into the C layer. The timestamp is one for all samples or a
+        sequence of one per sample. With coherent the batch is written as a coherent set, which needs a
+        publisher with coherent access."""
+        self._batch(ddspy_write_many, samples, timestamp, coherent, "writing")
+
     def write_dispose(self, sample, timestamp=None):
-        if timestamp is not None:
-            ret = ddspy_writedispose_ts(self._ref, sample.serialize(), timestamp)
-        else:
-            ret = ddspy_writedispose(self._ref, sample.serialize())
+        with self._serialized(sample) as data:
+            if timestamp is not None:
+                ret = ddspy_writedispose_ts(self._ref, data, timestamp)
+            else:
+                ret = ddspy_writedispose(self._ref, data)
 
         if ret < 0:
             raise DDSException(ret, f"Occurred while writedisposing sample in {repr(self)}")
 
     def dispose(self, sample, timestamp=None):
-        if timestamp is not None:
-            ret = ddspy_dispose_ts(self._ref, sample.serialize(), timestamp)
-        else:
-            ret = ddspy_dispose(self._ref, sample.serialize())
+        with self._serialized(sample) as data:
+            if timestamp is not None:
+                ret = ddspy_dispose_ts(self._ref, data, timestamp)
+            else:
+                ret = ddspy_dispose(self._ref, data)
 
         if ret < 0:
             raise DDSException(ret, f"Occurred while disposing in {repr(self)}")
 
+    def dispose_many(self, samples, timestamp=None, coherent=False):
+        """Dispose the instances of a batch of samples, like write_many."""
+        self._batch(ddspy_dispose_many, samples, timestamp, coherent, "disposing")
+
     def dispose_instance_handle(self, handle, timestamp=None):
         if timestamp is not None:
             ret = ddspy_dispose_handle_ts(self._ref, handle, timestamp)
@@ -184,20 +235,26 @@ class DataWriter(Entity):
             raise DDSException(ret, f"Occurred while disposing in {repr(self)}")
 
     def register_instance(self, sample):
-        ret = ddspy_register_instance(self._ref, sample.serialize())
+        with self._serialized(sample) as data:
+            ret = ddspy_register_instance(self._ref, data)
         if ret < 0:
             raise DDSException(ret, f"Occurred while registering instance in {repr(self)}")
         return ret
 
     def unregister_instance(self, sample, timestamp: int = None):
-        if timestamp is not None:
-            ret = ddspy_unregister_instance_ts(self._ref, sample.serialize(), timestamp)
-        else:
-            ret = ddspy_unregister_instance(self._ref, sample.serialize())
+        with self._serialized(sample) as data:
+            if timestamp is not None:
+                ret = ddspy_unregister_instance_ts(self._ref, data, timestamp)
+            else:
+                ret = ddspy_unregister_instance(self._ref, data)
 
         if ret < 0:
             raise DDSException(ret, f"Occurred while unregistering instance in {repr(self)}")
 
+    def unregister_many(self, samples, timestamp=None, coherent=False):
+        """Unregister the instances of a batch of samples, like write_many."""
+        self._batch(ddspy_unregister_many, samples, timestamp, coherent, "unregistering")
+
     def unregister_instance_handle(self, handle, timestamp: int = None):
         if timestamp is not None:
             ret = ddspy_unregister_instance_handle_ts(self._ref, handle, timestamp)
@@ -216,7 +273,8 @@ class DataWriter(Entity):
         raise DDSException(ret, f"Occurred while waiting for acks from {repr(self)}")
 
     def lookup_instance(self, sample):
-        ret = ddspy_lookup_instance(self._ref, sample.serialize())
+        with self._serialized(sample) as data:
+            ret = ddspy_lookup_instance(self._ref, data)
         if ret < 0:
             raise DDSException(ret, f"Occurred while lookup up instance from {repr(self)}")
         if ret == 0:
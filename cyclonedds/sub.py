@@ -12,7 +12,7 @@
 
 import asyncio
 import concurrent.futures
-from typing import AsyncGenerator, List, Optional, Union, Generator, TYPE_CHECKING
+from typing import AsyncGenerator, Dict, List, Optional, Tuple, Union, Generator, TYPE_CHECKING
 
 from .core import Entity, Listener, DDSException, WaitSet, ReadCondition, SampleState, InstanceState, ViewState
 from .domain import DomainParticipant
@@ -20,12 +20,15 @@ from .topic import Topic
 from .internal import c_call, dds_c_t, InvalidSample
 from .qos import _CQos, Qos, LimitedScopeQos, SubscriberQos, DataReaderQos
 from .util import duration
+from .idl._columns import sample_info_columns
 
-from cyclonedds._clayer import ddspy_read, ddspy_take, ddspy_read_handle, ddspy_take_handle, ddspy_lookup_instance
+from cyclonedds._clayer import ddspy_read, ddspy_take, ddspy_read_handle, ddspy_take_handle, ddspy_lookup_instance, \
+    ReadBuffers
 
 
 if TYPE_CHECKING:
     import cyclonedds
+    import numpy
 
 
 class Subscriber(Entity):
@@ -87,7 +90,8 @@ class DataReader(Entity):
             subscriber_or_participant: Union['cyclonedds.sub.Subscriber', 'cyclonedds.domain.DomainParticipant'],
             topic: Topic,
             qos: Optional[Qos] = None,
-            listener: Optional[Listener] = None):
+            listener: Optional[Listener] = None,
+            projection: Optional[List[str]] = None):
         """Initialize the DataReader
 
         Parameters
@@ -103,6 +107,9 @@ class DataReader(Entity):
             Optionally supply a Qos.
         listener: cyclonedds.core.Listener = None
             Optionally supply a Listener.
+        projection: List[str], optional = None
+            Only decode these members of every sample, given as member names or dotted paths into nested structs.
+            Samples are returned as a cyclonedds.idl.ProjectedSample, a tuple of the values in this order.
         """
         if not (isinstance(subscriber_or_participant, DomainParticipant) or
                 isinstance(subscriber_or_participant, Subscriber)):
@@ -112,6 +119,9 @@ class DataReader(Entity):
         if not isinstance(topic, Topic):
             raise TypeError(f"{topic} is not a cyclonedds.topic.Topic.")
 
+        # Checks the fields before the reader exists
+        self._projection = topic.data_type.__idl__.projection(projection).fields if projection is not None else None
+
         if qos is not None:
             if isinstance(qos, LimitedScopeQos) and not isinstance(qos, DataReaderQos):
                 raise TypeError(f"{qos} is not appropriate for a DataReader")
@@ -139,13 +149,15 @@ class DataReader(Entity):
         self._topic = topic
         self._topic_ref = topic._ref
         self._next_condition = None
+        self._read_buffers = ReadBuffers()
         self._keepalive_entities = [self.subscriber, topic]
 
     @property
     def topic(self) -> 'cyclonedds.topic.Topic':
         return self._topic
 
-    def read(self, N: int = 1, condition: Entity = None, instance_handle: int = None) -> List[object]:
+    def read(self, N: int = 1, condition: Entity = None, instance_handle: int = None,
+             lazy: bool = False, with_info: bool = True) -> List[object]:
         """Read a maximum of N samples, non-blocking. Optionally use a read/query-condition to select which samples
         you are interested in.
 
@@ -155,6 +167,12 @@ class DataReader(Entity):
             The maximum number of samples to read.
         condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
             Only read samples that satisfy the supplied condition.
+        lazy: bool
+            Return views over the serialized samples that decode members on first access instead of
+            fully decoded samples, see cyclonedds.idl.SampleView.
+        with_info: bool
+            Set the sample_info of every sample. Without it no SampleInfo is created at all and samples
+            without valid data (for disposed and unregistered instances) are not returned.
 
         Raises
         ------
@@ -162,23 +180,28 @@ class DataReader(Entity):
             If any error code is returned by the DDS API it is converted into an exception.
         """
         if instance_handle is not None:
-            ret = ddspy_read_handle(condition._ref if condition else self._ref, N, instance_handle)
+            ret = ddspy_read_handle(condition._ref if condition else self._ref, N, instance_handle, with_info,
+                                    self._read_buffers)
         else:
-            ret = ddspy_read(condition._ref if condition else self._ref, N)
+            ret = ddspy_read(condition._ref if condition else self._ref, N, with_info, self._read_buffers)
 
         if type(ret) == int:
             raise DDSException(ret, f"Occurred while reading data in {repr(self)}")
 
+        if not with_info:
+            return [self._topic.data_type.deserialize(data, lazy=lazy, fields=self._projection) for data in ret]
+
         samples = []
         for (data, info) in ret:
             if info.valid_data:
-                samples.append(self._topic.data_type.deserialize(data))
+                samples.append(self._topic.data_type.deserialize(data, lazy=lazy, fields=self._projection))
                 samples[-1].sample_info = info
             else:
-                samples.append(InvalidSample(data, info))
+                samples.append(InvalidSample(bytes(data), info, self._topic.data_type, data.key_only))
         return samples
 
-    def take(self, N: int = 1, condition: Entity = None, instance_handle: int = None) -> List[object]:
+    def take(self, N: int = 1, condition: Entity = None, instance_handle: int = None,
+             lazy: bool = False, with_info: bool = True) -> List[object]:
         """Take a maximum of N samples, non-blocking. Optionally use a read/query-condition to select which samples
         you are interested in.
 
@@ -188,6 +211,12 @@ class DataReader(Entity):
             The maximum number of samples to read.
         condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
             Only take samples that satisfy the supplied condition.
+        lazy: bool
+            Return views over the serialized samples that decode members on first access instead of
+            fully decoded samples, see cyclonedds.idl.SampleView.
+        with_info: bool
+            Set the sample_info of every sample. Without it no SampleInfo is created at all and samples
+            without valid data (for disposed and unregistered instances) are not returned.
 
         Raises
         ------
@@ -195,22 +224,66 @@ class DataReader(Entity):
             If any error code is returned by the DDS API it is converted into an exception.
         """
         if instance_handle is not None:
-            ret = ddspy_take_handle(condition._ref if condition else self._ref, N, instance_handle)
+            ret = ddspy_take_handle(condition._ref if condition else self._ref, N, instance_handle, with_info,
+                                    self._read_buffers)
         else:
-            ret = ddspy_take(condition._ref if condition else self._ref, N)
+            ret = ddspy_take(condition._ref if condition else self._ref, N, with_info, self._read_buffers)
 
         if type(ret) == int:
             raise DDSException(ret, f"Occurred while taking data in {repr(self)}")
 
+        if not with_info:
+            return [self._topic.data_type.deserialize(data, lazy=lazy, fields=self._projection) for data in ret]
+
         samples = []
         for (data, info) in ret:
             if info.valid_data:
-                samples.append(self._topic.data_type.deserialize(data))
+                samples.append(self._topic.data_type.deserialize(data, lazy=lazy, fields=self._projection))
                 samples[-1].sample_info = info
             else:
-                samples.append(InvalidSample(data, info))
+                samples.append(InvalidSample(bytes(data), info, self._topic.data_type, data.key_only))
         return samples
 
+    def take_columns(self, N: int = 1, fields: Optional[List[str]] = None, condition: Entity = None,
+                     instance_handle: int = None) -> Tuple[Dict[str, 'numpy.ndarray'], Dict[str, 'numpy.ndarray']]:
+        """Take a maximum of N samples and decode them into numpy arrays, one per field, without creating
+        a python object per sample. Requires numpy.
+
+        Parameters
+        ----------
+        N: int
+            The maximum number of samples to take.
+        fields: List[str], optional
+            Member names or dotted paths into nested structs, by default every member with nested structs expanded.
+        condition: cyclonedds.core.ReadCondition, cyclonedds.core.QueryCondition, optional
+            Only take samples that satisfy the supplied condition.
+
+        Returns
+        -------
+        Tuple[Dict[str, numpy.ndarray], Dict[str, numpy.ndarray]]
+            The columns of the samples by field and the columns of their sample infos by member of
+            cyclonedds.internal.SampleInfo. Rows of invalid samples (valid_data is False) are zero in the
+            sample columns, or None in columns of objects.
+
+        Raises
+        ------
+        DDSException
+            If any error code is returned by the DDS API it is converted into an exception.
+        """
+        if instance_handle is not None:
+            ret = ddspy_take_handle(condition._ref if condition else self._ref, N, instance_handle, True, self._read_buffers)
+        else:
+            ret = ddspy_take(condition._ref if condition else self._ref, N, True, self._read_buffers)
+
+        if type(ret) == int:
+            raise DDSException(ret, f"Occurred while taking data in {repr(self)}")
+
+        infos = [info for _, info in ret]
+        columns = self._topic.data_type.__idl__.deserialize_columns(
+            [data for data, _ in ret], fields=fields, valid=[info.valid_data for info in infos]
+        )
+        return columns, sample_info_columns(infos)
+
     def read_next(self) -> Optional[object]:
         """Shortcut method to read exactly one sample or return None.
 
@@ -1,9 +1,11 @@
 from cyclonedds.idl import IdlStruct, IdlUnion
-from cyclonedds.idl.annotations import keylist, key
+from cyclonedds.idl.annotations import keylist, key, typed_array, zero_copy, appendable, mutable, autoid, final
 import cyclonedds.idl.types as pt
 
 from enum import IntEnum, auto
+from contextlib import contextmanager
 from dataclasses import dataclass
+from typing import Optional
 
 
 
@@ -111,3 +113,216 @@ class EasyUnion(IdlUnion, discriminator=int):
 @dataclass
 class SingleUnion(IdlStruct):
     value: EasyUnion
+
+
+@dataclass
+class Vector(IdlStruct):
+    x: pt.float32
+    y: pt.float64
+    z: pt.int8
+
+
+@dataclass
+class Telemetry(IdlStruct):
+    a: pt.int8
+    b: pt.int32
+    position: Vector
+    name: str
+    arr: pt.array[pt.int16, 3]
+    seq: pt.sequence[pt.float64]
+    vectors: pt.sequence[Vector]
+    opt: Optional[pt.int16]
+    enum: BasicEnum
+    char: pt.char
+    d: pt.uint64
+    blob: bytes
+    union: EasyUnion
+    vector_array: pt.array[Vector, 2]
+
+
+@dataclass
+class Waveform(IdlStruct):
+    channel: pt.uint8
+    samples: pt.sequence[pt.float64]
+    typed_array(samples)
+    levels: pt.array[pt.int32, 100]
+    typed_array(levels)
+    gains: pt.array[pt.float32, 3]
+    raw: pt.sequence[pt.int16]
+    flags: pt.sequence[bool]
+
+
+@dataclass
+class Blob(IdlStruct):
+    name: str
+    payload: bytes
+    zero_copy(payload)
+    checksum: pt.uint32
+    copied: bytes
+
+
+@dataclass
+class KeyedNested(IdlStruct):
+    id: pt.int16
+    key(id)
+    position: Vector
+    key(position)
+    name: str
+    key(name)
+    samples: pt.sequence[pt.float64]
+    keyed: pt.array[Keyed, 2]
+    key(keyed)
+    flag: Optional[pt.int8]
+    key(flag)
+
+
+@dataclass(frozen=True)
+class FrozenKeyed(IdlStruct):
+    id: pt.int64
+    key(id)
+    name: str
+
+
+@dataclass
+@appendable
+class AppendableVector(IdlStruct):
+    x: pt.float32
+    y: pt.float64
+    z: pt.int8
+
+
+@appendable
+class AppendableUnion(IdlUnion, discriminator=pt.int16):
+    a: pt.case[1, pt.float64]
+    b: pt.case[2, str]
+    c: pt.default[AppendableVector]
+
+
+@dataclass
+@mutable
+class MutableReading(IdlStruct):
+    id: pt.uint32
+    key(id)
+    value: pt.float64
+    label: str
+    samples: pt.sequence[pt.int16]
+    note: Optional[str]
+    level: BasicEnum
+    position: AppendableVector
+
+
+@dataclass
+@appendable
+class ExtensibleTelemetry(IdlStruct):
+    id: pt.int64
+    key(id)
+    d: pt.float64
+    names: pt.sequence[str]
+    vectors: pt.sequence[Vector]
+    vector_array: pt.array[AppendableVector, 2]
+    reading: MutableReading
+    union: AppendableUnion
+    opt: Optional[pt.int16]
+    char: pt.char
+
+
+@dataclass
+class MutableKeyHolder(IdlStruct):
+    flag: bool
+    reading: MutableReading
+    key(reading)
+    extra: ExtensibleTelemetry
+
+
+@dataclass
+@mutable
+@autoid("hash")
+class HashedMembers(IdlStruct):
+    name: str
+    key(name)
+    count: pt.uint16
+    weights: pt.array[pt.float64, 2]
+
+
+@dataclass
+@final
+class FixedPose(IdlStruct):
+    flag: bool
+    id: pt.uint32
+    key(id)
+    position: Vector
+    levels: pt.array[pt.int16, 3]
+    corners: pt.array[Vector, 2]
+    state: BasicEnum
+    code: pt.char
+    stamp: pt.float64
+
+
+# Samples shared by the tests
+
+
+def telemetry(i):
+    return Telemetry(
+        a=i % 100, b=i, position=Vector(i / 2, 2.5 - i, i % 3), name="né"[i % 2] * (i % 5), arr=[i % 7, 2, 3],
+        seq=[1.0] * (i % 3), vectors=[Vector(1, 2, 3)] * (i % 2), opt=i if i % 2 else None, enum=BasicEnum(i % 3 + 1),
+        char="xyz"[i % 3], d=2**64 - 1 - i, blob=b'a' * (i % 9), union=EasyUnion(a=i),
+        vector_array=[Vector(0, 0, 0), Vector(i, 1, 1)]
+    )
+
+
+reading = MutableReading(
+    id=7, value=2.5, label="héllo", samples=[1, -2, 3], note=None, level=BasicEnum.Two,
+    position=AppendableVector(4, 5, 6)
+)
+
+codec_test_data = [
+    SingleInt(value=1000),
+    SingleString(value="Hello, World! ñ €"),
+    SingleFloat(value=0.1),
+    SingleBool(value=True),
+    SingleSequence(value=[0, 1] * 100),
+    SingleArray(value=[0, 1, 2]),
+    SingleUint16(value=65535),
+    SingleBoundedSequence(value=[100, 1, 1]),
+    SingleBoundedString(value="0123456789"),
+    SingleEnum(value=BasicEnum.Two),
+    SingleNested(value=SingleInt(1)),
+    SingleUnion(value=EasyUnion(b=True)),
+    AllPrimitives(),
+    Telemetry(
+        a=1, b=2, position=Vector(1.5, 2.5, 3), name="héllo", arr=[1, 2, 3], seq=[1.0, 2.0],
+        vectors=[Vector(1, 2, 3)], opt=None, enum=BasicEnum.Two, char='x', d=5, blob=b'abc',
+        union=EasyUnion(a=3), vector_array=[Vector(0, 0, 0), Vector(1, 1, 1)]
+    ),
+    Telemetry(
+        a=-1, b=0, position=Vector(0, 0, 0), name="", arr=[0, 0, 0], seq=[],
+        vectors=[], opt=7, enum=BasicEnum.One, char='y', d=0, blob=b'',
+        union=EasyUnion(b=False), vector_array=[Vector(0, 0, 0), Vector(1, 1, 1)]
+    ),
+]
+
+
+@contextmanager
+def machines_only(cls):
+    # Bypass the native and the compiled codecs of 'cls'
+    idl = cls.__idl__
+    if idl.machine is None:
+        idl.populate()
+    codecs = {name: getattr(idl, name) for name in ("native_serialize", "native_deserialize", "codecs", "codecs_v2")}
+    try:
+        for name in codecs:
+            setattr(idl, name, None)
+        yield
+    finally:
+        for name, codec in codecs.items():
+            setattr(idl, name, codec)
+
+
+def machine_serialize(value, endianness):
+    with machines_only(type(value)):
+        return value.serialize(endianness=endianness)
+
+
+def machine_deserialize(cls, data):
+    with machines_only(cls):
+        return cls.deserialize(data)
@@ -72,3 +72,46 @@ def test_simple_union():
         b = v1.serialize()
         v2 = tc.SingleUnion.deserialize(b)
         assert v1 == v2
+
+
+def reading(i):
+    return tc.MutableReading(id=i, value=2.5, label="l", samples=[i], note=None, level=tc.BasicEnum.Two,
+                             position=tc.AppendableVector(1, 2, 3))
+
+
+key_only_data = [
+    (tc.Keyed(a=1, b=2), tc.Keyed(a=1, b=None)),
+    (tc.Keyed2(a=1, b=2), tc.Keyed2(a=1, b=None)),
+    (tc.FrozenKeyed(id=-7, name="seven"), tc.FrozenKeyed(id=-7, name=None)),
+    (
+        tc.FixedPose(flag=True, id=12, position=tc.Vector(1, 2, 3), levels=[1, 2, 3],
+                     corners=[tc.Vector(1, 2, 3), tc.Vector(4, 5, 6)], state=tc.BasicEnum.One, code='c', stamp=0.5),
+        tc.FixedPose(flag=None, id=12, position=None, levels=None, corners=None, state=None, code=None, stamp=None)
+    ),
+    (
+        tc.MutableKeyHolder(flag=True, reading=reading(3), extra=tc.ExtensibleTelemetry(
+            id=1, d=1.5, names=[], vectors=[], vector_array=[tc.AppendableVector(1, 2, 3)] * 2, reading=reading(4),
+            union=tc.AppendableUnion(a=1), opt=None, char='a'
+        )),
+        tc.MutableKeyHolder(flag=None, reading=tc.MutableReading(
+            id=3, value=None, label=None, samples=None, note=None, level=None, position=None
+        ), extra=None)
+    ),
+]
+
+
+@pytest.mark.parametrize("value,key_only", key_only_data)
+def test_key_only(value, key_only):
+    idl = type(value).__idl__
+    key = idl.key(value)
+    assert len(key) == idl.key_fixed_size <= idl.key_max_size
+    assert key == ddspy_calc_key(idl, value.serialize())
+    assert idl.deserialize_key(b"\0\0\0\0" + key) == key_only
+    # Keys of at most 16 bytes are the keyhash, zero padded
+    assert idl.deserialize_key(b"\0\0\0\0" + idl.keyhash(value)) == key_only
+
+
+@pytest.mark.parametrize("_type", [tc.KeyedNested, tc.SingleString, tc.SingleSequence, tc.EasyUnion])
+def test_key_not_fixed(_type):
+    _type.__idl__.populate()
+    assert _type.__idl__.key_fixed_size is None
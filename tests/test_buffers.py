@@ -0,0 +1,83 @@
+import pytest
+import threading
+import test_classes as tc
+
+from cyclonedds.idl._main import IDL
+from cyclonedds.idl._support import Buffer, BufferPool
+
+
+def test_buffer_grows_for_large_write():
+    buffer = Buffer()
+    data = bytes(range(256)) * 20
+    buffer.write('I', 4, 1)
+    buffer.write_bytes(data)
+    assert buffer.asbytes()[4:] == data
+
+
+def test_buffer_pool_hands_out_distinct_buffers():
+    pool = BufferPool(max_retained=2048)
+    a = pool.acquire()
+    b = pool.acquire()
+    assert a is not b
+
+    pool.release(a)
+    pool.release(b)
+    assert pool.acquire() is b
+
+    big = Buffer(bytes(4096))
+    pool.release(big)
+    assert pool.acquire() is a
+    assert pool.acquire() is not big
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_concurrent_serialization(compiled, monkeypatch):
+    idl = tc.Telemetry.__idl__
+    idl.populate()
+    monkeypatch.setattr(idl, "native_serialize", None)
+    if not compiled:
+        monkeypatch.setattr(idl, "codecs", None)
+
+    samples = [
+        tc.Telemetry(
+            a=i % 100, b=i, position=tc.Vector(i, i, 1), name="x" * (i % 50), arr=[i % 7, 1, 2], seq=[1.0] * (i % 20),
+            vectors=[tc.Vector(1, 2, 3)] * (i % 5), opt=None, enum=tc.BasicEnum.Two, char='x', d=i, blob=b'a' * i,
+            union=tc.EasyUnion(a=i), vector_array=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)]
+        )
+        for i in range(100)
+    ]
+    expected = [s.serialize() for s in samples]
+    errors = []
+
+    def run():
+        for _ in range(20):
+            if [s.serialize() for s in samples] != expected:
+                errors.append("mismatch")
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+
+
+def test_pooled_buffer_output_is_reproducible(monkeypatch):
+    large = tc.Telemetry(
+        a=1, b=2, position=tc.Vector(1, 2, 3), name="x" * 300, arr=[1, 2, 3], seq=[1.0] * 40,
+        vectors=[], opt=None, enum=tc.BasicEnum.One, char='x', d=1, blob=b'\xff' * 300,
+        union=tc.EasyUnion(a=1), vector_array=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)]
+    )
+    small = tc.Telemetry(
+        a=1, b=2, position=tc.Vector(1, 2, 3), name="", arr=[1, 2, 3], seq=[],
+        vectors=[], opt=3, enum=tc.BasicEnum.One, char='x', d=1, blob=b'',
+        union=tc.EasyUnion(a=1), vector_array=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)]
+    )
+    idl = tc.Telemetry.__idl__
+    idl.populate()
+    monkeypatch.setattr(idl, "native_serialize", None)
+    monkeypatch.setattr(IDL, "buffer_pool", BufferPool())
+    first = small.serialize()
+    large.serialize()
+    assert small.serialize() == first
@@ -0,0 +1,110 @@
+import pytest
+import test_classes as tc
+from test_classes import reading, telemetry
+
+from dataclasses import dataclass
+
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import appendable
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+numpy = pytest.importorskip("numpy")
+
+
+def value_of(sample, field):
+    for name in field.split("."):
+        sample = getattr(sample, name)
+    return sample
+
+
+def check_columns(samples, columns):
+    for field, column in columns.items():
+        assert len(column) == len(samples)
+        for sample, value in zip(samples, column):
+            expected = value_of(sample, field)
+            if hasattr(expected, "value") and not isinstance(expected, tc.EasyUnion):
+                expected = expected.value
+            if isinstance(value, numpy.ndarray):
+                assert value.tolist() == list(expected)
+            else:
+                assert value == expected
+
+
+batches = [
+    [telemetry(i) for i in range(10)],
+    [tc.Vector(i, -i, i % 100) for i in range(20)],
+    [tc.AppendableVector(i, -i, i % 100) for i in range(5)],
+    [reading] * 3,
+]
+
+
+@pytest.mark.parametrize("samples", batches)
+def test_columns_all_fields(samples):
+    data = [s.serialize(endianness=Endianness.Little if i % 2 else Endianness.Big) for i, s in enumerate(samples)]
+    columns = type(samples[0]).deserialize_columns(data)
+    check_columns(samples, columns)
+
+
+def test_columns_fields():
+    samples = [telemetry(i) for i in range(10)]
+    columns = tc.Telemetry.deserialize_columns([s.serialize() for s in samples], fields=["d", "position.y", "arr", "name"])
+    assert list(columns) == ["d", "position.y", "arr", "name"]
+    assert columns["position.y"].dtype == numpy.float64
+    assert columns["arr"].shape == (10, 3)
+    assert columns["name"].dtype == object
+    check_columns(samples, columns)
+
+
+def test_columns_fixed_layout_dtypes():
+    samples = [tc.Vector(i, -i, i % 100) for i in range(4)]
+    columns = tc.Vector.deserialize_columns([s.serialize() for s in samples])
+    assert [c.dtype for c in columns.values()] == [numpy.float32, numpy.float64, numpy.int8]
+    # Every member is copied out of the batch at once, nothing is decoded per sample
+    gathered, projection = tc.Vector.__idl__.column_decoders[None].plans[1]
+    assert projection is None and len(gathered) == 3
+
+
+def test_columns_mixed_versions():
+    samples = [telemetry(i) for i in range(6)]
+    data = [s.serialize(use_version_2=bool(i % 2)) for i, s in enumerate(samples)]
+    check_columns(samples, tc.Telemetry.deserialize_columns(data))
+
+
+@dataclass
+@appendable
+class PointV1(IdlStruct, typename="ColumnPoint"):
+    x: pt.int32
+
+
+@dataclass
+@appendable
+class PointV2(IdlStruct, typename="ColumnPoint"):
+    x: pt.int32
+    z: pt.int16
+    tag: str
+    y: pt.float64 = 1.5
+
+
+def test_columns_appendable_versions():
+    # Members appended after the older samples were written get their default or zero value
+    data = [PointV1(1).serialize(), PointV2(2, 3, "t", 4.5).serialize(), PointV1(5).serialize()]
+    columns = PointV2.deserialize_columns(data)
+    assert columns["x"].tolist() == [1, 2, 5]
+    assert columns["z"].tolist() == [0, 3, 0]
+    assert columns["tag"].tolist() == ["", "t", ""]
+    assert columns["y"].tolist() == [1.5, 4.5, 1.5]
+    # x and z are copied out of the batch, tag and y come after a string and are decoded per sample
+    assert [g[0] for g in PointV2.__idl__.column_decoders[None].plans[2][0]] == ["x", "z"]
+
+
+def test_columns_invalid_rows():
+    samples = [tc.Vector(1, 2, 3), tc.Vector(4, 5, 6)]
+    columns = tc.Vector.__idl__.deserialize_columns([s.serialize() for s in samples], valid=[False, True])
+    assert columns["x"].tolist() == [0, 4]
+
+
+def test_columns_empty():
+    columns = tc.Telemetry.deserialize_columns([], fields=["a", "name"])
+    assert len(columns["a"]) == 0 and len(columns["name"]) == 0
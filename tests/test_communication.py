@@ -1,6 +1,12 @@
 import pytest
+import pickle
+import threading
+import time
 
 from cyclonedds.core import Entity, DDSStatus
+from cyclonedds.sub import DataReader
+from cyclonedds._clayer import ddspy_take, SampleLoan
+from cyclonedds.internal import SampleInfo
 
 from  testtopics import Message
 
@@ -35,6 +41,101 @@ def test_communication_order(common_setup):
     assert result[1] == msg2
 
 
+def test_communication_write_many(common_setup):
+    msgs = [Message(message=f"Hi{i}!") for i in range(5)]
+    common_setup.dw.write_many(msgs)
+    result = common_setup.dr.read(N=10)
+
+    assert result == msgs
+
+
+def test_communication_write_serialized(common_setup):
+    msgs = [Message(message=f"Hi{i}!") for i in range(3)]
+    common_setup.dw.write(bytearray(msgs[0].serialize()))
+    common_setup.dw.write(memoryview(msgs[1].serialize()))
+    with Message.__idl__.serialized(msgs[2]) as data:
+        common_setup.dw.write(data)
+
+    assert common_setup.dr.take(N=10) == msgs
+
+    with pytest.raises(TypeError):
+        common_setup.dw.write("Hi!")
+    with pytest.raises(ValueError):
+        common_setup.dw.write(b"\x00")
+
+
+def test_communication_lazy_take(common_setup):
+    msg = Message(message="Hi!")
+    common_setup.dw.write(msg)
+    result = common_setup.dr.take(lazy=True)
+
+    assert len(result) == 1
+    assert result[0].message == "Hi!"
+    assert result[0].sample_info.valid_data
+    assert result[0].materialize() == msg
+
+
+def test_communication_loaned_samples(common_setup):
+    msg = Message(message="Hi!")
+    common_setup.dw.write(msg)
+    (data, info), = ddspy_take(common_setup.dr._ref, 1)
+
+    assert isinstance(data, SampleLoan)
+    assert info.valid_data
+    assert memoryview(data).readonly
+    assert len(data) == len(bytes(data))
+    assert Message.deserialize(data) == msg
+
+
+def test_communication_without_info(common_setup):
+    msg = Message(message="Hi!")
+    common_setup.dw.write(msg)
+    result = common_setup.dr.take(with_info=False)
+
+    assert result == [msg]
+    assert not hasattr(result[0], "sample_info")
+
+
+def test_communication_sample_info(common_setup):
+    common_setup.dw.write(Message(message="Hi!"))
+    info = common_setup.dr.read()[0].sample_info
+
+    assert isinstance(info, SampleInfo)
+    assert info.valid_data
+    assert SampleInfo(*(getattr(info, name) for name in SampleInfo.__match_args__)) == info
+    assert pickle.loads(pickle.dumps(info)) == info
+
+
+def test_communication_reuses_read_buffers(common_setup):
+    msgs = [Message(message=f"Hi{i}!") for i in range(5)]
+    for msg in msgs:
+        common_setup.dw.write(msg)
+
+    assert common_setup.dr.read(N=2) == msgs[:2]
+    assert common_setup.dr.read(N=10) == msgs
+    assert common_setup.dr.take(N=1) == msgs[:1]
+    assert common_setup.dr.take(N=10) == msgs[1:]
+
+
+def test_communication_projection(common_setup):
+    dr = DataReader(common_setup.sub, common_setup.tp, qos=common_setup.qos, projection=["message"])
+    common_setup.dw.write(Message(message="Hi!"))
+    result = dr.take()
+
+    assert result == [("Hi!",)]
+    assert result[0].sample_info.valid_data
+
+
+def test_communication_take_columns(common_setup):
+    pytest.importorskip("numpy")
+    common_setup.dw.write_many([Message(message=f"Hi{i}!") for i in range(3)])
+    columns, infos = common_setup.dr.take_columns(N=10)
+
+    assert list(columns["message"]) == ["Hi0!", "Hi1!", "Hi2!"]
+    assert infos["valid_data"].all()
+    assert len(infos["source_timestamp"]) == 3
+
+
 def test_communication_read_nodestroys(common_setup):
     msg = Message(message="Hi!")
     common_setup.dw.write(msg)
@@ -58,6 +159,27 @@ def test_communication_take_destroys(common_setup):
     assert result1[0] == result2[0] == msg
 
 
+def test_communication_threads(common_setup):
+    msgs = [Message(message=f"Hi{i}!") for i in range(50)]
+
+    def write():
+        for msg in msgs:
+            common_setup.dw.write(msg)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    received = []
+    deadline = time.monotonic() + 10
+    while msgs[-1] not in received and time.monotonic() < deadline:
+        received += common_setup.dr.take(N=10)
+    writer.join()
+
+    # Keep last history may drop samples a slow reader did not get to, but never reorders them
+    indices = [msgs.index(msg) for msg in received]
+    assert indices == sorted(indices)
+    assert indices[-1] == len(msgs) - 1
+
+
 def test_communication_status_mask(common_setup):
     common_setup.dr.set_status_mask(DDSStatus.PublicationMatched)
     status = common_setup.dr.read_status()
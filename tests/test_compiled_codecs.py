@@ -0,0 +1,97 @@
+import pytest
+import test_classes as tc
+import test_rec_classes as trc
+from test_classes import machine_serialize
+
+from dataclasses import dataclass
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import key
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+compiled_test_data = tc.codec_test_data + [trc.CNode(value=0).add(3).add(-2).add(5).add(1)]
+
+
+@pytest.mark.parametrize("value", compiled_test_data)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_compiled_matches_machines(value, endianness, monkeypatch):
+    value.__idl__.populate()
+    assert value.__idl__.codecs is not None
+    monkeypatch.setattr(value.__idl__, "native_serialize", None)
+    monkeypatch.setattr(value.__idl__, "native_deserialize", None)
+
+    data = value.serialize(endianness=endianness)
+    assert data == machine_serialize(value, endianness)
+    assert type(value).deserialize(data) == value
+
+
+def test_compiled_error_falls_back_to_machines():
+    with pytest.raises(Exception, match="Failed to encode member value") as e:
+        tc.SingleBoundedString(value="a" * 11).serialize()
+    assert str(e.value.__cause__) == "String longer than bound."
+
+    with pytest.raises(Exception, match="Failed to encode member value"):
+        tc.SingleUint16(value=-1).serialize()
+
+
+keyed_test_data = [
+    tc.Keyed(a=1, b=2),
+    tc.Keyed2(a=-5, b=2),
+    tc.KeyedNested(
+        id=3, position=tc.Vector(1.5, 2.5, 3), name="héllo", samples=[1.0, 2.0],
+        keyed=[tc.Keyed(a=1, b=2), tc.Keyed(a=3, b=4)], flag=None
+    ),
+    tc.KeyedNested(
+        id=-1, position=tc.Vector(0, 0, 0), name="", samples=[],
+        keyed=[tc.Keyed(a=0, b=0), tc.Keyed(a=0, b=0)], flag=7
+    ),
+    tc.FrozenKeyed(id=12, name="frozen"),
+]
+
+
+@pytest.mark.parametrize("value", keyed_test_data)
+def test_compiled_key_matches_machines(value):
+    idl = value.__idl__
+    idl.populate()
+    assert idl.key_codec is not None
+
+    key = idl.key(value)
+    codec, idl.key_codec = idl.key_codec, None
+    try:
+        assert key == idl.key(value)
+    finally:
+        idl.key_codec = codec
+
+
+def test_keyhash_memo():
+    idl = tc.FrozenKeyed.__idl__
+    value = tc.FrozenKeyed(id=1, name="a")
+    keyhash = idl.keyhash(value)
+    assert idl.keyhash(value) is keyhash
+    assert "__idl_keyhash__" not in value.__dict__
+    assert idl.keyhash(tc.FrozenKeyed(id=2, name="a")) != keyhash
+
+    # Entries go with their samples
+    key = id(value)
+    assert key in idl.keyhash_memo
+    del value
+    assert key not in idl.keyhash_memo
+
+    tc.Keyed.__idl__.keyhash(tc.Keyed(a=1, b=2))
+    assert tc.Keyed.__idl__.keyhash_memo is None
+
+
+@dataclass(frozen=True)
+class FrozenSequenceKey(IdlStruct):
+    ids: pt.sequence[pt.int32]
+    key(ids)
+
+
+def test_keyhash_memo_mutable_key():
+    # A frozen sample still holds a list, which can change under it
+    value = FrozenSequenceKey(ids=[1])
+    keyhash = FrozenSequenceKey.__idl__.keyhash(value)
+    value.ids.append(2)
+    assert FrozenSequenceKey.__idl__.keyhash(value) != keyhash
+    assert FrozenSequenceKey.__idl__.keyhash_memo is None
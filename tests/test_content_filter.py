@@ -0,0 +1,114 @@
+import pytest
+import test_classes as tc
+from test_classes import telemetry
+
+from cyclonedds.idl._support import Endianness
+from cyclonedds._clayer import ddspy_content_filter_create, ddspy_content_filter_eval
+
+
+def extensible(i):
+    return tc.ExtensibleTelemetry(
+        id=-i, d=i * 1.5, names=["x"] * (i % 3), vectors=[tc.Vector(1, 2, 3)] * (i % 2),
+        vector_array=[tc.AppendableVector(1, 2, 3), tc.AppendableVector(4, 5, i)],
+        reading=tc.MutableReading(id=i, value=2.5, label="l" * i, samples=[i], note=None, level=tc.BasicEnum.Two,
+                                  position=tc.AppendableVector(1, 2, 3)),
+        union=tc.AppendableUnion(a=i), opt=i if i % 3 else None, char="ab"[i % 2]
+    )
+
+
+def encodings(value):
+    for endianness in (Endianness.Little, Endianness.Big):
+        for version_2 in (False, True):
+            if not version_2 and value.__idl__.requires_version_2:
+                continue
+            yield value.serialize(endianness=endianness, use_version_2=version_2)
+
+
+def check(cls, samples, expr, expected, params=()):
+    content_filter = cls.__idl__.content_filter(expr, params)
+    native = ddspy_content_filter_create(content_filter.fields, content_filter.ops)
+    for sample in samples:
+        for data in encodings(sample):
+            assert ddspy_content_filter_eval(native, data) == expected(sample), (expr, sample, data)
+
+
+@pytest.mark.parametrize("expr, expected, params", [
+    ("b > 30", lambda s: s.b > 30, ()),
+    ("b >= 30 AND a < 40", lambda s: s.b >= 30 and s.a < 40, ()),
+    ("30 < b", lambda s: s.b > 30, ()),
+    ("NOT (b = 3 OR b = %0)", lambda s: s.b not in (3, 7), (7,)),
+    ("position.x >= 10.5", lambda s: s.position.x >= 10.5, ()),
+    ("position.y < -20", lambda s: s.position.y < -20, ()),
+    ("position.z <> 1", lambda s: s.position.z != 1, ()),
+    ("b > 12.5", lambda s: s.b > 12.5, ()),
+    ("name = 'nnn'", lambda s: s.name == "nnn", ()),
+    ("name < %0", lambda s: s.name < "nn", ("nn",)),
+    ("opt > 5", lambda s: s.opt is not None and s.opt > 5, ()),
+    ("NOT opt > 5", lambda s: not (s.opt is not None and s.opt > 5), ()),
+    ("enum = 'Two'", lambda s: s.enum == tc.BasicEnum.Two, ()),
+    ("enum >= %0", lambda s: s.enum >= tc.BasicEnum.Two, (tc.BasicEnum.Two,)),
+    ("char = 'y'", lambda s: s.char == "y", ()),
+    ("d > 18446744073709551600", lambda s: s.d > 18446744073709551600, ()),
+    ("d > -1", lambda s: True, ()),
+    ("vector_array.x = 1", None, ()),
+])
+def test_content_filter_telemetry(expr, expected, params):
+    if expected is None:
+        with pytest.raises(ValueError):
+            tc.Telemetry.__idl__.content_filter(expr, params)
+        return
+    check(tc.Telemetry, [telemetry(i) for i in range(40)], expr, expected, params)
+
+
+def test_content_filter_extensible():
+    samples = [extensible(i) for i in range(10)]
+    check(tc.ExtensibleTelemetry, samples, "id > -5 AND d < 9", lambda s: s.id > -5 and s.d < 9)
+    check(tc.ExtensibleTelemetry, samples, "opt <= 4 OR char = 'a'",
+          lambda s: (s.opt is not None and s.opt <= 4) or s.char == "a")
+
+
+def test_content_filter_bool():
+    samples = [tc.FixedPose(flag=i % 2 == 0, id=i, position=tc.Vector(1, 2, 3), levels=[i, 1, 2],
+                            corners=[tc.Vector(1, 2, 3), tc.Vector(i, i, i)], state=tc.BasicEnum.One, code='c',
+                            stamp=i * 0.25) for i in range(6)]
+    check(tc.FixedPose, samples, "flag = TRUE AND stamp > 0.25", lambda s: s.flag and s.stamp > 0.25)
+
+
+@pytest.mark.parametrize("expr, params", [
+    ("b >", ()),
+    ("b > 1 AND", ()),
+    ("(b > 1", ()),
+    ("b > %0", ()),
+    ("b = a", ()),
+    ("1 = 1", ()),
+    ("missing = 1", ()),
+    ("name = 1", ()),
+    ("b = 'x'", ()),
+    ("char = 'xy'", ()),
+    ("enum = 'Four'", ()),
+    ("seq = 1", ()),
+    ("b = 1 $", ()),
+])
+def test_content_filter_invalid(expr, params):
+    with pytest.raises(ValueError):
+        tc.Telemetry.__idl__.content_filter(expr, params)
+
+
+def test_content_filter_mutable():
+    with pytest.raises(ValueError):
+        tc.MutableReading.__idl__.content_filter("id = 1")
+
+
+def test_content_filter_not_struct():
+    with pytest.raises(TypeError):
+        tc.EasyUnion.__idl__.content_filter("a = 1")
+
+
+def test_content_filter_truncated():
+    content_filter = tc.Telemetry.__idl__.content_filter("NOT name = 'x' AND NOT d = 1")
+    native = ddspy_content_filter_create(content_filter.fields, content_filter.ops)
+    data = telemetry(3).serialize()
+    assert ddspy_content_filter_eval(native, data)
+    # Samples that end before the members do match nothing, negated comparisons neither
+    results = [ddspy_content_filter_eval(native, data[:size]) for size in range(len(data) + 1)]
+    assert results == sorted(results) and not any(results[:24])
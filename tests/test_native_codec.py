@@ -0,0 +1,56 @@
+import pytest
+import test_classes as tc
+import test_rec_classes as trc
+from test_classes import machine_serialize, machine_deserialize
+
+from cyclonedds.idl._support import Endianness
+
+
+native_test_data = tc.codec_test_data + [
+    trc.CNode(value=0).add(3).add(-2).add(5).add(1),
+    trc.Node(
+        left=trc.OptNode(node=trc.Node(left=trc.OptNode(nothing=None), right=trc.OptNode(nothing=None), value=1)),
+        right=trc.OptNode(nothing=None),
+        value=2
+    )
+]
+
+
+@pytest.mark.parametrize("value", native_test_data)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_native_matches_machines(value, endianness):
+    value.__idl__.populate()
+    assert value.__idl__.native_serialize is not None
+
+    data = value.serialize(endianness=endianness)
+    assert data == machine_serialize(value, endianness)
+    assert type(value).deserialize(data) == value
+    assert machine_deserialize(type(value), data) == value
+
+
+def test_native_error_falls_back_to_machines():
+    with pytest.raises(Exception, match="Failed to encode member value") as e:
+        tc.SingleBoundedString(value="a" * 11).serialize()
+    assert str(e.value.__cause__) == "String longer than bound."
+
+    with pytest.raises(Exception, match="Failed to encode member value"):
+        tc.SingleUint16(value=-1).serialize()
+
+
+class Unconvertible:
+    calls = 0
+
+    def __index__(self):
+        Unconvertible.calls += 1
+        raise RuntimeError("Not a number.")
+
+
+@pytest.mark.parametrize("path", ["native", "compiled"])
+def test_codec_failure_is_not_rerun(path, monkeypatch):
+    if path == "compiled":
+        monkeypatch.setattr(tc.SingleInt.__idl__, "native_serialize", None)
+    Unconvertible.calls = 0
+    with pytest.raises(RuntimeError, match="Not a number."):
+        tc.SingleInt(value=Unconvertible()).serialize()
+    # Only errors about values the codec does not handle are retried on the machines
+    assert Unconvertible.calls == 1
@@ -58,3 +58,43 @@ def test_querycondition_read(common_setup):
     received = common_setup.dr.read(condition=qc)
 
     assert len(received) == 1 and received[0] == messages[5]
+
+
+def test_querycondition_expression(common_setup):
+    qc = QueryCondition(
+        common_setup.dr,
+        SampleState.Any | ViewState.Any | InstanceState.Any,
+        expr="message = %0 OR message > 'Hi 3'",
+        params=["Goodbye"]
+    )
+
+    messages = [Message(message=f"Hi {i}!") for i in range(5)] + [Message(message="Goodbye")]
+    for m in messages:
+        common_setup.dw.write(m)
+
+    received = common_setup.dr.read(N=10, condition=qc)
+
+    assert received == [messages[3], messages[4], messages[5]]
+
+
+def test_querycondition_expression_many(common_setup):
+    # More conditions than there are native filter functions, the rest filter through a callback
+    conditions = [
+        QueryCondition(common_setup.dr, SampleState.Any | ViewState.Any | InstanceState.Any,
+                       expr="message = %0", params=[f"Hi {i}!"])
+        for i in range(40)
+    ]
+
+    messages = [Message(message=f"Hi {i}!") for i in range(40)]
+    for m in messages:
+        common_setup.dw.write(m)
+
+    for i, qc in enumerate(conditions):
+        assert common_setup.dr.read(N=50, condition=qc) == [messages[i]]
+
+
+def test_querycondition_expression_invalid(common_setup):
+    with pytest.raises(ValueError):
+        QueryCondition(common_setup.dr, SampleState.Any | ViewState.Any | InstanceState.Any, expr="missing = 1")
+    with pytest.raises(ValueError):
+        QueryCondition(common_setup.dr, SampleState.Any | ViewState.Any | InstanceState.Any)
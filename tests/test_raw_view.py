@@ -0,0 +1,66 @@
+import pytest
+import test_classes as tc
+
+from cyclonedds.idl import RawView
+from cyclonedds.idl._support import Endianness
+
+
+pose = tc.FixedPose(
+    flag=True, id=42, position=tc.Vector(1.5, 2.5, -3), levels=[1, -2, 3],
+    corners=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)], state=tc.BasicEnum.Two, code='q', stamp=12.25
+)
+
+
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+@pytest.mark.parametrize("use_version_2", [False, True])
+def test_raw_view_read(endianness, use_version_2):
+    view = tc.FixedPose.raw_view(pose.serialize(endianness=endianness, use_version_2=use_version_2))
+    assert isinstance(view, RawView)
+    for member in pose.__dataclass_fields__:
+        if member not in ("position", "corners"):
+            assert getattr(view, member) == getattr(pose, member)
+    assert view.position.y == 2.5
+    assert view.corners[1].x == 1
+    assert view.position == pose.position
+    assert view.materialize() == pose
+
+
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+@pytest.mark.parametrize("use_version_2", [False, True])
+def test_raw_view_patch(endianness, use_version_2):
+    data = bytearray(pose.serialize(endianness=endianness, use_version_2=use_version_2))
+    view = tc.FixedPose.raw_view(data)
+    view.stamp = 13.5
+    view.position.x = -1
+    view.set_field("levels", [7, 8, 9])
+    view.set_field("corners.1.z", 5)
+    view.set_field("state", tc.BasicEnum.Three)
+    view.set_field("code", 'r')
+
+    expected = tc.FixedPose(
+        flag=True, id=42, position=tc.Vector(-1, 2.5, -3), levels=[7, 8, 9],
+        corners=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 5)], state=tc.BasicEnum.Three, code='r', stamp=13.5
+    )
+    assert tc.FixedPose.deserialize(view.serialize()) == expected
+    assert bytes(data) == expected.serialize(endianness=endianness, use_version_2=use_version_2)
+
+
+def test_raw_view_fixed_layout_table():
+    table = tc.FixedPose.__idl__.fixed_layouts[1]
+    assert table["flag"][0] == 0 and table["id"][0] == 4
+    # Doubles are aligned to 8 in XCDR1 and to 4 in XCDR2
+    assert table["position.y"][0] == 16
+    assert tc.FixedPose.__idl__.fixed_layouts[2]["position.y"][0] == 12
+    assert tc.Telemetry.__idl__.fixed_layouts[1] is None
+    assert tc.AppendableVector.__idl__.fixed_layouts[2] is None
+
+
+def test_raw_view_unsupported():
+    with pytest.raises(TypeError):
+        tc.SingleString.raw_view(tc.SingleString(value="x").serialize())
+    view = tc.FixedPose.raw_view(pose.serialize())
+    with pytest.raises(AttributeError):
+        view.set_field("position", tc.Vector(0, 0, 0))
+    with pytest.raises(TypeError):
+        # Serialized data in bytes is read-only
+        view.stamp = 1.0
@@ -0,0 +1,136 @@
+import pytest
+import test_classes as tc
+from test_classes import reading, telemetry
+
+from dataclasses import dataclass
+from typing import Optional
+
+from cyclonedds.idl import IdlStruct, SampleView, ProjectedSample
+from cyclonedds.idl.annotations import appendable
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+view_test_data = [
+    telemetry(0),
+    telemetry(3),
+    tc.AppendableVector(1.5, 2.5, -3),
+    reading,
+    tc.ExtensibleTelemetry(
+        id=5, d=1.5, names=["a", "bc"], vectors=[tc.Vector(1, 2, 3)],
+        vector_array=[tc.AppendableVector(1, 2, 3), tc.AppendableVector(0, 0, 0)],
+        reading=reading, union=tc.AppendableUnion(b="hi"), opt=None, char='z'
+    ),
+]
+
+
+@pytest.mark.parametrize("value", view_test_data)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+@pytest.mark.parametrize("order", ["forward", "backward"])
+def test_sample_view_members(value, endianness, order):
+    view = type(value).deserialize(value.serialize(endianness=endianness), lazy=True)
+    assert isinstance(view, SampleView)
+
+    members = list(value.__dataclass_fields__)
+    for member in (members if order == "forward" else reversed(members)):
+        assert getattr(view, member) == getattr(value, member)
+    assert view.materialize() == value
+    assert view == value
+
+
+def test_sample_view_decodes_on_access():
+    view = tc.Telemetry.deserialize(telemetry(3).serialize(), lazy=True)
+    assert "name" not in view.__dict__
+    assert view.name == "ééé"
+    assert "name" in view.__dict__
+    # Only the member that was asked for is decoded
+    assert "seq" not in view.__dict__ and "a" not in view.__dict__
+
+
+def test_sample_view_xcdr1():
+    value = tc.Vector(1, 2, 3)
+    view = tc.Vector.deserialize(value.serialize(use_version_2=True), lazy=True)
+    assert view.z == 3 and view.y == 2
+    assert tc.Vector.deserialize(value.serialize(), lazy=True).y == 2
+
+
+def test_sample_view_unknown_member():
+    view = tc.Vector.deserialize(tc.Vector(1, 2, 3).serialize(), lazy=True)
+    with pytest.raises(AttributeError):
+        view.w
+
+
+def test_sample_view_sample_info():
+    view = tc.Vector.deserialize(tc.Vector(1, 2, 3).serialize(), lazy=True)
+    view.sample_info = "info"
+    assert view.sample_info == "info"
+
+
+def test_sample_view_union_is_decoded():
+    value = tc.EasyUnion(a=3)
+    assert tc.EasyUnion.deserialize(value.serialize(), lazy=True) == value
+
+
+@dataclass
+@appendable
+class ShapeV1(IdlStruct, typename="ViewShape"):
+    x: pt.int32
+    y: pt.float64
+
+
+@dataclass
+@appendable
+class ShapeV2(IdlStruct, typename="ViewShape"):
+    x: pt.int32
+    y: pt.float64
+    note: Optional[str]
+    sizes: pt.sequence[pt.int64]
+
+
+def test_sample_view_appendable_versions():
+    view = ShapeV2.deserialize(ShapeV1(x=1, y=2.5).serialize(), lazy=True)
+    assert view.y == 2.5
+    assert view.note is None
+    # Appended after the sample was written and not optional
+    assert view.sizes == []
+
+    view = ShapeV1.deserialize(ShapeV2(x=1, y=2.5, note="n", sizes=[1]).serialize(), lazy=True)
+    assert view.y == 2.5 and view.x == 1
+
+
+@pytest.mark.parametrize("value", view_test_data)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_projection_members(value, endianness):
+    data = value.serialize(endianness=endianness)
+    members = list(value.__dataclass_fields__)
+    for fields in ([members[0]], [members[-1]], members[::-2], members):
+        projected = type(value).deserialize(data, fields=fields)
+        assert isinstance(projected, ProjectedSample)
+        assert projected == tuple(getattr(value, member) for member in fields)
+
+
+def test_projection_nested():
+    value = telemetry(3)
+    assert tc.Telemetry.deserialize(value.serialize(), fields=["d", "position.y", "a"]) == (value.d, -0.5, 3)
+    value = view_test_data[-1]
+    assert tc.ExtensibleTelemetry.deserialize(value.serialize(), fields=["reading.position.z", "opt", "reading.id"]) == \
+        (6, None, 7)
+
+
+def test_projection_invalid_fields():
+    with pytest.raises(TypeError):
+        tc.Telemetry.deserialize(telemetry(1).serialize(), fields=["nope"])
+    with pytest.raises(TypeError):
+        tc.Telemetry.deserialize(telemetry(1).serialize(), fields=["name.x"])
+    with pytest.raises(TypeError):
+        tc.Telemetry.deserialize(telemetry(1).serialize(), fields=["position", "position.x"])
+    with pytest.raises(TypeError):
+        tc.Telemetry.deserialize(telemetry(1).serialize(), fields=[])
+
+
+def test_projection_appendable_versions():
+    data = ShapeV1(x=1, y=2.5).serialize()
+    assert ShapeV2.deserialize(data, fields=["note", "x"]) == (None, 1)
+    assert ShapeV2.deserialize(data, fields=["sizes"]) == ([],)
+    data = ShapeV2(x=1, y=2.5, note="n", sizes=[1]).serialize()
+    assert ShapeV1.deserialize(data, fields=["y"]) == (2.5,)
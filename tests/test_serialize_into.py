@@ -0,0 +1,139 @@
+import mmap
+import pytest
+import test_classes as tc
+import test_rec_classes as trc
+
+from cyclonedds.idl._support import Endianness
+
+
+sized_test_data = [
+    tc.SingleInt(value=1000),
+    tc.SingleString(value="Hello, World! ñ €"),
+    tc.SingleSequence(value=[0, 1] * 100),
+    tc.SingleArray(value=[0, 1, 2]),
+    tc.SingleBoundedSequence(value=[100, 1]),
+    tc.SingleBoundedString(value="0123456789"),
+    tc.SingleUnion(value=tc.EasyUnion(b=True)),
+    tc.AllPrimitives(),
+    tc.Telemetry(
+        a=1, b=2, position=tc.Vector(1.5, 2.5, 3), name="héllo", arr=[1, 2, 3], seq=[1.0, 2.0],
+        vectors=[tc.Vector(1, 2, 3)], opt=None, enum=tc.BasicEnum.Two, char='x', d=5, blob=b'abc',
+        union=tc.EasyUnion(a=3), vector_array=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)]
+    ),
+    tc.Telemetry(
+        a=-1, b=0, position=tc.Vector(0, 0, 0), name="", arr=[0, 0, 0], seq=[],
+        vectors=[], opt=7, enum=tc.BasicEnum.One, char='y', d=0, blob=b'',
+        union=tc.EasyUnion(b=False), vector_array=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)]
+    ),
+    trc.CNode(value=0).add(3).add(-2).add(5).add(1),
+]
+
+
+@pytest.fixture(params=["native", "python"])
+def path(request, monkeypatch):
+    if request.param == "python":
+        for value in sized_test_data:
+            monkeypatch.setattr(value.__idl__, "native_serialize_into", None)
+    return request.param
+
+
+@pytest.mark.parametrize("value", sized_test_data)
+def test_serialized_size(value):
+    assert value.serialized_size() == len(value.serialize())
+
+
+@pytest.mark.parametrize("value", sized_test_data)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_serialize_into(value, endianness, path):
+    data = value.serialize(endianness=endianness)
+    target = bytearray(7 + len(data) + 5)
+
+    assert value.serialize_into(target, 7, endianness=endianness) == len(data)
+    assert target[7:7 + len(data)] == data
+    assert target[:7] == bytes(7) and target[7 + len(data):] == bytes(5)
+
+
+@pytest.mark.parametrize("value", sized_test_data)
+@pytest.mark.parametrize("version_2", [False, True])
+def test_serialize_into_zeroes_padding(value, version_2, path, monkeypatch):
+    data = value.serialize(use_version_2=version_2)
+    for codecs in (True, False):
+        if not codecs:
+            monkeypatch.setattr(value.__idl__, "codecs", None)
+            monkeypatch.setattr(value.__idl__, "codecs_v2", None)
+        target = bytearray(b'\xff' * (len(data) + 3))
+        assert value.serialize_into(target, 1, use_version_2=version_2) == len(data)
+        assert target == b'\xff' + data + b'\xff\xff'
+
+
+def test_serialize_into_mmap(path):
+    samples = sized_test_data[:8]
+    region = mmap.mmap(-1, sum(s.serialized_size() for s in samples))
+    offset = 0
+    for sample in samples:
+        offset += sample.serialize_into(region, offset)
+
+    assert offset == len(region)
+    offset = 0
+    for sample in samples:
+        size = sample.serialized_size()
+        assert type(sample).deserialize(region[offset:offset + size]) == sample
+        offset += size
+
+
+def test_serialize_into_too_small(path):
+    value = sized_test_data[2]
+    with pytest.raises(Exception):
+        value.serialize_into(bytearray(value.serialized_size() - 1))
+    with pytest.raises(Exception):
+        value.serialize_into(bytes(1000))
+
+
+def test_max_serialized_size():
+    assert tc.SingleInt.max_serialized_size() == 4 + 8
+    assert tc.SingleArray.max_serialized_size() == 4 + 6
+    assert tc.SingleBoundedSequence.max_serialized_size() == 4 + 4 + 4 + 3 * 8
+    assert tc.AllPrimitives.max_serialized_size() == len(tc.AllPrimitives().serialize())
+    assert tc.SingleBoundedString.max_serialized_size() >= len(tc.SingleBoundedString(value="€" * 10).serialize())
+    assert tc.SingleUnion.max_serialized_size() == 4 + 4 + 4 + 8
+    assert tc.SingleString.max_serialized_size() is None
+    assert tc.Telemetry.max_serialized_size() is None
+    assert trc.CNode.max_serialized_size() is None
+
+
+@pytest.mark.parametrize("value", sized_test_data)
+@pytest.mark.parametrize("native", [True, False])
+def test_serialized(value, native, monkeypatch):
+    if not native:
+        monkeypatch.setattr(value.__idl__, "native_serialize", None)
+    with value.__idl__.serialized(value) as data:
+        assert bytes(data) == value.serialize()
+        assert memoryview(data).readonly
+
+    if not native:
+        # The view of the pooled buffer ends with the block
+        with pytest.raises(ValueError):
+            bytes(data)
+
+
+def test_serialized_releases_on_error(monkeypatch):
+    value = tc.SingleString(value="abc")
+    monkeypatch.setattr(value.__idl__, "native_serialize", None)
+    with pytest.raises(KeyError):
+        with value.__idl__.serialized(value):
+            raise KeyError()
+    # The buffer went back to the pool and is handed out again
+    assert value.__idl__.buffer_pool._local.free
+
+
+@pytest.mark.parametrize("value", sized_test_data)
+def test_fits_serialized_size(value):
+    idl = value.__idl__
+    for version_2 in ([False, True] if not idl.requires_version_2 else [True]):
+        size = len(value.serialize(use_version_2=version_2))
+        version = 2 if version_2 else 1
+        assert idl.fits_serialized_size(size, version)
+        fixed = idl.fixed_layouts[version] is not None and not idl.version_2
+        assert idl.fits_serialized_size(size - 1, version) != fixed
+        if idl.max_sizes[version] is not None:
+            assert idl.fits_serialized_size(idl.max_sizes[version] + 4, version) == idl.version_2
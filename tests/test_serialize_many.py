@@ -0,0 +1,133 @@
+import pytest
+import test_classes as tc
+import test_rec_classes as trc
+from test_classes import telemetry
+
+from array import array
+from cyclonedds.idl._support import Endianness
+
+
+batches = [
+    [tc.SingleInt(value=i) for i in range(10)],
+    [tc.SingleString(value="x" * i) for i in range(10)],
+    [telemetry(i) for i in range(25)],
+    [trc.CNode(value=0).add(i).add(-i) for i in range(5)],
+    [tc.Blob(name="b" * i, payload=b'x' * i, checksum=i, copied=b'y' * i) for i in range(5)],
+]
+
+keyed_batches = [
+    [tc.Keyed2(a=i, b=-i) for i in range(10)],
+    [tc.FixedPose(flag=True, id=i, position=tc.Vector(i, 2, 3), levels=[i, 1, 2],
+                  corners=[tc.Vector(1, 2, 3), tc.Vector(i, i, i)], state=tc.BasicEnum.One, code='c', stamp=1.5)
+     for i in range(10)],
+    [tc.KeyedNested(id=i, position=tc.Vector(1, i, 3), name="k" * i, samples=[1.0] * i,
+                    keyed=[tc.Keyed(a=i, b=1), tc.Keyed(a=2, b=i)], flag=i if i % 2 else None) for i in range(10)],
+    [tc.MutableReading(id=i, value=2.5, label="l" * i, samples=[i], note=None, level=tc.BasicEnum.Two,
+                       position=tc.AppendableVector(1, 2, 3)) for i in range(10)],
+    [tc.HashedMembers(name="n" * i, count=i, weights=[1.0, 2.0]) for i in range(10)],
+]
+
+
+@pytest.fixture(params=["native", "python"])
+def path(request, monkeypatch):
+    if request.param == "python":
+        for batch in batches + keyed_batches:
+            idl = type(batch[0]).__idl__
+            idl.populate()
+            monkeypatch.setattr(idl, "native_serialize_many", None)
+            monkeypatch.setattr(idl, "native_deserialize_many", None)
+            monkeypatch.setattr(idl, "key_vm", False)
+    return request.param
+
+
+@pytest.mark.parametrize("samples", batches)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_serialize_many(samples, endianness, path):
+    cls = type(samples[0])
+    data, offsets = cls.serialize_many(samples, endianness=endianness)
+
+    assert isinstance(offsets, array) and len(offsets) == len(samples) + 1
+    for i, sample in enumerate(samples):
+        assert data[offsets[i]:offsets[i + 1]] == sample.serialize(endianness=endianness)
+
+    assert cls.deserialize_many(data, offsets) == samples
+    assert cls.deserialize_many(data, list(offsets)) == samples
+
+
+def test_serialize_many_empty(path):
+    data, offsets = tc.SingleInt.serialize_many([])
+    assert data == b'' and list(offsets) == [0]
+    assert tc.SingleInt.deserialize_many(data, offsets) == []
+
+
+def test_deserialize_many_bad_offsets(path):
+    data, offsets = tc.SingleInt.serialize_many([tc.SingleInt(value=1)])
+    with pytest.raises(Exception):
+        tc.SingleInt.deserialize_many(data, [0, len(data) + 100])
+
+
+@pytest.mark.parametrize("samples", batches + keyed_batches)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_key_many(samples, endianness, path):
+    idl = type(samples[0]).__idl__
+    data, offsets = type(samples[0]).serialize_many(samples, endianness=endianness)
+    separate = [data[offsets[i]:offsets[i + 1]] for i in range(len(samples))]
+
+    for args in ((data, offsets), (data, list(offsets)), (separate,)):
+        keys, key_offsets = idl.key_many(*args)
+        assert isinstance(key_offsets, array) and len(key_offsets) == len(samples) + 1
+        assert [keys[key_offsets[i]:key_offsets[i + 1]] for i in range(len(samples))] == [idl.key(s) for s in samples]
+        assert idl.keyhash_many(*args) == b"".join(idl.keyhash(s) for s in samples)
+
+
+def test_keyhash_many_numpy(path):
+    pytest.importorskip("numpy")
+    samples = keyed_batches[2]
+    idl = tc.KeyedNested.__idl__
+    keyhashes = idl.keyhash_many(*tc.KeyedNested.serialize_many(samples), as_numpy=True)
+    assert keyhashes.shape == (len(samples), 16)
+    assert [bytes(row) for row in keyhashes] == [idl.keyhash(s) for s in samples]
+
+
+def test_key_many_bad_samples(path):
+    data, offsets = tc.Keyed2.serialize_many([tc.Keyed2(a=1, b=2)])
+    with pytest.raises(Exception):
+        tc.Keyed2.__idl__.key_many(data, [0, len(data) + 100])
+    with pytest.raises(Exception):
+        tc.Keyed2.__idl__.keyhash_many([data[:2]])
+
+
+@pytest.mark.parametrize("sample", [keyed_batches[2][3], keyed_batches[3][3], keyed_batches[4][3]])
+def test_key_many_truncated_samples(sample, path):
+    idl = type(sample).__idl__
+    data = sample.serialize()
+    assert idl.keyhash_many([data]) == idl.keyhash(sample)
+
+    # Every sample that ends before its key does is rejected, not read past its end
+    for size in range(len(data)):
+        with pytest.raises(ValueError):
+            idl.key_many([data[:size]])
+        with pytest.raises(ValueError):
+            idl.keyhash_many(data[:size] + data, [0, size, size + len(data)])
+
+
+def test_key_many_bad_string_length(path):
+    data = bytearray(tc.HashedMembers(name="abc", count=1, weights=[1.0, 2.0]).serialize())
+    data[4:8] = b'\xff\xff\xff\x7f' if data[1] & 1 else b'\x7f\xff\xff\xff'
+    with pytest.raises(ValueError):
+        tc.HashedMembers.__idl__.key_many([bytes(data)])
+
+
+def test_key_vm_errors_propagate(monkeypatch):
+    import cyclonedds._clayer
+
+    def failing(idl, md5):
+        raise ValueError("no key vm")
+
+    idl = tc.Keyed2.__idl__
+    idl.populate()
+    monkeypatch.setattr(idl, "key_vm", None)
+    monkeypatch.setattr(cyclonedds._clayer, "ddspy_key_vm_create", failing)
+    with pytest.raises(ValueError, match="no key vm"):
+        idl.keyhash_many([tc.Keyed2(a=1, b=2).serialize()])
+    assert idl.key_vm is None
@@ -3,9 +3,11 @@ import pytest
 from cyclonedds.core import Entity
 from cyclonedds.domain import DomainParticipant
 from cyclonedds.topic import Topic
+from cyclonedds.pub import DataWriter
+from cyclonedds.sub import DataReader
 from cyclonedds.util import isgoodentity
 
-from  testtopics import Message
+from  testtopics import Message, MessageKeyed
 
 
 def test_create_topic():
@@ -26,3 +28,21 @@ def test_get_type_name():
     tp = Topic(dp, 'MessageTopic', Message)
 
     assert tp.typename == tp.get_type_name() == 'Message'
+
+
+def test_topics_share_key_vm():
+    participants = [DomainParticipant(0), DomainParticipant(0), DomainParticipant(1)]
+    topics = [Topic(dp, f"MessageKeyed{i}", MessageKeyed) for i in range(3) for dp in participants]
+    assert all(isgoodentity(tp) for tp in topics)
+
+    # Compiled once for the type, whatever the number of topics and domains
+    key_vm = MessageKeyed.__idl__.key_vm
+    assert key_vm
+    Topic(participants[2], "MessageKeyedMore", MessageKeyed)
+    assert MessageKeyed.__idl__.key_vm is key_vm
+
+    msg = MessageKeyed(user_id=3, message="Hello")
+    dr = DataReader(participants[2], topics[-1])
+    dw = DataWriter(participants[2], topics[-1])
+    dw.write(msg)
+    assert dr.read() == [msg]
@@ -0,0 +1,89 @@
+import array
+import pytest
+import test_classes as tc
+
+from dataclasses import dataclass
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import typed_array
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+paths = ["machines", "compiled", "native"]
+
+
+@pytest.fixture(params=paths)
+def path(request, monkeypatch):
+    idl = tc.Waveform.__idl__
+    idl.populate()
+    if request.param == "native" and idl.native_serialize is None:
+        pytest.skip("C layer not available")
+    if request.param != "native":
+        monkeypatch.setattr(idl, "native_serialize", None)
+        monkeypatch.setattr(idl, "native_deserialize", None)
+    if request.param == "machines":
+        monkeypatch.setattr(idl, "codecs", None)
+    return request.param
+
+
+def waveform(samples, levels, raw):
+    return tc.Waveform(channel=3, samples=samples, levels=levels, gains=[1.0, 0.5, 0.25], raw=raw, flags=[True, False])
+
+
+def as_lists(sample):
+    return (list(sample.samples), list(sample.levels), list(sample.raw), sample.flags)
+
+
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_typed_array_accepts_array_array(path, endianness):
+    samples = [i * 0.5 for i in range(1000)]
+    levels = list(range(-50, 50))
+    raw = list(range(-200, 200))
+
+    reference = waveform(samples, levels, raw).serialize(endianness=endianness)
+    typed = waveform(array.array('d', samples), array.array('i', levels), array.array('h', raw))
+    data = typed.serialize(endianness=endianness)
+    assert data == reference
+
+    decoded = tc.Waveform.deserialize(data)
+    assert as_lists(decoded) == (samples, levels, raw, [True, False])
+    assert type(decoded.raw) == list
+
+
+def test_typed_array_produces_typed_values(path):
+    data = waveform([1.0, 2.0], list(range(100)), [1, 2]).serialize(endianness=Endianness.Big)
+    decoded = tc.Waveform.deserialize(data)
+    assert not isinstance(decoded.samples, list)
+    assert not isinstance(decoded.levels, list)
+    assert list(decoded.samples) == [1.0, 2.0]
+    assert list(decoded.levels) == list(range(100))
+
+    empty = tc.Waveform.deserialize(waveform([], list(range(100)), []).serialize())
+    assert len(empty.samples) == 0 and not isinstance(empty.samples, list)
+
+
+def test_typed_array_numpy(path):
+    numpy = pytest.importorskip("numpy")
+    samples = numpy.linspace(0, 1, 100_000)
+    levels = numpy.arange(100, dtype='>i4')
+    raw = numpy.arange(-10, 10, dtype=numpy.int16)
+
+    for endianness in (Endianness.Little, Endianness.Big):
+        data = waveform(samples, levels, raw).serialize(endianness=endianness)
+        assert data == waveform(list(samples), list(levels), list(raw)).serialize(endianness=endianness)
+
+        decoded = tc.Waveform.deserialize(data)
+        assert isinstance(decoded.samples, numpy.ndarray) and decoded.samples.dtype.isnative
+        assert (decoded.samples == samples).all()
+        assert (decoded.levels == levels).all()
+        assert decoded.raw == list(raw)
+
+
+def test_typed_array_requires_primitives():
+    @dataclass
+    class NotPrimitive(IdlStruct):
+        names: pt.sequence[str]
+        typed_array(names)
+
+    with pytest.raises(TypeError):
+        NotPrimitive.__idl__.populate()
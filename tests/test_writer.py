@@ -1,9 +1,12 @@
 import pytest
 
-from cyclonedds.core import DDSException
+from cyclonedds.core import DDSException, InstanceState
+from cyclonedds.internal import InvalidSample
 from cyclonedds.domain import DomainParticipant
 from cyclonedds.topic import Topic
 from cyclonedds.pub import Publisher, DataWriter
+from cyclonedds.sub import DataReader
+from cyclonedds.qos import Qos, Policy
 from cyclonedds.util import duration, isgoodentity
 
 from testtopics import Message, MessageKeyed
@@ -86,3 +89,36 @@ def test_writer_lookup():
     assert handle1 > 0 and handle2 > 0 and handle1 != handle2
     assert handle1 == dw.lookup_instance(keymsg1)
     assert handle2 == dw.lookup_instance(keymsg2)
+
+
+def test_writer_many_instances():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    pub = Publisher(dp)
+    dw = DataWriter(pub, tp)
+    dr = DataReader(dp, tp)
+
+    msgs = [MessageKeyed(user_id=i, message="Hello") for i in range(10)]
+    dw.write_many(msgs, timestamp=[duration(seconds=i + 1) for i in range(10)])
+    received = dr.read(N=20)
+    assert received == msgs
+    assert [s.sample_info.source_timestamp for s in received] == [duration(seconds=i + 1) for i in range(10)]
+
+    dw.dispose_many(msgs[:5])
+    dw.unregister_many(msgs[5:], timestamp=duration(seconds=20))
+    for sample in dr.read(N=40):
+        user_id = (sample.sample() if isinstance(sample, InvalidSample) else sample).user_id
+        expected = InstanceState.NotAliveDisposed if user_id < 5 else InstanceState.NotAliveNoWriters
+        assert sample.sample_info.instance_state == expected
+
+    with pytest.raises(ValueError):
+        dw.write_many(msgs, timestamp=[1, 2])
+
+
+def test_writer_many_coherent():
+    dp = DomainParticipant(0)
+    tp = Topic(dp, "MessageKeyed", MessageKeyed)
+    pub = Publisher(dp, qos=Qos(Policy.PresentationAccessScope.Topic(coherent_access=True, ordered_access=False)))
+    dw = DataWriter(pub, tp)
+
+    dw.write_many([MessageKeyed(user_id=i, message="Hello") for i in range(10)], coherent=True)
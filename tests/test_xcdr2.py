@@ -0,0 +1,285 @@
+import pytest
+import struct
+import test_classes as tc
+from test_classes import reading
+
+from dataclasses import dataclass, field
+from hashlib import md5
+from typing import Optional
+
+from cyclonedds._clayer import ddspy_calc_key
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import appendable, mutable, autoid, key, must_understand
+from cyclonedds.idl._support import Endianness
+import cyclonedds.idl.types as pt
+
+
+telemetry = tc.ExtensibleTelemetry(
+    id=5, d=1.5, names=["a", "bc", ""], vectors=[tc.Vector(1, 2, 3)],
+    vector_array=[tc.AppendableVector(1, 2, 3), tc.AppendableVector(0, 0, 0)],
+    reading=reading, union=tc.AppendableUnion(b="hi"), opt=3, char='z'
+)
+
+xcdr2_test_data = [
+    tc.AppendableVector(1.5, 2.5, -3),
+    tc.SingleUnion(value=tc.EasyUnion(a=3)),
+    reading,
+    tc.MutableReading(
+        id=0, value=0, label="", samples=[], note="present", level=tc.BasicEnum.One,
+        position=tc.AppendableVector(0, 0, 0)
+    ),
+    telemetry,
+    tc.ExtensibleTelemetry(
+        id=-1, d=0, names=[], vectors=[], vector_array=[tc.AppendableVector(0, 0, 0)] * 2,
+        reading=reading, union=tc.AppendableUnion(c=tc.AppendableVector(1, 1, 1)),
+        opt=None, char='a'
+    ),
+    tc.MutableKeyHolder(flag=True, reading=reading, extra=telemetry),
+    tc.HashedMembers(name="nm", count=3, weights=[1.0, 2.0]),
+    tc.Telemetry(
+        a=1, b=2, position=tc.Vector(1.5, 2.5, 3), name="héllo", arr=[1, 2, 3], seq=[1.0, 2.0],
+        vectors=[tc.Vector(1, 2, 3)], opt=None, enum=tc.BasicEnum.Two, char='x', d=5, blob=b'abc',
+        union=tc.EasyUnion(a=3), vector_array=[tc.Vector(0, 0, 0), tc.Vector(1, 1, 1)]
+    ),
+]
+
+
+@pytest.fixture(params=["native", "compiled", "machines"])
+def path(request, monkeypatch):
+    for value in xcdr2_test_data:
+        idl = value.__idl__
+        idl.populate()
+        if request.param != "native":
+            for name in ("native_serialize", "native_serialize_into", "native_serialize_many",
+                         "native_deserialize", "native_deserialize_many"):
+                monkeypatch.setattr(idl, name, None)
+        if request.param == "machines":
+            monkeypatch.setattr(idl, "codecs", None)
+            monkeypatch.setattr(idl, "codecs_v2", None)
+    return request.param
+
+
+@pytest.mark.parametrize("value", xcdr2_test_data)
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_xcdr2_roundtrip(value, endianness, path):
+    data = value.serialize(endianness=endianness, use_version_2=True)
+    assert data[1] & 1 == (endianness == Endianness.Little)
+    assert data[1] >= 6
+    assert type(value).deserialize(data) == value
+    assert value.serialized_size(use_version_2=True) == len(data)
+
+
+@pytest.mark.parametrize("value", xcdr2_test_data)
+def test_xcdr2_paths_agree(value, monkeypatch):
+    data = value.serialize(use_version_2=True)
+    idl = value.__idl__
+    monkeypatch.setattr(idl, "native_serialize", None)
+    assert value.serialize(use_version_2=True) == data
+    monkeypatch.setattr(idl, "codecs_v2", None)
+    assert value.serialize(use_version_2=True) == data
+
+
+@pytest.mark.parametrize("value", xcdr2_test_data)
+def test_xcdr2_key(value):
+    idl = value.__idl__
+    if idl.keyless:
+        return
+    # Keys are always XCDR1, whatever the encoding of the sample
+    assert ddspy_calc_key(idl, value.serialize(use_version_2=True)) == idl.key(value)
+    assert ddspy_calc_key(idl, value.serialize(endianness=Endianness.Big, use_version_2=True)) == idl.key(value)
+
+
+@dataclass
+class KeyPart(IdlStruct, typename="KeyPart"):
+    flag: pt.int8
+    code: pt.int16
+    count: pt.int32
+
+
+@dataclass
+class StaticKeys(IdlStruct, typename="StaticKeys"):
+    a: pt.int8
+    key(a)
+    b: pt.int8
+    key(b)
+    skipped: pt.array[pt.int16, 3]
+    c: pt.int64
+    key(c)
+    parts: pt.array[KeyPart, 2]
+    key(parts)
+    d: pt.uint32
+    key(d)
+    e: pt.uint32
+    key(e)
+    label: str
+
+
+@pytest.mark.parametrize("use_version_2", [False, True])
+@pytest.mark.parametrize("endianness", [Endianness.Little, Endianness.Big])
+def test_xcdr2_static_key(endianness, use_version_2):
+    # Keys at fixed offsets are copied out directly, in XCDR2 the int64 lands on a 4 byte boundary
+    value = StaticKeys(a=1, b=-2, skipped=[3, 4, 5], c=-6, parts=[KeyPart(7, 8, 9), KeyPart(-1, -2, -3)], d=10, e=11,
+                       label="abc")
+    data = value.serialize(endianness=endianness, use_version_2=use_version_2)
+    assert ddspy_calc_key(StaticKeys.__idl__, data) == StaticKeys.__idl__.key(value)
+
+
+def test_xcdr2_default_encapsulation():
+    assert tc.AppendableVector(1, 2, 3).serialize(endianness=Endianness.Little)[:2] == b'\x00\x09'
+    assert reading.serialize(endianness=Endianness.Big)[:2] == b'\x00\x0a'
+    assert tc.MutableKeyHolder(True, reading, telemetry).serialize(endianness=Endianness.Little)[:2] == b'\x00\x07'
+    # Types that are final all the way down stay XCDR1 unless asked
+    assert tc.Vector(1, 2, 3).serialize(endianness=Endianness.Little)[:2] == b'\x00\x01'
+    assert tc.Vector(1, 2, 3).serialize(endianness=Endianness.Big, use_version_2=True)[:2] == b'\x00\x06'
+
+
+def test_xcdr2_mutable_requires_version_2():
+    with pytest.raises(Exception):
+        reading.serialize(use_version_2=False)
+    with pytest.raises(Exception):
+        telemetry.serialize(use_version_2=False)
+
+
+def test_xcdr2_alignment():
+    # An 8 byte member after a 4 byte one is not padded in XCDR2
+    v = tc.Vector(1.5, 2.5, 3)
+    assert len(v.serialize()) == 4 + 4 + 4 + 8 + 1
+    assert v.serialize(endianness=Endianness.Big, use_version_2=True) == \
+        b'\x00\x06\x00\x00' + struct.pack(">fdb", 1.5, 2.5, 3)
+    assert tc.Vector.deserialize(v.serialize(use_version_2=True)) == v
+
+
+def test_xcdr2_appendable_layout():
+    data = tc.AppendableVector(1.5, 2.5, 3).serialize(endianness=Endianness.Big)
+    assert data == b'\x00\x08\x00\x00' + struct.pack(">IfdB", 13, 1.5, 2.5, 3)
+
+
+def test_xcdr2_mutable_layout():
+    data = tc.HashedMembers(name="nm", count=3, weights=[1.0, 2.0]).serialize(endianness=Endianness.Little)
+
+    def member_id(name):
+        return int.from_bytes(md5(name.encode()).digest()[:4], 'little') & 0x0FFFFFFF
+
+    assert data[:4] == b'\x00\x0b\x00\x00'
+    assert data[4:8] == struct.pack("<I", len(data) - 8)
+    # Key member: must understand flag, length code 4 (NEXTINT) and the hashed id
+    assert data[8:16] == struct.pack("<II", 0x80000000 | 4 << 28 | member_id("name"), 7)
+    assert data[16:23] == struct.pack("<I", 3) + b'nm\0'
+    # uint16: length code 1, no NEXTINT
+    assert data[24:30] == struct.pack("<IH", 1 << 28 | member_id("count"), 3)
+
+
+@dataclass
+@appendable
+class ShapeV1(IdlStruct, typename="Shape"):
+    x: pt.int32
+    y: pt.float64
+
+
+@dataclass
+@appendable
+class ShapeV2(IdlStruct, typename="Shape"):
+    x: pt.int32
+    y: pt.float64
+    label: Optional[str]
+    sizes: pt.sequence[pt.int64]
+
+
+@dataclass
+@appendable
+class ShapeV3(IdlStruct, typename="Shape"):
+    x: pt.int32
+    y: pt.float64
+    label: Optional[str]
+    sizes: pt.sequence[pt.int64]
+    origin: tc.Vector
+    kind: tc.BasicEnum
+    scale: pt.float32 = 1.0
+    tags: pt.sequence[str] = field(default_factory=lambda: ["new"])
+
+
+@dataclass
+@mutable
+@autoid("hash")
+class ReadingV1(IdlStruct, typename="Reading"):
+    id: pt.uint32
+    key(id)
+    value: pt.float64
+    label: str
+
+
+@dataclass
+@mutable
+@autoid("hash")
+class ReadingV2(IdlStruct, typename="Reading"):
+    unit: str
+    label: str
+    id: pt.uint32
+    key(id)
+    value: pt.float64
+    extra: pt.sequence[pt.int16]
+    note: Optional[str]
+
+
+@dataclass
+@mutable
+@autoid("hash")
+class ReadingV3(IdlStruct, typename="Reading"):
+    id: pt.uint32
+    key(id)
+    value: pt.float64
+    label: str
+    critical: pt.int8
+    must_understand(critical)
+
+
+def test_xcdr2_appendable_skips_unknown_members(path):
+    data = ShapeV2(x=1, y=2.5, label="new", sizes=[1, 2, 3]).serialize()
+    assert ShapeV1.deserialize(data) == ShapeV1(x=1, y=2.5)
+
+
+def test_xcdr2_appendable_missing_members(path):
+    # Members appended after the data was written get their default, or else the zero value of their type
+    data = ShapeV1(x=1, y=2.5).serialize()
+    assert ShapeV2.deserialize(data) == ShapeV2(x=1, y=2.5, label=None, sizes=[])
+    assert ShapeV3.deserialize(data) == ShapeV3(
+        x=1, y=2.5, label=None, sizes=[], origin=tc.Vector(0, 0, 0), kind=tc.BasicEnum.One, scale=1.0, tags=["new"]
+    )
+
+
+def test_xcdr2_mutable_evolution(path):
+    # Hashed member ids survive reordering
+    v2 = ReadingV2(unit="m", label="x", id=3, value=1.25, extra=[1, 2], note="n")
+    assert ReadingV1.deserialize(v2.serialize()) == ReadingV1(id=3, value=1.25, label="x")
+
+    v1 = ReadingV1(id=3, value=1.25, label="x")
+    assert ReadingV2.deserialize(v1.serialize()) == ReadingV2(unit="", label="x", id=3, value=1.25, extra=[], note=None)
+
+
+def test_xcdr2_mutable_sequential_ids():
+    data = reading.serialize(endianness=Endianness.Little)
+    assert struct.unpack_from("<II", data, 8) == (0x80000000 | 2 << 28 | 0, 7)
+    assert struct.unpack_from("<I", data, 16)[0] == 3 << 28 | 1
+
+
+def test_xcdr2_unknown_must_understand(path):
+    data = ReadingV3(id=3, value=1.25, label="x", critical=1).serialize()
+    with pytest.raises(Exception):
+        ReadingV1.deserialize(data)
+
+
+def test_xcdr2_max_serialized_size():
+    assert tc.AppendableVector.max_serialized_size() == 4 + 4 + 4 + 8 + 1
+    assert tc.AppendableVector(1, 2, 3).serialized_size() == tc.AppendableVector.max_serialized_size()
+    assert tc.MutableReading.max_serialized_size() is None
+    assert tc.HashedMembers.max_serialized_size() is None
+
+
+def test_xcdr2_serialize_many(path):
+    samples = [reading, tc.MutableReading(
+        id=1, value=0, label="a", samples=[5], note="b", level=tc.BasicEnum.Three,
+        position=tc.AppendableVector(1, 1, 1)
+    )]
+    data, offsets = tc.MutableReading.serialize_many(samples)
+    assert data[offsets[1]:offsets[2]] == samples[1].serialize()
+    assert tc.MutableReading.deserialize_many(data, offsets) == samples
@@ -0,0 +1,54 @@
+import pytest
+import test_classes as tc
+
+from dataclasses import dataclass
+from cyclonedds.idl import IdlStruct
+from cyclonedds.idl.annotations import zero_copy
+from cyclonedds.idl._support import Buffer
+import cyclonedds.idl.types as pt
+
+
+@pytest.fixture(params=["machines", "compiled", "native"])
+def path(request, monkeypatch):
+    idl = tc.Blob.__idl__
+    idl.populate()
+    if request.param == "native" and idl.native_deserialize is None:
+        pytest.skip("C layer not available")
+    if request.param != "native":
+        monkeypatch.setattr(idl, "native_deserialize", None)
+    if request.param == "machines":
+        monkeypatch.setattr(idl, "codecs", None)
+    return request.param
+
+
+def test_zero_copy_bytes_reference_data(path):
+    sample = tc.Blob(name="blöb", payload=bytes(range(256)) * 64, checksum=7, copied=b"abc")
+    data = sample.serialize()
+
+    decoded = tc.Blob.deserialize(data)
+    assert decoded == sample
+    assert isinstance(decoded.payload, memoryview)
+    assert decoded.payload.obj is data
+    assert type(decoded.copied) == bytes
+    assert decoded.name == "blöb"
+
+
+def test_readonly_buffer():
+    data = bytes(range(16))
+    buffer = Buffer(data, readonly=True)
+    assert buffer.read('I', 4) == int.from_bytes(data[:4], "little" if buffer._endian == "<" else "big")
+    assert buffer.read_view(4).obj is data
+    assert buffer.tell() == 8
+
+    with pytest.raises(TypeError):
+        buffer.write('I', 4, 1)
+
+
+def test_zero_copy_requires_bytes():
+    @dataclass
+    class NotBytes(IdlStruct):
+        value: pt.sequence[pt.uint8]
+        zero_copy(value)
+
+    with pytest.raises(TypeError):
+        NotBytes.__idl__.populate()